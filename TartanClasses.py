@@ -26,15 +26,18 @@ COPYING
 # ========================================================
 # Standard Python modules
 # ========================================================
-import copy, csv, datetime, functools, glob, gzip, math, os, re, shutil
-import subprocess, sys, tarfile, tempfile, textwrap, threading, time
+import array, collections, copy, csv, datetime, functools, glob, gzip
+import hashlib, importlib, io, json
+import math, os, pickle, re, shutil, struct, subprocess, sys, tarfile
+import tempfile, textwrap, threading, time
 # ========================================================
 # TARTAN Standard Functions and Variables e.g. showError
 # ========================================================
 from tartanFunctions import askQuestion, b64Convert, chkAggregate, chkMod
 from tartanFunctions import copyList, dateDiff, doPrinter, doWriteExport
 from tartanFunctions import getColors, getCost, getFileName, getFontSize
-from tartanFunctions import getImage, getModName, getPeriods, getPrgPath
+from tartanFunctions import getImage, getMailMessage, getMailServer
+from tartanFunctions import getModName, getPeriods, getPrgPath
 from tartanFunctions import getPrinters, getSell, getSingleRecords, getTrn
 from tartanFunctions import getUnderline, loadRcFile, luhnFunc, makeArray
 from tartanFunctions import mthendDate, parsePrg, printPDF, projectDate
@@ -49,13 +52,51 @@ try:
 except:
     changes = None
 # ========================================================
+# Optional modules, only imported when first used
+# ========================================================
+class LazyModule(object):
+    """
+    A stand-in for an optional module which is only imported when one of
+    its attributes is first used, or it is first tested for, so that
+    modules which are seldom used do not slow down starting up. It is True
+    if the module can be imported, and is also used as the flag of the
+    module e.g. if XLSX: openpyxl.load_workbook(...)
+
+    name - The name of the module e.g. "progress.bar"
+    init - A function to call with the module once it has been imported
+    """
+    def __init__(self, name, init=None):
+        self._name = name
+        self._init = init
+        self._module = None
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                self._module = importlib.import_module(self._name)
+                if self._init:
+                    self._init(self._module)
+            except:
+                self._module = None
+        return self._module
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        mod = self._load()
+        if mod is None:
+            raise ImportError("No module named %s" % self._name)
+        return getattr(mod, attr)
+# ========================================================
 # TkinterHtml
 # ========================================================
-try:
-    from tkinterhtml import HtmlFrame
-    HTML = True
-except:
-    HTML = False
+tkinterhtml = LazyModule("tkinterhtml")
+HTML = tkinterhtml
 # ========================================================
 # PyFPDF
 # ========================================================
@@ -70,62 +111,43 @@ if not fpdf.fpdf.Image:
 # ========================================================
 # MuPDF
 # ========================================================
-try:
-    import pymupdf
-    pymupdf.TOOLS.mupdf_display_errors(False)
-    FITZ = True
-except:
-    FITZ = False
+pymupdf = LazyModule("pymupdf",
+    init=lambda mod: mod.TOOLS.mupdf_display_errors(False))
+FITZ = pymupdf
 # ========================================================
 # Excel import and export modules
 # ========================================================
-try:
-    from pyexcel_xls import get_data as getxls
-    XLS = True
-except:
-    XLS = False
-try:
-    import openpyxl
-    XLSX = True
-except:
-    XLSX = False
+pyexcel_xls = LazyModule("pyexcel_xls")
+XLS = pyexcel_xls
+openpyxl = LazyModule("openpyxl")
+XLSX = openpyxl
 # ========================================================
 # Openoffice import module
 # ========================================================
-try:
-    from pyexcel_ods import get_data as getods
-    ODS = True
-except:
-    ODS = False
+pyexcel_ods = LazyModule("pyexcel_ods")
+ODS = pyexcel_ods
 # ========================================================
 # Curses Progress Bar
 # ========================================================
-try:
-    from progress.bar import Bar
-    TBAR = True
-except:
-    TBAR = False
+progbar = LazyModule("progress.bar")
+TBAR = progbar
+# ========================================================
+# Zstandard compression of backups
+# ========================================================
+zstandard = LazyModule("zstandard")
+ZSTD = zstandard
 # ========================================================
 # PyGal imports
 # ========================================================
-try:
-    import pygal
-    PYGAL = True
-except:
-    PYGAL = False
-try:
-    import cairosvg
-    CVTSVG = True
-except:
-    CVTSVG = False
+pygal = LazyModule("pygal")
+PYGAL = pygal
+cairosvg = LazyModule("cairosvg")
+CVTSVG = cairosvg
 # ========================================================
 # OfxTools import
 # ========================================================
-try:
-    from ofxtools.Parser import OFXTree
-    OFX = True
-except:
-    OFX = False
+ofxparser = LazyModule("ofxtools.Parser")
+OFX = ofxparser
 # ========================================================
 # RGB color tuple
 # ========================================================
@@ -1888,6 +1910,110 @@ Please enjoy yourself while you wait ..."""
         else:
             self.scrn.update()
 
+class Schema(object):
+    """
+    A process wide registry of the ffield and ftable records of a database.
+
+    The records are read once and the resulting structures are shared by all
+    Sql instances using the same database until the registry is cleared by
+    Dbase.clearSchema which is called when tables are created, populated or
+    dropped.
+
+        tables = A dictionary of tables having:
+                    {"table": [table_col, table_fld, table_dic]}
+        keys   = A dictionary of unique indexes having:
+                    {"table": [ftable record, ...]}
+        queries = A dictionary of compiled getRec statements having:
+                    {(tables, join, cols, where shape, group, order):
+                        [statement, uses]}
+        impdbd = Whether or not the delrec table exists
+        search = A list of the tables having search indexes
+        hits   = The number of tables served from the registry
+        misses = The number of times the registry was loaded
+    """
+    registry = {}
+    lock = threading.RLock()
+
+    def __init__(self):
+        self.loaded = False
+        self.tables = {}
+        self.keys = {}
+        self.queries = {}
+        self.impdbd = False
+        self.search = []
+        self.hits = 0
+        self.misses = 0
+
+    def loadSchema(self, dbm):
+        self.tables = {}
+        self.keys = {}
+        dbm.cu.execute("Select * from ffield order by ff_tabl, ff_seq")
+        for c in dbm.cu.fetchall():
+            if c[0] not in self.tables:
+                self.tables[c[0]] = [[], "", {}]
+            tab = self.tables[c[0]]
+            tab[0].append(c[2])
+            if not tab[1]:
+                tab[1] = c[2]
+            else:
+                tab[1] = "%s, %s" % (tab[1], c[2])
+            tab[2][c[2]] = [c[0], c[1], c[3], c[4], c[5], c[6]]
+        if dbm.checkTable("ftable"):
+            dbm.cu.execute("Select * from ftable where ft_type = 'U' "
+                "order by ft_tabl, ft_seq")
+            for k in dbm.cu.fetchall():
+                self.keys.setdefault(k[0], []).append(list(k))
+        if dbm.checkTable("delrec"):
+            self.impdbd = True
+        else:
+            self.impdbd = False
+        self.search = []
+        for table in tartanWork.srchdic:
+            if dbm.checkSearch(table):
+                self.search.append(table)
+        self.loaded = True
+        self.misses += 1
+
+    def getTable(self, dbm, table):
+        with self.lock:
+            if not self.loaded:
+                self.loadSchema(dbm)
+            if table in self.tables:
+                self.hits += 1
+                return self.tables[table]
+
+    def getKeys(self, dbm, table):
+        with self.lock:
+            if not self.loaded:
+                self.loadSchema(dbm)
+            return self.keys.get(table, [])
+
+    def getImpdbd(self, dbm):
+        with self.lock:
+            if not self.loaded:
+                self.loadSchema(dbm)
+            return self.impdbd
+
+    def getSearch(self, dbm):
+        with self.lock:
+            if not self.loaded:
+                self.loadSchema(dbm)
+            return self.search
+
+    def addQuery(self, key, qry):
+        with self.lock:
+            if len(self.queries) >= 5000:
+                # Limit the size of the cache
+                self.queries = {}
+            self.queries[key] = qry
+
+    def clearSchema(self):
+        with self.lock:
+            self.loaded = False
+            self.tables = {}
+            self.keys = {}
+            self.queries = {}
+
 class Dbase(object):
     """
     A class to manipulate databases.
@@ -1949,6 +2075,7 @@ class Dbase(object):
                 raise Exception("Invalid Database Type (%s)" % self.dbase)
             self.err = False
             self.dbopen = False
+            self.prepared = {}
             self.engine = engine
             if not self.setVariables():
                 raise Exception("Variables Error")
@@ -2067,8 +2194,12 @@ class Dbase(object):
             else:
                 self.db = self.engine.connect(database=self.dbdsn)
                 self.db.text_factory = str
+                # The record hash of Sql.getPrint
+                self.db.create_function("tartan_hash", -1, hashRow,
+                    deterministic=True)
             self.cu = self.db.cursor()
             self.setAutoCommit(auto)
+            self.prepared = {}
             self.dbopen = True
         except Exception as e:
             self.db = self.cu = None
@@ -2137,6 +2268,7 @@ class Dbase(object):
                 self.closeDbase()
             else:
                 os.remove(self.dbdsn)
+            self.clearSchema()
         except:
             showException(self.screen, self.wrkdir,
                 "Database %s" % self.dbname)
@@ -2233,6 +2365,8 @@ class Dbase(object):
                     qry = "Create index %s_key%s on %s (%s)" % \
                         (table, str(key[2]), table, kk)
                 self.cu.execute(qry)
+            # Create the search index
+            self.createSearch(table, drop=True)
         # Set permissions
         if self.dbase == "PgSQL":
             self.cu.execute("Select * from pg_catalog.pg_group where "
@@ -2245,6 +2379,7 @@ class Dbase(object):
             if sequence:
                 self.cu.execute("Grant ALL on %s_%s_seq to group %s" %
                     (table, sequence, self.dbname))
+        self.clearSchema()
 
     def populateTable(self, table, commit=True):
         # Populate ftable and ffield tables
@@ -2267,8 +2402,10 @@ class Dbase(object):
             self.cu.execute(qry, k)
         if commit:
             self.db.commit()
+        self.clearSchema()
 
     def dropTable(self, table, frecs=False):
+        self.dropSearch(table)
         if self.checkTable(table):
             self.cu.execute("Drop table %s" % table)
         if frecs:
@@ -2276,6 +2413,133 @@ class Dbase(object):
                 "Delete from ffield where ff_tabl = '%s'" % table)
             self.cu.execute(
                 "Delete from ftable where ft_tabl = '%s'" % table)
+        self.clearSchema()
+
+    def checkSearch(self, table):
+        "Check to see if the search index of a table exists"
+        if self.dbase == "PgSQL":
+            self.cu.execute("Select indexname from pg_indexes where "
+                "indexname = '%s_srch0'" % table)
+        else:
+            self.cu.execute("Select name from SQLITE_MASTER where "
+                "name = '%s_fts' and type = 'table'" % table)
+        return self.cu.fetchone()
+
+    def createSearch(self, table, drop=False):
+        """
+        Create the search index of the columns of a table in srchdic and
+        index its existing records.
+
+        SQLite - A fts5 table, using the trigram tokenizer, having the table
+                 as its content and kept in sync by triggers on the table.
+        PgSQL  - A gin index on each column using the pg_trgm extension.
+
+        The index is not created if fts5 or pg_trgm are not available.
+        """
+        if table not in tartanWork.srchdic:
+            return
+        if self.checkSearch(table):
+            if not drop:
+                return
+            self.dropSearch(table)
+        cols = tartanWork.srchdic[table]
+        if self.dbase == "PgSQL":
+            trans = not self.db.autocommit
+            try:
+                if trans:
+                    self.cu.execute("Savepoint tartan_search")
+                self.cu.execute("Create extension if not exists pg_trgm")
+                for num, col in enumerate(cols):
+                    self.cu.execute("Create index %s_srch%s on %s using "
+                        "gin (%s gin_trgm_ops)" % (table, num, table, col))
+                if trans:
+                    self.cu.execute("Release savepoint tartan_search")
+            except:
+                if trans:
+                    self.cu.execute("Rollback to savepoint tartan_search")
+            self.clearSchema()
+            return
+        fts = "%s_fts" % table
+        try:
+            self.cu.execute("Create virtual table %s using fts5(%s, "
+                "content='%s', tokenize='trigram')" % (fts, ", ".join(cols),
+                table))
+        except:
+            return
+        new = ", ".join(["new.%s" % col for col in cols])
+        old = ", ".join(["old.%s" % col for col in cols])
+        cols = ", ".join(cols)
+        self.cu.execute("Create trigger %s_ins after insert on %s begin "
+            "insert into %s (rowid, %s) values (new.rowid, %s); end" %
+            (fts, table, fts, cols, new))
+        self.cu.execute("Create trigger %s_del after delete on %s begin "
+            "insert into %s (%s, rowid, %s) values ('delete', old.rowid, "
+            "%s); end" % (fts, table, fts, fts, cols, old))
+        self.cu.execute("Create trigger %s_upd after update of %s on %s "
+            "begin insert into %s (%s, rowid, %s) values ('delete', "
+            "old.rowid, %s); insert into %s (rowid, %s) values (new.rowid, "
+            "%s); end" % (fts, cols, table, fts, fts, cols, old, fts, cols,
+            new))
+        self.cu.execute("Insert into %s (%s) values ('rebuild')" % (fts, fts))
+        self.clearSchema()
+
+    def dropSearch(self, table):
+        if table not in tartanWork.srchdic or not self.checkSearch(table):
+            return
+        if self.dbase == "PgSQL":
+            for num in range(len(tartanWork.srchdic[table])):
+                self.cu.execute("Drop index if exists %s_srch%s" %
+                    (table, num))
+        else:
+            for trg in ("ins", "del", "upd"):
+                self.cu.execute("Drop trigger if exists %s_fts_%s" %
+                    (table, trg))
+            self.cu.execute("Drop table %s_fts" % table)
+        self.clearSchema()
+
+    def getKey(self):
+        "Return the key identifying this database in process wide caches"
+        if self.dbase == "PgSQL":
+            return (self.dbase, self.dbhost, str(self.dbport), self.dbname)
+        return (self.dbase, os.path.abspath(self.dbdsn))
+
+    def getSchema(self):
+        "Return the process wide Schema registry for this database"
+        key = self.getKey()
+        with Schema.lock:
+            if key not in Schema.registry:
+                Schema.registry[key] = Schema()
+            return Schema.registry[key]
+
+    def clearSchema(self):
+        "Discard the cached table structures after a change to the tables"
+        self.getSchema().clearSchema()
+        if self.dbase == "PgSQL" and self.dbopen and self.prepared:
+            self.cu.execute("Deallocate all")
+        self.prepared = {}
+
+def copyText(val):
+    """
+    Return a value in the text format of the PgSQL copy command.
+    """
+    if val is None:
+        return "\\N"
+    if type(val) is str:
+        return val.replace("\\", "\\\\").replace("\t", "\\t").replace(
+            "\n", "\\n").replace("\r", "\\r")
+    if type(val) is float:
+        return repr(val)
+    if type(val) in (bytes, bytearray, memoryview):
+        return "\\\\x%s" % bytes(val).hex()
+    return str(val)
+
+def hashRow(*args):
+    """
+    Return a signed 32 bit hash of a record, registered as the tartan_hash
+    function of SQLite connections by Dbase.openDbase for Sql.getPrint.
+    """
+    dig = hashlib.md5(repr(args).encode("utf-8")).digest()
+    return struct.unpack(">i", dig[:4])[0]
 
 class Sql(object):
     """
@@ -2284,7 +2548,12 @@ class Sql(object):
         table_fld  = A string of all column names comma delimited
         table_dic  = A dictionary of columns having:
                      {"colname": [table, seq, type, size, desc, head]}
+
+    The table_col and table_dic structures are shared by all instances via
+    the Schema registry and must therefore not be altered.
     """
+    cursors = 0
+
     def __init__(self, dbm, tables=None, error=True, prog=None):
         """
         dbm    - The database class
@@ -2298,31 +2567,22 @@ class Sql(object):
         else:
             self.prog = "unknown"
         self.error = []
+        self.schema = self.dbm.getSchema()
+        self.stb = None
         if not tables:
             return
         elif type(tables) is str:
             self.tables = [tables]
         else:
             self.tables = tables
+        # The column structures are shared with the Schema registry
         for table in self.tables:
             setattr(self, table, table)
-            self.dbm.cu.execute("Select * from ffield where ff_tabl='%s' "
-                "order by ff_seq" % table)
-            cols = self.dbm.cu.fetchall()
-            if cols and type(cols) in (list, tuple):
-                col = []
-                fld = ""
-                dic = {}
-                for n, c in enumerate(cols):
-                    col.append(c[2])
-                    if not fld:
-                        fld = c[2]
-                    else:
-                        fld = "%s, %s" % (fld, c[2])
-                    dic[c[2]] = [table, c[1], c[3], c[4], c[5], c[6]]
-                setattr(self, "%s_col" % table, col)
-                setattr(self, "%s_fld" % table, fld)
-                setattr(self, "%s_dic" % table, dic)
+            tab = self.schema.getTable(self.dbm, table)
+            if tab:
+                setattr(self, "%s_col" % table, tab[0])
+                setattr(self, "%s_fld" % table, tab[1])
+                setattr(self, "%s_dic" % table, tab[2])
             else:
                 self.error.append(table)
         if error and self.error:
@@ -2331,10 +2591,14 @@ class Sql(object):
                 mess = "%s%s, " % (mess, tab)
             mess = mess[:-2]
             showError(self.dbm.screen, "Error", mess)
-        if self.dbm.checkTable("delrec"):
-            self.impdbd = True
-        else:
-            self.impdbd = False
+        self.impdbd = self.schema.getImpdbd(self.dbm)
+
+    def getStrBal(self):
+        # The stores balances summary which is kept up to date with strtrn
+        if not self.stb:
+            self.stb = StrBal(self.dbm)
+        if self.stb.active:
+            return self.stb
 
     def sqlRec(self, state=None, limit=None, fetch=False):
         """
@@ -2377,7 +2641,7 @@ class Sql(object):
                         self.dbm.cu.execute(state[0], state[1][0])
                 else:
                     self.dbm.cu.execute(state[0], state[1])
-            if comm[0].lower() == "select" or comm[0].lower() == "show":
+            if comm[0].lower() in ("select", "show", "execute"):
                 if fetch:
                     return
                 elif limit and limit == 1:
@@ -2469,6 +2733,7 @@ class Sql(object):
             self.ndat = []
         # Create data
         self.ndat = []
+        recs = []
         for onum, odat in enumerate(data):
             try:
                 tdat = list(odat)
@@ -2486,10 +2751,11 @@ class Sql(object):
                     dat = tdat[:len(col)]
                 if dofmt:
                     for n, c in enumerate(fld):
-                        chk = CCD(dat[n], dic[c][2], dic[c][3])
-                        if chk.err:
-                            raise Exception(chk.err)
-                        dat[n] = chk.work
+                        work, disp, err = getCCF(dic[c][2],
+                            dic[c][3]).format(dat[n])
+                        if err:
+                            raise Exception(err)
+                        dat[n] = work
             except Exception as err:
                 showError(None, "insRec Error",
                     """Data and CSV Formats Differ
@@ -2501,9 +2767,7 @@ Table %s in Program %s""" % (err, table, self.prog))
                 os._exit(1)
             # Test and Correct for a Column in Unique Keys (e.g. drt_ref1)
             if unique:
-                cols = self.sqlRec(state=("Select * from ftable where "\
-                    "ft_tabl=%s and ft_type = 'U' order by ft_seq" %
-                    self.dbm.dbf, (table,)))
+                cols = self.schema.getKeys(self.dbm, table)
                 ok = False
                 for key in cols:
                     if unique in key[4:]:
@@ -2535,6 +2799,8 @@ Table %s in Program %s""" % (err, table, self.prog))
                     d = CCD(d, typ, siz)
                     dat[col.index(unique)] = d.work
                     cnt += 1
+            if table == "strtrn":
+                recs.append(dat)
             # Insert records
             if not self.dbm.mrecs:
                 # Single record insert
@@ -2554,6 +2820,118 @@ Table %s in Program %s""" % (err, table, self.prog))
         if self.ndat:
             # Multiple records remainder
             multiples()
+        if recs and self.getStrBal():
+            self.stb.addRecs(recs)
+
+    def bulkRec(self, table, data=None, dofmt=True, xprt=True, pbar=None, size=5000):
+        """
+        A bulk load of pre-validated records, where no unique columns are
+        required, in the current transaction. SQLite uses executemany and
+        PgSQL uses copy from stdin. Returns the number of records inserted
+        and sets self.rate to the records loaded per second.
+
+        table   = The table to insert into
+        data    = A list, or iterable, of lists of all the column's data
+        dofmt   = Whether or not to format the data, a column at a time
+        xprt    = Blank the export flag
+        pbar    = ProgressBar object
+        size    = The number of records per executemany or copy
+
+        The strbal summary of strtrn is not kept up to date, see StrBal.
+        """
+        if table not in self.tables:
+            showError(None, "bulkRec Error",
+                "Table %s Not In Sql Tables\n\nIn module %s" %
+                (table, self.prog))
+            self.dbm.rollbackDbase()
+            sys.exit()
+        st = time.perf_counter()
+        dic = getattr(self, "%s_dic" % table)
+        col = getattr(self, "%s_col" % table)
+        xfl = None
+        idx = None
+        fld = []
+        for n, c in enumerate(col):
+            if xprt and c.count("_xflag"):
+                xfl = c
+                idx = n
+            elif dic[c][2] == "US":
+                if idx is None:
+                    idx = n
+                continue
+            fld.append(c)
+        if idx is None:
+            idx = len(col)
+        if dofmt:
+            fmts = []
+            for c in fld:
+                fmts.append(getCCF(dic[c][2], dic[c][3]))
+        if self.dbm.dbase == "PgSQL":
+            put = "Copy %s (%s) from stdin" % (table, ",".join(fld))
+        else:
+            put = "Insert into %s (%s) values (%s)" % (table, ",".join(fld),
+                ",".join([self.dbm.dbf] * len(fld)))
+        rows = 0
+        chunk = []
+        for rec in data or []:
+            # Clear/Add the export field and drop the sequence field
+            if xfl:
+                chunk.append(list(rec[:idx]) + [""])
+            else:
+                chunk.append(rec[:idx])
+            if len(chunk) < size:
+                continue
+            rows += self.bulkLoad(table, put, chunk, fmts if dofmt else None)
+            if pbar:
+                pbar.displayProgress(rows)
+            chunk = []
+        if chunk:
+            rows += self.bulkLoad(table, put, chunk, fmts if dofmt else None)
+        self.rate = rows / max(time.perf_counter() - st, 0.000001)
+        return rows
+
+    def bulkLoad(self, table, put, chunk, fmts=None):
+        """
+        Format a chunk of bulkRec records by column and load them.
+        """
+        if fmts:
+            try:
+                cols = []
+                for num, dat in enumerate(zip(*chunk)):
+                    works, disps, errs = fmts[num].column(dat)
+                    if any(errs):
+                        raise Exception([err for err in errs if err][0])
+                    cols.append(works)
+                chunk = list(zip(*cols))
+            except Exception as err:
+                showError(None, "bulkRec Error",
+                    """Data and CSV Formats Differ
+
+(%s)
+
+Table %s in Program %s""" % (err, table, self.prog))
+                self.dbm.rollbackDbase()
+                os._exit(1)
+        try:
+            if self.dbm.dbase == "PgSQL":
+                buf = io.StringIO()
+                for rec in chunk:
+                    buf.write("\t".join(map(copyText, rec)))
+                    buf.write("\n")
+                buf.seek(0)
+                self.dbm.cu.copy_expert(put, buf)
+            else:
+                self.dbm.cu.executemany(put, chunk)
+        except:
+            try:
+                self.dbm.rollbackDbase()
+            except:
+                pass
+            showException(self.dbm.screen, self.dbm.wrkdir,
+                "Error Executing SQL Statement\n\n%s\n\nIn module %s" %
+                (put, self.prog), dbm=self.dbm)
+            os._exit(1)
+        return len(chunk)
 
     def getRec(self, tables, join=None, cols=None, where=None, group=None, order=None, fetch=False, limit=None):
         """
@@ -2588,6 +2966,110 @@ Table %s in Program %s""" % (err, table, self.prog))
         # convert tables to list if string
         if type(tables) is str:
             tables = [tables]
+        if where:
+            # Selection of records
+            shape, dat = self.parseWhere(where)
+        else:
+            # All records
+            shape = dat = None
+        qry = self.getQuery(tables, join, cols, shape, group, order)
+        qry[1] += 1
+        get = qry[0]
+        if not dat:
+            return self.sqlRec(get, fetch=fetch, limit=limit)
+        if self.dbm.dbase == "PgSQL" and qry[1] > 2:
+            # Frequently used statement, use a server side prepared statement
+            name = self.prepareRec(get, len(dat))
+            if name:
+                get = "Execute %s (%s)" % (name, ",".join(["%s"] * len(dat)))
+        return self.sqlRec((get, dat), fetch=fetch, limit=limit)
+
+    def iterRec(self, tables, join=None, cols=None, where=None, group=None, order=None, size=1000):
+        """
+        A generator yielding the records of a getRec statement one at a time.
+
+        The statement is executed on its own cursor, a server side one with
+        PgSQL, and size records are fetched at a time so that all the records
+        are never held in memory and other statements can be executed while
+        iterating. The arguments are as per getRec.
+        """
+        if type(tables) is str:
+            tables = [tables]
+        if where:
+            shape, dat = self.parseWhere(where)
+        else:
+            shape, dat = None, []
+        get = self.getQuery(tables, join, cols, shape, group, order)[0]
+        try:
+            if self.dbm.dbase == "PgSQL" and not self.dbm.db.autocommit:
+                Sql.cursors += 1
+                cur = self.dbm.db.cursor(name="tartan_cursor_%s" %
+                    Sql.cursors, withhold=True)
+                cur.itersize = size
+            else:
+                cur = self.dbm.db.cursor()
+            cur.execute(get, dat)
+        except:
+            try:
+                self.dbm.rollbackDbase()
+            except:
+                pass
+            showException(self.dbm.screen, self.dbm.wrkdir,
+                "Error Executing SQL Statement\n\n%s\n\nIn module %s" %
+                (str((get, dat)), self.prog), dbm=self.dbm)
+            os._exit(1)
+        try:
+            while True:
+                recs = cur.fetchmany(size)
+                if not recs:
+                    break
+                for rec in recs:
+                    yield list(rec)
+        finally:
+            cur.close()
+
+    def getPrint(self, table, where=None):
+        """
+        Return the fingerprint of the records selected by where, being their
+        count and the sum of a hash of each whole record, computed by the
+        database so that records amended, deleted or replaced are detected.
+        """
+        col = getattr(self, "%s_col" % table)
+        if self.dbm.dbase == "PgSQL":
+            fun = "sum(('x' || substr(md5(row(%s)::text), 1, 8))::bit(32)"\
+                "::int4)" % ",".join(col)
+        else:
+            fun = "sum(tartan_hash(%s))" % ",".join(col)
+        cnt, tot = self.getRec(table, cols=["count(*)", fun], where=where,
+            limit=1)
+        return [cnt, int(tot or 0)]
+
+    def getQuery(self, tables, join=None, cols=None, shape=None, group=None, order=None):
+        """
+        Return the compiled statement, and the number of times it has been
+        used, for this shape of query from the Schema registry, compiling it
+        if not available.
+        """
+        try:
+            if cols:
+                key = (tuple(tables), join, tuple(cols), shape, group, order)
+            else:
+                key = (tuple(tables), join, None, shape, group, order)
+            qry = self.schema.queries.get(key)
+        except TypeError:
+            key = qry = None
+        if qry is None:
+            qry = [self.compileRec(tables, join, cols, shape, group, order), 0]
+            if key is not None:
+                self.schema.addQuery(key, qry)
+        return qry
+
+    def compileRec(self, tables, join=None, cols=None, shape=None, group=None, order=None):
+        """
+        Build the select statement for getRec with placeholders for the data.
+
+        shape = The where statement fragments as returned by parseWhere
+        """
         # Start the get statement
         get = "Select"
         # If no cols get all columns
@@ -2650,31 +3132,48 @@ Table %s in Program %s""" % (err, table, self.prog))
         get = get[:-1]
         if join:
             get = "%s %s" % (get, join)
-        if where:
-            # Selection of records
-            whr, dat = self.getSqlWhere(where)
-        else:
-            # All records
-            whr = None
-            dat = None
-        if whr:
-            get = "%s %s" % (get, whr)
+        if shape:
+            get = "%s %s" % (get, self.joinWhere(shape))
         if grpreq and grpcol:
             if not group:
                 group = grpcol
-            else:
-                g1 = group.split()
-                gr = []
-                for g in g1:
-                    gr.append(g.replace(",", ""))
         if group:
             get = "%s group by %s" % (get, group)
         if order:
             get = "%s order by %s" % (get, order)
-        if not dat:
-            return self.sqlRec(get, fetch=fetch, limit=limit)
-        else:
-            return self.sqlRec((get, dat), fetch=fetch, limit=limit)
+        return get
+
+    def prepareRec(self, get, cnt):
+        """
+        Return the name of a PgSQL prepared statement for get else None.
+
+        get = The select statement having cnt %s placeholders
+        """
+        prepared = self.dbm.prepared
+        if get in prepared:
+            return prepared[get]
+        parts = get.split("%s")
+        if len(parts) != cnt + 1:
+            prepared[get] = None
+            return
+        txt = parts[0]
+        for num, part in enumerate(parts[1:]):
+            txt = "%s$%s%s" % (txt, num + 1, part)
+        name = "tartan_%s" % len(prepared)
+        trans = not self.dbm.db.autocommit
+        try:
+            if trans:
+                self.dbm.cu.execute("Savepoint tartan_prepare")
+            self.dbm.cu.execute("Prepare %s as %s" % (name,
+                txt.replace("%%", "%")))
+            if trans:
+                self.dbm.cu.execute("Release savepoint tartan_prepare")
+        except:
+            if trans:
+                self.dbm.cu.execute("Rollback to savepoint tartan_prepare")
+            name = None
+        prepared[get] = name
+        return name
 
     def updRec(self, table, where=None, data=None, cols=None, dofmt=True):
         """
@@ -2717,6 +3216,15 @@ Table %s in Program %s""" % (err, table, self.prog))
                         dat[num] = rec[num]
                 self.insRec(table, data=dat)
                 return
+        sums = None
+        if table == "strtrn" and self.getStrBal():
+            # Subtract the summary of the records before updating them
+            bals = ["stt_%s" % key for key in StrBal.keys]
+            bals.extend(["stt_qty", "stt_cost", "stt_sell"])
+            if not cols or [col for col in cols if col in bals]:
+                seqs = [rec[0] for rec in self.getRec(table,
+                    cols=["stt_seq"], where=where)]
+                sums = self.stb.getSums(where)
         if not cols:
             cols = ccc[:]
         if len(data) != len(cols):
@@ -2730,19 +3238,25 @@ Table %s in Program %s""" % (err, table, self.prog))
             else:
                 cmd = "%s, %s = %s" % (cmd, col, self.dbm.dbf)
             if dofmt:
-                dat = CCD(data[num], dic[col][2], dic[col][3])
-                if dat.err:
+                work, disp, err = getCCF(dic[col][2],
+                    dic[col][3]).format(data[num])
+                if err:
                     showError(None, "updRec Error",
                         "Invalid Data for %s in table %s\n\n%s\n\n%s" %
-                        (dic[col][4], table, data, dat.err))
+                        (dic[col][4], table, data, err))
                     sys.exit()
-                data[num] = dat.work
+                data[num] = work
         dat = copyList(data)
         if where:
             whr, ext = self.getSqlWhere(where)
             dat.extend(ext)
             cmd = "%s %s" % (cmd, whr)
         self.sqlRec((cmd, tuple(dat)))
+        if sums:
+            self.stb.addSums(sums, -1)
+            for num in range(0, len(seqs), 500):
+                self.stb.addSums(self.stb.getSums([("stt_seq", "in",
+                    tuple(seqs[num:num + 500]))]))
 
     def delRec(self, table, cols=None, data=None, where=None):
         """
@@ -2797,36 +3311,58 @@ Table %s in Program %s""" % (err, table, self.prog))
                     # Exported record
                     self.sqlRec(("Insert into delrec values (%s, %s)" %
                         (self.dbm.dbf, self.dbm.dbf), (table, str(rec))))
+        sums = None
+        if table == "strtrn" and self.getStrBal():
+            # The summary of the records being deleted
+            if where:
+                sums = self.stb.getSums(where)
+            elif data:
+                sums = self.stb.getSums([(col, "=", data[num])
+                    for num, col in enumerate(cols)])
+            else:
+                sums = self.stb.getSums()
         self.sqlRec(cmd)
+        if sums:
+            self.stb.addSums(sums, -1)
 
     def getSqlWhere(self, where):
-        whr = ""
+        shape, dat = self.parseWhere(where)
+        return self.joinWhere(shape), dat
+
+    def parseWhere(self, where):
+        """
+        Split a where statement, as per getRec, into a tuple of the fragments
+        of the statement, with placeholders for the data, and a list of the
+        data. The fragments are used as the shape of the statement in the
+        compiled query cache.
+        """
+        whr = []
         dat = []
         for w in where:
             if len(w) == 1:
                 if not whr:
-                    whr = "where %s" % w[0]
+                    whr.append("where %s" % w[0])
                 else:
-                    whr = "%s and %s" % (whr, w[0])
+                    whr.append(" and %s" % w[0])
                 continue
             flag = None
             for c in w:
                 if not flag:
                     if not whr:
-                        whr = "where %s" % c
+                        whr.append("where %s" % c)
                     else:
-                        whr = "%s and %s" % (whr, c)
+                        whr.append(" and %s" % c)
                     if c in ("(", ")"):
                         flag = "a"
                     else:
                         flag = "f"
                 elif flag == "a":
-                    whr = "%s %s" % (whr, c)
+                    whr.append(" %s" % c)
                     flag = "f"
                 elif flag == "f":
                     if c.lower() == "ilike" and self.dbm.dbase != "PgSQL":
                         c = "like"
-                    whr = "%s %s" % (whr, c)
+                    whr.append(" %s" % c)
                     if c.lower() == "between":
                         flag = "b1"
                     elif c.lower() == "not":
@@ -2836,7 +3372,7 @@ Table %s in Program %s""" % (err, table, self.prog))
                     else:
                         flag = "b0"
                 elif flag in ("b0", "b1"):
-                    whr = "%s %s" % (whr, self.dbm.dbf)
+                    whr.append(" %s" % self.dbm.dbf)
                     if type(c) == float:
                         dat.append(str(c))
                     else:
@@ -2846,33 +3382,32 @@ Table %s in Program %s""" % (err, table, self.prog))
                     else:
                         flag = "b2"
                 elif flag == "b2":
-                    whr = "%s and %s" % (whr, self.dbm.dbf)
+                    whr.append(" and %s" % self.dbm.dbf)
                     if type(c) == float:
                         dat.append(str(c))
                     else:
                         dat.append(c)
                     flag = "n"
                 elif flag == "i":
-                    whr = "%s (" % whr
-                    for x in c:
-                        whr = "%s %s," % (whr, self.dbm.dbf)
-                        if type(c) == float:
-                            dat.append(str(x))
-                        else:
-                            dat.append(x)
-                    whr = whr[:-1] + ")"
+                    whr.append(" (%s)" % ",".join(
+                        [" %s" % self.dbm.dbf] * len(c)))
+                    dat.extend(c)
                     flag = "n"
                 elif flag in ("n", "x"):
-                    whr = "%s %s" % (whr, c)
+                    whr.append(" %s" % c)
                     if c in ("(", ")"):
                         continue
                     if flag == "n":
                         flag = "x"
                     else:
                         flag = "f"
+        return tuple(whr), dat
+
+    def joinWhere(self, shape):
+        whr = "".join(shape)
         if self.dbm.dbase == "PgSQL":
             whr = whr.replace(" % ", " %% ")
-        return whr, dat
+        return whr
 
 class CCD(object):
     """
@@ -3301,6 +3836,228 @@ class CCD(object):
         else:
             self.work = self.disp = ""
 
+class CCF(object):
+    """
+    A compiled formatter returning exactly the same work, disp and err as
+    CCD for data of a type and size, where:
+
+        types - The data type as per CCD
+        size  - The data size as per CCD
+
+    Data of the usual python type e.g. an int for UI, a str for NA or an
+    int date for D1, is checked and formatted directly while other data is
+    formatted by CCD, caching the results of the first distinct values.
+
+    Use getCCF to return the shared formatter of a type and size e.g.
+
+        work, disp, err = getCCF("SD", 13.2).format(data)
+        works, disps, errs = getCCF("SD", 13.2).column(datas)
+    """
+    cache = {}
+
+    def __init__(self, types, size=0):
+        if len(types) == 3:
+            types = types[1:]
+        self.types = types
+        self.size = size
+        self.quo = int(size)
+        self.rem = int(round((size % 1) * 10))
+        self.memo = {}
+        if self.quo:
+            self.top = 10 ** self.quo
+        else:
+            self.top = 0
+        if types in ("CB", "RB", "RW"):
+            self.format = self.fmtRaw
+        elif types in ("FD", "FF", "TS"):
+            # Not cached, depends on the file system or is not formatted
+            self.format = self.newCCD
+        elif types in ("UI", "US", "UL", "ID"):
+            self.format = self.fmtUnsigned
+        elif types in ("SI", "SL", "CI"):
+            self.format = self.fmtSigned
+        elif types in ("UD", "SD", "CD"):
+            self.format = self.fmtDecimal
+        elif types in ("NA", "TX", "Tv"):
+            self.format = self.fmtText
+        elif types in ("UA", "LA", "HA", "TV"):
+            self.format = self.fmtAlpha
+        elif types in ("Na", "Ua", "La"):
+            self.format = self.fmtRight
+        elif types in ("D1", "d1"):
+            self.format = self.fmtDate
+        elif types in ("D2", "d2"):
+            self.format = self.fmtPeriod
+        else:
+            self.format = self.fmtCCD
+
+    def column(self, datas):
+        """
+        Return lists of the work, disp and err of a column of data.
+        """
+        rets = list(map(self.format, datas))
+        if not rets:
+            return [], [], []
+        works, disps, errs = zip(*rets)
+        return list(works), list(disps), list(errs)
+
+    def fmtRaw(self, data):
+        return data, data, ""
+
+    def fmtUnsigned(self, data):
+        if type(data) is int and 0 <= data < self.top:
+            return data, str(data).rjust(self.quo), ""
+        return self.fmtCCD(data)
+
+    def fmtSigned(self, data):
+        if type(data) is int:
+            if self.types == "CI":
+                txt = "{:,}".format(abs(data))
+            else:
+                txt = str(abs(data))
+            if data < 0:
+                txt += "-"
+            else:
+                txt += " "
+            if len(txt) <= self.quo:
+                return data, txt.rjust(self.quo), ""
+        return self.fmtCCD(data)
+
+    def fmtDecimal(self, data):
+        if type(data) not in (int, float) or not self.rem:
+            return self.fmtCCD(data)
+        txt = str(data)
+        if txt.count("e") or txt.count("n"):
+            # Exponents, inf and nan
+            return self.fmtCCD(data)
+        if self.types == "UD":
+            if txt.count("-"):
+                return self.fmtCCD(data)
+            work = round(float(data), self.rem)
+            txt = str(work)
+        else:
+            work = round(float(data), self.rem)
+            if not work:
+                work = 0.0
+            if self.types == "SD":
+                txt = str(work)
+            else:
+                txt = "{:,}".format(work)
+        dec = txt.split(".")
+        if len(dec) != 2 or len(dec[0]) > self.quo - (self.rem + 1) or \
+                len(dec[1]) > self.rem:
+            return self.fmtCCD(data)
+        txt = txt + ((self.rem - len(dec[1])) * "0")
+        if self.types != "UD":
+            if work < 0:
+                txt = txt.replace("-", "") + "-"
+            else:
+                txt = txt + " "
+        disp = txt.rjust(self.quo)
+        d = len(disp) - self.quo
+        if d > 0:
+            disp = disp[d:]
+        return work, disp, ""
+
+    def fmtText(self, data):
+        if type(data) is str and data.isascii() and data.isprintable() and \
+                not data.count("\\"):
+            if self.types == "NA":
+                work = data.rstrip()[:self.quo]
+                return work, work.ljust(self.quo), ""
+            work = data.strip()
+            return work, work, ""
+        return self.fmtCCD(data)
+
+    def fmtAlpha(self, data):
+        if type(data) is str:
+            if self.types == "TV":
+                work = data.strip()
+                return work, work, ""
+            work = data.strip()[:self.quo]
+            if self.types == "UA":
+                work = work.upper()
+            elif self.types == "LA":
+                work = work.lower()
+            return work, work.ljust(self.quo), ""
+        return self.fmtCCD(data)
+
+    def fmtRight(self, data):
+        # Right justified if numeric, only clear cut data is direct
+        if type(data) is not str or not data.isascii():
+            return self.fmtCCD(data)
+        if self.types == "Na":
+            if not data.isprintable() or data.count("\\"):
+                return self.fmtCCD(data)
+            txt = data.rstrip()[:self.quo]
+        else:
+            txt = data.strip()[:self.quo]
+        if txt.isdigit():
+            work = str(int(txt)).rjust(self.quo)
+            return work, work, ""
+        if not set(txt).difference("+-_0123456789 \t\n\r\x0b\x0c"):
+            return self.fmtCCD(data)
+        if self.types == "Ua":
+            txt = txt.upper()
+        elif self.types == "La":
+            txt = txt.lower()
+        return txt, txt.ljust(self.quo), ""
+
+    def fmtDate(self, data):
+        if type(data) is int and 10000000 <= data <= 99991231:
+            yy, mm = divmod(data, 10000)
+            mm, dd = divmod(mm, 100)
+            try:
+                datetime.date(yy, mm, dd)
+            except:
+                return self.fmtCCD(data)
+            disp = "%04i-%02i-%02i" % (yy, mm, dd)
+            if len(disp) < self.size:
+                disp = disp + (" " * (int(self.size / 1) - len(disp)))
+            return data, disp, ""
+        return self.fmtCCD(data)
+
+    def fmtPeriod(self, data):
+        if type(data) is int and 100001 <= data <= 999912:
+            yy, mm = divmod(data, 100)
+            if not 0 < mm < 13:
+                return self.fmtCCD(data)
+            disp = "%04i-%02i" % (yy, mm)
+            if len(disp) < self.size:
+                disp = disp + (" " * (int(self.size / 1) - len(disp)))
+            return data, disp, ""
+        return self.fmtCCD(data)
+
+    def fmtCCD(self, data):
+        if type(data) is float:
+            # Keep 0.0 and -0.0 apart
+            key = (float, repr(data))
+        else:
+            key = (type(data), data)
+        try:
+            return self.memo[key]
+        except KeyError:
+            pass
+        except TypeError:
+            return self.newCCD(data)
+        ret = self.newCCD(data)
+        if len(self.memo) < 10000:
+            self.memo[key] = ret
+        return ret
+
+    def newCCD(self, data):
+        ccd = CCD(data, self.types, self.size)
+        return ccd.work, ccd.disp, ccd.err
+
+def getCCF(types, size=0):
+    """
+    Return the shared CCF formatter of a data type and size.
+    """
+    key = (types, size)
+    if key not in CCF.cache:
+        CCF.cache[key] = CCF(types, size)
+    return CCF.cache[key]
+
 class ASD(object):
     """
     Used for Adding and Subtracting Floats as follows:
@@ -3324,6 +4081,60 @@ class ASD(object):
     def __float__(self):
         return(round((self.amt / self.multiply), self.decimals))
 
+class ACC(object):
+    """
+    Used for Accumulating Floats as integer cents, giving exactly the same
+    results as repeatedly using ASD, as follows:
+
+    total = ACC()
+    total.add(amount1)          # total = float(ASD(total) + ASD(amount1))
+    total.sub(amount2)          # total = float(ASD(total) - ASD(amount2))
+    total.addAll(amounts)       # add each amount of a list or column
+    answer = float(total)
+    """
+    # Below this the cents of ASD survive its float round trip unchanged
+    limit = 2 ** 50
+
+    def __init__(self, amount=0, decimals=2):
+        self.decimals = decimals
+        self.multiply = 1.0
+        for x in range(decimals):
+            self.multiply = self.multiply * 10
+        self.amt = int(round((float(amount) * self.multiply), 0))
+
+    def add(self, amount):
+        self.amt += int(round((float(amount) * self.multiply), 0))
+        if not -self.limit < self.amt < self.limit:
+            self.setCents()
+        return self
+
+    def sub(self, amount):
+        self.amt -= int(round((float(amount) * self.multiply), 0))
+        if not -self.limit < self.amt < self.limit:
+            self.setCents()
+        return self
+
+    def addAll(self, amounts):
+        mlt = self.multiply
+        amts = [int(round((float(a) * mlt), 0)) for a in amounts]
+        if abs(self.amt) + sum(map(abs, amts)) < self.limit:
+            self.amt += sum(amts)
+        else:
+            for amt in amts:
+                self.amt += amt
+                if not -self.limit < self.amt < self.limit:
+                    self.setCents()
+        return self
+
+    def setCents(self):
+        # Repeat the float round trip of ASD for very large amounts
+        amt = int(round(((self.amt / self.multiply) * self.multiply), 0))
+        amt = round((amt / self.multiply), self.decimals)
+        self.amt = int(round((amt * self.multiply), 0))
+
+    def __float__(self):
+        return(round((self.amt / self.multiply), self.decimals))
+
 class DBCreate(object):
     """
     This is used to setup a database and create necessary tables.
@@ -6557,13 +7368,25 @@ class SRec(object):
                 fltr = True
             self.coll.append(col)
         self.setTableFields()
+        page = None
         if self.wtype == "D":
             self.data = self.where
-        else:
+        elif self.wtype or self.extra:
             self.data = self.getSelectStatement()
             if self.extra:
                 for num, exr in enumerate(self.extra):
                     self.data.insert(num, exr)
+        else:
+            # Fetch the records a page at a time if possible
+            cols = self.getSelectColumns()
+            pager = LookupPager(self.mf.dbm, self.tables, cols,
+                where=self.where, group=self.group, order=self.order)
+            if pager.pageable:
+                self.data, keys, more = pager.getPage()
+                if more:
+                    page = [pager, keys, more]
+            else:
+                self.data = self.getSelectStatement(cols)
         if not self.data:
             self.gt = 0
         else:
@@ -6574,7 +7397,7 @@ class SRec(object):
             self.selection = self.data
         else:
             sc = SelectChoice(self.screen, self.title, self.cols, self.data,
-                sort=self.sort, butt=self.butt, fltr=fltr)
+                sort=self.sort, butt=self.butt, fltr=fltr, page=page)
             if self.butt and sc.button:
                 sc.button(sc.selection)
             elif sc.selection:
@@ -6627,8 +7450,8 @@ class SRec(object):
                 self.cols.append([col[0], col[3], col[2], col[1], sch])
         self.l1 = self.l1[:-1]
 
-    def getSelectStatement(self):
-        sql = Sql(self.mf.dbm, self.tables, prog=__name__)
+    def getSelectColumns(self):
+        # Return the columns and set the group and order statements
         cols = []
         for col in self.cols:
             cols.append(col[0])
@@ -6651,6 +7474,12 @@ class SRec(object):
             for col in cols:
                 if not col.count("("):
                     self.order = col
+        return cols
+
+    def getSelectStatement(self, cols=None):
+        if cols is None:
+            cols = self.getSelectColumns()
+        sql = Sql(self.mf.dbm, self.tables, prog=__name__)
         return sql.getRec(tables=self.tables, cols=cols, where=self.where,
             group=self.group, order=self.order)
 
@@ -6790,6 +7619,301 @@ class SChoice(object):
                         elif self.retn == "I":
                             self.selection.append(sel[0])
 
+class LookupPager(object):
+    """
+    This class fetches the records of a lookup a page at a time using keyset
+    paging i.e. a page is selected by the values of the ordering columns of
+    the last, or first, record of the adjacent page so that the position is
+    found using the indexes instead of fetching all the preceding records.
+
+    dbm    - The Dbase object.
+    tables - A list of the tables.
+    cols   - A list of the columns to return as per Sql.getRec.
+    where  - A list of where conditions as per Sql.getRec else None.
+    group  - The group statement else None.
+    order  - The order statement e.g. "drm_name, drm_acno desc".
+    size   - The number of records per page.
+
+    The ordering is made unique by adding the columns of the group statement,
+    or else of the unique index of every table, to the order. If this is not
+    possible, e.g. the order contains a function, pageable is False.
+
+    Filters and searches on the columns of a table in srchdic use its search
+    index, see Dbase.createSearch, if it exists.
+    """
+    def __init__(self, dbm, tables, cols, where=None, group=None, order=None, size=200):
+        if type(tables) is str:
+            tables = [tables]
+        self.sql = Sql(dbm, tables, prog=__name__)
+        self.tables = tables
+        self.cols = list(cols)
+        if where:
+            self.where = list(where)
+        else:
+            self.where = []
+        self.group = group
+        self.size = size
+        self.fltr = []
+        self.keys = []
+        self.pageable = self.setOrder(order)
+        self.search = []
+        for tab in self.sql.schema.getSearch(dbm):
+            if tab in self.tables:
+                self.search.append(tab)
+
+    def isColumn(self, col):
+        # Whether col is a column of one of the tables
+        for tab in self.tables:
+            if col in getattr(self.sql, "%s_dic" % tab):
+                return True
+        return False
+
+    def setOrder(self, order):
+        """
+        Set the order of the records, returns False if it cannot be paged.
+        """
+        if not self.group:
+            for col in self.cols:
+                for agg in ("count(", "sum(", "avg(", "max(", "min("):
+                    if col.lower().count(agg):
+                        # Implicitly grouped
+                        return False
+        keys = []
+        if order:
+            for col in order.split(","):
+                col = col.split()
+                if len(col) == 2 and col[1].lower() in ("asc", "desc"):
+                    desc = bool(col[1].lower() == "desc")
+                elif len(col) == 1:
+                    desc = False
+                else:
+                    return False
+                if not self.isColumn(col[0]):
+                    return False
+                if col[0] not in [key[0] for key in keys]:
+                    keys.append((col[0], desc))
+        if self.group:
+            uniq = [col.strip() for col in self.group.split(",")]
+        else:
+            uniq = []
+            for tab in self.tables:
+                idx = self.sql.schema.getKeys(self.sql.dbm, tab)
+                if not idx:
+                    return False
+                uniq.extend([col for col in idx[0][4:] if col])
+        for col in uniq:
+            if not self.isColumn(col):
+                return False
+            if col not in [key[0] for key in keys]:
+                keys.append((col, False))
+        self.keys = keys
+        return True
+
+    def setSort(self, col, descending=False):
+        """
+        Order the records by the column numbered col, returns False if it
+        cannot be paged in which case the order is unchanged.
+        """
+        if not self.isColumn(self.cols[col]):
+            return False
+        keys = self.keys
+        if descending:
+            order = "%s desc" % self.cols[col]
+        else:
+            order = self.cols[col]
+        if not self.setOrder(order):
+            self.keys = keys
+            return False
+        return True
+
+    def getFilter(self, col, text, begins=False):
+        """
+        Return the where condition selecting the records where the column
+        numbered col contains, or begins with, text else None if this cannot
+        be done in the database i.e. the column is a function or text is a
+        pattern.
+        """
+        nam = self.cols[col]
+        if not self.isColumn(nam):
+            return
+        text = str(text)
+        for c in ".^$*+?{}[]\\|()%_":
+            if c in text:
+                return
+        size = len(text)
+        if begins:
+            text = "%s%%" % text
+        else:
+            text = "%%%s%%" % text
+        for tab in self.tables:
+            dic = getattr(self.sql, "%s_dic" % tab)
+            if nam in dic:
+                typ = dic[nam][2]
+                break
+        if tab in self.search and nam in tartanWork.srchdic[tab] and \
+                self.sql.dbm.dbase == "SQLite" and size > 2:
+            # Match the phrase in the fts5 table, ^ being the start of the
+            # column, pg_trgm indexes are used by ilike
+            text = '"%s"' % text.strip("%").replace('"', '""')
+            if begins:
+                text = "%s : ^ %s" % (nam, text)
+            else:
+                text = "%s : %s" % (nam, text)
+            return ("%s.rowid in (select rowid from %s_fts where %s_fts" % (
+                tab, tab, tab), "match", text, ")")
+        if typ[1] not in ("A", "a", "X"):
+            nam = "cast(%s as varchar)" % nam
+        return (nam, "ilike", text)
+
+    def getOrder(self, direction):
+        # The order statement of the keys, reversed for the previous page
+        order = []
+        for col, desc in self.keys:
+            if desc == bool(direction == "P"):
+                order.append(col)
+            else:
+                order.append("%s desc" % col)
+        return ", ".join(order)
+
+    def getKeyset(self, key, direction, incl=False):
+        # The where conditions selecting the records after, or before, key
+        oper = []
+        for col, desc in self.keys:
+            if desc == bool(direction == "P"):
+                oper.append(">")
+            else:
+                oper.append("<")
+        # The first column on its own allows the use of an index
+        whr = [(self.keys[0][0], "%s=" % oper[0], key[0])]
+        cond = ["("]
+        for num in range(len(self.keys)):
+            if num:
+                cond.extend(["or", "("])
+            for idx in range(num):
+                cond.extend([self.keys[idx][0], "=", key[idx], "and"])
+            if incl and num == len(self.keys) - 1:
+                cond.extend([self.keys[num][0], "%s=" % oper[num], key[num]])
+            else:
+                cond.extend([self.keys[num][0], oper[num], key[num]])
+            if num:
+                cond.append(")")
+        cond.append(")")
+        whr.append(tuple(cond))
+        return whr
+
+    def getPage(self, key=None, direction="N", incl=False, size=None):
+        """
+        Return a list of the records, a list of their keys and whether there
+        are more records, of the page following, direction "N", or preceding,
+        direction "P", the record having key else the first or last page.
+
+        incl - Include the record having key.
+        size - The number of records else the default page size.
+        """
+        if size is None:
+            size = self.size
+        whr = self.where + self.fltr
+        if key is not None:
+            whr = whr + self.getKeyset(key, direction, incl)
+        # The limit is added to the order statement as getRec only limits
+        # the number of records fetched from the cursor
+        order = "%s limit %s" % (self.getOrder(direction), size + 1)
+        recs = self.sql.getRec(tables=self.tables, cols=self.cols +
+            [col for col, desc in self.keys], where=whr or None,
+            group=self.group, order=order)
+        more = bool(len(recs) > size)
+        recs = recs[:size]
+        if direction == "P":
+            recs.reverse()
+        num = len(self.cols)
+        return [rec[:num] for rec in recs], [rec[num:] for rec in recs], more
+
+    def getAll(self):
+        """
+        Return all the records of the current order and filter.
+        """
+        return self.sql.getRec(tables=self.tables, cols=self.cols,
+            where=self.where + self.fltr or None, group=self.group,
+            order=self.getOrder("N"))
+
+    def getMatches(self, text, size=None):
+        """
+        Return a list of the records, and a list of their keys, having all
+        the words of text, of 3 or more characters, in the columns of the
+        search index ranked by relevance, or empty lists if not possible.
+
+        size - The number of records else the default page size.
+        """
+        if not self.search or self.group:
+            return [], []
+        if size is None:
+            size = self.size
+        words = [word for word in text.split() if len(word) > 2]
+        if not words:
+            return [], []
+        tab = self.search[0]
+        cols = self.cols + [col for col, desc in self.keys]
+        num = len(self.cols)
+        if self.sql.dbm.dbase == "SQLite":
+            # Fetch the records of the ranked rowids of the fts5 table, a
+            # batch at a time, until there are enough
+            fts = "%s_fts" % tab
+            qry = " ".join(['"%s"' % word.replace('"', '""')
+                for word in words])
+            recs = []
+            keys = []
+            start = 0
+            while len(recs) < size:
+                rows = self.sql.sqlRec(("Select rowid from %s where %s "
+                    "match ? order by rank limit 500 offset %s" % (fts, fts,
+                    start), [qry]))
+                if not rows:
+                    break
+                rows = [row[0] for row in rows]
+                data = {}
+                for rec in self.sql.getRec(tables=self.tables, cols=cols +
+                        ["%s.rowid" % tab], where=self.where + self.fltr +
+                        [("%s.rowid" % tab, "in", rows)]):
+                    data[rec[-1]] = rec[:-1]
+                for row in rows:
+                    if row in data:
+                        recs.append(data[row][:num])
+                        keys.append(data[row][num:])
+                start += 500
+            return recs[:size], keys[:size]
+        whr = self.where + self.fltr
+        for word in words:
+            cond = ["("]
+            for idx, col in enumerate(tartanWork.srchdic[tab]):
+                if idx:
+                    cond.append("or")
+                cond.extend([col, "ilike", "%%%s%%" % word])
+            cond.append(")")
+            whr.append(tuple(cond))
+        text = self.sql.dbm.cu.mogrify("%s", (text,))
+        if type(text) == bytes:
+            text = text.decode("utf-8")
+        order = "similarity(concat_ws(' ', %s), %s) desc limit %s" % (
+            ", ".join(tartanWork.srchdic[tab]), text.replace("%", "%%"), size)
+        recs = self.sql.getRec(tables=self.tables, cols=cols, where=whr,
+            order=order)
+        return [rec[:num] for rec in recs], [rec[num:] for rec in recs]
+
+    def findKey(self, col, text, begins=False, key=None, direction="N"):
+        """
+        Return the key of the first record, following or preceding key, where
+        the column numbered col contains, or begins with, text else None.
+        """
+        fltr = self.getFilter(col, text, begins)
+        if fltr is None:
+            return
+        whr = self.fltr
+        self.fltr = whr + [fltr]
+        keys = self.getPage(key, direction, size=1)[1]
+        self.fltr = whr
+        if keys:
+            return keys[0]
+
 class SelectChoice(object):
     """
     This class displays a scrolled list of items.
@@ -6840,8 +7964,13 @@ class SelectChoice(object):
     rowc   - Alternate the colours of every x rows e.g.
              rowc = (2, "black", "white", "black", "grey") or
              rowc = 2
+    page   - A list of a LookupPager, the keys of the records in data and
+             whether there are more records, in which case data is the first
+             page and further pages are fetched as the list is scrolled. The
+             searching, sorting and filtering of the records is then done by
+             the database where possible.
     """
-    def __init__(self, scrn, titl, cols, data, lines=0, sort=True, wait=True, cmnd=None, butt=None, neww=True, deco=True, modal=True, live=True, posn=None, fltr=False, scrl=True, styl="Treeview", font="TkHeadingFont", escape=True, colr=None, rowc=1):
+    def __init__(self, scrn, titl, cols, data, lines=0, sort=True, wait=True, cmnd=None, butt=None, neww=True, deco=True, modal=True, live=True, posn=None, fltr=False, scrl=True, styl="Treeview", font="TkHeadingFont", escape=True, colr=None, rowc=1, page=None):
         self.scrn = scrn
         self.ocol = cols
         if titl:
@@ -6882,6 +8011,13 @@ class SelectChoice(object):
             self.sort = False
         else:
             self.sort = sort
+        if page and not self.chek:
+            self.pager, self.dkey, more = page
+            self.atstart = True
+            self.atend = not more
+        else:
+            self.pager = None
+        self.loading = False
         self.wait = wait
         self.cmnd = cmnd
         if butt is None:
@@ -6989,13 +8125,15 @@ class SelectChoice(object):
             self.tree.configure(padding=[-15, 0, 0, 0])
         self.tree.grid(column=0, row=0, sticky="nswe")
         if self.scrl:
-            vsb = ttk.Scrollbar(self.mstFrame, orient="vertical",
+            self.vsb = ttk.Scrollbar(self.mstFrame, orient="vertical",
                 command=self.tree.yview)
-            vsb.grid(column=1, row=0, sticky="ns")
+            self.vsb.grid(column=1, row=0, sticky="ns")
             hsb = ttk.Scrollbar(self.mstFrame, orient="horizontal",
                 command=self.tree.xview)
             hsb.grid(column=0, row=1, sticky="ew")
-            self.tree.configure(xscroll=hsb.set, yscroll=vsb.set)
+            self.tree.configure(xscroll=hsb.set, yscroll=self.vsb.set)
+        if self.pager:
+            self.tree.configure(yscroll=self.doYscroll)
         if not self.wait:
             return
         exits = False
@@ -7087,10 +8225,6 @@ class SelectChoice(object):
                 background=self.rowc[2])
             self.tree.tag_configure("B", foreground=self.rowc[3],
                 background=self.rowc[4])
-            self.cchg = []
-            for x in range(0, len(self.data), (self.rowc[0] * 2)):
-                for y in range(self.rowc[0]):
-                    self.cchg.extend([x + y])
         self.iids = {}
         start = None
         last = None
@@ -7151,7 +8285,7 @@ class SelectChoice(object):
             self.window.grab_set()
             self.tree.focus_force()
 
-    def addItem(self, num, item):
+    def addItem(self, num, item, posn="end"):
         item = list(item)
         if self.chek:
             chk = item.pop(0)
@@ -7177,13 +8311,13 @@ class SelectChoice(object):
                 item[idx] = ccd.disp
             item[idx] = item[idx].replace("\n", " \n")
         if self.chek:
-            if self.rowc and num in self.cchg:
+            if self.rowc and num % (self.rowc[0] * 2) < self.rowc[0]:
                 tags = ["T%s" % num, "A", "font"]
             elif self.rowc:
                 tags = ["T%s" % num, "B", "font"]
             else:
                 tags = ["T%s" % num, "font"]
-            iid = self.tree.insert("", "end", image=img, values=item,
+            iid = self.tree.insert("", posn, image=img, values=item,
                 tags=tags)
             self.tree.tag_bind("T%s" % num, "<ButtonRelease-1>",
                 functools.partial(self.doToggle, iid))
@@ -7192,18 +8326,89 @@ class SelectChoice(object):
             self.tree.tag_bind("T%s" % num, "<Return>",
                 functools.partial(self.doToggle, iid))
         else:
-            if self.colr and item[self.colr[0]] in self.colr[1]:
-                tags = ["font", item[self.colr[0]]]
-            elif self.rowc and num in self.cchg:
-                tags = ["font", "A"]
-            elif self.rowc:
-                tags = ["font", "B"]
-            else:
-                tags = ["font"]
-            iid = self.tree.insert("", "end", values=item, tags=tags)
+            iid = self.tree.insert("", posn, values=item,
+                tags=self.getTags(num, item))
         self.iids[iid] = num
         return iid
 
+    def getTags(self, num, item):
+        if self.colr and item[self.colr[0]] in self.colr[1]:
+            return ["font", item[self.colr[0]]]
+        elif self.rowc and num % (self.rowc[0] * 2) < self.rowc[0]:
+            return ["font", "A"]
+        elif self.rowc:
+            return ["font", "B"]
+        else:
+            return ["font"]
+
+    def doYscroll(self, first, last):
+        # Fetch the next or previous page when nearing the end or the start
+        if self.scrl:
+            self.vsb.set(first, last)
+        if not self.pager or self.loading or not self.dkey:
+            return
+        if float(last) > .9 and not self.atend:
+            self.loading = True
+            self.tree.after_idle(self.loadPage, "N")
+        elif float(first) < .1 and not self.atstart:
+            self.loading = True
+            self.tree.after_idle(self.loadPage, "P")
+
+    def loadPage(self, direction):
+        # Add the next, or the previous, page of records to the tree
+        if not self.tree.winfo_exists():
+            return
+        if direction == "N":
+            recs, keys, more = self.pager.getPage(self.dkey[-1])
+            self.atend = not more
+            for rec in recs:
+                self.data.append(rec)
+                self.addItem(len(self.data) - 1, rec)
+            self.dkey.extend(keys)
+        else:
+            recs, keys, more = self.pager.getPage(self.dkey[0], "P")
+            self.atstart = not more
+            for num, rec in enumerate(recs):
+                self.addItem(num, rec, num)
+            self.data = recs + self.data
+            self.dkey = keys + self.dkey
+            children = self.tree.get_children()
+            self.iids = {}
+            for num, iid in enumerate(children):
+                self.iids[iid] = num
+                if self.rowc and len(recs) % (self.rowc[0] * 2):
+                    self.tree.item(iid, tags=self.getTags(num,
+                        list(self.tree.item(iid, "values"))))
+            # Keep the same records in view
+            self.tree.yview_scroll(len(recs), "units")
+        self.loading = False
+
+    def resetPage(self, key=None, direction="N"):
+        # Replace the records of the tree with the page starting at key or
+        # the first or last page, returns the iids of the records
+        recs, self.dkey, more = self.pager.getPage(key, direction, incl=True)
+        if direction == "N":
+            self.atstart = bool(key is None)
+            self.atend = not more
+        else:
+            self.atstart = not more
+            self.atend = bool(key is None)
+        self.tree.delete(*self.tree.get_children())
+        self.iids = {}
+        self.data = recs
+        for num, rec in enumerate(recs):
+            self.addItem(num, rec)
+        return self.tree.get_children()
+
+    def loadAll(self):
+        # Replace the records of the tree with all the records and stop paging
+        self.data = self.pager.getAll()
+        self.pager = None
+        self.tree.delete(*self.tree.get_children())
+        self.iids = {}
+        for num, rec in enumerate(self.data):
+            self.addItem(num, rec)
+
     def doToggle(self, *args):
         def set_image(wid, iid):
             img = wid.item(iid, "image")
@@ -7268,6 +8473,14 @@ class SelectChoice(object):
             spos = "B"
         else:
             spos = "A"
+        if self.pager:
+            typ = self.cdet[self.cols[self.srch]][1]
+            if type(typ) in (list, tuple):
+                # Coded column, search all the records
+                self.loadAll()
+            elif not start and not self.atstart:
+                # New search, start with the first record
+                return self.findPage(pattern, spos)
         children = list(self.tree.get_children())
         if direction and direction == "Up":
             children.reverse()
@@ -7287,6 +8500,30 @@ class SelectChoice(object):
                 self.tree.focus(child)
                 self.tree.see(child)
                 return True
+        if not self.pager or not self.dkey:
+            return
+        if direction == "Up" and not self.atstart:
+            return self.findPage(pattern, spos, self.dkey[0], "P")
+        elif direction != "Up" and not self.atend:
+            return self.findPage(pattern, spos, self.dkey[-1])
+
+    def findPage(self, pattern, spos, key=None, direction="N"):
+        # Search the records not in the tree, starting after or before key
+        fkey = self.pager.findKey(self.srch, pattern, bool(spos == "B"),
+            key, direction)
+        if fkey is None and key is None:
+            # The best match in the columns of the search index
+            keys = self.pager.getMatches(pattern, 1)[1]
+            if keys:
+                fkey = keys[0]
+        if fkey is None:
+            return
+        child = self.resetPage(fkey)[0]
+        self.tree.selection_set(child)
+        self.tree.update_idletasks()
+        self.tree.focus(child)
+        self.tree.see(child)
+        return True
 
     def doSelect(self, event=None):
         if self.chek:
@@ -7331,6 +8568,10 @@ class SelectChoice(object):
             self.closeProcess()
 
     def doScroll(self, event):
+        if self.pager and event.keysym == "Home" and not self.atstart:
+            self.resetPage()
+        elif self.pager and event.keysym == "End" and not self.atend:
+            self.resetPage(direction="P")
         iids = self.tree.get_children()
         if event.keysym in ("Home", "End"):
             if event.keysym == "Home":
@@ -7360,6 +8601,18 @@ class SelectChoice(object):
 
     def doSort(self, col, descending):
         """Sort tree contents when a column is clicked on."""
+        if self.pager:
+            idx = list(self.tree["columns"]).index(col)
+            if self.pager.setSort(idx, descending):
+                # Sort the records in the database
+                start = self.resetPage()[0]
+                self.tree.heading(col,
+                    command=lambda col=col: self.doSort(col, not descending))
+                if self.live:
+                    self.tree.selection_set(start)
+                self.tree.focus(start)
+                return
+            self.loadAll()
         # grab values to sort
         data = [(self.tree.set(child, col), child) for child in \
             self.tree.get_children("")]
@@ -7411,6 +8664,31 @@ class SelectChoice(object):
                     fcol.remove(col)
         else:
             self.tree.focus_set()
+        if self.pager and diag.data:
+            # Filter the records in the database
+            fltr = []
+            for col in fcol:
+                whr = self.pager.getFilter(col[1], diag.data[col[0]])
+                if whr is None:
+                    break
+                fltr.append(whr)
+            else:
+                self.pager.fltr = self.pager.fltr + fltr
+                recs, keys, more = self.pager.getPage()
+                if not recs:
+                    self.doExit()
+                elif len(recs) == 1 and not more:
+                    self.selection = [0] + list(recs[0])
+                    self.closeProcess()
+                else:
+                    self.data = recs
+                    self.dkey = keys
+                    self.atstart = True
+                    self.atend = not more
+                    self.setupWidgets(clear=True)
+                    self.buildTree()
+                return
+            self.loadAll()
         olddata = copyList(self.data)
         newdata = []
         for dat in olddata:
@@ -7497,7 +8775,7 @@ class ScrollHtml(object):
             if pos != -1:
                 self.binds.append(b.cget("text")[pos])
         try:
-            self.frame = HtmlFrame(self.root,
+            self.frame = tkinterhtml.HtmlFrame(self.root,
                 vertical_scrollbar=self.vertical,
                 horizontal_scrollbar=self.horizontal,
                 fontscale=1.5)
@@ -7781,6 +9059,489 @@ class ShowEmail(object):
     def doClose(self, *args):
         self.window.destroy()
 
+class MailQueue(object):
+    """
+    Sends email messages over a pool of smtp sessions which are kept open
+    and reused, instead of connecting to the server for every message.
+
+        server  - A list of the smtp server details i.e.
+                  [host, port, security, auth, username, password]
+        workers - The number of sessions used to send queued messages
+                  concurrently.
+        limit   - The number of messages sent per session after which it
+                  is closed and a new session opened.
+        retry   - The number of times a message is resent on a new session
+                  after the session failed, e.g. the server disconnected.
+        timeout - The number of seconds before timing out.
+        local   - The local hostname as fqdn.
+
+    sendMail sends a message immediately, taking the same arguments and
+    returning the same as tartanFunctions.sendMail.
+
+    addMail queues a message, with a key identifying it, and doSend sends
+    all the queued messages and returns the results, per recipient, as a
+    list of (key, from, to, subject, status, error) where status is "OK"
+    or "FAILED". getLog returns the results as emllog records.
+
+    The sessions are closed by closeQueue or on leaving a with block e.g.
+
+        with MailQueue(server, workers=4) as mq:
+            for acno, eml, pdf in statements:
+                mq.addMail(fromad, eml, subj, mess, attach=[pdf], key=acno)
+            results = mq.doSend()
+        sql.insRec("emllog", data=mq.getLog(results))
+    """
+    def __init__(self, server, workers=1, limit=100, retry=2, timeout=30, local=None):
+        self.server = server
+        self.workers = max(1, workers)
+        self.limit = limit
+        self.retry = retry
+        self.timeout = timeout
+        self.local = local
+        self.lock = threading.Lock()
+        self.idle = []
+        self.mails = []
+        self.opened = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closeQueue()
+
+    def getSession(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+            self.opened += 1
+        return [getMailServer(self.server, timeout=self.timeout,
+            local=self.local), 0]
+
+    def putSession(self, session):
+        session[1] += 1
+        if session[1] >= self.limit:
+            self.dropSession(session)
+        else:
+            with self.lock:
+                self.idle.append(session)
+
+    def dropSession(self, session):
+        try:
+            session[0].quit()
+        except:
+            try:
+                session[0].close()
+            except:
+                pass
+
+    def sendMessage(self, ex, to, msg):
+        """
+        Sends a message, as returned by getMailMessage, reconnecting if the
+        session fails and returns a dictionary of the refused recipients.
+        """
+        import smtplib
+
+        for x in range(self.retry + 1):
+            try:
+                session = self.getSession()
+            except smtplib.SMTPResponseException:
+                # The server rejected the connection or the login
+                raise
+            except Exception as err:
+                error = err
+                continue
+            try:
+                refused = session[0].sendmail(ex, to, msg)
+                self.putSession(session)
+                return refused
+            except smtplib.SMTPRecipientsRefused as err:
+                self.putSession(session)
+                return err.recipients
+            except smtplib.SMTPResponseException:
+                # The message was rejected, the session is still usable
+                try:
+                    session[0].rset()
+                    self.putSession(session)
+                except:
+                    self.dropSession(session)
+                raise
+            except Exception as err:
+                self.dropSession(session)
+                error = err
+        raise error
+
+    def sendMail(self, ex, to, subj, mess="", attach=None, embed=None, lnkurl=None):
+        try:
+            to, msg = getMailMessage(ex, to, subj, mess=mess, attach=attach,
+                embed=embed, lnkurl=lnkurl)
+            self.sendMessage(ex, to, msg)
+        except Exception as err:
+            return err
+
+    def addMail(self, ex, to, subj, mess="", attach=None, embed=None, lnkurl=None, key=None):
+        self.mails.append((key, ex, to, subj, mess, attach, embed, lnkurl))
+
+    def doSend(self, call=None):
+        """
+        Sends the queued messages and returns the results per recipient.
+
+        call - A function called, with the number of messages sent and the
+               total, after each message has been sent.
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        mails, self.mails = self.mails, []
+        results = [None] * len(mails)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            jobs = {}
+            for num, mail in enumerate(mails):
+                jobs[pool.submit(self.doMail, *mail)] = num
+            for cnt, job in enumerate(as_completed(jobs)):
+                results[jobs[job]] = job.result()
+                if call:
+                    call(cnt + 1, len(mails))
+        return [res for rslt in results for res in rslt]
+
+    def doMail(self, key, ex, to, subj, mess, attach, embed, lnkurl):
+        if type(to) == str:
+            to = [to]
+        try:
+            to, msg = getMailMessage(ex, to, subj, mess=mess, attach=attach,
+                embed=embed, lnkurl=lnkurl)
+            refused = self.sendMessage(ex, to, msg)
+        except Exception as err:
+            return [(key, ex, eml, subj, "FAILED", err) for eml in to]
+        results = []
+        for eml in to:
+            if eml in refused:
+                results.append((key, ex, eml, subj, "FAILED", refused[eml]))
+            else:
+                results.append((key, ex, eml, subj, "OK", None))
+        return results
+
+    def getLog(self, results, dtt=None):
+        if not dtt:
+            dtt = "%04i-%02i-%02i %02i:%02i" % time.localtime()[0:5]
+        return [[ex.strip(), eml.strip(), subj.strip(), dtt, sta]
+            for key, ex, eml, subj, sta, err in results]
+
+    def closeQueue(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for session in idle:
+            self.dropSession(session)
+
+class LogWriter(object):
+    """
+    Records the launching of modules in ctllog from a background thread,
+    with its own connection to the database, so that launching a module
+    does not wait for the insert and commit. The records are written in
+    batches, the connection only being open while writing, and a record
+    which is rejected, e.g. a duplicate key, is skipped.
+
+        rcdic - The rcfile dictionary of the database.
+        delay - The number of seconds to gather records before writing.
+
+    addLog queues a ctllog record and closeWriter writes the queued records
+    and stops the thread e.g. before exiting.
+    """
+    def __init__(self, rcdic, delay=2):
+        self.rcdic = rcdic
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.logs = []
+        self.thread = None
+
+    def addLog(self, data):
+        with self.lock:
+            self.logs.append(list(data))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.doWrite,
+                    daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def doWrite(self):
+        while True:
+            self.wake.wait()
+            # Gather the records of launches in quick succession
+            self.stop.wait(self.delay)
+            self.wake.clear()
+            with self.lock:
+                logs, self.logs = self.logs, []
+            if logs:
+                logs = self.writeLogs(logs)
+            if logs:
+                # The database is busy, try again later
+                with self.lock:
+                    self.logs = logs + self.logs
+                if self.stop.is_set():
+                    return
+                self.wake.set()
+            elif self.stop.is_set():
+                return
+
+    def writeLogs(self, logs):
+        """
+        Writes the records and returns the records which could not be
+        written as the database could not be used. Sql is not used as it
+        shows its errors on screen and exits.
+        """
+        dbm = Dbase(rcdic=self.rcdic)
+        if dbm.err or dbm.openDbase(err=False):
+            return logs
+        dic = tartanWork.tabdic["ctllog"]["fld"]
+        cols = [fld[1] for fld in dic]
+        state = "Insert into ctllog (%s) values (%s)" % (", ".join(cols),
+            ", ".join([dbm.dbf] * len(cols)))
+        try:
+            dbm.cu.execute("Select count(*) from ffield where ff_tabl = "
+                "'ctllog'")
+            if dbm.cu.fetchone()[0] != len(cols):
+                return
+            for log in logs:
+                data = []
+                for num, fld in enumerate(dic):
+                    if fld[1] == "clg_xflag":
+                        data.append("")
+                        continue
+                    work, disp, err = getCCF(fld[2], fld[3]).format(log[num])
+                    if err:
+                        break
+                    data.append(work)
+                if len(data) != len(cols):
+                    continue
+                dbm.cu.execute("Savepoint tartan_log")
+                try:
+                    dbm.cu.execute(state, data)
+                    dbm.cu.execute("Release savepoint tartan_log")
+                except dbm.engine.IntegrityError:
+                    dbm.cu.execute("Rollback to savepoint tartan_log")
+            dbm.commitDbase()
+        except:
+            try:
+                dbm.rollbackDbase()
+            except:
+                pass
+            return logs
+        finally:
+            dbm.closeDbase()
+
+    def closeWriter(self, timeout=30):
+        self.stop.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+class PrintBatch(object):
+    """
+    Used with doPrinter when printing and/or emailing many documents in a
+    run, e.g. statements, where:
+
+        mf      - The MainFrame object whose database connection is used.
+        conum   - The company number, defaults to 1.
+        workers - The number of processes used to render the forms of the
+                  DrawForm objects created with this batch, 0 for the
+                  number of cpus, defaults to the Render Workers of the
+                  tartanrc file, itself defaulting to 1 i.e. the forms are
+                  not rendered by the batch.
+
+    The mail server details and the company email address are read once,
+    the emails are sent over a MailQueue session which is reused for all
+    the documents and the emllog records are written, with one insert on
+    the connection of mf, and committed when the batch is closed by
+    closeBatch or on leaving a with block e.g.
+
+        with PrintBatch(mf, conum) as batch:
+            for pdfnam, repeml in documents:
+                doPrinter(mf=mf, conum=conum, pdfnam=pdfnam, repprt=repprt,
+                    repeml=repeml, batch=batch)
+
+    As the emllog records are committed the batch must only be closed once
+    the run's own transactions have been committed or rolled back.
+
+    With more than one worker the forms saved by a DrawForm having this
+    batch are rendered by a pool of processes, while the run carries on,
+    and doPrinter holds back the printing and emailing of the documents
+    until doRender, or closeBatch, has waited for them to be rendered and
+    then prints and/or emails them in the order they were saved. A large
+    document, e.g. all the statements in one file, is rendered in parts,
+    of at least PrintBatch.pages pages each, which are then merged. Forms
+    which could not be rendered by the pool are rendered in this process.
+    """
+    pages = 20
+
+    def __init__(self, mf, conum=None, workers=None):
+        self.mf = mf
+        if not conum:
+            conum = 1
+        if workers is None:
+            workers = int(self.mf.rcdic.get("rwk", 1))
+        if workers < 1:
+            workers = os.cpu_count() or 1
+        if getattr(sys, "frozen", False):
+            # A frozen executable cannot spawn the rendering processes
+            workers = 1
+        self.workers = workers
+        self.sql = Sql(self.mf.dbm, ["ctlsys", "ctlmst", "emllog"],
+            prog=__name__)
+        self.smtp = self.sql.getRec(tables=["ctlmst", "ctlsys"],
+            cols=["sys_msvr", "sys_mprt", "sys_msec", "sys_maut", "sys_mnam",
+            "sys_mpwd", "ctm_email"], where=[("ctm_cono", "=", conum)],
+            limit=1)
+        self.mq = None
+        self.logs = []
+        self.pool = None
+        self.docs = []
+        self.prints = []
+        self.forms = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closeBatch()
+
+    def addForm(self, form, pdfnam):
+        if pdfnam in [doc[0] for doc in self.docs]:
+            # The file is still to be rendered and printed
+            self.doRender()
+        pages = [num for num, op in enumerate(form.ops) if op is None]
+        size = max(self.pages, -(-len(pages) // self.workers))
+        if not FITZ or len(pages) <= size:
+            jobs = [(form.tname, form.foot, form.wrkdir, form.sysdt, form.ops,
+                pdfnam, 0, 0)]
+        else:
+            jobs = []
+            nam, ext = os.path.splitext(pdfnam)
+            begs = pages[::size]
+            begs[0] = 0
+            ends = begs[1:] + [len(form.ops)]
+            for num, beg in enumerate(begs):
+                jobs.append((form.tname, form.foot, form.wrkdir, form.sysdt,
+                    form.ops[beg:ends[num]], "%s_%03i%s" % (nam, num, ext),
+                    num * size, len(pages)))
+        self.docs.append((pdfnam, [(job, self.doSubmit(job))
+            for job in jobs]))
+
+    def doSubmit(self, job):
+        if self.workers > 1 and not self.pool:
+            try:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=renderInit, initargs=(self.mf.dbm.rcdic,))
+            except:
+                self.workers = 1
+        if self.pool:
+            try:
+                return self.pool.submit(renderForm, job)
+            except:
+                pass
+
+    def holdPrint(self, **args):
+        """
+        Hold back a doPrinter call if its document is still to be rendered,
+        or documents before it are still to be printed, returning True.
+        """
+        if not self.prints and args["pdfnam"] not in [doc[0]
+                for doc in self.docs]:
+            return False
+        for nam in ("header", "repprt", "repeml", "attach"):
+            if type(args[nam]) in (list, tuple):
+                args[nam] = copyList(args[nam])
+        self.prints.append(args)
+        return True
+
+    def doRender(self, call=None):
+        """
+        Wait for the saved forms to be rendered and print and/or email them.
+
+        call - A function called, with the number of forms rendered and the
+               total, after each form has been rendered, else a ProgressBar
+               is displayed.
+        """
+        docs, self.docs = self.docs, []
+        prints, self.prints = self.prints, []
+        total = sum([len(doc[1]) for doc in docs])
+        pb = None
+        if total and not call and self.mf.body:
+            pb = ProgressBar(self.mf.body, typ=("P",
+                "Rendering the Documents ... Please Wait"), mxs=total)
+        count = 0
+        errs = {}
+        for pdfnam, jobs in docs:
+            for job, fut in jobs:
+                try:
+                    fut.result()
+                except:
+                    try:
+                        renderForm(job, self.mf.dbm)
+                    except Exception as err:
+                        errs[pdfnam] = err
+                count += 1
+                if pb:
+                    pb.displayProgress(count)
+                elif call:
+                    call(count, total)
+            if len(jobs) > 1 and pdfnam not in errs:
+                try:
+                    self.doMerge(pdfnam, jobs)
+                except Exception as err:
+                    errs[pdfnam] = err
+        if pb:
+            pb.closeProgress()
+        for args in prints:
+            if args["pdfnam"] in errs:
+                showError(self.mf.window, "Render Error",
+                    "Could Not Render %s\n\n%s" % (args["pdfnam"],
+                    errs[args["pdfnam"]]))
+            else:
+                doPrinter(batch=self, **args)
+
+    def doMerge(self, pdfnam, jobs):
+        doc = pymupdf.open()
+        for job, fut in jobs:
+            part = pymupdf.open(job[5])
+            if not doc.page_count:
+                doc.set_metadata(part.metadata)
+            doc.insert_pdf(part)
+            part.close()
+            os.remove(job[5])
+        doc.save(pdfnam)
+        doc.close()
+
+    def sendMail(self, ex, to, subj, mess, attach):
+        if not self.smtp:
+            return "Missing Mail Server Details"
+        if not self.mq:
+            self.mq = MailQueue(self.smtp[0:6])
+        return self.mq.sendMail(ex, to, subj, mess=mess, attach=attach)
+
+    def addLog(self, ex, to, subj, sta):
+        self.logs.append([ex.strip(), to, subj, "%04i-%02i-%02i %02i:%02i" %
+            time.localtime()[0:5], sta])
+
+    def closeBatch(self):
+        try:
+            self.doRender()
+        finally:
+            if self.pool:
+                self.pool.shutdown()
+                self.pool = None
+            if self.mq:
+                self.mq.closeQueue()
+                self.mq = None
+            if self.logs:
+                # The emails sent are logged even if rendering failed
+                self.sql.insRec("emllog", data=self.logs)
+                self.mf.dbm.commitDbase()
+                self.logs = []
+
 class ShowImage(object):
     def __init__(self, vbox, flenam, wrkdir=None, msiz=400, crop=False):
         self.vbox = vbox
@@ -8027,6 +9788,11 @@ class TartanConfig(object):
                 self.rcdic["wrkf"].upper(),"N",None,None,None,None),
             (("T",2,14,0),("IRB",r3s),0,"Automatically Apply","",
                 self.rcdic["wrka"].upper(),"N",None,None,None,None),
+            (("T",2,15,0),"IUI",2,"Render Workers","",
+                self.rcdic["rwk"],"N",None,None,None,("efld",),None,
+                "The Number of Processes used to Render Documents, e.g. "\
+                "Statements, 0 for the Number of CPUs. Leave this as 1 "\
+                "Unless Large Runs on a Computer with Many CPUs are Slow."),
             (("T",3,0,0),"INA",30,"Menu Font Name","",
                 self.rcdic["mft"],"N",self.doFtNam,aft,None,("in",self.aft),
                 None,"The Font to be used for the Menu"),
@@ -8417,6 +10183,7 @@ class TartanConfig(object):
         self.df.loadEntry("T",2,12,self.rcdic["errs"].upper())
         self.df.loadEntry("T",2,13,self.rcdic["wrkf"].upper())
         self.df.loadEntry("T",2,14,self.rcdic["wrka"].upper())
+        self.df.loadEntry("T",2,15,self.rcdic["rwk"])
         # Font and Theme
         self.df.loadEntry("T",3,0,self.rcdic["mft"])
         self.df.loadEntry("T",3,1,self.rcdic["mfs"])
@@ -8511,6 +10278,7 @@ class TartanConfig(object):
             ["errs", self.df.t_work[2][0][12]],
             ["wrkf", self.df.t_work[2][0][13]],
             ["wrka", self.df.t_work[2][0][14]],
+            ["rwk", self.df.t_work[2][0][15]],
             ["mft", self.df.t_work[3][0][0]],
             ["mfs", self.df.t_work[3][0][1]],
             ["dft", self.df.t_work[3][0][2]],
@@ -8878,6 +10646,11 @@ class Balances(object):
 
     doAllBals       - Returns Total, Current, 30, 60, 90 and 120+ Balances with
                         or without transactions
+    doLedgerBals    - Yields the doAllBals balances, without transactions, for
+                        all the accounts of a ledger using grouped queries
+    doBulkBals      - Yields the doAllBals balances, with or without
+                        transactions, for a list of accounts read a number
+                        of accounts at a time
     doCrsDrsHist    - Returns the Last 12 Months Sale and Payment Balances
     doStrBals       - Returns
                         Current Month
@@ -8901,18 +10674,24 @@ class Balances(object):
                       Creditors is the acno
                       Debtors is a list containing (chain, acno)
                       Members is the member number
+                      None for doLedgerBals or doBulkBals with Creditors,
+                        Debtors or Members
                       Stores is a list containing:
                           if len(keys) == 1: rep
                           if len(keys) == 2: rep, period
                           if len(keys) == 3: group, code, loc
                           if len(keys) == 4: group, code, loc, period
     """
-    def __init__(self, mf, system, conum, curdt, keys):
+    def __init__(self, mf, system, conum, curdt, keys=None):
         self.mf = mf
         self.system = system.upper()
         self.conum = conum
         self.curdt = curdt
-        if not keys:
+        if not keys and self.system in ("CRS", "DRS", "MEM"):
+            # Ledger balances
+            self.sql = Sql(self.mf.dbm, ["%strn" % self.system.lower(),
+                "%sage" % self.system.lower()], prog=__name__)
+        elif not keys:
             showError(self.mf.window, "Keys Error",
                 "You Must have a Key Argument")
             sys.exit()
@@ -8927,8 +10706,9 @@ class Balances(object):
                 self.sql = Sql(self.mf.dbm, "memtrn", prog=__name__)
                 self.memno = keys[0]
             elif self.system == "STR" and len(keys) in (1, 2, 3, 4):
-                self.sql = Sql(self.mf.dbm, ["strgrp", "strmf2", "strtrn",
-                    "strpom", "strpot", "slsiv1", "slsiv2"], prog=__name__)
+                self.sql = Sql(self.mf.dbm, ["strbal", "strgrp", "strmf2",
+                    "strtrn", "strpom", "strpot", "slsiv1", "slsiv2"],
+                    prog=__name__)
                 self.group = None
                 self.code = None
                 self.loc = None
@@ -9013,21 +10793,7 @@ class Balances(object):
         else:
             return
         if trns:
-            for trn in trns:
-                cbal = float(ASD(cbal) + ASD(trn[col.index("balance")]))
-                if self.system == "CRS":
-                    age = self.curdt - trn[col.index("crt_curdt")]
-                elif self.system == "DRS":
-                    age = self.curdt - trn[col.index("drt_curdt")]
-                else:
-                    age = self.curdt - trn[col.index("mlt_curdt")]
-                while age > 88:
-                    age = age - 88
-                if age < 0:
-                    age = 0
-                if age > 4:
-                    age = 4
-                ages[age] = float(ASD(ages[age])+ASD(trn[col.index("balance")]))
+            cbal, ages = self.getAges(col, trns)
         if trans == "N":
             return obal, cbal, ages
         else:
@@ -9046,10 +10812,202 @@ class Balances(object):
                     where=w, limit=1)
             return obal, cbal, ages, [col, trns, cmth[0]]
 
+    def getAges(self, col, trns):
+        """
+        Returns the balance of the transactions and its age analysis.
+        """
+        bal = col.index("balance")
+        cdt = col.index("%s_curdt" % col[0].split("_")[0])
+        tots = [ACC(), ACC(), ACC(), ACC(), ACC()]
+        for trn in trns:
+            age = self.curdt - trn[cdt]
+            while age > 88:
+                age = age - 88
+            if age < 0:
+                age = 0
+            if age > 4:
+                age = 4
+            tots[age].add(trn[bal])
+        cbal = float(ACC().addAll([trn[bal] for trn in trns]))
+        return cbal, [float(tot) for tot in tots]
+
+    def doBulkBals(self, accs, trans="N", size=100):
+        """
+        Yields (key, obal, cbal, ages, [col, trns, cmth]) for every key in
+        accs, in the same order, as doAllBals would return them, where key
+        is the acno, (chain, acno) or memno, e.g. for a statement run.
+
+        accs  - A list of keys of the accounts
+        trans - As per doAllBals, with "N" the transactions are not yielded
+        size  - The number of accounts read at a time
+
+        The opening balances and the number of current transactions are read
+        with grouped queries and the transactions by getTrn, as a generator,
+        for size accounts at a time so that the transactions of all the
+        accounts are never held in memory.
+        """
+        if self.system == "CRS":
+            pfx, ref, key = "crt", "ref1", ["crt_acno"]
+        elif self.system == "DRS":
+            pfx, ref, key = "drt", "ref1", ["drt_chain", "drt_acno"]
+        elif self.system == "MEM":
+            pfx, ref, key = "mlt", "refno", ["mlt_memno"]
+        else:
+            return
+        tab = "%strn" % self.system.lower()
+        nkey = len(key)
+
+        def getKey(rec):
+            if nkey == 1:
+                return rec[0]
+            return tuple(rec[:nkey])
+
+        for beg in range(0, len(accs), size):
+            chunk = accs[beg:beg + size]
+            whr = [("%s_cono" % pfx, "=", self.conum)]
+            if nkey == 1:
+                whr.append((key[0], "in", list(set(chunk))))
+            else:
+                for num, k in enumerate(key):
+                    whr.append((k, "in", list(set([acc[num]
+                        for acc in chunk]))))
+            grp = ", ".join(key)
+            w = whr + [("%s_curdt" % pfx, "<", self.curdt)]
+            obal = {}
+            for rec in self.sql.getRec(tab, cols=key +
+                    ["round(sum(%s_tramt), 2)" % pfx], where=w, group=grp):
+                obal[getKey(rec)] = rec[-1]
+            cmth = {}
+            if trans != "N":
+                w = whr + [("%s_curdt" % pfx, "=", self.curdt)]
+                for rec in self.sql.getRec(tab, cols=key + ["count(*)"],
+                        where=w, group=grp):
+                    cmth[getKey(rec)] = rec[-1]
+            col, recs = getTrn(self.mf.dbm, self.system.lower(),
+                cdt=self.curdt, whr=copyList(whr), odr="%s, %s_trdt, "\
+                "%s_type, %s_%s" % (grp, pfx, pfx, pfx, ref),
+                zer=trans, itr=True)
+            pos = [col.index(k) for k in key]
+            trns = {}
+            for rec in recs:
+                acc = getKey([rec[p] for p in pos])
+                trns.setdefault(acc, []).append(rec)
+            used = set()
+            for acc in chunk:
+                if type(acc) is list:
+                    acc = tuple(acc)
+                bal = obal.get(acc)
+                if not bal:
+                    bal = 0.0
+                if acc in used:
+                    # A repeated account gets its own transactions
+                    trn = copyList(trns.get(acc, []))
+                else:
+                    trn = trns.get(acc, [])
+                    used.add(acc)
+                if trn:
+                    cbal, ages = self.getAges(col, trn)
+                else:
+                    cbal, ages = 0.0, [0, 0, 0, 0, 0]
+                if trans == "N":
+                    yield acc, bal, cbal, ages
+                else:
+                    yield acc, bal, cbal, ages, [col, trn, cmth.get(acc, 0)]
+
+    def doLedgerBals(self, accs=None, where=None):
+        """
+        Yields (key, obal, cbal, ages) for every account having transactions
+        up to the current period, as doAllBals would return them, where key
+        is the acno, (chain, acno) or memno.
+
+        accs  - A list of keys to limit the accounts to
+        where - Additional where statements on the transactions table
+
+        The balances are calculated with three grouped queries on the
+        transactions, the transactions' ageing records up to the current
+        period and those allocated after the current period.
+        """
+        if self.system == "CRS":
+            pfx, apx, ref = "crt", "cra", "ref1"
+            key = ["crt_acno"]
+        elif self.system == "DRS":
+            pfx, apx, ref = "drt", "dra", "ref1"
+            key = ["drt_chain", "drt_acno"]
+        elif self.system == "MEM":
+            pfx, apx, ref = "mlt", "mta", "refno"
+            key = ["mlt_memno"]
+        else:
+            return
+        trn = "%strn" % self.system.lower()
+        age = "%sage" % self.system.lower()
+        whr = [("%s_cono" % pfx, "=", self.conum), ("%s_curdt" % pfx, "<=",
+            self.curdt)]
+        if accs is not None:
+            if self.system == "DRS":
+                accs = set([tuple(acc) for acc in accs])
+            else:
+                accs = set(accs)
+        if where:
+            whr.extend(where)
+        cols = key + ["%s_curdt" % pfx]
+        grp = ", ".join(cols)
+        # Join on the keys of the transactions
+        jon = "%s_cono=%s_cono" % (apx, pfx)
+        for k in key:
+            jon = "%s and %s=%s" % (jon, k.replace(pfx, apx), k)
+        # Transaction amounts
+        amts = self.sql.getRec(trn, cols=cols + ["sum(%s_tramt)" % pfx],
+            where=whr, group=grp, order=grp)
+        # Allocations to the transactions up to the current period
+        alls = {}
+        for rec in self.sql.getRec(trn, join="join %s on %s and "\
+                "%s_type=%s_type and %s_%s=%s_%s and %s_curdt <= %s" % (age,
+                jon, apx, pfx, apx, ref, pfx, ref, apx, self.curdt),
+                cols=cols + ["sum(%s_amnt)" % apx], where=whr, group=grp):
+            alls[tuple(rec[:-1])] = int(round(rec[-1] * 100, 0))
+        # Allocations by the transactions after the current period
+        for rec in self.sql.getRec(trn, join="join %s on %s and "\
+                "%s_atyp=%s_type and %s_aref=%s_%s and %s_curdt > %s" % (age,
+                jon, apx, pfx, apx, pfx, ref, apx, self.curdt),
+                cols=cols + ["sum(%s_amnt)" % apx], where=whr, group=grp):
+            amt = int(round(rec[-1] * 100, 0))
+            alls[tuple(rec[:-1])] = alls.get(tuple(rec[:-1]), 0) + amt
+        nkey = len(key)
+        last = None
+        def getBals():
+            return round(obal / 100.0, 2), round(cbal / 100.0, 2), \
+                [round(a / 100.0, 2) for a in ages]
+        for rec in amts:
+            if self.system == "DRS":
+                acc = tuple(rec[:nkey])
+            else:
+                acc = rec[0]
+            if accs is not None and acc not in accs:
+                continue
+            if acc != last:
+                if last is not None:
+                    yield (last,) + getBals()
+                last = acc
+                obal = cbal = 0
+                ages = [0, 0, 0, 0, 0]
+            amt = int(round(rec[-1] * 100, 0))
+            if rec[nkey] < self.curdt:
+                obal += amt
+            bal = amt - alls.get(tuple(rec[:-1]), 0)
+            cbal += bal
+            age = self.curdt - rec[nkey]
+            while age > 88:
+                age = age - 88
+            if age < 0:
+                age = 0
+            if age > 4:
+                age = 4
+            ages[age] += bal
+        if last is not None:
+            yield (last,) + getBals()
+
     def doCrsDrsHist(self):
-        hist = [
-            [0,0,0,0,0,0,0,0,0,0,0,0,0],
-            [0,0,0,0,0,0,0,0,0,0,0,0,0]]
+        hist = [[ACC() for x in range(13)], [ACC() for x in range(13)]]
         start = self.curdt - 99
         if (start % 100) == 13:
             start = start + 100 - 12
@@ -9080,77 +11038,47 @@ class Balances(object):
             mth = self.curdt - bal[0]
             while mth > 88:
                 mth = mth - 88
-            hist[x][mth] = float(ASD(hist[x][mth]) + ASD(bal[2]) - ASD(bal[3]))
-            hist[x][12] = float(ASD(hist[x][12]) + ASD(bal[2]) - ASD(bal[3]))
+            hist[x][mth].add(bal[2]).sub(bal[3])
+            hist[x][12].add(bal[2]).sub(bal[3])
+        for x in range(2):
+            hist[x] = [float(tot) for tot in hist[x]]
         return hist
 
     def doStrBals(self, start=None, trans="N"):
         if not start:
             start = self.start
+        where = [("sbl_cono", "=", self.conum), ("sbl_group", "=",
+            self.group), ("sbl_code", "=", self.code)]
         if self.loc:
-            where = [("stt_cono", "=", self.conum), ("stt_group", "=",
-                self.group), ("stt_code", "=", self.code), ("stt_loc", "=",
-                self.loc)]
-        else:
-            where = [("stt_cono", "=", self.conum), ("stt_group", "=",
-                self.group), ("stt_code", "=", self.code)]
-        # Current Period
-        whr = copyList(where)
-        whr.append(("stt_curdt", "<", self.curdt))
-        obal = self.sql.getRec("strtrn", cols=["round(sum(stt_qty), 2)",
-            "round(sum(stt_cost), 2)"], where=whr, limit=1)
-        if not obal:
-            obal = [0, 0]
-        if not obal[0]:
-            obal[0] = 0
-        if not obal[1]:
-            obal[1] = 0
-        whr = copyList(where)
-        whr.append(("stt_curdt", "between", self.curdt, self.curdt))
-        grp = "stt_type"
-        move = self.sql.getRec("strtrn", cols=["stt_type",
-            "round(sum(stt_qty), 2)", "round(sum(stt_cost), 2)",
-            "round(sum(stt_sell), 2)"], where=whr, group=grp, order=grp)
-        whr = copyList(where)
-        whr.append(("stt_curdt", "<=", self.curdt))
-        cbal = self.sql.getRec("strtrn", cols=["round(sum(stt_qty), 2)",
-            "round(sum(stt_cost), 2)"], where=whr, limit=1)
-        if not cbal:
-            cbal = [0, 0]
-        if not cbal[0]:
-            cbal[0] = 0
-        if not cbal[1]:
-            cbal[1] = 0
-        data = [obal, move, cbal]
-        # Year to Date
-        whr = copyList(where)
-        whr.append(("stt_curdt", "<", start))
-        obal = self.sql.getRec("strtrn", cols=["round(sum(stt_qty), 2)",
-            "round(sum(stt_cost), 2)"], where=whr, limit=1)
-        if not obal:
-            obal = [0, 0]
-        if not obal[0]:
-            obal[0] = 0
-        if not obal[1]:
-            obal[1] = 0
-        whr = copyList(where)
-        whr.append(("stt_curdt", "between", start, self.curdt))
-        move = self.sql.getRec("strtrn", cols=["stt_type",
-            "round(sum(stt_qty), 2)", "round(sum(stt_cost), 2)",
-            "round(sum(stt_sell), 2)"], where=whr, group=grp, order=grp)
-        if not move:
-            move = []
-        whr = copyList(where)
-        whr.append(("stt_curdt", "<=", self.curdt))
-        cbal = self.sql.getRec(tables="strtrn", cols=["round(sum(stt_qty), 2)",
-            "round(sum(stt_cost), 2)"], where=whr, limit=1)
-        if not cbal:
-            cbal = [0, 0]
-        if not cbal[0]:
-            cbal[0] = 0
-        if not cbal[1]:
-            cbal[1] = 0
-        data.extend([obal, move, cbal])
+            where.append(("sbl_loc", "=", self.loc))
+        where.append(("sbl_curdt", "<=", self.curdt))
+        # The summary by period and type up to the current period
+        grp = "sbl_curdt, sbl_type"
+        sums = self.sql.getRec("strbal", cols=["sbl_curdt", "sbl_type",
+            "sum(sbl_qty)", "sum(sbl_cost)", "sum(sbl_sell)"], where=where,
+            group=grp, order=grp)
+        data = []
+        # Current Period and Year to Date
+        for frm in (self.curdt, start):
+            obal = [ACC(), ACC()]
+            move = {}
+            cbal = [ACC(), ACC()]
+            for curdt, typ, qty, cost, sell in sums:
+                if curdt < frm:
+                    obal[0].add(qty)
+                    obal[1].add(cost)
+                else:
+                    if typ not in move:
+                        move[typ] = [ACC(), ACC(), ACC()]
+                    move[typ][0].add(qty)
+                    move[typ][1].add(cost)
+                    move[typ][2].add(sell)
+                cbal[0].add(qty)
+                cbal[1].add(cost)
+            data.extend([[float(obal[0]), float(obal[1])],
+                [[typ] + [float(tot) for tot in move[typ]]
+                for typ in sorted(move)],
+                [float(cbal[0]), float(cbal[1])]])
         # Average and Last Cost Prices
         cost = getCost(self.sql, self.conum, self.group, self.code,
             loc=self.loc, ind="AL")
@@ -9160,7 +11088,10 @@ class Balances(object):
             self.loc, ind="L"))
         if trans == "Y":
             # Transactions
-            whr = copyList(where)
+            whr = [("stt_cono", "=", self.conum), ("stt_group", "=",
+                self.group), ("stt_code", "=", self.code)]
+            if self.loc:
+                whr.append(("stt_loc", "=", self.loc))
             whr.append(("stt_curdt", "between", start, self.curdt))
             odr = "stt_trdt, stt_type, stt_ref1"
             data.append((self.sql.getRec("strtrn", where=whr,
@@ -9169,15 +11100,15 @@ class Balances(object):
 
     def doStrOrds(self):
         # Closing Balance
-        whr = [("stt_cono", "=", self.conum)]
+        whr = [("sbl_cono", "=", self.conum)]
         if self.loc:
-            whr.append(("stt_loc", "=", self.loc))
+            whr.append(("sbl_loc", "=", self.loc))
         whr.extend([
-            ("stt_group", "=", self.group),
-            ("stt_code", "=", self.code),
-            ("stt_curdt", "<=", self.curdt)])
-        cbal = self.sql.getRec("strtrn", cols=[
-            "round(sum(stt_qty), 2)"], where=whr, limit=1)
+            ("sbl_group", "=", self.group),
+            ("sbl_code", "=", self.code),
+            ("sbl_curdt", "<=", self.curdt)])
+        cbal = self.sql.getRec("strbal", cols=[
+            "round(sum(sbl_qty), 2)"], where=whr, limit=1)
         if not cbal or not cbal[0]:
             data = [CCD(0, "SD", 12.2)]
         else:
@@ -9224,14 +11155,11 @@ class Balances(object):
     def doStrHist(self, start=None, more=None):
         if not start:
             start = self.start
-        this = [[0,0],[0,0],[0,0,0]]
+        this = [[ACC(), ACC()], [ACC(), ACC()], [ACC(), ACC(), ACC()]]
         hist = [
-            [[0,0],[0,0],[0,0],[0,0],[0,0],[0,0],
-            [0,0],[0,0],[0,0],[0,0],[0,0],[0,0]],
-            [[0,0],[0,0],[0,0],[0,0],[0,0],[0,0],
-            [0,0],[0,0],[0,0],[0,0],[0,0],[0,0]],
-            [[0,0,0],[0,0,0],[0,0,0],[0,0,0],[0,0,0],[0,0,0],
-            [0,0,0],[0,0,0],[0,0,0],[0,0,0],[0,0,0],[0,0,0]]]
+            [[ACC(), ACC()] for x in range(12)],
+            [[ACC(), ACC()] for x in range(12)],
+            [[ACC(), ACC(), ACC()] for x in range(12)]]
         whr = [("stt_cono", "=", self.conum)]
         if self.rep:
             whr.append(("stt_rep", "=", self.rep))
@@ -9255,23 +11183,22 @@ class Balances(object):
                 x = 1
             else:
                 continue
-            this[x][0] = float(ASD(this[x][0]) + ASD(bal[2]))
-            this[x][1] = float(ASD(this[x][1]) + ASD(bal[3]))
-            if bal[1] in (7, 8):
-                this[2][0] = float(ASD(this[2][0]) + ASD(bal[2]))
-                this[2][1] = float(ASD(this[2][1]) + ASD(bal[3]))
-                this[2][2] = float(ASD(this[2][2]) + ASD(bal[4]))
             mth = self.curdt - bal[0]
             while mth > 88:
                 mth = mth - 88
             if mth > 11:
                 mth = 11
-            hist[x][mth][0] = float(ASD(hist[x][mth][0]) + ASD(bal[2]))
-            hist[x][mth][1] = float(ASD(hist[x][mth][1]) + ASD(bal[3]))
+            for tots in (this[x], hist[x][mth]):
+                tots[0].add(bal[2])
+                tots[1].add(bal[3])
             if bal[1] in (7, 8):
-                hist[2][mth][0] = float(ASD(hist[2][mth][0]) + ASD(bal[2]))
-                hist[2][mth][1] = float(ASD(hist[2][mth][1]) + ASD(bal[3]))
-                hist[2][mth][2] = float(ASD(hist[2][mth][2]) + ASD(bal[4]))
+                for tots in (this[2], hist[2][mth]):
+                    tots[0].add(bal[2])
+                    tots[1].add(bal[3])
+                    tots[2].add(bal[4])
+        this = [[float(tot) for tot in tots] for tots in this]
+        hist = [[[float(tot) for tot in tots] for tots in mths]
+            for mths in hist]
         return this, hist
 
     def doAssBals(self, start=None, end=None, trans="N"):
@@ -9322,7 +11249,450 @@ class Balances(object):
                 order="ast_date, ast_type")
             return cap[0], dep[0], dep[1], cbl, rbl, mov, [trn, col]
         else:
-            return cap[0], dep[0], dep[1], cbl, rbl, mov
+            return cap[0], dep[0], dep[1], cbl, rbl, mov
+
+class StrBal(object):
+    """
+    Maintains the strbal table, a summary of the strtrn quantities, costs and
+    sales, and the number of transactions, by company, group, code, location,
+    period and transaction type.
+
+    dbm - A database class
+
+    Sql keeps the summary up to date as strtrn records are inserted, updated
+    and deleted by insRec, updRec and delRec. Any other change to strtrn, e.g.
+    by bulkRec or an sql statement, must be followed by doBuild for the items
+    changed. tb1020 rebuilds the summary of all companies.
+    """
+    keys = ("cono", "group", "code", "loc", "curdt", "type")
+
+    def __init__(self, dbm):
+        self.dbm = dbm
+        self.sql = Sql(self.dbm, ["strbal", "strtrn"], error=False,
+            prog=__name__)
+        # A database not yet updated to have the summary is ignored
+        self.active = not self.sql.error
+
+    def getSums(self, where=None):
+        """
+        Return the summary records of the strtrn records selected by where.
+        """
+        cols = ["stt_%s" % key for key in self.keys]
+        grp = ", ".join(cols)
+        cols.extend(["round(sum(stt_qty), 2)", "round(sum(stt_cost), 2)",
+            "round(sum(stt_sell), 2)", "count(*)"])
+        return self.sql.getRec("strtrn", cols=cols, where=where, group=grp)
+
+    def addRecs(self, recs):
+        """
+        Add strtrn records, which have been inserted, to the summary.
+        """
+        col = self.sql.strtrn_col
+        idx = [col.index("stt_%s" % key) for key in self.keys]
+        amt = [col.index(c) for c in ("stt_qty", "stt_cost", "stt_sell")]
+        tots = {}
+        for rec in recs:
+            key = tuple([rec[x] for x in idx])
+            if key not in tots:
+                tots[key] = [ACC(), ACC(), ACC(), 0]
+            for num, x in enumerate(amt):
+                tots[key][num].add(rec[x] or 0)
+            tots[key][3] += 1
+        sums = []
+        for key in tots:
+            qty, cost, sell, trns = tots[key]
+            sums.append(list(key) + [float(qty), float(cost), float(sell),
+                trns])
+        self.addSums(sums)
+
+    def addSums(self, sums, sign=1):
+        """
+        Add, or with a sign of -1 subtract, summary records to the summary.
+        Each record is added by the database in a single statement, an
+        upsert with PgSQL, so that the postings of concurrent users to the
+        same summary record are not lost.
+        """
+        dbf = self.dbm.dbf
+        keys = ["sbl_%s" % key for key in self.keys]
+        cols = ["sbl_qty", "sbl_cost", "sbl_sell", "sbl_trns"]
+        vals = ", ".join([dbf] * (len(keys) + len(cols)))
+        sets = []
+        for col in cols:
+            if col == "sbl_trns":
+                sets.append("%s = strbal.%s + %s" % (col, col, dbf))
+            else:
+                sets.append("%s = round(strbal.%s + %s, 2)" % (col, col,
+                    dbf))
+        whr = " and ".join(["%s = %s" % (key, dbf) for key in keys])
+        upd = "Update strbal set %s where %s" % (", ".join(sets), whr)
+        if self.dbm.dbase == "PgSQL":
+            ups = "Insert into strbal values (%s) on conflict (%s) do "\
+                "update set %s" % (vals, ", ".join(keys), ", ".join(sets))
+        else:
+            ups = "Insert or ignore into strbal values (%s)" % vals
+        for dat in sums:
+            amts = [dat[6 + num] * sign for num in range(4)]
+            if sign == 1:
+                if self.dbm.dbase == "PgSQL":
+                    self.sql.sqlRec((ups, list(dat) + amts))
+                    continue
+                self.sql.sqlRec((ups, list(dat)))
+                if self.dbm.cu.rowcount:
+                    continue
+            self.sql.sqlRec((upd, amts + list(dat[:6])))
+            if sign == -1:
+                self.sql.sqlRec(("Delete from strbal where %s and "\
+                    "sbl_trns < 1" % whr, list(dat[:6])))
+
+    def doBuild(self, cono=None, group=None, code=None, loc=None):
+        """
+        Rebuild the summary of all companies, a company or an item from
+        strtrn.
+        """
+        whr = []
+        for key, dat in (("cono", cono), ("group", group), ("code", code),
+                ("loc", loc)):
+            if dat is not None:
+                whr.append((key, dat))
+        self.sql.delRec("strbal", where=[("sbl_%s" % key, "=", dat)
+            for key, dat in whr] or None)
+        sums = self.getSums(where=[("stt_%s" % key, "=", dat)
+            for key, dat in whr] or None)
+        if sums:
+            self.sql.insRec("strbal", data=sums)
+
+class StrPrices(object):
+    """
+    Resolves the cost and selling prices of many stores items, returning the
+    same values as tartanFunctions getCost and getSell.
+
+    dbm  - A database class
+    cono - The company number
+
+    The item master records, recipes, balances, last costs, standard costs,
+    selling prices and markups of a list of (group, code, loc) keys are read
+    by doLoad using a few grouped queries per product group and are kept for
+    the duration of a run. Recipe ingredients are loaded with their recipes.
+    Items not loaded are loaded when first used. If strtrn records of an
+    item are changed during the run use doClear to have them read again.
+    """
+    def __init__(self, dbm, cono):
+        self.dbm = dbm
+        self.cono = cono
+        self.sql = Sql(self.dbm, ["slsiv3", "strcmu", "strcst", "strctl",
+            "strgmu", "strmf1", "strprc", "strrcp", "strtrn"], prog=__name__)
+        ctl = self.sql.getRec("strctl", cols=["cts_automu"],
+            where=[("cts_cono", "=", self.cono)], limit=1)
+        if ctl:
+            self.automu = ctl[0]
+        else:
+            self.automu = "N"
+        self.mf1 = {}
+        self.gmu = {}
+        self.doClear()
+
+    def doClear(self, keys=None):
+        """
+        Clear the loaded transaction values of keys, a list of (group, code)
+        or (group, code, loc) keys, or of all items.
+        """
+        if keys is None:
+            self.items = set()
+            self.rcp = {}
+            self.bals = {}
+            self.lcst = {}
+            self.scst = {}
+            self.lsel = {}
+            self.prc = {}
+            self.cmu = {}
+            return
+        items = set([tuple(key[:2]) for key in keys])
+        self.items.difference_update(items)
+        for dic in (self.rcp, self.bals, self.lcst, self.scst, self.lsel,
+                self.prc, self.cmu):
+            for key in list(dic.keys()):
+                if key[:2] in items:
+                    del dic[key]
+
+    def doLoad(self, keys):
+        """
+        Load the values of keys, a list of (group, code) or (group, code, loc)
+        keys, and of their recipe ingredients.
+        """
+        items = set([tuple(key[:2]) for key in keys]) - self.items
+        while items:
+            self.items.update(items)
+            grps = {}
+            for grp, cod in items:
+                grps.setdefault(grp, []).append(cod)
+            for grp in grps:
+                if grp not in self.gmu:
+                    self.loadGroup(grp)
+                cods = sorted(grps[grp])
+                for x in range(0, len(cods), 500):
+                    self.loadCodes(grp, cods[x:x + 500])
+            # Recipe ingredients not yet loaded
+            rcps = items
+            items = set()
+            for key in self.rcp:
+                if key[:2] not in rcps:
+                    continue
+                for ggg, ccc, qqq in self.rcp[key]:
+                    if (ggg, ccc) not in self.items:
+                        items.add((ggg, ccc))
+
+    def loadGroup(self, grp):
+        self.gmu[grp] = {}
+        recs = self.sql.getRec("strgmu", cols=["smg_level", "smg_markup"],
+            where=[("smg_cono", "=", self.cono), ("smg_group", "=", grp)])
+        for lvl, mkp in recs:
+            self.gmu[grp][lvl] = mkp
+
+    def loadCodes(self, grp, cods):
+        whr = [("st1_cono", "=", self.cono), ("st1_group", "=", grp),
+            ("st1_code", "in", cods)]
+        recs = self.sql.getRec("strmf1", cols=["st1_code", "st1_type",
+            "st1_value_ind"], where=whr)
+        for cod, typ, vin in recs:
+            self.mf1[(grp, cod)] = (typ, vin)
+        # Recipes
+        whr = [("srr_cono", "=", self.cono), ("srr_group", "=", grp),
+            ("srr_code", "in", cods)]
+        recs = self.sql.getRec("strrcp", cols=["srr_code", "srr_loc",
+            "srr_rgroup", "srr_rcode", "srr_rqty"], where=whr,
+            order="srr_code, srr_loc, srr_rgroup, srr_rcode")
+        for cod, loc, ggg, ccc, qqq in recs:
+            self.rcp.setdefault((grp, cod, loc), []).append([ggg, ccc, qqq])
+        # Quantity and cost balances, None being all locations
+        whr = [("stt_cono", "=", self.cono), ("stt_group", "=", grp),
+            ("stt_code", "in", cods)]
+        recs = self.sql.getRec("strtrn", cols=["stt_code", "stt_loc",
+            "round(sum(stt_qty), 2)", "round(sum(stt_cost), 2)"], where=whr,
+            group="stt_code, stt_loc", order="stt_code, stt_loc")
+        tots = {}
+        for cod, loc, qty, cst in recs:
+            self.bals[(grp, cod, loc)] = [qty, cst]
+            if cod not in tots:
+                tots[cod] = [ACC(), ACC()]
+            tots[cod][0].add(qty)
+            tots[cod][1].add(cst)
+        for cod in tots:
+            self.bals[(grp, cod, None)] = [float(tots[cod][0]),
+                float(tots[cod][1])]
+        # Last costs of receipts and adjustments
+        recs = self.sql.getRec("strtrn", cols=["stt_code", "stt_loc",
+            "stt_qty", "stt_cost"], where=whr + [("stt_type", "in", (1, 3)),
+            ("stt_qty", ">", 0), ("stt_cost", "<>", 0)],
+            order="stt_code, stt_capdt desc, stt_seq desc")
+        for cod, loc, qty, cst in recs:
+            if (grp, cod, loc) in self.lcst:
+                continue
+            q = CCD(qty, "SD", 11.2)
+            c = CCD(cst, "SD", 11.2)
+            if q.work and q.work > 0 and c.work:
+                self.lcst[(grp, cod, loc)] = round((c.work / q.work), 2)
+                if (grp, cod, None) not in self.lcst:
+                    self.lcst[(grp, cod, None)] = self.lcst[(grp, cod, loc)]
+        # Last selling prices of sales
+        recs = self.sql.getRec("strtrn", cols=["stt_code", "stt_loc",
+            "stt_qty", "stt_sell"], where=whr + [("stt_type", "in", (7, 8)),
+            ("stt_qty", "<", 0), ("stt_sell", "<>", 0)],
+            order="stt_code, stt_loc, stt_capdt desc, stt_seq desc")
+        for cod, loc, qty, sel in recs:
+            if (grp, cod, loc) in self.lsel:
+                continue
+            q = CCD(qty, "SD", 11.2)
+            s = CCD(sel, "SD", 11.2)
+            if q.work < 0 and s.work:
+                self.lsel[(grp, cod, loc)] = round((s.work / q.work), 2)
+        # Standard costs
+        whr = [("stc_cono", "=", self.cono), ("stc_group", "=", grp),
+            ("stc_code", "in", cods)]
+        recs = self.sql.getRec("strcst", cols=["stc_code", "stc_loc",
+            "stc_cost"], where=whr, order="stc_code, stc_loc")
+        for cod, loc, cst in recs:
+            self.scst[(grp, cod, loc)] = cst
+            if (grp, cod, None) not in self.scst:
+                self.scst[(grp, cod, None)] = cst
+        # Selling prices and markups
+        whr = [("stp_cono", "=", self.cono), ("stp_group", "=", grp),
+            ("stp_code", "in", cods)]
+        recs = self.sql.getRec("strprc", cols=["stp_code", "stp_loc",
+            "stp_level", "stp_price"], where=whr)
+        for cod, loc, lvl, prc in recs:
+            self.prc[(grp, cod, loc, lvl)] = prc
+        whr = [("smc_cono", "=", self.cono), ("smc_group", "=", grp),
+            ("smc_code", "in", cods)]
+        recs = self.sql.getRec("strcmu", cols=["smc_code", "smc_loc",
+            "smc_level", "smc_markup"], where=whr)
+        for cod, loc, lvl, mkp in recs:
+            self.cmu[(grp, cod, loc, lvl)] = mkp
+
+    def getMaster(self, group, code):
+        # Return the item's type and value indicator
+        if (group, code) not in self.items:
+            self.doLoad([(group, code)])
+        return self.mf1.get((group, code), ("", ""))
+
+    def getCost(self, group, code, loc=None, qty=1, ind="I", recp=False, tot=False, bal=False):
+        """
+        Return the cost prices of an item, see tartanFunctions getCost.
+        """
+        # Check for Recipe
+        if not recp:
+            if self.getMaster(group, code)[0] == "R" and loc:
+                recp = True
+        if recp:
+            # Recipe
+            items = []
+            if type(recp) in (list, tuple):
+                items = self.sql.getRec("slsiv3", cols=["si3_rgroup",
+                    "si3_rcode", "si3_rqty"], where=[("si3_cono", "=",
+                    self.cono), ("si3_rtn", "=", recp[0]), ("si3_docno", "=",
+                    recp[1]), ("si3_line", "=", recp[2])])
+                self.doLoad(items)
+            if not items:
+                self.getMaster(group, code)
+                items = self.rcp.get((group, code, loc), [])
+        else:
+            # Single Item
+            items = [[group, code, qty]]
+        if loc:
+            lkey = loc
+        else:
+            lkey = None
+        # Variables
+        acost = 0
+        lcost = 0
+        scost = 0
+        tcost = 0
+        csts = list(ind)
+        # Items
+        for ggg, ccc, qqq in items:
+            ac = 0
+            lc = 0
+            sc = 0
+            tc = 0
+            vin = self.getMaster(ggg, ccc)[1]
+            if vin == "N":
+                csts = ["N"] * len(csts)
+            elif "I" in csts:
+                csts = [vin]
+            elif vin == "S" and "A" in csts:
+                csts[csts.index("A")] = vin
+            # Cost Prices
+            bals = list(self.bals.get((ggg, ccc, lkey), [0, 0]))
+            # Average Cost
+            if bals[0] and qqq == bals[0]:
+                ac = round((bals[1] / qty), 2)
+                tc = bals[1]
+            elif bals[0]:
+                ac = round((bals[1] / bals[0]), 2)
+            # Last Cost
+            lc = self.lcst.get((ggg, ccc, lkey), 0)
+            # If average cost is zero
+            if not ac and lc:
+                ac = lc
+            if "S" in csts:
+                # Standard Cost
+                sc = self.scst.get((ggg, ccc, lkey), 0)
+            if recp:
+                if tc:
+                    acost = float(ASD(acost) + ASD(tc))
+                    tcost = float(ASD(tcost) + ASD(tc))
+                else:
+                    acost = float(ASD(acost) + ASD(round(ac * qqq, 2)))
+                lcost = float(ASD(lcost) + ASD(round(lc * qqq, 2)))
+                scost = float(ASD(scost) + ASD(round(sc * qqq, 2)))
+            else:
+                acost = ac
+                lcost = lc
+                scost = sc
+                tcost = tc
+        prcs = []
+        vals = []
+        if recp:
+            bals = [1, 0]
+        for flg in csts:
+            if flg == "A":
+                prcs.append(acost)
+                if tcost:
+                    vals.append(tcost)
+                else:
+                    vals.append(round(qty * acost, 2))
+            elif flg in ("Y", "L"):
+                prcs.append(lcost)
+                vals.append(round(qty * lcost, 2))
+            elif flg == "S":
+                prcs.append(scost)
+                vals.append(round(qty * scost, 2))
+            elif flg == "N":
+                prcs.append(0)
+                vals.append(0)
+        if len(csts) == 1:
+            if tot:
+                if bal:
+                    return prcs[0], vals[0], bals
+                else:
+                    return prcs[0], vals[0]
+            elif bal:
+                return prcs[0], bals
+            else:
+                return prcs[0]
+        elif tot:
+            if bal:
+                return prcs, vals, bals
+            else:
+                return prcs, vals
+        elif bal:
+            return prcs, bals
+        else:
+            return prcs
+
+    def getMarkup(self, group, code, loc, level):
+        self.getMaster(group, code)
+        mkp = self.gmu[group].get(level, 0)
+        if self.cmu.get((group, code, loc, level)):
+            mkp = self.cmu[(group, code, loc, level)]
+        return mkp
+
+    def getSell(self, group, code, loc=None, lvl=1, recp=False, ind=None):
+        """
+        Return the selling price of an item, see tartanFunctions getSell.
+        """
+        # Check for Recipe
+        if not recp:
+            if self.getMaster(group, code)[0] == "R":
+                recp = True
+        # Check Price Record
+        if (group, code, loc, lvl) in self.prc:
+            # Price Level
+            return self.prc[(group, code, loc, lvl)]
+        elif ind == "P":
+            return 0
+        # Last Selling Price
+        lst = self.lsel.get((group, code, loc), 0)
+        # Check for Automatic Markups
+        mui = self.automu
+        if mui == "A":
+            if self.getMaster(group, code)[1] == "S":
+                mui = "S"
+        if not recp and (mui == "N" or ind == "L"):
+            # Not a Recipe and ind=L or No Markups
+            return lst
+        # Markup Prices
+        prc = 0
+        if mui in ("A", "L", "S"):
+            # Cost Price
+            cst = self.getCost(group, code, loc, ind=mui, recp=recp)
+            if cst:
+                # Price Markup
+                mkp = self.getMarkup(group, code, loc, lvl)
+                if mkp:
+                    prc = round((cst * (100 + mkp) / 100.0), 2)
+        if not prc:
+            return lst
+        return prc
 
 class Batches(object):
     """
@@ -9776,6 +12146,143 @@ class Batches(object):
     def doTotExit(self):
         self.b2.closeProcess()
 
+class GenMatrix(object):
+    """
+    This class loads the general ledger opening balances, movements and
+    budgets of one or more companies into memory, once, so that the balance
+    of any account, or department roll-up, for any period can be returned
+    without a query.
+
+    sql    = An Sql instance including genbal, genbud and gentrn
+    conos  = A list of company numbers to load
+    start  = The first period to load e.g. 202203
+    end    = The last period to load e.g. 202502
+    trdts  = A list of opening balance dates to load
+    consol = True to combine the companies
+    base   = The department base, 10 ** account digits, to roll accounts up
+             by acno % base or None
+    budget = Whether to load the budgets
+
+    The amounts are held in cents in an array per account, indexed by the
+    number of months from start. Periods, and opening balance dates, which
+    were not loaded are read from the tables instead.
+    """
+    def __init__(self, sql, conos, start, end, trdts, consol=False, base=None, budget=True):
+        self.sql = sql
+        self.conos = conos
+        self.trdts = trdts
+        self.consol = consol
+        self.base = base
+        self.budget = budget
+        self.start = self.getMonth(start)
+        self.size = self.getMonth(end) - self.start + 1
+        self.obal = {}
+        self.move = {}
+        self.budg = {}
+        if trdts:
+            bals = self.sql.getRec("genbal", cols=["glo_cono", "glo_acno",
+                "glo_trdt", "glo_cyr"], where=[("glo_cono", "in", conos),
+                ("glo_trdt", "in", trdts)])
+            for cono, acno, trdt, amnt in bals:
+                key = self.getKey(cono, acno)
+                if key not in self.obal:
+                    self.obal[key] = {}
+                self.obal[key][trdt] = self.obal[key].get(trdt, 0) + \
+                    int(round(amnt * 100))
+        self.loadMatrix(self.move, "gentrn", "glt", "glt_tramt", conos,
+            start, end)
+        if budget:
+            self.loadMatrix(self.budg, "genbud", "glb", "glb_tramt", conos,
+                start, end)
+
+    def getMonth(self, curdt):
+        return (int(curdt / 100) * 12) + (curdt % 100) - 1
+
+    def getKey(self, cono, acno):
+        if self.consol:
+            cono = 0
+        if self.base:
+            acno = acno % self.base
+        return (cono, acno)
+
+    def loadMatrix(self, mtx, table, pfx, amt, conos, start, end):
+        recs = self.sql.getRec(table, cols=["%s_cono" % pfx, "%s_acno" % pfx,
+            "%s_curdt" % pfx, "sum(%s)" % amt], where=[("%s_cono" % pfx, "in",
+            conos), ("%s_curdt" % pfx, "between", start, end)],
+            group="%s_cono, %s_acno, %s_curdt" % (pfx, pfx, pfx))
+        for cono, acno, curdt, amnt in recs:
+            if not amnt:
+                continue
+            key = self.getKey(cono, acno)
+            if key not in mtx:
+                mtx[key] = array.array("q", bytes(8 * self.size))
+            mtx[key][self.getMonth(curdt) - self.start] += \
+                int(round(amnt * 100))
+
+    def getAmount(self, mtx, cono, acno, curdt):
+        key = self.getKey(cono, acno)
+        if key not in mtx:
+            return 0
+        idx = self.getMonth(curdt) - self.start
+        if not mtx[key][idx]:
+            return 0
+        return round(mtx[key][idx] / 100.0, 2)
+
+    def isLoaded(self, curdt):
+        idx = self.getMonth(curdt) - self.start
+        return 0 <= idx < self.size
+
+    def getQuery(self, table, pfx, amt, cono, acno, col, val):
+        """
+        Return the sum of amt for the account from the table where col
+        equals val, for periods or dates which were not loaded.
+        """
+        if self.consol:
+            whr = [("%s_cono" % pfx, "in", self.conos)]
+        else:
+            whr = [("%s_cono" % pfx, "=", cono)]
+        if self.base:
+            whr.append(("%s_acno" % pfx, "%", self.base, "=",
+                acno % self.base))
+        else:
+            whr.append(("%s_acno" % pfx, "=", acno))
+        whr.append(("%s_%s" % (pfx, col), "=", val))
+        amnt = self.sql.getRec(table, cols=["round(sum(%s), 2)" % amt],
+            where=whr, limit=1)[0]
+        if not amnt:
+            return 0
+        return amnt
+
+    def getObal(self, cono, acno, trdt):
+        """
+        Return the opening balance of the account as at trdt.
+        """
+        if not self.trdts or trdt not in self.trdts:
+            return self.getQuery("genbal", "glo", "glo_cyr", cono, acno,
+                "trdt", trdt)
+        key = self.getKey(cono, acno)
+        if key not in self.obal or not self.obal[key].get(trdt):
+            return 0
+        return round(self.obal[key][trdt] / 100.0, 2)
+
+    def getMove(self, cono, acno, curdt):
+        """
+        Return the movement on the account for the period curdt.
+        """
+        if not self.isLoaded(curdt):
+            return self.getQuery("gentrn", "glt", "glt_tramt", cono, acno,
+                "curdt", curdt)
+        return self.getAmount(self.move, cono, acno, curdt)
+
+    def getBudget(self, cono, acno, curdt):
+        """
+        Return the budget of the account for the period curdt.
+        """
+        if not self.budget or not self.isLoaded(curdt):
+            return self.getQuery("genbud", "glb", "glb_tramt", cono, acno,
+                "curdt", curdt)
+        return self.getAmount(self.budg, cono, acno, curdt)
+
 class FinReport(object):
     """
     This class generates a list comprising:
@@ -9975,6 +12482,32 @@ class FinReport(object):
                 self.alldeps.append(dep[0])
                 if self.depart and dep[0] == self.depart:
                     self.dname = dep[1]
+        # Account balance matrix of all the periods, including the last
+        # year comparatives, of the report
+        if self.consol:
+            conos = self.consol
+        else:
+            conos = [self.conum]
+        start = self.pers[0]["i_per"]
+        trdts = []
+        for p in self.pers:
+            if self.pers[p]:
+                start = min(start, self.pers[p]["i_per"])
+                trdts.append(self.pers[p]["o_dte"])
+        start -= 300
+        yr = int(self.pers[0]["s_per"] / 100)
+        mt = (self.pers[0]["s_per"] % 100) + 11
+        if mt > 12:
+            mt -= 12
+            yr += 1
+        end = max(self.pers[0]["e_per"], (yr * 100) + mt)
+        if self.sysdp[0] == "Y" and not self.depart:
+            base = 10 ** (7 - self.sysdp[1])
+        else:
+            base = None
+        self.matrix = GenMatrix(self.sql, conos, start, end, trdts,
+            consol=bool(self.consol), base=base,
+            budget=self.varcd not in ("N", "P"))
         return True
 
     def mainProcess(self):
@@ -10009,6 +12542,14 @@ class FinReport(object):
             self.ddet = [dtm[0], CCD(0, "SD", 13.2).disp]
         else:
             self.ddet = [dtm[0], CCD(dtt[0], "SD", 13.2).disp]
+        # Detail values of all periods
+        self.dtt = {}
+        recs = self.sql.getRec("gendtt", cols=["gdt_curdt", "gdt_value"],
+            where=[("gdt_cono", "=", self.conum), ("gdt_code", "=",
+            self.dcode)])
+        for curdt, value in recs:
+            if curdt not in self.dtt:
+                self.dtt[curdt] = value
 
     def processRecords(self):
         if self.grpind:
@@ -10461,200 +13002,29 @@ class FinReport(object):
 
     def getObal(self):
         lyr = [0, 0, 0]
-        if not self.consol:
-            if self.sysdp[0] == "Y" and not self.depart:
-                bas = 10 ** (7 - self.sysdp[1])
-                acc = self.s_acno % bas
-                if self.period[0]:
-                    for p in self.pers:
-                        if self.pers[p]:
-                            bal = self.sql.getRec("genbal",
-                                cols=["round(sum(glo_cyr), 2)"],
-                                where=[("glo_cono", "=", self.s_cono),
-                                ("glo_acno", "%", bas, "=", acc),
-                                ("glo_trdt", "=", self.pers[p]["o_dte"])],
-                                limit=1)
-                            if not bal[0]:
-                                lyr[p-1] = 0
-                            else:
-                                lyr[p-1] = bal[0]
-                cyr = self.sql.getRec("genbal",
-                    cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "=",
-                    self.s_cono), ("glo_acno", "%", bas, "=", acc),
-                    ("glo_trdt", "=", self.pers[0]["o_dte"])], limit=1)[0]
-            else:
-                if self.period[0]:
-                    for p in self.pers:
-                        if self.pers[p]:
-                            bal = self.sql.getRec("genbal",
-                                cols=["round(sum(glo_cyr), 2)"],
-                                where=[("glo_cono", "=", self.s_cono),
-                                ("glo_acno", "=", self.s_acno),
-                                ("glo_trdt", "=", self.pers[p]["o_dte"])],
-                                limit=1)
-                            if not bal[0]:
-                                lyr[p-1] = 0
-                            else:
-                                lyr[p-1] = bal[0]
-                cyr = self.sql.getRec("genbal",
-                    cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "=",
-                    self.s_cono), ("glo_acno", "=", self.s_acno), ("glo_trdt",
-                    "=", self.pers[0]["o_dte"])], limit=1)[0]
-        else:
-            if self.sysdp[0] == "Y" and not self.depart:
-                bas = 10 ** (7 - self.sysdp[1])
-                acc = self.s_acno % bas
-                if self.period[0]:
-                    for p in self.pers:
-                        if self.pers[p]:
-                            bal = self.sql.getRec("genbal",
-                                cols=["round(sum(glo_cyr), 2)"],
-                                where=[("glo_cono", "in", self.consol),
-                                ("glo_acno", "%", bas, "=", acc),
-                                ("glo_trdt", "=", self.pers[p]["o_dte"])],
-                                limit=1)
-                            if not bal[0]:
-                                lyr[p-1] = 0
-                            else:
-                                lyr[p-1] = bal[0]
-                cyr = self.sql.getRec("genbal",
-                    cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "in",
-                        self.consol), ("glo_acno", "%", bas, "=", acc),
-                        ("glo_trdt", "=", self.per[0]["o_dte"])], limit=1)[0]
-            else:
-                if self.period[0]:
-                    for p in self.pers:
-                        if self.pers[p]:
-                            bal = self.sql.getRec("genbal",
-                                cols=["round(sum(glo_cyr), 2)"],
-                                where=[("glo_cono", "in", self.consol),
-                                ("glo_acno", "=", self.s_acno),
-                                ("glo_trdt", "=", self.pers[p]["o_dte"])],
-                                limit=1)
-                            if not bal[0]:
-                                lyr[p-1] = 0
-                            else:
-                                lyr[p-1] = bal[0]
-                cyr = self.sql.getRec("genbal",
-                    cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "in",
-                    self.consol), ("glo_acno", "=", self.s_acno), ("glo_trdt",
-                    "=", self.pers[0]["o_dte"])], limit=1)[0]
-        if not cyr:
-            cyr = 0
+        if self.period[0]:
+            for p in self.pers:
+                if self.pers[p]:
+                    lyr[p-1] = self.matrix.getObal(self.s_cono, self.s_acno,
+                        self.pers[p]["o_dte"])
+        cyr = self.matrix.getObal(self.s_cono, self.s_acno,
+            self.pers[0]["o_dte"])
         return (lyr, cyr)
 
     def getMbal(self, curdt):
-        if not self.consol:
-            if self.sysdp[0] == "Y" and not self.depart:
-                bas = 10 ** (7 - self.sysdp[1])
-                acc = self.s_acno % bas
-                lyr = [0, 0, 0]
-                cdt = curdt
-                for p in range(3, 0, -1):
-                    if self.pers[p]:
-                        cdt -= 100
-                        bal = self.sql.getRec("gentrn",
-                            cols=["round(sum(glt_tramt), 2)"],
-                            where=[("glt_cono", "=", self.s_cono),
-                            ("glt_acno", "%", bas, "=", acc),
-                            ("glt_curdt", "=", cdt)], limit=1)
-                        if bal[0]:
-                            lyr[p-1] = bal[0]
-                cyr = self.sql.getRec("gentrn",
-                    cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono",
-                    "=", self.s_cono), ("glt_acno", "%", bas, "=", acc),
-                    ("glt_curdt", "=", curdt)], limit=1)[0]
-                if self.varcd == "P":
-                    bud = lyr[2]
-                elif self.varcd == "N":
-                    bud = 0
-                else:
-                    bud = self.sql.getRec("genbud",
-                        cols=["sum(glb_tramt)"], where=[("glb_cono",
-                        "=", self.s_cono), ("glb_acno", "%", bas, "=", acc),
-                        ("glb_curdt", "=", curdt)], limit=1)[0]
-            else:
-                lyr = [0, 0, 0]
-                cdt = curdt
-                for p in range(3, 0, -1):
-                    if self.pers[p]:
-                        cdt -= 100
-                        bal = self.sql.getRec("gentrn",
-                            cols=["round(sum(glt_tramt), 2)"],
-                            where=[("glt_cono", "=", self.s_cono),
-                            ("glt_acno", "=", self.s_acno),
-                            ("glt_curdt", "=", cdt)], limit=1)
-                        if bal[0]:
-                            lyr[p-1] = bal[0]
-                cyr = self.sql.getRec("gentrn",
-                    cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono",
-                    "=", self.s_cono), ("glt_acno", "=", self.s_acno),
-                    ("glt_curdt", "=", curdt)], limit=1)[0]
-                if self.varcd == "P":
-                    bud = lyr[2]
-                elif self.varcd == "N":
-                    bud = 0
-                else:
-                    bud = self.sql.getRec("genbud",
-                        cols=["sum(glb_tramt)"], where=[("glb_cono",
-                        "=", self.s_cono), ("glb_acno", "=", self.s_acno),
-                        ("glb_curdt", "=", curdt)], limit=1)[0]
-        elif self.sysdp[0] == "Y" and not self.depart:
-            bas = 10 ** (7 - self.sysdp[1])
-            acc = self.s_acno % bas
-            lyr = [0, 0, 0]
-            cdt = curdt
-            for p in range(3, 0, -1):
-                if self.pers[p]:
-                    cdt -= 100
-                    bal = self.sql.getRec("gentrn",
-                        cols=["round(sum(glt_tramt), 2)"],
-                        where=[("glt_cono", "in", self.consol),
-                        ("glt_acno", "%", bas, "=", acc),
-                        ("glt_curdt", "=", cdt)], limit=1)
-                    if bal[0]:
-                        lyr[p-1] = bal[0]
-            cyr = self.sql.getRec("gentrn",
-                cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono", "in",
-                self.consol), ("glt_acno", "%", bas, "=", acc),
-                ("glt_curdt", "=", curdt)], limit=1)[0]
-            if self.varcd == "P":
-                bud = lyr[2]
-            elif self.varcd == "N":
-                bud = 0
-            else:
-                bud = self.sql.getRec("genbud", cols=["sum(glb_tramt)"],
-                    where=[("glb_cono", "in", self.consol), ("glb_acno", "%",
-                    bas, "=", acc), ("glb_curdt", "=", curdt)], limit=1)[0]
-        else:
-            lyr = [0, 0, 0]
-            cdt = curdt
-            for p in range(3, 0, -1):
-                if self.pers[p]:
-                    cdt -= 100
-                    bal = self.sql.getRec("gentrn",
-                        cols=["round(sum(glt_tramt), 2)"],
-                        where=[("glt_cono", "in", self.consol),
-                        ("glt_acno", "=", self.s_acno),
-                        ("glt_curdt", "=", cdt)], limit=1)
-                    if bal[0]:
-                        lyr[p-1] = bal[0]
-            cyr = self.sql.getRec("gentrn",
-                cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono", "in",
-                self.consol), ("glt_acno", "=", self.s_acno), ("glt_curdt",
-                "=", curdt)], limit=1)[0]
-            if self.varcd == "P":
-                bud = lyr[2]
-            elif self.varcd == "N":
-                bud = 0
-            else:
-                bud = self.sql.getRec("genbud", cols=["sum(glb_tramt)"],
-                    where=[("glb_cono", "in", self.consol), ("glb_acno", "=",
-                    self.s_acno), ("glb_curdt", "=", curdt)], limit=1)[0]
-        if not cyr:
-            cyr = 0
-        if not bud:
+        lyr = [0, 0, 0]
+        cdt = curdt
+        for p in range(3, 0, -1):
+            if self.pers[p]:
+                cdt -= 100
+                lyr[p-1] = self.matrix.getMove(self.s_cono, self.s_acno, cdt)
+        cyr = self.matrix.getMove(self.s_cono, self.s_acno, curdt)
+        if self.varcd == "P":
+            bud = lyr[2]
+        elif self.varcd == "N":
             bud = 0
+        else:
+            bud = self.matrix.getBudget(self.s_cono, self.s_acno, curdt)
         return (lyr, cyr, bud)
 
     def printLine(self):
@@ -10739,19 +13109,9 @@ class FinReport(object):
         for p in range(1, 4):
             if self.pers[p]:
                 cdt -= 100
-                bal = self.sql.getRec("gendtt", cols=["gdt_value"],
-                    where=[("gdt_cono", "=", self.conum),
-                    ("gdt_code", "=", self.dcode),
-                    ("gdt_curdt", "=", cdt)], limit=1)
-                if bal:
-                    lyr[p-1] = bal[0]
-        cyr = self.sql.getRec("gendtt", cols=["gdt_value"],
-            where=[("gdt_cono", "=", self.conum), ("gdt_code", "=", self.dcode),
-            ("gdt_curdt", "=", curdt)], limit=1)
-        if not cyr:
-            cyr = 0
-        else:
-            cyr = cyr[0]
+                if cdt in self.dtt:
+                    lyr[p-1] = self.dtt[cdt]
+        cyr = self.dtt.get(curdt, 0)
         return (lyr, cyr)
 
     def signChkChg(self):
@@ -13837,7 +16197,7 @@ class BankImport(object):
             ofl = open(fname, "w")
             ofl.write(line)
             ofl.close()
-        parser = OFXTree()
+        parser = ofxparser.OFXTree()
         try:
             parser.parse(fname)
             ofx = parser.convert()
@@ -14077,6 +16437,32 @@ class BankImport(object):
             showError(self.mf.body, "Import Error", err)
             self.trans = []
 
+class RowSpool(object):
+    """
+    A list like store of rows which are pickled to a temporary file as they
+    are appended and can be iterated, repeatedly, once all are appended.
+
+    wrkdir - The directory for the temporary file
+    """
+    def __init__(self, wrkdir=None):
+        self.fle = tempfile.TemporaryFile(dir=wrkdir)
+        self.rows = 0
+
+    def append(self, row):
+        pickle.dump(row, self.fle, pickle.HIGHEST_PROTOCOL)
+        self.rows += 1
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        self.fle.seek(0)
+        for _ in range(self.rows):
+            yield pickle.load(self.fle)
+
+    def close(self):
+        self.fle.close()
+
 class RepPrt(object):
     """
     This is a Report Printer, following are the required parameters:
@@ -14173,11 +16559,15 @@ class RepPrt(object):
     tails   :   List of text to print at the end of the report
     wrkdir  :   The directory to use for temporary files
     sveprt  :   Whether or not to save and print the report
+    chunk   :   The number of records to fetch at a time with ttype "T", so
+                that memory use does not grow with the number of records, or
+                0 to fetch all the records at once. Defaults to 5000.
     """
     def __init__(self, mf, **args):
         self.mf = mf
         defaults = {
             "blank": False,
+            "chunk": 5000,
             "cols": [],
             "conam": None,
             "conum": None,
@@ -14301,18 +16691,18 @@ class RepPrt(object):
             recs = self.getData()
         else:
             recs = self.tables
+        if recs == "error":
+            self.xits = True
+            return
+        if type(recs) is list:
+            self.count = len(recs)
+        elif not self.count:
+            recs = []
         if self.stots:
-            # Sub total descriptions
+            # Sub total descriptions, added as the records are printed
             self.sdic = {}
             for s in self.stots:
                 self.sdic[s[0]] = {}
-                for rec in recs:
-                    idx = rec[self.l3.index(s[0])]
-                    if s[1] in self.l3:
-                        des = rec[self.l3.index(s[1])]
-                    else:
-                        des = s[1]
-                    self.sdic[s[0]][idx] = des
         if recs:
             self.formLayout()
             self.printReport(recs)
@@ -14531,12 +16921,41 @@ class RepPrt(object):
         else:
             order = self.order
         sql = Sql(self.mf.dbm, self.tables, prog=__name__)
-        return sql.getRec(tables=self.tables, cols=cols, join=join,
-            where=self.where, group=self.group, order=order)
+        if not self.chunk:
+            return sql.getRec(tables=self.tables, cols=cols, join=join,
+                where=self.where, group=self.group, order=order)
+        # Count the records and stream them in chunks
+        if self.where:
+            shape, dat = sql.parseWhere(self.where)
+        else:
+            shape, dat = None, []
+        get = sql.getQuery(self.tables, join, cols, shape, self.group)[0]
+        self.count = sql.sqlRec(("Select count(*) from (%s) as cnt" % get,
+            dat), limit=1)[0]
+        return sql.iterRec(self.tables, cols=cols, join=join,
+            where=self.where, group=self.group, order=order, size=self.chunk)
+
+    def getFormats(self):
+        """
+        Return a list of the (name, type, size, formatter, flags) of each
+        column, the formatter being as per CCF and the flags being whether
+        the column is the transaction type, has its sign changed and is
+        displayed.
+        """
+        fmts = []
+        for nam in self.l3:
+            t = self.fd[nam][0]
+            if t == "TX" and self.repprt[2] != "export":
+                t = "NA"
+            s = self.fd[nam][1]
+            trtp = bool(self.trtp and nam == self.trtp[0])
+            fmts.append((nam, t, s, getCCF(t, s).format, trtp,
+                nam in self.cg, nam in self.pr))
+        return fmts
 
     def printReport(self, recs):
         if self.pbar:
-            pb = ProgressBar(self.mf.body, mxs=len(recs), typ=self.pbar,
+            pb = ProgressBar(self.mf.body, mxs=self.count, typ=self.pbar,
                 esc=True)
         if self.pdffl:
             self.pdfnam = os.path.join(self.wrkdir, self.pdffl + ".pdf")
@@ -14548,16 +16967,17 @@ class RepPrt(object):
                 coy = self.conum
             self.pdfnam = getModName(self.wrkdir, self.name, coy, ext="pdf")
             self.expnam = self.pdfnam.replace(".pdf", "")
-        for sub in self.stots:
-            setattr(self, "%s_str" % sub[0], "")
-        for tot in self.gtots:
-            setattr(self, "%s_gtot" % tot, 0)
-            idx = 0
-            for sub in self.stots:
-                setattr(self, "%s_%s_stot" % (tot, idx), 0)
-                idx += 1
+        # Sub total break values and totals, by stots and gtots index
+        self.sstr = [""] * len(self.stots)
+        self.gdec = [self.fd[gt][0][1] == "D" for gt in self.gtots]
+        self.gtot = [self.newTotal(gi) for gi in range(len(self.gtots))]
+        self.stot = [[self.newTotal(gi) for gi in range(len(self.gtots))]
+            for sub in self.stots]
         self.pglin = 999
-        self.expdatas = []
+        if self.repprt[2] == "export" and self.chunk:
+            self.expdatas = RowSpool(self.wrkdir)
+        else:
+            self.expdatas = []
         if self.repprt[2] != "export":
             self.fpdf = MyFpdf(name=self.name, head=len(self.head4))
             for num, font in enumerate(self.fonts):
@@ -14573,6 +16993,13 @@ class RepPrt(object):
                     lpp = lpp + self.margin
                 if lpp <= self.fpdf.lpp:
                     self.fpdf.lpp = lpp
+        fmts = self.getFormats()
+        sdes = []
+        for sub in self.stots:
+            if sub[1] in self.l3:
+                sdes.append((self.l3.index(sub[0]), self.l3.index(sub[1])))
+            else:
+                sdes.append((self.l3.index(sub[0]), None))
         for x, rec in enumerate(recs):
             if self.pbar:
                 pb.displayProgress(x)
@@ -14585,16 +17012,10 @@ class RepPrt(object):
                     self.fpdf.drawText()
                     self.pglin += 1
                 continue
-            fn = self.l3
-            num = 0
             fld = []
             cld = []
             ldic = {}
-            for nam in fn:
-                t = self.fd[nam][0]
-                if t == "TX" and self.repprt[2] != "export":
-                    t = "NA"
-                s = self.fd[nam][1]
+            for num, (nam, t, s, fmt, trtp, chgs, disp) in enumerate(fmts):
                 if not rec[num]:
                     d = ""
                 else:
@@ -14602,11 +17023,11 @@ class RepPrt(object):
                 if t == "HA":
                     d = b64Convert("decode", rec[num])
                 if self.refmt:
-                    if self.trtp and nam == self.trtp[0]:
+                    if trtp:
                         d = self.trtp[1][int(d) - 1][0]
-                        ldic[nam] = CCD(d, "NA", 3)
+                        work, dsp, err = getCCF("NA", 3).format(d)
                     else:
-                        if nam in self.cg:
+                        if chgs:
                             if not d:
                                 d = 0
                             elif type(d) == int:
@@ -14614,50 +17035,54 @@ class RepPrt(object):
                             else:
                                 d = float(ASD(0) - ASD(d))
                         if self.blank and t[1] in ("D", "I") and not d:
-                            ldic[nam] = CCD("", "NA", s)
+                            work, dsp = "", " " * int(s)
                         else:
-                            ldic[nam] = CCD(d, t, s)
-                    if nam in self.pr:
-                        fld.append(ldic[nam].disp)
-                        cld.append(ldic[nam].work)
-                elif nam in self.pr:
-                    fld.append(d)
-                    cld.append(d)
-                num += 1
+                            work, dsp, err = fmt(d)
+                    ldic[nam] = work
+                    if disp:
+                        fld.append(dsp)
+                        cld.append(work)
+                else:
+                    ldic[nam] = d
+                    if disp:
+                        fld.append(d)
+                        cld.append(d)
             st = "n"
             for sq1 in range((len(self.stots) - 1), -1, -1):
-                w = getattr(self, "%s_str" % self.stots[sq1][0])
-                f = ldic[self.stots[sq1][0]].work
+                w = self.sstr[sq1]
+                f = ldic[self.stots[sq1][0]]
                 if not w:
                     w = f
                 if f != w and st == "n":
                     st = "y"
                     for sq2 in range(0, sq1+1):
                         self.subTotal(self.stots[sq2])
-                setattr(self, "%s_str" % self.stots[sq1][0], f)
+                self.sstr[sq1] = f
+            for sq1, (idx, des) in enumerate(sdes):
+                if des is None:
+                    self.sdic[self.stots[sq1][0]][rec[idx]] = \
+                        self.stots[sq1][1]
+                else:
+                    self.sdic[self.stots[sq1][0]][rec[idx]] = rec[des]
             if self.repprt[2] != "export" and self.pglin >= self.fpdf.lpp:
                 self.pageHeading()
-            for gt in self.gtots:
-                gtot = getattr(self, "%s_gtot" % gt)
-                if self.fd[gt][0][1] == "D":
-                    gtot = float(ASD(gtot) + ASD(ldic[gt].work))
+            for gi, gt in enumerate(self.gtots):
+                work = ldic[gt]
+                if self.gdec[gi]:
+                    self.gtot[gi].add(work)
+                    for stot in self.stot:
+                        stot[gi].add(work)
                 else:
-                    gtot = gtot + ldic[gt].work
-                setattr(self, "%s_gtot" % gt, gtot)
-                idx = 0
-                for s in self.stots:
-                    stot = getattr(self, "%s_%s_stot" % (gt, idx))
-                    if self.fd[gt][0][1] == "D":
-                        stot = float(ASD(stot) + ASD(ldic[gt].work))
-                    else:
-                        stot = stot + ldic[gt].work
-                    setattr(self, "%s_%s_stot" % (gt, idx), stot)
-                    idx += 1
+                    self.gtot[gi] = self.gtot[gi] + work
+                    for stot in self.stot:
+                        stot[gi] = stot[gi] + work
             if self.repprt[2] == "export":
                 self.expdatas.append(["BODY", cld])
             else:
                 self.fpdf.drawText(txt=self.h5hf % tuple(fld))
                 self.pglin += 1
+        if type(recs) is not list and hasattr(recs, "close"):
+            recs.close()
         if self.pbar:
             pb.closeProgress()
             if pb.quit:
@@ -14693,6 +17118,8 @@ class RepPrt(object):
                         repeml=self.repeml)
         except:
             pass
+        if type(self.expdatas) is RowSpool:
+            self.expdatas.close()
 
     def pageHeading(self, htype=None):
         if self.repprt[2] == "export":
@@ -14741,6 +17168,12 @@ class RepPrt(object):
         self.pglin += 1
         self.fpdf.setFont()
 
+    def newTotal(self, gi):
+        # Decimal totals are accumulated in cents
+        if self.gdec[gi]:
+            return ACC()
+        return 0
+
     def subTotal(self, col):
         if self.repprt[2] == "export":
             self.expdatas.append(["ULINES"])
@@ -14750,7 +17183,7 @@ class RepPrt(object):
             self.fpdf.setFont()
             self.pglin += 1
         snum = self.stots.index(col)
-        sdet = getattr(self, "%s_str" % col[0])
+        sdet = self.sstr[snum]
         self.printTotals("s", snum, sdet)
         if self.repprt[2] != "export" and col[2] == "Y":
             self.pglin = 999
@@ -14795,15 +17228,16 @@ class RepPrt(object):
         seq = 0
         for s, n in enumerate(self.pr):
             cldf = False
-            for c in self.gtots:
+            for gi, c in enumerate(self.gtots):
                 if n == c:
                     cldf = True
                     if typ == "s":
-                        j = CCD(getattr(self, "%s_%s_stot" % (n, snum)),
-                            self.fd[n][0], float(self.fd[n][1]))
+                        j = self.stot[snum][gi]
                     else:
-                        j = CCD(getattr(self, "%s_gtot" % n),
-                            self.fd[n][0], float(self.fd[n][1]))
+                        j = self.gtot[gi]
+                    if self.gdec[gi]:
+                        j = float(j)
+                    j = CCD(j, self.fd[n][0], float(self.fd[n][1]))
                     if not j.err:
                         fld.append(j.disp)
                         cld.append(j.work)
@@ -14814,9 +17248,9 @@ class RepPrt(object):
                         cld.append(0.00)
                     if clr == "y":
                         if typ == "s":
-                            setattr(self, "%s_%s_stot" % (n, snum), 0)
+                            self.stot[snum][gi] = self.newTotal(gi)
                         else:
-                            setattr(self, "%s_gtot" % n, 0)
+                            self.gtot[gi] = self.newTotal(gi)
                     if c == self.gtots[-1]:
                         seq = 0
                     else:
@@ -15426,6 +17860,228 @@ class TartanUser(object):
         self.df.closeProcess()
         self.mf.closeLoop()
 
+class TarStream(object):
+    """
+    A typed record stream used by TarBckRes to backup and restore a table.
+
+    The stream comprises a magic number, a length prefixed json header of
+    the table, columns and column codecs and then the records. The codecs
+    are derived from the ffield types as follows:
+
+        i = 8 byte signed integer
+        d = 8 byte float
+        s = utf-8 text
+
+    Each record is a 4 byte length followed by a bitmap of the columns whose
+    values do not match their codec, e.g. nulls, a fixed block of the i and
+    d values and the lengths of the s values, the s values and lastly the
+    values not matching their codec, each as a 1 byte tag, n(one),
+    i(nteger), l(arge integer), d(ecimal), s(tring) or b(ytes), followed
+    by the value.
+
+    The stream is gzip or zstd compressed and the number of records and a
+    sha256 checksum of the uncompressed stream are kept in rows and hash.
+
+        path  - The file name.
+        mode  - r(ead) or w(rite).
+        table - The table name when writing.
+        cols  - A list of (column, ffield type) when writing.
+        comp  - The compression, gzip or zstd, when writing.
+    """
+    magic = b"TBR\x02"
+    size = struct.Struct("<I")
+    intg = struct.Struct("<q")
+    flot = struct.Struct("<d")
+
+    def __init__(self, path, mode="r", table=None, cols=None, comp="gzip"):
+        self.path = path
+        self.mode = mode
+        self.rows = 0
+        self.hash = hashlib.sha256()
+        self.buf = []
+        self.data = b""
+        self.pos = 0
+        self.fle = open(path, "%sb" % mode)
+        if mode == "w":
+            if comp == "zstd":
+                self.zip = zstandard.ZstdCompressor().stream_writer(self.fle,
+                    closefd=False)
+            else:
+                self.zip = gzip.GzipFile(fileobj=self.fle, mode="wb",
+                    compresslevel=5)
+            self.table = table
+            self.cols = [col[0] for col in cols]
+            self.codec = "".join([self.getCodec(col[1]) for col in cols])
+            head = json.dumps({"table": table, "cols": self.cols,
+                "codec": self.codec}).encode("utf-8")
+            self.buf.append(self.magic + self.size.pack(len(head)) + head)
+        else:
+            if self.fle.read(4) == b"\x28\xb5\x2f\xfd":
+                self.fle.seek(0)
+                self.zip = zstandard.ZstdDecompressor().stream_reader(
+                    self.fle, closefd=False)
+            else:
+                self.fle.seek(0)
+                self.zip = gzip.GzipFile(fileobj=self.fle, mode="rb")
+            if self.read(4) != self.magic:
+                self.close()
+                raise ValueError("Invalid Backup File %s" % path)
+            head = json.loads(self.read(self.size.unpack(self.read(4))[0]))
+            self.table = head["table"]
+            self.cols = head["cols"]
+            self.codec = head["codec"]
+        # Column positions by codec and the fixed block
+        self.icol = [n for n, c in enumerate(self.codec) if c == "i"]
+        self.dcol = [n for n, c in enumerate(self.codec) if c == "d"]
+        self.scol = [n for n, c in enumerate(self.codec) if c == "s"]
+        self.fixed = struct.Struct("<%sq%sd%sI" % (len(self.icol),
+            len(self.dcol), len(self.scol)))
+        self.bits = int((len(self.codec) + 7) / 8)
+        self.zero = bytes(self.bits)
+        self.order = [0] * len(self.codec)
+        for n, c in enumerate(self.icol + self.dcol + self.scol):
+            self.order[c] = n
+
+    def getCodec(self, typ):
+        if typ[0].upper() == "D" or typ == "ID":
+            return "i"
+        if typ[0] in ("S", "T", "U"):
+            if typ[1].upper() == "D":
+                return "d"
+            if typ[1] in ("I", "L", "M"):
+                return "i"
+            if typ[1] == "S" and typ[0] != "T":
+                return "i"
+        return "s"
+
+    def flush(self):
+        data = b"".join(self.buf)
+        self.hash.update(data)
+        self.zip.write(data)
+        self.buf = []
+
+    def read(self, size):
+        while len(self.data) - self.pos < size:
+            byts = self.zip.read(1048576)
+            if not byts:
+                break
+            self.hash.update(byts)
+            self.data = self.data[self.pos:] + byts
+            self.pos = 0
+        data = self.data[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+    def writeRow(self, row):
+        try:
+            # All the values match their codecs
+            strs = [row[n].encode("utf-8") for n in self.scol]
+            flts = [row[n] for n in self.dcol]
+            for val in flts:
+                if type(val) is not float:
+                    raise TypeError
+            data = self.zero + self.fixed.pack(*[row[n] for n in self.icol],
+                *flts, *[len(val) for val in strs]) + b"".join(strs)
+        except (AttributeError, TypeError, struct.error):
+            data = self.packRow(row)
+        self.buf.append(self.size.pack(len(data)))
+        self.buf.append(data)
+        self.rows += 1
+        if len(self.buf) > 2000:
+            self.flush()
+
+    def packRow(self, row):
+        bits = bytearray(self.bits)
+        fixed = []
+        strs = []
+        tags = []
+        for num, (cod, val) in enumerate(zip(self.codec, row)):
+            typ = type(val)
+            if cod == "i" and typ in (int, bool) and -2**63 <= val < 2**63:
+                fixed.append(val)
+            elif cod == "d" and typ is float:
+                fixed.append(val)
+            elif cod == "s" and typ is str:
+                strs.append(val.encode("utf-8"))
+                fixed.append(len(strs[-1]))
+            else:
+                bits[num >> 3] |= 1 << (num & 7)
+                fixed.append(0)
+                tags.append(self.packValue(val))
+        fixed = [fixed[n] for n in self.icol + self.dcol + self.scol]
+        return bytes(bits) + self.fixed.pack(*fixed) + b"".join(strs) + \
+            b"".join(tags)
+
+    def packValue(self, val):
+        if val is None:
+            return b"n"
+        if isinstance(val, int):
+            if -2**63 <= val < 2**63:
+                return b"i" + self.intg.pack(val)
+            val = str(val).encode("utf-8")
+            return b"l" + self.size.pack(len(val)) + val
+        if isinstance(val, float):
+            return b"d" + self.flot.pack(val)
+        if isinstance(val, (bytes, bytearray, memoryview)):
+            val = bytes(val)
+            return b"b" + self.size.pack(len(val)) + val
+        val = str(val).encode("utf-8")
+        return b"s" + self.size.pack(len(val)) + val
+
+    def readRows(self):
+        """
+        A generator yielding the records as lists.
+        """
+        nint = len(self.icol) + len(self.dcol)
+        size = self.fixed.size
+        while True:
+            siz = self.read(4)
+            if not siz:
+                break
+            data = self.read(self.size.unpack(siz)[0])
+            vals = list(self.fixed.unpack_from(data, self.bits))
+            pos = self.bits + size
+            for num in range(nint, len(vals)):
+                end = pos + vals[num]
+                vals[num] = data[pos:end]
+                pos = end
+            if data[:self.bits] == self.zero:
+                row = [vals[n] for n in self.order]
+                for n in self.scol:
+                    row[n] = row[n].decode("utf-8")
+            else:
+                row = [vals[n] for n in self.order]
+                for num in range(len(row)):
+                    if data[num >> 3] & (1 << (num & 7)):
+                        row[num], pos = self.unpackValue(data, pos)
+                    elif self.codec[num] == "s":
+                        row[num] = row[num].decode("utf-8")
+            self.rows += 1
+            yield row
+
+    def unpackValue(self, data, pos):
+        tag = data[pos:pos + 1]
+        pos += 1
+        if tag == b"n":
+            return None, pos
+        if tag == b"i":
+            return self.intg.unpack_from(data, pos)[0], pos + 8
+        if tag == b"d":
+            return self.flot.unpack_from(data, pos)[0], pos + 8
+        siz = self.size.unpack_from(data, pos)[0]
+        val = data[pos + 4:pos + 4 + siz]
+        if tag == b"s":
+            val = val.decode("utf-8")
+        elif tag == b"l":
+            val = int(val)
+        return val, pos + 4 + siz
+
+    def close(self):
+        if self.mode == "w":
+            self.flush()
+        self.zip.close()
+        self.fle.close()
+
 class TarBckRes(object):
     """
     Backup and Restore routines for Tartan Systems
@@ -15434,10 +18090,43 @@ class TarBckRes(object):
         csys - The ctlsys detail.
         ver  - The tartan version.
         pbar - Whether to display a progressbar,
+        comp - The backup compression, gzip or zstd if available.
+        workers - The number of workers, each with its own connection, to
+                  backup and restore tables concurrently.
+        timing  - Whether to print the time taken per table.
+        incr    - Whether to make an incremental backup.
+
+    Backups are written as TarStream files, one per table and company,
+    with a manifest of the files, their record counts and checksums.
+    Archives of the original format, str(list) .dat files, can still be
+    restored.
+
+    An incremental backup only exports the records of tables having a
+    capture date or time column which were captured on or after the high
+    water mark, the latest capture, of the previous backup. If the records
+    before the mark have changed, e.g. records were amended or deleted,
+    determined by comparing a count and hash sum of the records computed
+    by the database, the whole table is exported. Other tables, as well as the delrec table of
+    an exported database, are exported in full. Restoring an incremental
+    archive restores its chain, the full base archive followed by each
+    incremental archive in turn.
     """
-    def __init__(self, mf, mode="B", csys=None, ver=None, pbar=True):
+    batch = 5000
+    capcol = {
+        "chglog": "chg_dte",
+        "ctllog": "clg_start",
+        "emllog": "eml_dtt"}
+
+    def __init__(self, mf, mode="B", csys=None, ver=None, pbar=True, comp="gzip", workers=1, timing=False, incr=False):
         self.mf = mf
         self.mode = mode
+        self.workers = max(1, workers)
+        self.timing = timing
+        self.incr = incr
+        if comp == "zstd" and ZSTD:
+            self.comp = comp
+        else:
+            self.comp = "gzip"
         self.budays = 0
         self.smtp = False
         if csys and "NOMAIL" not in os.environ:
@@ -15473,6 +18162,9 @@ class TarBckRes(object):
             showError(self.mf.body, "Error", "No Backups Exist")
             return
         self.tmpdir = os.path.join(self.bupdir, "temp")
+        self.manifest = None
+        self.chain = []
+        self.prev = {}
         # Get all company and non-company tables
         sql = Sql(self.mf.dbm, ["ftable", "ffield"])
         tab = sql.getRec("ftable", cols=["ft_tabl"], group="ft_tabl")
@@ -15633,14 +18325,33 @@ class TarBckRes(object):
         tarfle.extractall()
         tarfle.close()
         os.chdir(cwd)
-        if not os.path.isfile(os.path.join(self.tmpdir, "verupd_000.dat")):
-            return "Invalid Restore Archive"
-        zipfle = gzip.open(os.path.join(self.tmpdir, "verupd_000.dat"),
-            mode="rb")
-        data = zipfle.readlines()
-        data = data[0].decode("utf-8").replace("[[", "").replace("]]", "")
-        data = data.split("], [")
-        data = list(eval(data[0]))
+        self.manifest = None
+        mfle = os.path.join(self.tmpdir, "manifest.json")
+        if os.path.isfile(mfle):
+            with open(mfle, "r") as fle:
+                self.manifest = json.load(fle)
+            if not os.path.isfile(os.path.join(self.tmpdir, "verupd_000.rec")):
+                return "Invalid Restore Archive"
+            stm = TarStream(os.path.join(self.tmpdir, "verupd_000.rec"))
+            data = next(stm.readRows(), [None])
+            stm.close()
+            if self.manifest.get("type") == "incr":
+                # Incremental archive, check the chain of archives
+                for name in self.manifest["chain"]:
+                    if not os.path.isfile(os.path.join(self.archdir, name)):
+                        return "Missing Archive %s" % name
+                self.chain = self.manifest["chain"]
+            else:
+                self.chain = []
+        else:
+            if not os.path.isfile(os.path.join(self.tmpdir, "verupd_000.dat")):
+                return "Invalid Restore Archive"
+            zipfle = gzip.open(os.path.join(self.tmpdir, "verupd_000.dat"),
+                mode="rb")
+            data = zipfle.readlines()
+            data = data[0].decode("utf-8").replace("[[", "").replace("]]", "")
+            data = data.split("], [")
+            data = list(eval(data[0]))
         if data[0] != self.ver:
             showError(self.mf.window, "Version Error", "The Data "\
                 "to be Restored is Version %s which is Not the Same as "\
@@ -15820,10 +18531,22 @@ class TarBckRes(object):
                 "%s is Either Not Available or Write Protected! Please "\
                 "Rectify this Condition and Retry the Backup!" % self.bupdir)
             return
+        parent = None
+        if self.incr:
+            parent = self.getParent()
+        if parent:
+            keep = parent[1].get("chain", []) + [parent[0]]
+            self.prev = {}
+            for ent in parent[1]["files"]:
+                self.prev[ent["name"]] = ent
+        else:
+            keep = []
         if self.budays:
-            # Remove old archives
+            # Remove old archives, excepting the chain of an incremental
             try:
                 for arc in os.listdir(self.archdir):
+                    if arc in keep:
+                        continue
                     date = arc.split("_")[1].split(".")[0][:8]
                     if dateDiff(date, self.sysdtw, ptype="days") > self.budays:
                         os.remove(os.path.join(self.archdir, arc))
@@ -15831,21 +18554,28 @@ class TarBckRes(object):
                 pass
         tabs = []
         sql = Sql(self.mf.dbm, "ftable", prog=__name__)
+        impdbd = sql.impdbd
         tbs = sql.getRec("ftable", cols=["ft_tabl"], group="ft_tabl")
         for tb in tbs:
             tabs.append(tb[0])
         tabs.sort()
         coys = [[0, ""]] + self.coys
-        if self.mf.window:
+        tme = "%04i%02i%02i%02i%02i%02i" % time.localtime()[:-3]
+        names = ["manifest.json"]
+        files = []
+        if self.workers > 1:
+            files = self.doParallelBackup(tabs, coys)
+            names.extend([ent["name"] for ent in files])
+            coys = []
+        elif self.mf.window:
             p1 = ProgressBar(self.mf.body, mxs=len(coys))
             p2 = ProgressBar(self.mf.body, mxs=len(tabs), inn=p1)
-        names = []
         for cn, coy in enumerate(coys):
             if self.mf.window:
                 p1.txtlab.configure(text="Backing Up Company %s" % coy[0])
                 p1.displayProgress(cn)
             elif self.pbar and TBAR:
-                p2 = Bar("Company %s" % coy[0], max=len(tabs))
+                p2 = progbar.Bar("Company %s" % coy[0], max=len(tabs))
             for tn, tab in enumerate(tabs):
                 sql = Sql(self.mf.dbm, ["ffield", tab], prog=__name__)
                 if self.mf.window:
@@ -15862,21 +18592,31 @@ class TarBckRes(object):
                     continue
                 else:
                     whr = None
-                flenam = "%s_%03i.dat" % (tab, coy[0])
+                flenam = "%s_%03i.rec" % (tab, coy[0])
                 names.append(flenam)
-                zipfle = gzip.open(os.path.join(self.tmpdir, flenam),
-                    mode="wb", compresslevel=5)
-                sql.getRec(tables=tab, where=whr, fetch=True)
-                data = sql.sqlRec(fetch=True, limit=100000)
-                while data:
-                    zipfle.write(str(data).encode("utf-8"))
-                    data = sql.sqlRec(fetch=True, limit=100000)
-                zipfle.close()
+                files.append(self.backupTable(sql, tab, coy[0], whr, flenam))
             if not self.mf.window and self.pbar and TBAR:
                 p2.finish()
+        if self.workers == 1 and impdbd:
+            # Deleted records of an exported database
+            names.append("delrec_000.rec")
+            files.append(self.backupTable(Sql(self.mf.dbm, prog=__name__),
+                "delrec", 0, None, "delrec_000.rec"))
+        manifest = {
+            "format": 2,
+            "dbname": self.mf.rcdic["dbname"],
+            "date": tme,
+            "compress": self.comp,
+            "type": "full"}
+        if parent:
+            manifest["type"] = "incr"
+            manifest["parent"] = parent[0]
+            manifest["chain"] = keep
+        manifest["files"] = files
+        with open(os.path.join(self.tmpdir, "manifest.json"), "w") as fle:
+            json.dump(manifest, fle, indent=1)
         cwd = os.getcwd()
         os.chdir(self.tmpdir)
-        tme = "%04i%02i%02i%02i%02i%02i" % time.localtime()[:-3]
         self.arcfle = os.path.join(self.archdir,
             "%s_%s.tar" % (self.mf.rcdic["dbname"], tme))
         tarfle = tarfile.open(self.arcfle, "w")
@@ -15884,74 +18624,499 @@ class TarBckRes(object):
             tarfle.add(name)
         tarfle.close()
         os.chdir(cwd)
-        if self.mf.window:
+        if self.mf.window and self.workers == 1:
             p1.closeProgress()
             p2.closeProgress()
+        if self.timing:
+            self.showTimes("Backup", files)
 
-    def doFullRestore(self):
-        # Restore the Files
-        files = glob.glob(os.path.join(self.tmpdir, "??????_*.dat"))
-        files.sort()
-        self.p1 = ProgressBar(self.mf.body, mxs=len(files),
-            typ="Restoring Database %s" % self.mf.rcdic["dbname"])
-        for num1, fle in enumerate(files):
-            self.p1.displayProgress(num1)
-            base = os.path.basename(fle)
-            name = base.split("_")[0]
-            if name in ("ffield", "ftable"):
+    def doParallelBackup(self, tabs, coys):
+        """
+        Backup the tables using a pool of workers. With PgSQL each worker
+        has its own connection and all read the same exported snapshot of
+        the database. With SQLite each table is read on its own connection
+        and there is no snapshot shared by the connections, so the tables
+        are only consistent with each other if the database is not changed
+        during the backup.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        sql = Sql(self.mf.dbm, tabs, prog=__name__)
+        jobs = []
+        for coy in coys:
+            for tab in tabs:
+                fld = getattr(sql, "%s_col" % tab)[0]
+                if fld.count("_cono"):
+                    whr = [(fld, "=", coy[0])]
+                elif coy[0]:
+                    continue
+                else:
+                    whr = None
+                jobs.append((tab, coy[0], whr, "%s_%03i.rec" % (tab, coy[0])))
+        if sql.impdbd:
+            jobs.append(("delrec", 0, None, "delrec_000.rec"))
+        snap = None
+        if self.mf.dbm.dbase == "PgSQL":
+            # Export a snapshot for the workers to share
+            snap = Dbase(rcdic=self.mf.dbm.rcdic)
+            snap.openDbase()
+            snap.cu.execute("Set transaction isolation level repeatable "\
+                "read, read only")
+            snap.cu.execute("Select pg_export_snapshot()")
+            snap = (snap, snap.cu.fetchone()[0])
+
+        def doJob(job):
+            tab, coy, whr, flenam = job
+            if snap:
+                dbm = self.getWorker(snap)
+            else:
+                dbm = Dbase(rcdic=self.mf.dbm.rcdic)
+                dbm.openDbase()
+                dbm.cu.execute("Begin")
+            if tab == "delrec":
+                sql = Sql(dbm, prog=__name__)
+            else:
+                sql = Sql(dbm, tab, prog=__name__)
+            ent = self.backupTable(sql, tab, coy, whr, flenam)
+            if not snap:
+                dbm.rollbackDbase()
+                dbm.closeDbase()
+            return ent
+
+        self.conns = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            files = self.doRunJobs(pool, doJob, jobs, "Backing Up")
+        for dbm in self.conns:
+            dbm.rollbackDbase()
+            dbm.closeDbase()
+        if snap:
+            snap[0].rollbackDbase()
+            snap[0].closeDbase()
+        return files
+
+    def getWorker(self, snap=None):
+        """
+        Return the calling worker thread's PgSQL connection, opening it if
+        required. With snap the connection reads the exported snapshot.
+        """
+        if not hasattr(self.local, "dbm"):
+            dbm = Dbase(rcdic=self.mf.dbm.rcdic)
+            dbm.openDbase()
+            if snap:
+                dbm.cu.execute("Set transaction isolation level repeatable "\
+                    "read, read only")
+                dbm.cu.execute("Set transaction snapshot '%s'" % snap[1])
+            self.local.dbm = dbm
+            with Schema.lock:
+                self.conns.append(dbm)
+        return self.local.dbm
+
+    def doRunJobs(self, pool, func, jobs, text):
+        """
+        Run the jobs in the pool, displaying the progress, and return their
+        results in the order of the jobs.
+        """
+        from concurrent.futures import as_completed
+        self.local = threading.local()
+        futs = [pool.submit(func, job) for job in jobs]
+        if self.mf.window:
+            pb = ProgressBar(self.mf.body, mxs=len(jobs),
+                typ="%s %s Tables" % (text, len(jobs)))
+        elif self.pbar and TBAR:
+            pb = progbar.Bar(text, max=len(jobs))
+        else:
+            pb = None
+        for num, fut in enumerate(as_completed(futs)):
+            if self.mf.window:
+                pb.displayProgress(num)
+            elif pb:
+                pb.next()
+        if self.mf.window:
+            pb.closeProgress()
+        elif pb:
+            pb.finish()
+        return [fut.result() for fut in futs]
+
+    def showTimes(self, text, ents):
+        print("%s of %s using %s worker(s)" % (text,
+            self.mf.rcdic["dbname"], self.workers))
+        print("%-20s %12s %10s %12s" % ("File", "Records", "Seconds",
+            "Records/s"))
+        tot = [0, 0]
+        for ent in sorted(ents, key=lambda x: x["secs"], reverse=True):
+            tot[0] += ent["rows"]
+            tot[1] += ent["secs"]
+            if not ent["rows"]:
+                continue
+            print("%-20s %12s %10.3f %12.0f" % (ent["name"], ent["rows"],
+                ent["secs"], ent["rows"] / max(ent["secs"], 0.001)))
+        print("%-20s %12s %10.3f" % ("Total", tot[0], tot[1]))
+
+    def getParent(self):
+        """
+        Return the name and manifest of the latest archive to be the parent
+        of an incremental backup, or None if there is no such archive.
+        """
+        arcs = glob.glob(os.path.join(self.archdir, "%s_*.tar" %
+            self.mf.rcdic["dbname"]))
+        for arc in sorted(arcs, reverse=True):
+            try:
+                tarfle = tarfile.open(arc, "r")
+                manifest = json.load(tarfle.extractfile("manifest.json"))
+                tarfle.close()
+            except:
                 continue
-            comp = int(base.split("_")[1].split(".")[0])
-            sql = Sql(self.mf.dbm, name, prog=__name__)
-            if not comp:
-                sql.delRec(name)
+            if manifest.get("format") == 2:
+                return (os.path.basename(arc), manifest)
+            return
+
+    def getCapCol(self, tab, col):
+        """
+        Return the capture date or time column of the table, if any.
+        """
+        if tab in self.capcol:
+            return self.capcol[tab]
+        for c in col:
+            if c.endswith("_capdt"):
+                return c
+
+    def backupTable(self, sql, tab, coy, whr, flenam):
+        """
+        Write the table's records to a TarStream file and return the manifest
+        entry of the file.
+        """
+        st = time.perf_counter()
+        ent = {
+            "name": flenam,
+            "table": tab,
+            "cono": coy}
+        odr = None
+        if tab == "delrec":
+            col = ["dd_tab", "dd_dat"]
+            typ = [("dd_tab", "NA"), ("dd_dat", "TX")]
+        else:
+            dic = getattr(sql, "%s_dic" % tab)
+            col = getattr(sql, "%s_col" % tab)
+            typ = [(c, dic[c][2]) for c in col]
+            # Keep the order of any sequence column as it is renumbered
+            for c in col:
+                if dic[c][2] == "US":
+                    odr = c
+            cap = self.getCapCol(tab, col)
+            if cap:
+                whr = self.getWindow(sql, tab, whr, cap,
+                    self.prev.get(flenam), ent)
+        stm = TarStream(os.path.join(self.tmpdir, flenam), mode="w", table=tab,
+            cols=typ, comp=self.comp)
+        for rec in sql.iterRec(tab, cols=col, where=whr, order=odr,
+                size=self.batch):
+            stm.writeRow(rec)
+        stm.close()
+        ent["rows"] = stm.rows
+        ent["sha256"] = stm.hash.hexdigest()
+        ent["secs"] = round(time.perf_counter() - st, 3)
+        return ent
+
+    def getWindow(self, sql, tab, whr, cap, prev, ent):
+        """
+        Record the high water mark of the capture column, and the fingerprint
+        of the records before it, in the manifest entry and, for an
+        incremental backup where the records before the previous mark are
+        unchanged, return the where statement selecting only the records
+        captured since the previous mark.
+        """
+        if not whr:
+            whr = []
+        hwm = sql.getRec(tab, cols=["max(%s)" % cap], where=whr, limit=1)[0]
+        if hwm is None:
+            below = [0, 0]
+        else:
+            below = sql.getPrint(tab, whr + [(cap, "<", hwm)])
+        if prev and prev.get("hwm") is not None:
+            chk = sql.getPrint(tab, whr + [(cap, "<", prev["hwm"])])
+            if chk == prev["below"]:
+                ent["from"] = prev["hwm"]
+                whr = whr + [(cap, ">=", prev["hwm"])]
+        ent["capcol"] = cap
+        ent["hwm"] = hwm
+        ent["below"] = below
+        return whr or None
+
+    def getArchives(self):
+        """
+        Return a list of the (directory, manifest) of the archives to be
+        restored in order, being the chain of an incremental archive, if
+        any, followed by the selected archive.
+        """
+        arcs = []
+        for num, name in enumerate(self.chain):
+            tmp = os.path.join(self.tmpdir, "chain%03i" % num)
+            os.makedirs(tmp)
+            tarfle = tarfile.open(os.path.join(self.archdir, name), "r")
+            tarfle.extractall(tmp)
+            tarfle.close()
+            with open(os.path.join(tmp, "manifest.json"), "r") as fle:
+                arcs.append((tmp, json.load(fle)))
+        arcs.append((self.tmpdir, self.manifest))
+        return arcs
+
+    def getFiles(self, tmp, manifest):
+        """
+        Return a list of (table, company, file name, manifest entry, whether
+        incremental) of an archive.
+        """
+        files = []
+        if manifest:
+            incr = bool(manifest.get("type") == "incr")
+            for ent in manifest["files"]:
+                files.append((ent["table"], ent["cono"],
+                    os.path.join(tmp, ent["name"]), ent, incr))
+            return files
+        for fle in sorted(glob.glob(os.path.join(tmp, "??????_*.dat"))):
+            base = os.path.basename(fle)
+            files.append((base.split("_")[0],
+                int(base.split("_")[1].split(".")[0]), fle, None, False))
+        return files
+
+    def getSql(self, dbm, tab):
+        """
+        Return the Sql class for restoring a table, creating the delrec
+        table if required.
+        """
+        if tab != "delrec":
+            sql = Sql(dbm, tab, prog=__name__)
+            self.skipStrBal(sql)
+            return sql
+        if not dbm.checkTable("delrec"):
+            dbm.cu.execute("Create table delrec (dd_tab varchar(6), "\
+                "dd_dat %s)" % dbm.txt)
+            dbm.clearSchema()
+        return Sql(dbm, prog=__name__)
+
+    def skipStrBal(self, sql):
+        """
+        The strbal summary is not kept up to date while restoring strtrn as
+        it is rebuilt by doStrBal once the tables have been restored.
+        """
+        sql.stb = StrBal(sql.dbm)
+        sql.stb.active = False
+
+    def doStrBal(self, names, cono=None):
+        if "strtrn" in names:
+            StrBal(self.mf.dbm).doBuild(cono=cono)
+
+    def clearTable(self, sql, tab, coy=None, ent=None):
+        """
+        Delete the records to be replaced by a backup file, being all the
+        records, those of the company or, with an incremental backup file,
+        those of the company captured since the previous backup.
+        """
+        if tab == "delrec":
+            sql.sqlRec("Delete from delrec")
+            return
+        whr = []
+        fld = getattr(sql, "%s_col" % tab)[0]
+        if coy is not None and fld.count("_cono"):
+            whr.append((fld, "=", coy))
+        if ent and ent.get("from") is not None:
+            whr.append((ent["capcol"], ">=", ent["from"]))
+        sql.delRec(tab, where=whr or None)
+
+    def restoreTable(self, sql, tab, fle, ent, pbar=True):
+        """
+        Insert the records of a backup file in batches. Returns False if the
+        records do not agree with the manifest entry.
+        """
+        if not ent:
+            # Original format
             zipfle = gzip.open(fle, mode="rb")
             data = zipfle.readlines()
             zipfle.close()
             if data:
-                newd = self.extractData(name, data)
+                newd = self.extractData(tab, data)
                 p2 = ProgressBar(self.mf.body, inn=self.p1, mxs=len(newd),
-                    typ="Restoring Table (%s)" % name)
-                sql.insRec(name, data=newd, dofmt=False, pbar=p2)
+                    typ="Restoring Table (%s)" % tab)
+                sql.bulkRec(tab, data=newd, dofmt=False, pbar=p2)
                 p2.closeProgress()
+            return True
+        stm = TarStream(fle)
+        if pbar and ent["rows"]:
+            p2 = ProgressBar(self.mf.body, inn=self.p1, mxs=ent["rows"],
+                typ="Restoring Table (%s)" % tab)
+        else:
+            p2 = None
+        data = []
+        for rec in stm.readRows():
+            if tab == "delrec":
+                sql.sqlRec(("Insert into delrec values (%s, %s)" %
+                    (sql.dbm.dbf, sql.dbm.dbf), rec))
+                continue
+            data.append(rec)
+            if len(data) == self.batch:
+                sql.bulkRec(tab, data=data, dofmt=False)
+                if p2:
+                    p2.displayProgress(stm.rows)
+                data = []
+        if data:
+            sql.bulkRec(tab, data=data, dofmt=False)
+        if p2:
+            p2.closeProgress()
+        stm.close()
+        if stm.rows != ent["rows"] or stm.hash.hexdigest() != ent["sha256"]:
+            return False
+        return True
+
+    def doRestoreError(self, tab):
+        self.mf.dbm.rollbackDbase()
+        if self.p1:
+            self.p1.closeProgress()
+        showError(self.mf.body, "Restore Error", "The Backup of Table %s "\
+            "Does Not Agree with the Archive Manifest.\n\nThe Restore Has "\
+            "Been Aborted and No Data Has Been Changed." % tab)
+
+    def doFullRestore(self):
+        # Restore the Files
+        if self.workers > 1 and self.manifest and not self.chain and \
+                self.mf.dbm.dbase == "PgSQL":
+            self.doParallelRestore(self.getFiles(self.tmpdir, self.manifest))
+            return
+        files = []
+        for tmp, manifest in self.getArchives():
+            files.extend(self.getFiles(tmp, manifest))
+        self.p1 = ProgressBar(self.mf.body, mxs=len(files),
+            typ="Restoring Database %s" % self.mf.rcdic["dbname"])
+        for num1, (name, comp, fle, ent, incr) in enumerate(files):
+            self.p1.displayProgress(num1)
+            if name in ("ffield", "ftable"):
+                continue
+            sql = self.getSql(self.mf.dbm, name)
+            if incr:
+                self.clearTable(sql, name, comp, ent)
+            elif not comp:
+                self.clearTable(sql, name)
+            if not self.restoreTable(sql, name, fle, ent):
+                self.doRestoreError(name)
+                return
+        self.doStrBal([rec[0] for rec in files])
         self.p1.closeProgress()
         self.mf.dbm.commitDbase()
+        clearForms()
+
+    def doParallelRestore(self, files):
+        """
+        Restore the tables using a pool of workers, each with its own
+        connection, committing all the connections once all the tables have
+        been restored. The connections are committed one after the other,
+        so if a commit fails the tables already committed are reported as
+        restored and the others as not restored.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        tabs = {}
+        for name, comp, fle, ent, incr in files:
+            if name in ("ffield", "ftable"):
+                continue
+            if name not in tabs:
+                tabs[name] = []
+            tabs[name].append((comp, fle, ent))
+
+        def doJob(tab):
+            st = time.perf_counter()
+            dbm = self.getWorker()
+            sql = self.getSql(dbm, tab)
+            ok = True
+            for comp, fle, ent in tabs[tab]:
+                if not comp:
+                    self.clearTable(sql, tab)
+                if not self.restoreTable(sql, tab, fle, ent, pbar=False):
+                    ok = False
+                    break
+            rows = 0
+            for ent in self.manifest["files"]:
+                if ent["table"] == tab:
+                    rows += ent["rows"]
+            return {"name": tab, "rows": rows, "ok": ok, "dbm": dbm,
+                "secs": round(time.perf_counter() - st, 3)}
+
+        self.conns = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            ents = self.doRunJobs(pool, doJob, list(tabs.keys()), "Restoring")
+        err = None
+        for ent in ents:
+            if not ent["ok"]:
+                err = ent["name"]
+                break
+        done = []
+        fail = None
+        for dbm in self.conns:
+            try:
+                if err or fail:
+                    dbm.rollbackDbase()
+                else:
+                    dbm.commitDbase()
+                    done.append(dbm)
+                dbm.closeDbase()
+            except Exception as exc:
+                if not err and not fail:
+                    fail = exc
+        if err:
+            self.p1 = None
+            self.doRestoreError(err)
+            return
+        if fail:
+            yes = [ent["name"] for ent in ents if ent["dbm"] in done]
+            nos = [ent["name"] for ent in ents if ent["dbm"] not in done]
+            showError(self.mf.body, "Restore Error", "The Restore Could "\
+                "Not be Committed (%s) and is Only Partially Complete.\n\n"\
+                "Restored Tables: %s\n\nTables Not Restored: %s\n\nThe "\
+                "Archive Must be Restored Again." % (fail, ", ".join(yes) or
+                "None", ", ".join(nos)))
+            return
+        self.doStrBal(list(tabs.keys()))
+        self.mf.dbm.commitDbase()
+        clearForms()
+        if self.timing:
+            self.showTimes("Restore", ents)
 
     def doPartialRestore(self):
+        arcs = self.getArchives()
         self.p1 = ProgressBar(self.mf.body, mxs=len(self.con),
             typ="Restoring Database %s" % self.mf.rcdic["dbname"])
         for cn, coy in enumerate(self.con):
             self.p1.displayProgress(cn)
             sql = Sql(self.mf.dbm, self.yess, prog=__name__)
-            for tab in self.yess:
-                if tab[:3].upper() not in self.syn:
-                    continue
-                flenam = os.path.join(self.tmpdir, "%s_%s.dat" % (tab, coy))
-                if os.path.exists(flenam):
+            self.skipStrBal(sql)
+            for tmp, manifest in arcs:
+                ents = {}
+                if manifest:
+                    for ent in manifest["files"]:
+                        ents[ent["name"]] = ent
+                for tab in self.yess:
+                    if tab[:3].upper() not in self.syn:
+                        continue
+                    if manifest:
+                        flenam = "%s_%03i.rec" % (tab, coy)
+                    else:
+                        flenam = "%s_%03i.dat" % (tab, coy)
+                    if not os.path.exists(os.path.join(tmp, flenam)):
+                        continue
+                    # Ignore tables without _cono columns
+                    if not getattr(sql, "%s_col" % tab)[0].count("_cono"):
+                        continue
                     # Delete existing records
-                    if not coy:
-                        whr = None
+                    ent = ents.get(flenam)
+                    if manifest and manifest.get("type") == "incr":
+                        self.clearTable(sql, tab, coy, ent)
                     else:
-                        fld = sql.sqlRec(("Select ff_name from ffield "\
-                            "where ff_tabl = %s and ff_seq = %s" % \
-                            (self.mf.dbm.dbf, self.mf.dbm.dbf), (tab, 0)),
-                            limit=1)
-                        # Ignore tables without _cono columns
-                        if not fld[0].count("_cono"):
-                            continue
-                        whr = [("%s" % fld[0], "=", coy)]
-                    sql.delRec(tab, where=whr)
+                        self.clearTable(sql, tab, coy)
                     # Restore backed up records
-                    zipfle = gzip.open(flenam, mode="rb")
-                    data = zipfle.readlines()
-                    zipfle.close()
-                    if data:
-                        newd = self.extractData(tab, data)
-                        p2 = ProgressBar(self.mf.body, inn=self.p1,
-                            mxs=len(newd), typ="Restoring Table (%s)" % tab)
-                        sql.insRec(tab, data=newd, dofmt=False, pbar=p2)
-                        p2.closeProgress()
+                    if not self.restoreTable(sql, tab, os.path.join(tmp,
+                            flenam), ent):
+                        self.doRestoreError(tab)
+                        return
+            if "STR" in self.syn:
+                self.doStrBal(self.yess, coy)
         self.p1.closeProgress()
         self.mf.dbm.commitDbase()
+        clearForms()
 
     def noBckRes(self):
         self.bu.closeProcess()
@@ -16628,7 +19793,7 @@ class FileImport(object):
         elif name.split(".")[-1].lower() == "ods":
             self.ftype = "ods"
             try:
-                self.workbk = getods(name)
+                self.workbk = pyexcel_ods.get_data(name)
                 self.sht["data"] = list(self.workbk.keys())
                 self.sht["data"].sort()
             except Exception as err:
@@ -16636,7 +19801,7 @@ class FileImport(object):
         elif name.split(".")[-1].lower() == "xls" and XLS:
             self.ftype = "xls"
             try:
-                self.workbk = getxls(name)
+                self.workbk = pyexcel_xls.get_data(name)
                 self.sht["data"] = list(self.workbk.keys())
                 self.sht["data"].sort()
             except Exception as err:
@@ -16719,10 +19884,10 @@ class FileImport(object):
                                     dat = int(dat.strftime("%Y%m%d"))
                                 elif isinstance(dat, datetime.datetime):
                                     dat = int(rdd.strftime("%Y%m%d"))
-                        d = CCD(dat, cdd[2], cdd[3])
-                        if d.err:
-                            raise Exception(d.err)
-                        lin.append(d.work)
+                        work, disp, err = getCCF(cdd[2], cdd[3]).format(dat)
+                        if err:
+                            raise Exception(err)
+                        lin.append(work)
                     if nun == chk:
                         break
                     self.impdat.append(lin)
@@ -16770,6 +19935,8 @@ class MyFpdf(fpdf.FPDF):
         else:
             self.foot = False
         self.suc = chr(151)
+        self.pgoff = 0
+        self.pgtot = 0
         t = time.localtime()
         self.sysdt = time.strftime("%d %B %Y %H:%M:%S", t)
         try:
@@ -16965,8 +20132,12 @@ class MyFpdf(fpdf.FPDF):
             txt = "Tartan Systems %s" % self.sysdt
         self.cell(w=0, h=10, text=txt, border=0, new_x=XPos.RIGHT,
             new_y=YPos.TOP, align="L")
-        self.cell(w=0, h=10, text="Page " + str(self.page_no()) + "/{nb}",
-            border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align="R")
+        if self.pgtot:
+            txt = "Page %s/%s" % (self.page_no() + self.pgoff, self.pgtot)
+        else:
+            txt = "Page " + str(self.page_no()) + "/{nb}"
+        self.cell(w=0, h=10, text=txt, border=0, new_x=XPos.RIGHT,
+            new_y=YPos.TOP, align="R")
 
     def newPage(self, lines=1, lhgt=None):
         if self.page:
@@ -17038,11 +20209,35 @@ class DrawForm(MyFpdf):
     tname  - A template name or a list having template data
     foot   - Whether to print a footer on each form, default True
     wrkdir - A directory to be used as a working directory
+
+    batch  - A PrintBatch object, having more than one worker, to render
+             the form in another process
+
+    A template read from the database is compiled once, i.e. the template,
+    its details and the types of its merge codes, and kept in DrawForm.cache
+    by database and template name. Every form of the template is then
+    created from copies of the compiled template. clearForms is called
+    after a template has been changed, as tp1010 does, and after a restore.
+    A template changed by another user is detected by a fingerprint of its
+    records, checked once per batch or, without a batch, at most once every
+    DrawForm.verify seconds.
+
+    With a batch the pages and details of the form are only recorded in
+    self.ops and saveFile passes the form to the batch to be rendered, and
+    printed or emailed, by PrintBatch.doRender.
     """
-    def __init__(self, dbm, tname, foot=True, wrkdir=None):
+    cache = {}
+    verify = 60
+
+    def __init__(self, dbm, tname, foot=True, wrkdir=None, batch=None):
         self.dbm = dbm
         self.tname = tname
         self.wrkdir = wrkdir
+        self.batch = batch
+        if batch and batch.workers > 1:
+            self.ops = []
+        else:
+            self.ops = None
         if self.setVariables():
             super().__init__(orientation=self.ortn, fmat=self.pgsz, foot=foot)
             self.set_title(self.titl)
@@ -17077,14 +20272,28 @@ class DrawForm(MyFpdf):
         if type(self.tname) in (list, tuple):
             tplmst = self.tname[0]
             self.tpldet = self.tname[1]
-        else:
-            tplmst = self.sql.getRec("tplmst", where=[("tpm_tname",
-                "=", self.tname)], limit=1)
-            if not tplmst:
-                showError(None, "Template Error", "Invalid Template Name")
-                return
-            self.tpldet = self.sql.getRec("tpldet",
-                where=[("tpd_tname", "=", self.tname)], order="tpd_detseq")
+            self.tptp = self.getTypes(tplmst, self.tpldet)
+        else:
+            key = (self.dbm.getKey(), self.tname)
+            if key not in DrawForm.cache or not self.isCurrent(key):
+                chk = self.getPrint()
+                tplmst = self.sql.getRec("tplmst", where=[("tpm_tname",
+                    "=", self.tname)], limit=1)
+                if not tplmst:
+                    showError(None, "Template Error", "Invalid Template Name")
+                    return
+                tpldet = self.sql.getRec("tpldet", where=[("tpd_tname",
+                    "=", self.tname)], order="tpd_detseq")
+                DrawForm.cache[key] = [chk, time.time(), tuple(tplmst),
+                    tuple(tuple(line) for line in tpldet),
+                    self.getTypes(tplmst, tpldet)]
+                if self.batch:
+                    self.batch.forms.add(key)
+            chk, when, tplmst, tpldet, tptp = DrawForm.cache[key]
+            self.tpldet = [list(line) for line in tpldet]
+            self.tptp = {}
+            for mrgcod in tptp:
+                self.tptp[mrgcod] = copyList(tptp[mrgcod])
         self.titl = tplmst[self.sql.tplmst_col.index("tpm_title")]
         self.tptyp = tplmst[self.sql.tplmst_col.index("tpm_type")]
         self.pgsz = tplmst[self.sql.tplmst_col.index("tpm_pgsize")]
@@ -17097,28 +20306,61 @@ class DrawForm(MyFpdf):
         elif self.pgsz == "A6":
             self.pgsz = (105, 148)
         self.ortn = tplmst[self.sql.tplmst_col.index("tpm_orient")]
-        self.tptp = {}
         self.head = []
         self.body = []
         self.total = []
         self.tail = []
         self.newkey = []
         self.newdic = {}
-        for line in self.tpldet:
-            mrgcod = line[self.sql.tpldet_col.index("tpd_mrgcod")]
-            if mrgcod in tartanWork.tptrtp["G"]["codes"]:
-                self.tptp[mrgcod] = copyList(
-                    tartanWork.tptrtp["G"]["codes"][mrgcod])
-            elif mrgcod in tartanWork.tptrtp[self.tptyp]["codes"]:
-                self.tptp[mrgcod] = copyList(
-                    tartanWork.tptrtp[self.tptyp]["codes"][mrgcod])
-            else:
-                fld = self.sql.getRec("ffield", cols=["ff_tabl", "ff_type",
-                    "ff_size"], where=[("ff_name", "=", mrgcod)], limit=1)
-                if fld:
-                    self.tptp[mrgcod] = [[fld[0], fld[1], fld[2], ""], []]
         return True
 
+    def getPrint(self):
+        return [self.sql.getPrint("tplmst", where=[("tpm_tname", "=",
+            self.tname)]), self.sql.getPrint("tpldet", where=[("tpd_tname",
+            "=", self.tname)])]
+
+    def isCurrent(self, key):
+        """
+        Check that the compiled template is not stale, e.g. changed by
+        another user, once per batch or else once every DrawForm.verify
+        seconds.
+        """
+        ent = DrawForm.cache[key]
+        if self.batch:
+            if key in self.batch.forms:
+                return True
+            self.batch.forms.add(key)
+        elif time.time() - ent[1] < DrawForm.verify:
+            return True
+        if self.getPrint() != ent[0]:
+            return False
+        ent[1] = time.time()
+        return True
+
+    def getTypes(self, tplmst, tpldet):
+        # The types of the merge codes, from tptrtp or else ffield
+        codes = tartanWork.tptrtp["G"]["codes"]
+        types = tartanWork.tptrtp[tplmst[self.sql.tplmst_col.index(
+            "tpm_type")]]["codes"]
+        tptp = {}
+        fields = []
+        for line in tpldet:
+            mrgcod = line[self.sql.tpldet_col.index("tpd_mrgcod")]
+            if mrgcod in codes:
+                tptp[mrgcod] = copyList(codes[mrgcod])
+            elif mrgcod in types:
+                tptp[mrgcod] = copyList(types[mrgcod])
+            elif mrgcod and mrgcod not in fields:
+                fields.append(mrgcod)
+        if fields:
+            flds = self.sql.getRec("ffield", cols=["ff_name", "ff_tabl",
+                "ff_type", "ff_size"], where=[("ff_name", "in",
+                tuple(fields))])
+            for fld in flds:
+                if fld[0] not in tptp:
+                    tptp[fld[0]] = [[fld[1], fld[2], fld[3], ""], []]
+        return tptp
+
     def doText(self, x1=0, y1=0, x2=0, y2=0, text="", font="courier", size=10, colour=0, bold=False, italic=False, uline=False, align="", border=0, ln=1, fill=0):
         if text:
             if text != str:
@@ -17210,7 +20452,23 @@ class DrawForm(MyFpdf):
         if font == "interleaved 2of5 nt":
             self.interleaved2of5(text, x1, y1, w=size, h=y2-y1)
 
+    def add_page(self, *args, **kwargs):
+        if self.ops is None:
+            super().add_page(*args, **kwargs)
+        else:
+            self.ops.append(None)
+            self.page += 1
+
+    def saveFile(self, pdfnam, scrn=None):
+        if self.ops is None:
+            return super().saveFile(pdfnam, scrn)
+        self.batch.addForm(self, pdfnam)
+        return True
+
     def doDrawDetail(self, line, fmat=True):
+        if self.ops is not None:
+            self.ops.append((list(line), fmat))
+            return
         lic = {}
         tdc = self.sql.tpldet_col
         if line[tdc.index("tpd_type")] == "B":
@@ -17328,7 +20586,7 @@ class DrawForm(MyFpdf):
             self.doNewLines(line)
 
     def doNewLines(self, line):
-        nl = copyList(line)
+        nl = list(line)
         tdc = self.sql.tpldet_col
         mrgcod = nl[tdc.index("tpd_mrgcod")]
         if mrgcod:
@@ -17348,7 +20606,7 @@ class DrawForm(MyFpdf):
             self.newdic[detseq] = nl
         elif nl[tdc.index("tpd_type")] == "C":
             if nl[tdc.index("tpd_ttyp")] in ("H", "L"):
-                tl = copyList(nl)
+                tl = list(nl)
                 tl[tdc.index("tpd_type")] = "T"
                 if tl[tdc.index("tpd_place")] == "B" and \
                         tl[tdc.index("tpd_ttyp")] == "H":
@@ -17371,7 +20629,7 @@ class DrawForm(MyFpdf):
                     if tl[tdc.index("tpd_border")] and x and x == times-1:
                         tl[tdc.index("tpd_border")] += "B"
                     self.newkey.append(newseq)
-                    self.newdic[newseq] = copyList(tl)
+                    self.newdic[newseq] = list(tl)
                     t_y2 = tl[tdc.index("tpd_y2")]
                     tl[tdc.index("tpd_y1")] = t_y2
                     tl[tdc.index("tpd_y2")] = t_y2 + height
@@ -17392,7 +20650,7 @@ class DrawForm(MyFpdf):
                 if nl[tdc.index("tpd_mrg_border")] and x and x == repeat-1:
                     nl[tdc.index("tpd_mrg_border")] += "B"
                 self.newkey.append(newseq)
-                self.newdic[newseq] = copyList(nl)
+                self.newdic[newseq] = list(nl)
                 c_y2 = nl[tdc.index("tpd_mrg_y2")]
                 nl[tdc.index("tpd_mrg_y1")] = c_y2
                 nl[tdc.index("tpd_mrg_y2")] = c_y2 + height
@@ -17537,6 +20795,45 @@ class DrawForm(MyFpdf):
         doc.close()
         doc2.close()
 
+def clearForms(tname=None):
+    """
+    Remove a changed template, or all templates, from the DrawForm cache.
+    """
+    for key in list(DrawForm.cache):
+        if not tname or key[1] == tname:
+            del DrawForm.cache[key]
+
+def renderInit(rcdic):
+    """
+    Open the database in a process rendering forms for a PrintBatch.
+    """
+    PrintBatch.dbm = Dbase(rcdic)
+    PrintBatch.dbm.openDbase()
+
+def renderForm(job, dbm=None):
+    """
+    Render a form recorded by a DrawForm having a batch, where job is:
+
+        (tname, foot, wrkdir, sysdt, ops, pdfnam, pgoff, pgtot)
+
+    pgoff and pgtot are the page offset and the total pages of the document
+    when the form is only a part of it, else 0.
+    """
+    tname, foot, wrkdir, sysdt, ops, pdfnam, pgoff, pgtot = job
+    if dbm is None:
+        dbm = PrintBatch.dbm
+    form = DrawForm(dbm, tname, foot=foot, wrkdir=wrkdir)
+    form.sysdt = sysdt
+    form.pgoff = pgoff
+    form.pgtot = pgtot
+    for op in ops:
+        if op is None:
+            form.add_page()
+        else:
+            form.doDrawDetail(*op)
+    form.output(pdfnam)
+    return pdfnam
+
 class ToolTip(object):
     def __init__(self, widget, text, font=None, color=("black","light yellow")):
         self.widget = widget
@@ -18305,7 +21602,9 @@ Only Databases of the Same Version can be Merged.""" % (self.dbnam,
                 whr = [(xfl, "==", "")]
                 recs = self.sqf.getRec(tables=tab, where=whr)
                 if recs:
-                    self.sqt.insRec(tab, data=recs)
+                    self.sqt.bulkRec(tab, data=recs, dofmt=False)
+                    if tab == "strtrn" and self.sqt.getStrBal():
+                        self.sqt.stb.addRecs(recs)
                 self.sqf.sqlRec("Delete from %s" % tab)
 
     def doExit(self):
@@ -18658,6 +21957,88 @@ class MakeManual(object):
         fam, sty, siz = self.fonts[font]
         self.fpdf.setFont(fam, sty, siz)
 
+class PdfCache(object):
+    """
+    A bounded, least recently used, cache of the rendered pages of a
+    pymupdf document, as ppm data keyed by page number and matrix, and an
+    index of the text of the pages, built once, for finding text.
+
+    doc  - The pymupdf document.
+    size - The maximum size of the cache in bytes, at least the current
+           page is always kept.
+
+    getPage     - Return the ppm data of a page, rendering it if required.
+    getPrefetch - Return the number of the nearest uncached neighbouring
+                  page to render ahead of time, or None.
+    findPages   - Return the numbers of the pages containing text.
+    clear       - Remove a page, or all the pages, from the cache, i.e.
+                  after annotating or rotating the pages.
+    """
+    def __init__(self, doc, size=64000000):
+        self.doc = doc
+        self.size = size
+        self.used = 0
+        self.last = 0
+        self.pixs = collections.OrderedDict()
+        self.text = None
+
+    def getPage(self, pgno, matrix):
+        key = (pgno, tuple(matrix))
+        if key in self.pixs:
+            self.pixs.move_to_end(key)
+            return self.pixs[key]
+        dlist = self.doc[pgno - 1].get_displaylist()
+        pix = dlist.get_pixmap(matrix=matrix, alpha=False)
+        data = pix.tobytes("ppm")
+        self.pixs[key] = data
+        self.used += len(data)
+        self.last = len(data)
+        while self.used > self.size and len(self.pixs) > 1:
+            self.used -= len(self.pixs.popitem(last=False)[1])
+        return data
+
+    def getPrefetch(self, pgno, matrix, ahead=2):
+        """
+        Return the nearest page, following and then preceding pgno, within
+        ahead pages, not yet rendered, or None if there is none or it would
+        not fit in the cache without removing the pages being viewed.
+        """
+        if self.used + self.last > self.size:
+            return
+        for num in range(1, ahead + 1):
+            for page in (pgno + num, pgno - num):
+                if page < 1 or page > self.doc.page_count:
+                    continue
+                if (page, tuple(matrix)) not in self.pixs:
+                    return page
+
+    def findPages(self, text):
+        """
+        Return the numbers of the pages containing text, ignoring case and
+        white space, as page.search_for would find it.
+        """
+        text = " ".join(text.lower().split())
+        if not text:
+            return []
+        if self.text is None:
+            flags = pymupdf.TEXT_DEHYPHENATE | \
+                pymupdf.TEXT_PRESERVE_LIGATURES | \
+                pymupdf.TEXT_PRESERVE_WHITESPACE | pymupdf.TEXT_MEDIABOX_CLIP
+            self.text = []
+            for page in self.doc:
+                self.text.append(" ".join(page.get_text("text",
+                    flags=flags).lower().split()))
+        pags = []
+        for num, txt in enumerate(self.text):
+            if text in txt:
+                pags.append(num + 1)
+        return pags
+
+    def clear(self, pgno=None):
+        for key in list(self.pixs.keys()):
+            if pgno is None or key[0] == pgno:
+                self.used -= len(self.pixs.pop(key))
+
 class ViewPDF(object):
     """
     This class is used to view pdf files using either the system default
@@ -18733,6 +22114,8 @@ class ViewPDF(object):
         if pwd and not self.doPassword():
             return
         self.lastpg = self.doc.page_count
+        self.cache = PdfCache(self.doc)
+        self.fetch = None
         rect = self.doc[0].mediabox
         if not self.doc[0].rotation:
             self.siz = [rect[2], rect[3]]
@@ -19029,6 +22412,7 @@ class ViewPDF(object):
                 self.rotate -= 90
         for page in self.doc:
             page.set_rotation(self.rotate)
+        self.cache.clear()
         self.showPage()
 
     def doZoom(self, event=None):
@@ -19050,16 +22434,17 @@ class ViewPDF(object):
             self.found = False
             self.pags = []
             self.prec = {}
-            for page in self.doc:
+            for numb in self.cache.findPages(self.search):
+                page = self.doc[numb - 1]
                 found = page.search_for(self.search)
                 if found:
                     self.found = True
                     for inst in found:
-                        numb = (page.number + 1)
                         if numb not in self.pags:
                             self.pags.append(numb)
                             self.prec[numb] = inst
                         page.add_highlight_annot(inst)
+                    self.cache.clear(numb)
             if self.pags:
                 self.pgno = self.pags[0]
             frm.destroy()
@@ -19136,6 +22521,9 @@ class ViewPDF(object):
         self.win.update_idletasks()
 
     def showPage(self, pos=None):
+        if self.fetch:
+            self.win.after_cancel(self.fetch)
+            self.fetch = None
         self.ltime = 0
         self.cv.delete("all")
         page = self.doc[self.pgno - 1]
@@ -19156,13 +22544,9 @@ class ViewPDF(object):
             fmt = "%s%s%s" % ("%", self.entsiz, "s")
             self.pgd.insert(0, fmt % self.pgno)
             self.pgd.configure(state="disabled")
-        try:
-            dlist = page.get_displaylist()
-        except:
-            pass
-        # Create image
-        pix = dlist.get_pixmap(matrix=self.matrix, alpha=False)
-        self.ti = tk.PhotoImage(data=pix.tobytes("ppm"))
+        # Create image, from the cache if already rendered
+        self.ti = tk.PhotoImage(data=self.cache.getPage(self.pgno,
+            self.matrix))
         self.cv.create_image(0, 0, image=self.ti, anchor="nw", tags="img")
         self.cv.configure(width=self.ti.width(), height=self.ti.height())
         # Limit display size to %-tage of screen size
@@ -19201,6 +22585,15 @@ class ViewPDF(object):
         self.win.grab_set()
         self.win.focus_set()
         self.win.update_idletasks()
+        self.fetch = self.win.after_idle(self.doPrefetch)
+
+    def doPrefetch(self):
+        # Render the neighbouring pages, one at a time, while idle
+        self.fetch = None
+        pgno = self.cache.getPrefetch(self.pgno, self.matrix)
+        if pgno is not None:
+            self.cache.getPage(pgno, self.matrix)
+            self.fetch = self.win.after_idle(self.doPrefetch)
 
     def getVisibleArea(self):
         y1 = self.cv.canvasy(0)
@@ -19363,6 +22756,7 @@ class ViewPDF(object):
                 page = self.doc[self.pgno - 1]
                 self.prec[self.pgno] = rect
                 page.add_highlight_annot(rect)
+                self.cache.clear(self.pgno)
                 self.cont = True
                 self.showPage()
             self.cv.focus_force()
@@ -19373,6 +22767,7 @@ class ViewPDF(object):
             while annot and annot.type != "null":
                 if annot.type[0] == pymupdf.PDF_ANNOT_HIGHLIGHT:
                     annot = page.delete_annot(annot)
+                    self.cache.clear(page.number + 1)
                 else:
                     annot = annot.next
 
@@ -19660,6 +23055,8 @@ class ViewPDF(object):
             cnf.close()
         except:
             pass
+        if self.fetch:
+            self.win.after_cancel(self.fetch)
         self.doc.close()
         self.win.destroy()
 
@@ -185,6 +185,14 @@ Curdt: Produce a report based on Financial Period, this will always balance with
             ("crm_acno", "<=", self.acc2)]
         recs = self.sql.getRec("crsmst", cols=["crm_acno", "crm_name"],
             where=whr, order="crm_acno")
+        if recs and self.base == "A":
+            # Age all the accounts
+            bals = Balances(self.opts["mf"], "CRS", self.opts["conum"],
+                self.cutoff)
+            self.bals = {}
+            for key, obal, cbal, ages in bals.doLedgerBals(where=[("crt_acno",
+                    ">=", self.acc1), ("crt_acno", "<=", self.acc2)]):
+                self.bals[key] = (obal, cbal, ages)
         if not recs:
             showError(self.opts["mf"].body, "Selection Error",
                 "No Accounts Selected")
@@ -276,9 +284,8 @@ Curdt: Produce a report based on Financial Period, this will always balance with
         acc = CCD(data[0], "NA", 7)
         name = CCD(data[1], "NA", 30)
         if self.base == "A":
-            bals = Balances(self.opts["mf"], "CRS", self.opts["conum"],
-                self.cutoff, keys=(data[0],))
-            obal, cbal, ages = bals.doAllBals()
+            obal, cbal, ages = self.bals.get(data[0],
+                (0.0, 0.0, [0, 0, 0, 0, 0]))
         else:
             pers = []
             yr = int(self.cutoff / 100)
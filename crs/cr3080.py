@@ -25,7 +25,8 @@ COPYING
 """
 
 import os, time
-from TartanClasses import ASD, DrawForm, GetCtl, ProgressBar, Sql, TartanDialog
+from TartanClasses import ASD, DrawForm, GetCtl, PrintBatch, ProgressBar, Sql
+from TartanClasses import TartanDialog
 from tartanFunctions import doPrinter, getModName, getSingleRecords, getTrn
 from tartanFunctions import copyList, showError
 from tartanWork import crtrtp
@@ -58,6 +59,7 @@ class cr3080(object):
         self.bankac = crsctl["ctc_bankac"]
         self.tplnam = crsctl["ctc_tplnam"]
         self.fromad = crsctl["ctc_emadd"]
+        self.batch = None
         if self.glint == "Y":
             ctlctl = gc.getCtl("ctlctl", self.opts["conum"])
             if not ctlctl:
@@ -213,23 +215,27 @@ class cr3080(object):
                 showError(self.opts["mf"].body, "Error",
                     "No Accounts Selected")
         if recs:
+            self.batch = PrintBatch(self.opts["mf"], self.opts["conum"])
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
+            trns = self.doLoadTrans([rec[self.sql.crsmst_col.index("crm_acno")]
+                for rec in recs])
             p = ProgressBar(self.opts["mf"].body, mxs=len(recs), esc=True)
             for num, rec in enumerate(recs):
                 p.displayProgress(num)
                 if p.quit:
                     self.opts["mf"].dbm.rollbackDbase()
                     break
-                self.doProcess(rec)
+                self.doProcess(rec, next(trns))
             p.closeProgress()
             if p.quit or not self.form.page:
                 pass
             elif self.df.repeml[1] == "N" or self.emadd:
                 self.df.repeml[2] = self.emadd
                 self.doPrint()
+            self.batch.doRender()
             if self.bestac:
                 # Trailer for BEST
                 value = int(round((self.etotal * 100), 0))
@@ -251,6 +257,7 @@ class cr3080(object):
                     mess="""Would you like to commit all elecronic payments?
 
 If you decide to do this, you must remember to upload the BEST file to the Bank otherwise you are NOT going to Reconcile!""", default="no")
+            self.batch.closeBatch()
         if "wait" not in self.opts:
             self.opts["mf"].closeLoop()
 
@@ -409,7 +416,26 @@ If you decide to do this, you must remember to upload the BEST file to the Bank
             self.form.letterhead(cmc, ctm, "letterhead", None)
         self.form.document_date(self.duedtd)
 
-    def doProcess(self, crm):
+    def doLoadTrans(self, acnos, size=100):
+        # Yields the transactions due of each account, read by getTrn for
+        # size accounts at a time
+        for beg in range(0, len(acnos), size):
+            chunk = acnos[beg:beg + size]
+            whr = [
+                ("crt_cono", "=", self.opts["conum"]),
+                ("crt_acno", "in", chunk),
+                ("crt_payind", "=", "Y"),
+                ("crt_paydt", "<=", self.duedtw)]
+            ctc, recs = getTrn(self.opts["mf"].dbm, "crs", cdt=self.curdt,
+                whr=whr, odr="crt_acno, crt_trdt, crt_type, crt_ref1",
+                zer="N", itr=True)
+            trns = {}
+            for rec in recs:
+                trns.setdefault(rec[ctc.index("crt_acno")], []).append(rec)
+            for acno in chunk:
+                yield ctc, trns.get(acno, [])
+
+    def doProcess(self, crm, trns):
         cmc = self.sql.crsmst_col
         tdc = self.form.sql.tpldet_col
         self.acno = crm[cmc.index("crm_acno")]
@@ -420,13 +446,7 @@ If you decide to do this, you must remember to upload the BEST file to the Bank
             if d in self.form.newdic:
                 dat = crm[cmc.index(col)]
                 self.form.newdic[d][tdc.index("tpd_text")] = dat
-        whr = [
-            ("crt_cono", "=", self.opts["conum"]),
-            ("crt_acno", "=", self.acno),
-            ("crt_payind", "=", "Y"),
-            ("crt_paydt", "<=", self.duedtw)]
-        ctc, crt = getTrn(self.opts["mf"].dbm, "crs", cdt=self.curdt,
-            whr=whr, zer="N")
+        ctc, crt = trns
         if not crt:
             return
         bal = 0
@@ -474,10 +494,10 @@ If you decide to do this, you must remember to upload the BEST file to the Bank
             head = "%s Remittance Advice" % self.opts["conam"]
             doPrinter(mf=self.opts["mf"], conum=self.opts["conum"],
                 pdfnam=pdfnam, header=head, repprt=self.df.repprt,
-                fromad=self.fromad, repeml=self.df.repeml)
+                fromad=self.fromad, repeml=self.df.repeml, batch=self.batch)
         if self.df.repeml[1] == "Y":
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
 
@@ -192,6 +192,13 @@ Curdt: Produce a report based on Financial Period, this will always balance with
         odr = "drm_chain, drm_acno"
         recs = self.sql.getRec("drsmst", cols=["drm_chain", "drm_acno",
             "drm_name"], where=whr, order=odr)
+        if recs and self.base == "A":
+            # Age all the accounts
+            bals = Balances(self.opts["mf"], "DRS", self.opts["conum"],
+                self.cutoff)
+            self.bals = {}
+            for key, obal, cbal, ages in bals.doLedgerBals():
+                self.bals[key] = (obal, cbal, ages)
         if not recs:
             showError(self.opts["mf"].body, "Selection Error",
                 "No Records Selected")
@@ -287,9 +294,8 @@ Curdt: Produce a report based on Financial Period, this will always balance with
         acc = CCD(data[1], "NA", 7)
         name = CCD(data[2], "NA", 30)
         if self.base == "A":
-            bals = Balances(self.opts["mf"], "DRS", self.opts["conum"],
-                self.cutoff, keys=(data[0], data[1]))
-            obal, cbal, ages = bals.doAllBals()
+            obal, cbal, ages = self.bals.get((data[0], data[1]),
+                (0.0, 0.0, [0, 0, 0, 0, 0]))
         else:
             pers = []
             yr = int(self.cutoff / 100)
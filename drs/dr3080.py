@@ -25,8 +25,8 @@ COPYING
 """
 
 import time
-from TartanClasses import ASD, Balances, DrawForm, GetCtl, ProgressBar, Sql
-from TartanClasses import TartanDialog
+from TartanClasses import ASD, Balances, DrawForm, GetCtl, PrintBatch
+from TartanClasses import ProgressBar, Sql, TartanDialog
 from tartanFunctions import doPrinter, getModName, getSingleRecords, copyList
 from tartanFunctions import showError
 from tartanWork import drtrtp
@@ -51,6 +51,7 @@ class dr3080(object):
         self.stpl = drsctl["ctd_tplnam"]
         self.ageing = drsctl["ctd_ageing"]
         self.fromad = drsctl["ctd_emadd"]
+        self.batch = None
         t = time.localtime()
         self.sysdtw = (t[0] * 10000) + (t[1] * 100) + t[2]
         if self.chains == "N":
@@ -280,22 +281,32 @@ class dr3080(object):
             showError(self.opts["mf"].body, "Error",
                 "No Accounts Selected")
         else:
+            self.batch = PrintBatch(self.opts["mf"], self.opts["conum"])
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
+            if self.alloc == "Y":
+                tt = "A"
+            else:
+                tt = "Y"
+            dmc = self.sql.drsmst_col
+            bals = Balances(self.opts["mf"], "DRS", self.opts["conum"],
+                self.curdt).doBulkBals([(rec[dmc.index("drm_chain")],
+                rec[dmc.index("drm_acno")]) for rec in recs], trans=tt)
             p = ProgressBar(self.opts["mf"].body, mxs=len(recs), esc=True)
             for num, rec in enumerate(recs):
                 p.displayProgress(num)
                 if p.quit:
                     break
-                self.doProcess(rec)
+                self.doProcess(rec, next(bals)[1:])
             p.closeProgress()
             if p.quit or not self.form.page:
                 pass
             elif self.df.repeml[1] == "N" or self.emadd:
                 self.df.repeml[2] = self.emadd
                 self.doPrint()
+            self.batch.closeBatch()
         self.opts["mf"].closeLoop()
 
     def doLoadStatic(self):
@@ -314,7 +325,7 @@ class dr3080(object):
         self.form.document_date(self.dated)
         self.form.bank_details(cmc, ctm, 0)
 
-    def doProcess(self, drm):
+    def doProcess(self, drm, bals):
         dmc = self.sql.drsmst_col
         dtc = self.sql.drstrn_col
         tdc = self.form.sql.tpldet_col
@@ -331,13 +342,7 @@ class dr3080(object):
             if d in self.form.newdic:
                 dat = drm[dmc.index(col)]
                 self.form.newdic[d][tdc.index("tpd_text")] = dat
-        bals = Balances(self.opts["mf"], "DRS", self.opts["conum"], self.curdt,
-            (self.chn, self.acc))
-        if self.alloc == "Y":
-            tt = "A"
-        else:
-            tt = "Y"
-        obal, self.tbal, self.ages, trns = bals.doAllBals(trans=tt)
+        obal, self.tbal, self.ages, trns = bals
         if not trns[1]:
             return
         if self.sttyp == "O":
@@ -426,10 +431,10 @@ class dr3080(object):
                 self.acc, self.dated)
             doPrinter(mf=self.opts["mf"], conum=self.opts["conum"],
                 pdfnam=pdfnam, header=head, repprt=self.df.repprt,
-                fromad=self.fromad, repeml=self.df.repeml)
+                fromad=self.fromad, repeml=self.df.repeml, batch=self.batch)
         if self.df.repeml[1] == "Y":
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
 
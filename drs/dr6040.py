@@ -72,6 +72,12 @@ class dr6040(object):
             order="drm_chain, drm_name")
         if recs:
             col = self.sql.drsmst_col
+            # Age all the accounts
+            bals = Balances(self.opts["mf"], "DRS", self.opts["conum"],
+                self.curdt)
+            ages = {}
+            for key, obal, cbal, age in bals.doLedgerBals():
+                ages[key] = (obal, cbal, age)
             p = ProgressBar(self.opts["mf"].body, typ="Calculating Ratings",
                 mxs=len(recs))
             for num, rec in enumerate(recs):
@@ -87,9 +93,8 @@ class dr6040(object):
                     rating = "B"
                 else:
                     rating = None
-                    bal = Balances(self.opts["mf"], "DRS", self.opts["conum"],
-                        self.curdt, [chn, acc])
-                    obal, cbal, age = bal.doAllBals()
+                    obal, cbal, age = ages.get((chn, acc),
+                        (0.0, 0.0, [0, 0, 0, 0, 0]))
                     if cbal > 0:
                         if lim and cbal > lim:
                             rating = "P"
@@ -25,8 +25,8 @@ COPYING
 """
 
 from operator import itemgetter
-from TartanClasses import ASD, GetCtl, ScrollGrid, SplashScreen, Sql, SRec
-from TartanClasses import TartanDialog
+from TartanClasses import ASD, GenMatrix, GetCtl, ScrollGrid, SplashScreen
+from TartanClasses import Sql, SRec, TartanDialog
 from tartanFunctions import getPeriods, copyList, dateDiff, makeArray
 from tartanFunctions import mthendDate
 from tartanWork import gltrtp, mthnam
@@ -314,6 +314,15 @@ class gl4020(object):
             self.scon = []
             for c in coy:
                 self.scon.append(c[0])
+        if self.scon:
+            conos = self.scon
+        else:
+            conos = [self.opts["conum"]]
+        trdts = [self.opts["period"][1][0]]
+        if self.opts["period"][0]:
+            trdts.append(self.s_lyr.work)
+        self.matrix = GenMatrix(self.sql, conos, self.s_per - 100, self.end,
+            trdts, consol=bool(self.scon))
         self.rep_num = 0
         self.rpt_lst = self.sql.getRec("genrpt", where=[("glr_cono",
             "=", self.repco), ("glr_repno", "=", self.rep)], order="glr_seq")
@@ -654,83 +663,27 @@ class gl4020(object):
                 self.trn[self.s_desc][self.mths + 1].extend(trn)
 
     def getObal(self):
-        if not self.scon:
-            if not self.opts["period"][0]:
-                lyr = None
-            else:
-                lyr = self.sql.getRec("genbal",
-                    cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "=",
-                    self.s_cono), ("glo_acno", "=", self.s_acno), ("glo_trdt",
-                    "=", self.s_lyr.work)], limit=1)[0]
-            cyr = self.sql.getRec("genbal",
-                cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "=",
-                self.s_cono), ("glo_acno", "=", self.s_acno), ("glo_trdt",
-                "=", self.opts["period"][1][0])], limit=1)[0]
-        else:
-            if not self.opts["period"][0]:
-                lyr = None
-            else:
-                lyr = self.sql.getRec("genbal",
-                    cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "in",
-                    self.scon), ("glo_acno", "=", self.s_acno), ("glo_trdt",
-                    "=", self.s_lyr.work)], limit=1)[0]
-            cyr = self.sql.getRec("genbal",
-                cols=["round(sum(glo_cyr), 2)"], where=[("glo_cono", "in",
-                self.scon), ("glo_acno", "=", self.s_acno), ("glo_trdt",
-                "=", self.opts["period"][1][0])], limit=1)[0]
-        if not lyr:
+        if not self.opts["period"][0]:
             lyr = 0
         else:
-            lyr = float(lyr)
-        if not cyr:
-            cyr = 0
-        else:
-            cyr = float(cyr)
+            lyr = self.matrix.getObal(self.s_cono, self.s_acno,
+                self.s_lyr.work)
+        cyr = self.matrix.getObal(self.s_cono, self.s_acno,
+            self.opts["period"][1][0])
         return (lyr, cyr)
 
     def getMbal(self, curdt):
+        lyr = self.matrix.getMove(self.s_cono, self.s_acno, curdt - 100)
+        cyr = self.matrix.getMove(self.s_cono, self.s_acno, curdt)
+        bud = int(self.matrix.getBudget(self.s_cono, self.s_acno, curdt))
         if not self.scon:
-            lyr = self.sql.getRec("gentrn",
-                cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono", "=",
-                self.s_cono), ("glt_acno", "=", self.s_acno), ("glt_curdt",
-                "=", (curdt - 100))], limit=1)[0]
-            cyr = self.sql.getRec("gentrn",
-                cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono", "=",
-                self.s_cono), ("glt_acno", "=", self.s_acno), ("glt_curdt",
-                "=", curdt)], limit=1)[0]
-            bud = self.sql.getRec("genbud", cols=["sum(glb_tramt)"],
-                where=[("glb_cono", "=", self.s_cono), ("glb_acno", "=",
-                self.s_acno), ("glb_curdt", "=", curdt)], limit=1)[0]
             trn = self.sql.getRec("gentrn", where=[("glt_cono", "=",
                 self.s_cono), ("glt_acno", "=", self.s_acno), ("glt_curdt",
                 "=", curdt)], order="glt_trdt")
         else:
-            lyr = self.sql.getRec("gentrn",
-                cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono", "in",
-                self.scon), ("glt_acno", "=", self.s_acno), ("glt_curdt",
-                "=", (curdt - 100))], limit=1)[0]
-            cyr = self.sql.getRec("gentrn",
-                cols=["round(sum(glt_tramt), 2)"], where=[("glt_cono", "in",
-                self.scon), ("glt_acno", "=", self.s_acno), ("glt_curdt",
-                "=", curdt)], limit=1)[0]
-            bud = self.sql.getRec("genbud", cols=["sum(glb_tramt)"],
-                where=[("glb_cono", "in", self.scon), ("glb_acno", "=",
-                self.s_acno), ("glb_curdt", "=", curdt)], limit=1)[0]
             trn = self.sql.getRec("gentrn", where=[("glt_cono", "in",
                 self.scon), ("glt_acno", "=", self.s_acno), ("glt_curdt",
                 "=", curdt)], order="glt_trdt")
-        if not lyr:
-            lyr = 0
-        else:
-            lyr = float(lyr)
-        if not cyr:
-            cyr = 0
-        else:
-            cyr = float(cyr)
-        if not bud:
-            bud = 0
-        else:
-            bud = int(bud)
         return (lyr, cyr, bud, trn)
 
     def printLine(self, inc=1):
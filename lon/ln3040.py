@@ -26,8 +26,8 @@ COPYING
 
 import time
 from operator import itemgetter
-from TartanClasses import ASD, CCD, DrawForm, GetCtl, LoanInterest, ProgressBar
-from TartanClasses import Sql, TartanDialog
+from TartanClasses import ASD, CCD, DrawForm, GetCtl, LoanInterest, PrintBatch
+from TartanClasses import ProgressBar, Sql, TartanDialog
 from tartanFunctions import copyList, doPrinter, getModName, getSingleRecords
 from tartanFunctions import mthendDate, projectDate, showError
 from tartanWork import lntrtp
@@ -49,6 +49,8 @@ class ln3040(object):
         self.lint = lonctl["cln_last"]
         self.stpl = lonctl["cln_tplnam"]
         self.fromad = lonctl["cln_emadd"]
+        self.batch = None
+        self.periods = None
         t = time.localtime()
         self.sysdtw = (t[0] * 10000) + (t[1] * 100) + t[2]
         self.curdt = int(self.sysdtw / 100)
@@ -146,24 +148,62 @@ class ln3040(object):
             showError(self.opts["mf"].body, "Error",
                 "No Accounts Selected")
         else:
+            self.batch = PrintBatch(self.opts["mf"], self.opts["conum"])
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
+            data = self.doLoadData([rec[self.sql.lonmf1_col.index("lm1_acno")]
+                for rec in recs])
             p = ProgressBar(self.opts["mf"].body, mxs=len(recs), esc=True)
             for num, rec in enumerate(recs):
                 p.displayProgress(num)
                 if p.quit:
                     break
-                self.doProcess(rec)
+                self.doProcess(rec, next(data))
             p.closeProgress()
+            if self.pend == "Y":
+                # The pending interest is not kept, the batch commits its log
+                self.opts["mf"].dbm.rollbackDbase()
             if p.quit or not self.form.page:
                 pass
             elif self.df.repeml[1] == "N" or self.emadd:
                 self.df.repeml[2] = self.emadd
                 self.doPrint()
+            self.batch.closeBatch()
         self.opts["mf"].closeLoop()
 
+    def doLoadData(self, acnos, size=100):
+        # Yields the loans of each account with their transactions, read
+        # for size accounts at a time, or None if pending interest is to be
+        # raised first
+        l2c = self.sql.lonmf2_col
+        ltc = self.sql.lontrn_col
+        for beg in range(0, len(acnos), size):
+            chunk = acnos[beg:beg + size]
+            loans = {}
+            for rec in self.sql.getRec("lonmf2", where=[("lm2_cono", "=",
+                    self.opts["conum"]), ("lm2_acno", "in", chunk)],
+                    order="lm2_acno, lm2_loan"):
+                loans.setdefault(rec[l2c.index("lm2_acno")], []).append(rec)
+            trns = {}
+            if self.pend != "Y":
+                for rec in self.sql.getRec("lontrn", where=[("lnt_cono",
+                        "=", self.opts["conum"]), ("lnt_acno", "in", chunk),
+                        ("lnt_curdt", "<=", self.eperw)], order="lnt_acno, "\
+                        "lnt_loan, lnt_curdt, lnt_trdt, lnt_type, lnt_refno"):
+                    trns.setdefault((rec[ltc.index("lnt_acno")],
+                        rec[ltc.index("lnt_loan")]), []).append(rec)
+            for acno in chunk:
+                data = []
+                for lm2 in loans.get(acno, []):
+                    if self.pend == "Y":
+                        data.append((lm2, None))
+                    else:
+                        data.append((lm2, trns.get((acno,
+                            lm2[l2c.index("lm2_loan")]), [])))
+                yield data
+
     def doLoadStatic(self):
         cmc = self.sql.ctlmst_col
         ctm = self.sql.getRec("ctlmst", where=[("ctm_cono", "=",
@@ -180,7 +220,7 @@ class ln3040(object):
         self.form.document_date(self.date.disp)
         self.form.bank_details(cmc, ctm, 0)
 
-    def doProcess(self, lm1):
+    def doProcess(self, lm1, loans):
         l1c = self.sql.lonmf1_col
         tdc = self.form.sql.tpldet_col
         self.acno = lm1[l1c.index("lm1_acno")]
@@ -191,13 +231,10 @@ class ln3040(object):
             if d in self.form.newdic:
                 dat = lm1[l1c.index(col)]
                 self.form.newdic[d][tdc.index("tpd_text")] = dat
-        lonmf2 = self.sql.getRec("lonmf2", where=[("lm2_cono",
-            "=", self.opts["conum"]), ("lm2_acno", "=", self.acno)],
-            order="lm2_loan")
-        for loan in lonmf2:
-            self.doStatement(tdc, loan)
+        for loan, rows in loans:
+            self.doStatement(tdc, loan, rows)
 
-    def doStatement(self, tdc, lm2):
+    def doStatement(self, tdc, lm2, rows):
         l2c = self.sql.lonmf2_col
         ltc = copyList(self.sql.lontrn_col)
         self.loan = lm2[l2c.index("lm2_loan")]
@@ -211,16 +248,17 @@ class ln3040(object):
             LoanInterest("L", self.opts["mf"].dbm, lm2, update="Y",
                 tdate=self.date.work, batch="Pending", capnm="")
         # Get Transactions
-        whr = [
-            ("lnt_cono", "=", self.opts["conum"]),
-            ("lnt_acno", "=", self.acno),
-            ("lnt_loan", "=", self.loan),
-            ("lnt_curdt", "<=", self.eperw)]
-        odr = "lnt_curdt, lnt_trdt, lnt_type, lnt_refno"
+        if rows is None:
+            whr = [
+                ("lnt_cono", "=", self.opts["conum"]),
+                ("lnt_acno", "=", self.acno),
+                ("lnt_loan", "=", self.loan),
+                ("lnt_curdt", "<=", self.eperw)]
+            odr = "lnt_curdt, lnt_trdt, lnt_type, lnt_refno"
+            rows = self.sql.getRec("lontrn", where=whr, order=odr)
+        typ = ltc.index("lnt_type")
         if self.itot == "Y":
-            w = whr[:]
-            w.append(("lnt_type", "<>", 4))
-            trns = self.sql.getRec("lontrn", where=w, order=odr)
+            trns = [trn for trn in rows if trn[typ] != 4]
             if self.capb == "A":                        # Anniversary
                 fcap = [lm2[l2c.index("lm2_start")], 0]
                 fcap[0] = (int(fcap[0] / 100) * 100) + 1
@@ -230,11 +268,12 @@ class ln3040(object):
                     fcap[1] = projectDate(fcap[0], 5, typ="months")
                 fcap[1] = mthendDate(fcap[1])
             else:                                       # Financial
-                periods = self.sql.getRec("ctlynd",
-                    cols=["cye_period", "cye_start", "cye_end"],
-                    where=[("cye_cono", "=", self.opts["conum"])],
-                    order="cye_period")
-                fcap = [periods[0][1], periods[0][2]]
+                if self.periods is None:
+                    self.periods = self.sql.getRec("ctlynd",
+                        cols=["cye_period", "cye_start", "cye_end"],
+                        where=[("cye_cono", "=", self.opts["conum"])],
+                        order="cye_period")
+                fcap = [self.periods[0][1], self.periods[0][2]]
                 if self.capf == "B":                    # Bi-Annual
                     fcap[1] = projectDate(fcap[1], -6, typ="months")
             capdt = [copyList(fcap)]
@@ -248,11 +287,10 @@ class ln3040(object):
                 if fcap[1] > self.date.work:
                     fcap[1] = self.date.work
                 capdt.append(copyList(fcap))
+            trdt = ltc.index("lnt_trdt")
             for capd in capdt:
-                w = whr[:]
-                w.append(("lnt_type", "=", 4))
-                w.append(("lnt_trdt", "between", capd[0], capd[1]))
-                ints = self.sql.getRec("lontrn", where=w, order=odr)
+                ints = [trn for trn in rows if trn[typ] == 4 and
+                    capd[0] <= trn[trdt] <= capd[1]]
                 if not ints:
                     continue
                 ddes = "Dr Int %s to %s"
@@ -279,7 +317,7 @@ class ln3040(object):
                     trns.append(copyList(trn))
             trns = sorted(trns, key=itemgetter(5))
         else:
-            trns = self.sql.getRec("lontrn", where=whr, order=odr)
+            trns = rows
         if not trns:
             return
         self.bal = 0
@@ -332,10 +370,10 @@ class ln3040(object):
             head = "%s Statement at %s" % (self.opts["conam"], self.date.disp)
             doPrinter(mf=self.opts["mf"], conum=self.opts["conum"],
                 pdfnam=pdfnam, header=head, repprt=self.df.repprt,
-                fromad=self.fromad, repeml=self.df.repeml)
+                fromad=self.fromad, repeml=self.df.repeml, batch=self.batch)
         if self.df.repeml[1] == "Y":
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
 
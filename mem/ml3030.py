@@ -245,6 +245,14 @@ class ml3030(object):
             odr = "mlm_surname"
         recs = self.sql.getRec(tables=tab, cols=["mlm_memno", "mlm_title",
             "mlm_initial", "mlm_surname"], where=whr, order=odr)
+        if recs:
+            # Age all the members
+            bals = Balances(self.opts["mf"], "MEM", self.opts["conum"],
+                self.cutoff)
+            self.bals = {}
+            for key, obal, cbal, ages in bals.doLedgerBals(where=[("mlt_memno",
+                    ">=", self.acc1), ("mlt_memno", "<=", self.acc2)]):
+                self.bals[key] = (obal, cbal, ages)
         if not recs:
             showError(self.opts["mf"].body, "Selection Error",
                 "No Members Selected")
@@ -330,9 +338,8 @@ class ml3030(object):
     def getValues(self, data):
         acc = CCD(data[0], "UI", 6)
         name = CCD("%s, %s %s" % (data[3], data[1], data[2]), "NA", 30)
-        bals = Balances(self.opts["mf"], "MEM", self.opts["conum"],
-            self.cutoff, keys=(acc.work,))
-        obal, cbal, ages = bals.doAllBals()
+        obal, cbal, ages = self.bals.get(acc.work,
+            (0.0, 0.0, [0, 0, 0, 0, 0]))
         bal = CCD(cbal, "SD", 13.2)
         if self.limit and bal.work < self.limit:
             return
@@ -25,8 +25,8 @@ COPYING
 """
 
 import copy, time
-from TartanClasses import ASD, Balances, CCD, DrawForm, GetCtl, ProgressBar
-from TartanClasses import Sql, TartanDialog
+from TartanClasses import ASD, Balances, CCD, DrawForm, GetCtl, PrintBatch
+from TartanClasses import ProgressBar, Sql, TartanDialog
 from tartanFunctions import askQuestion, doPrinter, getModName, dateDiff
 from tartanFunctions import doChkCatChg, getSingleRecords, getVatRate
 from tartanFunctions import copyList, mthendDate, showError
@@ -60,6 +60,7 @@ class ml3040(object):
         self.lme = memctl["mcm_lme"]
         self.stpl = memctl["mcm_sttpl"]
         self.fromad = memctl["mcm_emadd"]
+        self.batch = None
         self.sql = Sql(self.opts["mf"].dbm, ["ctlmes", "ctlmst", "memmst",
             "memtrn", "memadd", "memcat", "memctc", "memctp", "memctk",
             "memkon", "memlnk", "tplmst"], prog=self.__class__.__name__)
@@ -270,6 +271,7 @@ class ml3040(object):
             self.repprt = self.opts["args"][2]
             self.repeml = self.opts["args"][3]
             recs = [self.opts["args"][0]]
+            self.doLoadLinks(recs[0][self.sql.memmst_col.index("mlm_memno")])
         else:
             self.df.closeProcess()
             self.repprt = self.df.repprt
@@ -301,24 +303,39 @@ class ml3040(object):
             nos = []
             for acc in recs:
                 nos.append(acc[col.index("mlm_memno")])
+            pars = self.doLoadLinks()
             chk = copyList(recs)
             for acc in chk:
-                whr = [
-                    ("mll_cono", "=", self.opts["conum"]),
-                    ("mll_lnkno", "=", acc[col.index("mlm_memno")])]
-                lnk = self.sql.getRec("memlnk", where=whr, limit=1)
-                if lnk and lnk[1] in nos:
+                if pars.get(acc[col.index("mlm_memno")]) in nos:
                     recs.remove(acc)
         if recs:
             self.emadd = self.repeml[2]
+            self.batch = PrintBatch(self.opts["mf"], self.opts["conum"])
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
             if self.repeml[1] == "N":
                 mess = "Printing Statements"
             else:
                 mess = "Printing and Emailing Statements"
+            # The members and their linked members in the order processed
+            col = self.sql.memmst_col
+            accs = []
+            for rec in recs:
+                accs.append(rec[col.index("mlm_memno")])
+                accs.extend(self.lnks.get(accs[-1], []))
+            if self.paid == "Y":
+                trans = "A"
+            else:
+                trans = "Y"
+            if self.pro:
+                # Each member is read after its pro-forma charges are raised
+                size = 1
+            else:
+                size = 100
+            bals = Balances(self.opts["mf"], "MEM", self.opts["conum"],
+                self.curdt).doBulkBals(accs, trans=trans, size=size)
             p = ProgressBar(self.opts["mf"].body, typ=mess, mxs=len(recs),
                 esc=True)
             for num, rec in enumerate(recs):
@@ -327,7 +344,7 @@ class ml3040(object):
                     break
                 if self.pro:
                     self.doProForma(rec)
-                self.doProcess(rec)
+                self.doProcess(rec, bals)
             p.closeProgress()
             if self.pro:
                 self.opts["mf"].dbm.rollbackDbase()
@@ -336,9 +353,23 @@ class ml3040(object):
             elif self.repeml[1] == "N" or self.emadd:
                 self.repeml[2] = self.emadd
                 self.doPrint()
+            self.batch.closeBatch()
         if "wait" not in self.opts:
             self.opts["mf"].closeLoop()
 
+    def doLoadLinks(self, memno=None):
+        # The linked members of the members and the member of each link
+        whr = [("mll_cono", "=", self.opts["conum"])]
+        if memno:
+            whr.append(("mll_memno", "=", memno))
+        self.lnks = {}
+        pars = {}
+        for mem, lnk in self.sql.getRec("memlnk", cols=["mll_memno",
+                "mll_lnkno"], where=whr):
+            self.lnks.setdefault(mem, []).append(lnk)
+            pars.setdefault(lnk, mem)
+        return pars
+
     def doLoadStatic(self):
         cmc = self.sql.ctlmst_col
         ctm = self.sql.getRec("ctlmst", where=[("ctm_cono", "=",
@@ -481,11 +512,11 @@ class ml3040(object):
             where=[("mlc_cono", "=", self.opts["conum"]), ("mlc_memno", "=",
             memno), ("mlc_type", "=", ctyp), ("mlc_code", "=", code)])
 
-    def doProcess(self, mlm):
+    def doProcess(self, mlm, bals):
         dmc = self.sql.memmst_col
         tdc = self.form.sql.tpldet_col
         self.memno = mlm[dmc.index("mlm_memno")]
-        self.doGetBalTrn()
+        self.doGetBalTrn(bals)
         if not self.mlt[1]:
             return
         if self.zeros == "N" and not self.tbal:
@@ -563,23 +594,13 @@ class ml3040(object):
             self.repeml[2] = eml
             self.doPrint()
 
-    def doGetBalTrn(self):
-        if self.paid == "Y":
-            trans = "A"
-        else:
-            trans = "Y"
-        bals = Balances(self.opts["mf"], "MEM", self.opts["conum"],
-            self.curdt, (self.memno,))
-        self.obal, self.tbal, self.ages, self.mlt = bals.doAllBals(trans=trans)
-        lnk = self.sql.getRec("memlnk", cols=["mll_lnkno"],
-            where=[("mll_cono", "=", self.opts["conum"]), ("mll_memno", "=",
-            self.memno)])
+    def doGetBalTrn(self, bals):
+        self.obal, self.tbal, self.ages, self.mlt = next(bals)[1:]
+        lnk = self.lnks.get(self.memno)
         if not lnk:
             return
         for l in lnk:
-            bals = Balances(self.opts["mf"], "MEM", self.opts["conum"],
-                self.curdt, (l[0],))
-            obal, tbal, ages, mlt = bals.doAllBals(trans=trans)
+            obal, tbal, ages, mlt = next(bals)[1:]
             for n, d in enumerate(mlt[1]):
                 mlt[1][n][mlt[0].index("mlt_desc")] = "%s (%s)" % \
                     (d[mlt[0].index("mlt_desc")][:30],
@@ -738,10 +759,10 @@ class ml3040(object):
             head = "%s Statement at %s" % (self.opts["conam"], self.dated)
             doPrinter(mf=self.opts["mf"], conum=self.opts["conum"],
                 pdfnam=pdfnam, header=head, fromad=self.fromad,
-                repprt=self.repprt, repeml=self.repeml)
+                repprt=self.repprt, repeml=self.repeml, batch=self.batch)
         if self.repeml[1] == "Y":
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
 
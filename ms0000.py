@@ -45,14 +45,15 @@ if errs:
 
 import getpass, gc, glob, io, os, platform, shutil, time
 from TartanClasses import Dbase, ViewPDF, FileDialog, FITZ, GUI, GetCtl
-from TartanClasses import MainFrame, MakeManual, MkWindow, PwdConfirm
+from TartanClasses import LogWriter, MainFrame, MakeManual, MkWindow
+from TartanClasses import PwdConfirm
 from TartanClasses import ScrollText, SelectChoice, SplashScreen, Sql
 from TartanClasses import TartanConfig, TartanDialog, TartanMenu, TartanUser
 from tartanFunctions import askQuestion, askChoice, b64Convert, chkMod
 from tartanFunctions import copyList, dateDiff, httpDownload, getPeriods
 from tartanFunctions import getPrgPath, loadRcFile, projectDate
 from tartanFunctions import runModule, showError, showException, showInfo
-from tartanWork import allsys, pymodb, tabdic, tarmen
+from tartanWork import allsys, pkgs, pymodb, tabdic, tarmen
 try:
     from send2trash import send2trash
     TRASH = True
@@ -71,6 +72,8 @@ else:
 class ms0000(object):
     def __init__(self, opts, args):
         self.cv = [VERSION, "%s.%s" % VERSION]
+        self.logger = None
+        self.loaded = {}
         frozen = getattr(sys, "frozen", False)
         default = [
             ("altered", True),
@@ -83,6 +86,7 @@ class ms0000(object):
             ("itoggle", False),
             ("loader", False),
             ("imods", False),
+            ("incr", False),
             ("output", False),
             ("program", None),
             ("rcfdir", None),
@@ -91,6 +95,7 @@ class ms0000(object):
             ("tcode", 0),
             ("user", {}),
             ("version", False),
+            ("workers", 1),
             ("xdisplay", True),
             ("zerobar", False)]
         for arg, val in default:
@@ -112,6 +117,8 @@ class ms0000(object):
                 self.help = True
             elif o in ("-i", "--image"):
                 self.itoggle = True
+            elif o in ("-I", "--incremental"):
+                self.incr = True
             elif o in ("-l", "--loader"):
                 self.loader = True
             elif o in ("-m", "--imods"):
@@ -146,6 +153,12 @@ class ms0000(object):
                     self.user["pwd"] = ""
             elif o in ("-v", "--version"):
                 self.version = True
+            elif o in ("-w", "--workers"):
+                try:
+                    self.workers = int(v)
+                except:
+                    print("Invalid value for -w")
+                    self.doExit(dbm=False)
             elif o in ("-x", "--xdisplay"):
                 self.xdisplay = False
             elif o in ("-z", "--zerobar"):
@@ -184,6 +197,7 @@ Options:
             -f, --finper=           The financial period
             -h, --help              This Help Message
             -i, --image             Toggle the Tartan image option.
+            -I, --incremental       Incremental backup with -ptarBck
             -l, --loader            Try and remove module before importing
             -m, --imods             Try to install missing modules using pip
             -n, --nomail            No checking for email smtp servers
@@ -196,6 +210,7 @@ Options:
             -t, --tcode=            Transaction code
             -u, --user=             User name and password i.e. name:password
             -v, --version           Display Version Details
+            -w, --workers=          Backup and restore workers with -ptarBck
             -x, --xdisplay          Do not have a mainframe with -ptarBck
             -z, --zerobar           Do not have a progressbar with -ptarBck
 """)
@@ -1109,39 +1124,52 @@ System --> Change Password""")
 
     def doRunModule(self, *prg, **popt):
         if not self.debug and self.loader:
-            try:
-                for mod in sys.modules:
-                    if mod.count(prg[0]):
-                        del(sys.modules[mod])
-                        gc.collect()
-            except:
-                pass
-        try:
-            rtn = popt.get("rtn", 0)
-            sql = Sql(self.dbm, ["ffield", "ctllog"], prog="ms0000")
-            if not sql.error:
-                chk = sql.getRec("ffield", where=[("ff_tabl", "=", "ctllog")])
-            if not sql.error and len(chk) == 8:
-                if not self.user:
-                    name = "admin"
-                else:
-                    name = self.user["name"]
+            # Remove the module, if changed since loaded, to re-import it
+            remove = False
+            for mod in list(sys.modules):
+                if not mod.count(prg[0]):
+                    continue
                 try:
-                    logd = [getpass.getuser(), name, prg[0], rtn]
+                    fle = sys.modules[mod].__file__
+                    if os.path.getmtime(fle) >= self.loaded[mod]:
+                        raise Exception("Changed")
                 except:
-                    logd = [name, name, prg[0], rtn]
-                if "conum" in popt:
-                    logd.append(popt["conum"])
-                else:
-                    logd.append(0)
-                if "period" in popt:
-                    logd.append(popt["period"][0])
-                else:
-                    logd.append(0)
-                logd.append(int(
-                    "%04i%02i%02i%02i%02i%02i" % time.localtime()[:-3]))
-                sql.insRec("ctllog", data=logd)
-                self.dbm.commitDbase()
+                    del sys.modules[mod]
+                    remove = True
+            if remove:
+                gc.collect()
+        try:
+            rtn = popt.get("rtn", 0)
+            if not self.user:
+                name = "admin"
+            else:
+                name = self.user["name"]
+            try:
+                logd = [getpass.getuser(), name, prg[0], rtn]
+            except:
+                logd = [name, name, prg[0], rtn]
+            if "conum" in popt:
+                logd.append(popt["conum"])
+            else:
+                logd.append(0)
+            if "period" in popt:
+                logd.append(popt["period"][0])
+            else:
+                logd.append(0)
+            logd.append(int(
+                "%04i%02i%02i%02i%02i%02i" % time.localtime()[:-3]))
+            # Record the launch in ctllog in the background
+            if self.logger and self.logger.rcdic is not self.dbm.rcdic:
+                self.logger.closeWriter()
+                self.logger = None
+            if not self.logger:
+                self.logger = LogWriter(self.dbm.rcdic)
+            self.logger.addLog(logd)
+            if not self.debug and self.loader and prg[0][:2] in pkgs:
+                # The time the module is imported, if not already imported
+                mod = "%s.%s" % (pkgs[prg[0][:2]], prg[0])
+                if mod not in sys.modules:
+                    self.loaded[mod] = time.time()
             runModule(prg[0], **popt)
         except Exception as err:
             if self.xdisplay:
@@ -1576,10 +1604,9 @@ System --> Change Password""")
                     raise Exception
             except:
                 csys = None
-            if self.zerobar:
-                TarBckRes(self.mf, mode="B", csys=csys, pbar=False)
-            else:
-                TarBckRes(self.mf, mode="B", csys=csys)
+            TarBckRes(self.mf, mode="B", csys=csys, pbar=not self.zerobar,
+                workers=self.workers, timing=self.workers > 1,
+                incr=self.incr)
         elif cf.flag == "no":
             if self.xdisplay:
                 scrn = self.mf.window
@@ -1592,7 +1619,8 @@ System --> Change Password""")
         cf = PwdConfirm(self.mf, conum=0, system="MST", code="TarRes",
             passwd=self.bpwd)
         if cf.flag == "ok":
-            TarBckRes(self.mf, mode="R", ver=self.cv[1])
+            TarBckRes(self.mf, mode="R", ver=self.cv[1],
+                workers=self.workers, timing=self.workers > 1)
 
     def tarCfg(self):
         cfg = TartanConfig(self.mf, rcdic=self.rcdic, level=self.lvl,
@@ -1713,6 +1741,8 @@ System --> Change Password""")
                     pass
 
     def doExit(self, dbm=True):
+        if self.logger:
+            self.logger.closeWriter()
         if dbm and self.dbm.dbopen:
             self.dbm.closeDbase()
         if self.debug:
@@ -1861,11 +1891,11 @@ if __name__ == "__main__":
             os.environ["UBUNTU_MENUPROXY"] = "0"
         # Load options
         opts, args = getopt.getopt(sys.argv[1:],
-            "ab:c:de:f:hiklmnoP:p:R:r:s:t:u:vxz", [
+            "ab:c:de:f:hIiklmnoP:p:R:r:s:t:u:vw:xz", [
             "altered", "bpwd=", "conum=", "debug", "exclude=", "finper=",
-            "help", "image", "loader", "nomail", "imods", "output", "pdf=",
+            "help", "image", "incremental", "loader", "nomail", "imods", "output", "pdf=",
             "program=", "rcfdir=", "rcfile=", "script=", "tcode=", "user=",
-            "version", "xdisplay", "zerobar"])
+            "version", "workers=", "xdisplay", "zerobar"])
         ms0000(opts, args)
     except Exception as err:
         print(err)
@@ -27,7 +27,7 @@ COPYING
 import time
 from TartanClasses import ASD, CCD, GetCtl, ProgressBar, PwdConfirm, Sql
 from TartanClasses import TartanDialog
-from tartanFunctions import getPeriods, copyList, doAutoAge, mthendDate
+from tartanFunctions import getPeriods, copyList, doBulkAge, mthendDate
 from tartanFunctions import showError
 from tartanWork import tabdic
 
@@ -469,6 +469,7 @@ Please select Control --> System Record Maintenance and change the Years to Keep
                     sql.delRec(tab[0], where=whrt)
             else:
                 recs = sql.getRec(tables=tab[3], where=whrm)
+                reage = []
                 for num, rec in enumerate(recs):
                     if "args" not in self.opts and not num % 10:
                         pb.displayProgress()
@@ -557,17 +558,14 @@ Please select Control --> System Record Maintenance and change the Years to Keep
                             "Brought Forward", "", "", self.opts["capnm"],
                             self.sysdtw, 0])
                         sql.insRec(tab[0], data=data)
-                        # Re-Age Transactions
-                        doAutoAge(self.opts["mf"].dbm, "crs", rec[0], rec[1])
+                        reage.append(rec[1])
                     elif tab[0] == "drstrn" and bals[0]:
                         data = rec[:3]
                         data.extend([3, "Bal-Fwd", "Bal-Fwd", edate, "",
                             bals[0], 0, ecurdt, "Brought Forward", "", "",
                             self.opts["capnm"], self.sysdtw, 0])
                         sql.insRec(tab[0], data=data)
-                        # Re-Age Transactions
-                        doAutoAge(self.opts["mf"].dbm, "drs", rec[0], rec[1],
-                            rec[2])
+                        reage.append((rec[1], rec[2]))
                     elif tab[0] == "gentrn" and bals[0]:
                         continue
                     elif tab[0] == "memtrn" and bals[0]:
@@ -576,8 +574,7 @@ Please select Control --> System Record Maintenance and change the Years to Keep
                             0, ecurdt, "", 0, "Brought Forward", "", "",
                             self.opts["capnm"], self.sysdtw, 0])
                         sql.insRec(tab[0], data=data)
-                        # Re-Age Transactions
-                        doAutoAge(self.opts["mf"].dbm, "mem", rec[0], rec[1])
+                        reage.append(rec[1])
                     elif tab[0] == "rcaowt" and bals[0]:
                         data = rec[:2]
                         data.extend([4, "Bal-Fwd", "Bal-Fwd", edate, bals[0],
@@ -621,6 +618,10 @@ Please select Control --> System Record Maintenance and change the Years to Keep
                                 "Brought Forward", 0, "", "", "", 0, "",
                                 self.opts["capnm"], self.sysdtw, 0])
                             sql.insRec(tab[0], data=data)
+                if reage:
+                    # Re-Age Transactions of all the accounts in one pass
+                    doBulkAge(self.opts["mf"].dbm, tab[0][:3],
+                        self.opts["conum"], accs=reage)
         if "args" not in self.opts:
             pb.closeProgress()
 
@@ -25,7 +25,8 @@ COPYING
 """
 
 import time
-from TartanClasses import ASD, DrawForm, GetCtl, ProgressBar, Sql, TartanDialog
+from TartanClasses import ASD, DrawForm, GetCtl, PrintBatch, ProgressBar, Sql
+from TartanClasses import TartanDialog
 from tartanFunctions import doPrinter, getModName, getSingleRecords, copyList
 from tartanFunctions import showError
 from tartanWork import rcmvtp, rctrtp
@@ -52,7 +53,8 @@ class rc3060(object):
                     wrkdir=self.opts["mf"].rcdic["wrkdir"])
                 self.doLoadStatic()
                 self.form.doNewDetail()
-                self.doProcess(rtn)
+                self.doProcess(rtn, next(self.doLoadData([(self.own,
+                    self.prm, self.acc)])))
                 if self.form.page and (self.repeml[1] == "N" or self.emadd):
                     self.repeml[2] = self.emadd
                     self.doPrint()
@@ -77,6 +79,7 @@ class rc3060(object):
             self.fromad = usr[0]
         else:
             self.fromad = rcactl["cte_emadd"]
+        self.batch = None
         t = time.localtime()
         self.sysdtw = (t[0] * 10000) + (t[1] * 100) + t[2]
         return True
@@ -166,22 +169,28 @@ class rc3060(object):
                 showError(self.opts["mf"].body, "Error",
                     "No Accounts Selected")
         if recs:
+            self.batch = PrintBatch(self.opts["mf"], self.opts["conum"])
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
+            tmc = self.sql.rcatnm_col
+            data = self.doLoadData([(rec[tmc.index("rtn_owner")],
+                rec[tmc.index("rtn_code")], rec[tmc.index("rtn_acno")])
+                for rec in recs])
             p = ProgressBar(self.opts["mf"].body, mxs=len(recs), esc=True)
             for num, rec in enumerate(recs):
                 p.displayProgress(num)
                 if p.quit:
                     break
-                self.doProcess(rec)
+                self.doProcess(rec, next(data))
             p.closeProgress()
             if p.quit or not self.form.page:
                 pass
             elif self.repeml[1] == "N" or self.emadd:
                 self.df.repeml[2] = self.emadd
                 self.doPrint()
+            self.batch.closeBatch()
         self.opts["mf"].closeLoop()
 
     def doLoadStatic(self):
@@ -199,17 +208,57 @@ class rc3060(object):
             self.form.letterhead(cmc, ctm, "letterhead", None)
         self.form.document_date(self.dated)
 
-    def doProcess(self, rtn):
+    def doLoadData(self, keys, size=100):
+        # Yields the contract, the totals, the premises and the transactions
+        # of each tenant, read with grouped queries for size tenants at a time
+        for beg in range(0, len(keys), size):
+            chunk = keys[beg:beg + size]
+            owns = list(set([key[0] for key in chunk]))
+            whr = [
+                ("rtu_cono", "=", self.opts["conum"]),
+                ("rtu_owner", "in", owns),
+                ("rtu_code", "in", list(set([key[1] for key in chunk]))),
+                ("rtu_acno", "in", list(set([key[2] for key in chunk]))),
+                ("rtu_trdt", "<=", self.datew)]
+            cons = {}
+            for rec in self.sql.getRec("rcacon", cols=["rcc_owner",
+                    "rcc_code", "rcc_acno", "rcc_cnum", "rcc_deposit",
+                    "rcc_status"], where=[("rcc_cono", "=",
+                    self.opts["conum"]), ("rcc_owner", "in", owns)],
+                    order="rcc_cnum"):
+                cons.setdefault(tuple(rec[:3]), []).append(rec[3:])
+            tots = {}
+            for rec in self.sql.getRec("rcatnt", cols=["rtu_owner",
+                    "rtu_code", "rtu_acno", "rtu_type", "rtu_mtyp",
+                    "round(sum(rtu_tramt), 2)"], where=whr,
+                    group="rtu_owner, rtu_code, rtu_acno, rtu_type, rtu_mtyp"):
+                tots.setdefault(tuple(rec[:3]), []).append(rec[3:])
+            prms = {}
+            for rec in self.sql.getRec("rcaprm", where=[("rcp_cono", "=",
+                    self.opts["conum"]), ("rcp_owner", "in", owns)]):
+                prms[(rec[1], rec[2])] = rec
+            trns = {}
+            for rec in self.sql.getRec("rcatnt", cols=["rtu_owner",
+                    "rtu_code", "rtu_acno", "rtu_trdt", "rtu_refno",
+                    "rtu_type", "rtu_desc", "rtu_cnum", "rtu_mtyp",
+                    "round(sum(rtu_tramt), 2)"], where=whr +
+                    [("rtu_type", "<>", 5)], group="rtu_owner, rtu_code, "\
+                    "rtu_acno, rtu_trdt, rtu_refno, rtu_type, rtu_desc, "\
+                    "rtu_cnum, rtu_mtyp", order="rtu_owner, rtu_code, "\
+                    "rtu_acno, rtu_trdt, rtu_cnum, rtu_refno"):
+                trns.setdefault(tuple(rec[:3]), []).append(rec[3:])
+            for key in chunk:
+                yield cons.get(key, []), tots.get(key, []), \
+                    prms.get(key[:2], []), trns.get(key, [])
+
+    def doProcess(self, rtn, data):
         tmc = self.sql.rcatnm_col
         tdc = self.form.sql.tpldet_col
         self.own = rtn[tmc.index("rtn_owner")]
         self.prm = rtn[tmc.index("rtn_code")]
         self.acc = rtn[tmc.index("rtn_acno")]
         eml = rtn[tmc.index("rtn_email")]
-        acc = self.sql.getRec("rcacon", cols=["rcc_cnum", "rcc_deposit",
-            "rcc_status"], where=[("rcc_cono", "=", self.opts["conum"]),
-            ("rcc_owner", "=", self.own), ("rcc_code", "=", self.prm),
-            ("rcc_acno", "=", self.acc)], order="rcc_cnum")
+        acc, tots, prm, rtt = data
         if acc:
             dps, dep, sta = acc[-1:][0]
         else:
@@ -220,11 +269,6 @@ class rc3060(object):
         else:
             dos = dep
         self.tots = [0.0, dep, 0.0, 0.0, 0.0, dep]
-        tots = self.sql.getRec("rcatnt", cols=["rtu_type", "rtu_mtyp",
-            "round(sum(rtu_tramt), 2)"], where=[("rtu_cono", "=",
-            self.opts["conum"]), ("rtu_owner", "=", self.own), ("rtu_code",
-            "=", self.prm), ("rtu_acno", "=", self.acc), ("rtu_trdt", "<=",
-            self.datew)], group="rtu_type, rtu_mtyp")
         self.dpp = 0.0
         for t in tots:
             if t[1] == 1:
@@ -252,19 +296,8 @@ class rc3060(object):
         if self.minus == "N" and not dos and self.tots[5] < 0:
             return
         prc = self.sql.rcaprm_col
-        prm = self.sql.getRec("rcaprm", where=[("rcp_cono", "=",
-            self.opts["conum"]), ("rcp_owner", "=", self.own), ("rcp_code",
-            "=", self.prm)], limit=1)
         ttc = ["rtu_trdt", "rtu_refno", "rtu_type", "rtu_desc", "rtu_cnum",
             "rtu_mtyp", "balance"]
-        rtt = self.sql.getRec("rcatnt", cols=["rtu_trdt",
-            "rtu_refno", "rtu_type", "rtu_desc", "rtu_cnum", "rtu_mtyp",
-            "round(sum(rtu_tramt), 2)"], where=[("rtu_cono", "=",
-            self.opts["conum"]), ("rtu_owner", "=", self.own), ("rtu_code",
-            "=", self.prm), ("rtu_acno", "=", self.acc), ("rtu_type", "<>", 5),
-            ("rtu_trdt", "<=", self.datew)], group="rtu_trdt, rtu_refno, "\
-            "rtu_type, rtu_desc, rtu_cnum, rtu_mtyp", order="rtu_trdt, "\
-            "rtu_cnum, rtu_refno")
         if not rtt:
             rtt = []
         if dos > 0:
@@ -337,10 +370,10 @@ class rc3060(object):
             head = "%s Statement at %s" % (self.opts["conam"], self.dated)
             doPrinter(mf=self.opts["mf"], conum=self.opts["conum"],
                 pdfnam=pdfnam, header=head, fromad=self.fromad,
-                repprt=self.repprt, repeml=self.repeml)
+                repprt=self.repprt, repeml=self.repeml, batch=self.batch)
         if self.repeml[1] == "Y":
             self.form = DrawForm(self.opts["mf"].dbm, self.tname,
-                wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                wrkdir=self.opts["mf"].rcdic["wrkdir"], batch=self.batch)
             self.doLoadStatic()
             self.form.doNewDetail()
 
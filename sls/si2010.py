@@ -26,7 +26,7 @@ COPYING
 
 import time
 from TartanClasses import AgeAll, ASD, Balances, CCD, GetCtl, PrintInvoice
-from TartanClasses import PwdConfirm, Sql, TartanDialog
+from TartanClasses import PwdConfirm, Sql, StrPrices, TartanDialog
 from tartanFunctions import callModule, copyList, getCost, getSell, getVatRate
 
 class si2010(object):
@@ -819,6 +819,8 @@ class si2010(object):
                 return "NoItems"
             self.recipe = []
             needpwd = False
+            prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+            prices.doLoad([(item[4], item[5], self.loc) for item in recipe])
             for item in recipe:
                 st1 = self.sql.getRec("strmf1", cols=["st1_type",
                     "st1_value_ind"], where=[("st1_cono", "=", item[0]),
@@ -827,8 +829,8 @@ class si2010(object):
                 if st1[0] == "X":
                     return "Redundant"
                 quant = item[6] * self.qty
-                icost, bal = getCost(self.sql, self.opts["conum"], item[4],
-                    item[5], loc=self.loc, qty=1, ind="I", bal=True)
+                icost, bal = prices.getCost(item[4], item[5], loc=self.loc,
+                    qty=1, ind="I", bal=True)
                 if st1[1] == "A" and quant > bal[0]:
                     needpwd = True
                 self.recipe.append([self.opts["conum"], self.typs, self.docno,
@@ -863,10 +865,12 @@ class si2010(object):
             recipe = self.sql.getRec("slsiv3", where=[("si3_cono", "=",
                 self.opts["conum"]), ("si3_rtn", "=", self.typs), ("si3_docno",
                 "=", self.docno), ("si3_line", "=", self.lineno)])
+            prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+            prices.doLoad([(item[4], item[5], self.loc) for item in recipe])
             for item in recipe:
                 quant = item[6] * self.qty
-                icost, tcost = getCost(self.sql, self.opts["conum"], item[4],
-                    item[5], loc=self.loc, qty=quant, ind="I", tot=True)
+                icost, tcost = prices.getCost(item[4], item[5], loc=self.loc,
+                    qty=quant, ind="I", tot=True)
                 self.tcost = float(ASD(self.tcost) + ASD(tcost))
             self.icost = round(self.tcost / self.qty, 2)
         elif atype == "S":
@@ -875,12 +879,14 @@ class si2010(object):
     def doRecChg(self):
         # Display recipe items and allow editing of quantities etc.
         data = []
+        prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+        prices.doLoad([(item[4], item[5], self.loc) for item in self.recipe])
         for num, item in enumerate(self.recipe):
             desc = self.sql.getRec("strmf1", cols=["st1_desc"],
                 where=[("st1_cono", "=", self.opts["conum"]), ("st1_group",
                 "=", item[4]), ("st1_code", "=", item[5])], limit=1)
-            icost, tcost = getCost(self.sql, self.opts["conum"], item[4],
-                item[5], loc=self.loc, qty=item[6], ind="I", tot=True)
+            icost, tcost = prices.getCost(item[4], item[5], loc=self.loc,
+                qty=item[6], ind="I", tot=True)
             data.append([num, item[4], item[5], desc[0], item[6], tcost])
         titl = "Recipe Items"
         head = ("Seq","Grp","Product-Code", "Description", "  Quantity",
@@ -1712,10 +1718,12 @@ class si2010(object):
                     "=", self.opts["conum"]), ("si3_rtn", "=", self.typs),
                     ("si3_docno", "=", self.othno), ("si3_line", "=",
                     self.oldline)])
+                prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+                prices.doLoad([(item[4], item[5], self.loc) for item in items])
                 for item in items:
                     quan = item[6] * qty
-                    icost = getCost(self.sql, self.opts["conum"], item[4],
-                        item[5], loc=self.loc, qty=1, ind="I")
+                    icost = prices.getCost(item[4], item[5], loc=self.loc,
+                        qty=1, ind="I")
                     cost = icost * quan
                     data = [self.opts["conum"], item[4], item[5], self.loc,
                         self.trdt, 6, self.othno, self.batch, ref2, quan, cost,
@@ -25,8 +25,9 @@ COPYING
 """
 
 import time
-from TartanClasses import CCD, GetCtl, MyFpdf, ProgressBar, Sql, TartanDialog
-from tartanFunctions import doWriteExport, getCost, getSell, getModName
+from TartanClasses import CCD, GetCtl, MyFpdf, ProgressBar, Sql, StrPrices
+from TartanClasses import TartanDialog
+from tartanFunctions import doWriteExport, getModName
 from tartanFunctions import getVatRate, doPrinter, showError
 
 class st3030(object):
@@ -170,7 +171,12 @@ class st3030(object):
         if not recs:
             showError(self.opts["mf"].body, "Processing Error",
                 "No Records Selected")
-        elif self.df.repprt[2] == "export":
+            self.closeProcess()
+            return
+        # Cost and selling prices of all the items
+        self.prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+        self.prices.doLoad([(rec[0], rec[1], self.loc) for rec in recs])
+        if self.df.repprt[2] == "export":
             self.exportReport(recs)
         elif self.rtype == "S":
             self.printSell(recs)
@@ -309,8 +315,8 @@ class st3030(object):
         desc = CCD(data[2], "UA", 30)
         uoi = CCD(data[3], "NA", 10)
         # Cost Prices and Balances
-        cst, bal = getCost(self.sql, self.opts["conum"], grp.work, code.work,
-            loc=self.loc, qty=1, ind="AL", bal=True)
+        cst, bal = self.prices.getCost(grp.work, code.work, loc=self.loc,
+            qty=1, ind="AL", bal=True)
         qty = CCD(bal[0], "SD", 12.2)
         if self.nostock == "Y" and qty.work == 0:
             return
@@ -328,8 +334,7 @@ class st3030(object):
                 rte = vatrte
         prcs = []
         for lev in self.levs:
-            prc = getSell(self.sql, self.opts["conum"], grp.work, code.work,
-                self.loc, lev)
+            prc = self.prices.getSell(grp.work, code.work, self.loc, lev)
             prcs.append(CCD(round((prc*((100 + rte)/100.0)),2), "UD", 9.2))
         if self.noprice == "Y":
             cont = False
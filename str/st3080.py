@@ -41,8 +41,8 @@ class st3080(object):
                 self.opts["mf"].startLoop()
 
     def setVariables(self):
-        self.sql = Sql(self.opts["mf"].dbm, ["strloc", "strgrp", "strmf1",
-            "strtrn"], prog=self.__class__.__name__)
+        self.sql = Sql(self.opts["mf"].dbm, ["strbal", "strloc", "strgrp",
+            "strmf1", "strtrn"], prog=self.__class__.__name__)
         if self.sql.error:
             return
         gc = GetCtl(self.opts["mf"])
@@ -252,14 +252,14 @@ class st3080(object):
         desc = CCD(data[2], "NA", 30)
         uoi = CCD(data[3], "NA", 10)
         whr = [
-            ("stt_cono", "=", self.opts["conum"]),
-            ("stt_group", "=", grp.work),
-            ("stt_code", "=", code.work)]
+            ("sbl_cono", "=", self.opts["conum"]),
+            ("sbl_group", "=", grp.work),
+            ("sbl_code", "=", code.work)]
         if self.loc:
-            whr.append(("stt_loc", "=", self.loc))
-        whr.append(("stt_curdt", "<=", self.curdt))
-        bal = self.sql.getRec("strtrn", cols=["round(sum(stt_qty), 2)",
-            "round(sum(stt_cost), 2)"], where=whr, limit=1)
+            whr.append(("sbl_loc", "=", self.loc))
+        whr.append(("sbl_curdt", "<=", self.curdt))
+        bal = self.sql.getRec("strbal", cols=["round(sum(sbl_qty), 2)",
+            "round(sum(sbl_cost), 2)"], where=whr, limit=1)
         if not bal[0]:
             bal[0] = 0
         if not bal[1]:
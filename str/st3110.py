@@ -26,8 +26,8 @@ COPYING
 
 import time
 from TartanClasses import ASD, CCD, GetCtl, TartanLabel, ProgressBar, Sql
-from TartanClasses import TartanDialog
-from tartanFunctions import getCost, getModName, doPrinter, getSell
+from TartanClasses import StrPrices, TartanDialog
+from tartanFunctions import getModName, doPrinter
 from tartanFunctions import getVatRate, showError
 from tartanWork import labels
 
@@ -206,6 +206,9 @@ class st3110(object):
         if not rec:
             showError(self.opts["mf"].body, "Error", "No Records Selected")
         else:
+            # Cost and selling prices of all the items
+            self.prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+            self.prices.doLoad([(dat[1], dat[2], dat[0]) for dat in rec])
             self.fpdf = TartanLabel(self.label, posY=self.srow, posX=self.scol)
             self.fpdf.add_page()
             p = ProgressBar(self.opts["mf"].body, mxs=len(rec), esc=True)
@@ -225,8 +228,8 @@ class st3110(object):
 
     def doProcess(self, dat):
         loc, group, code, desc, valind, vatcod = dat
-        icost, bal = getCost(self.sql, self.opts["conum"], group, code,
-            loc=loc, qty=1, ind="I", bal=True)
+        icost, bal = self.prices.getCost(group, code, loc=loc, qty=1, ind="I",
+            bal=True)
         if self.outs == "N" and not bal[0]:
             return
         if self.ccode:
@@ -241,7 +244,7 @@ class st3110(object):
         ####################################################################
         lab = "%s\n%s %s %s" % (lab, loc, group, code)
         lab = "%s\n%s\n" % (lab, desc)
-        prc = getSell(self.sql, self.opts["conum"], group, code, loc)
+        prc = self.prices.getSell(group, code, loc)
         price1 = CCD(prc, "UD", 9.2)
         vrte = getVatRate(self.sql, self.opts["conum"], vatcod, self.date)
         if vrte is None:
@@ -25,7 +25,8 @@ COPYING
 """
 
 import time
-from TartanClasses import FileImport, GetCtl, ProgressBar, Sql, TartanDialog
+from TartanClasses import FileImport, GetCtl, ProgressBar, Sql, StrPrices
+from TartanClasses import TartanDialog
 from tartanFunctions import askChoice, getCost, showError
 
 class st5020(object):
@@ -288,6 +289,9 @@ class st5020(object):
         fi = FileImport(self.opts["mf"], imptab="strvar", impskp=skp)
         sp = ProgressBar(self.opts["mf"].body,
             typ="Importing Stock Take", mxs=len(fi.impdat))
+        # Cost prices of all the items
+        prices = StrPrices(self.opts["mf"].dbm, self.opts["conum"])
+        prices.doLoad([(line[0], line[1], self.loc) for line in fi.impdat])
         err = None
         for num, line in enumerate(fi.impdat):
             sp.displayProgress(num)
@@ -302,14 +306,14 @@ class st5020(object):
             data.append(chk[self.sql.strmf2_col.index("st2_bin")])
             if self.costs == "N":
                 data.append(line[2])
-                data.append(getCost(self.sql, self.opts["conum"], line[0],
-                    line[1], loc=self.loc, ind="I"))
+                data.append(prices.getCost(line[0], line[1], loc=self.loc,
+                    ind="I"))
             else:
                 if line[3]:
                     data.append(line[3])
                 else:
-                    data.append(getCost(self.sql, self.opts["conum"], line[0],
-                        line[1], loc=self.loc, ind=self.costs))
+                    data.append(prices.getCost(line[0], line[1],
+                        loc=self.loc, ind=self.costs))
                 data.append(line[2])
             data.extend(["", 0, 0])
             whr = [("stv_cono", "=", data[0]), ("stv_group", "=", data[1]),
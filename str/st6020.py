@@ -46,8 +46,8 @@ class st6020(object):
                 self.opts["mf"].startLoop()
 
     def setVariables(self):
-        self.sql = Sql(self.opts["mf"].dbm, ["gentrn", "strloc", "strmf1",
-            "strmf2", "strtrn"], prog=self.__class__.__name__)
+        self.sql = Sql(self.opts["mf"].dbm, ["gentrn", "strbal", "strloc",
+            "strmf1", "strmf2", "strtrn"], prog=self.__class__.__name__)
         if self.sql.error:
             return
         gc = GetCtl(self.opts["mf"])
@@ -162,8 +162,8 @@ class st6020(object):
             txt = "Re-Valuation of Stock at Last Cost"
             if "args" not in self.opts:
                 p = ProgressBar(self.opts["mf"].body, mxs=len(recs), typ=txt)
-            obal = self.sql.getRec("strtrn", cols=["sum(stt_cost)"],
-                where=[("stt_cono", "=", self.opts["conum"]), ("stt_loc",
+            obal = self.sql.getRec("strbal", cols=["sum(sbl_cost)"],
+                where=[("sbl_cono", "=", self.opts["conum"]), ("sbl_loc",
                 "=", self.loc)], limit=1)[0]
             for num, rec in enumerate(recs):
                 if "args" not in self.opts:
@@ -173,8 +173,8 @@ class st6020(object):
                 self.doCurrent(rec)
             if "args" not in self.opts:
                 p.closeProgress()
-            cbal = self.sql.getRec("strtrn", cols=["sum(stt_cost)"],
-                where=[("stt_cono", "=", self.opts["conum"]), ("stt_loc",
+            cbal = self.sql.getRec("strbal", cols=["sum(sbl_cost)"],
+                where=[("sbl_cono", "=", self.opts["conum"]), ("sbl_loc",
                 "=", self.loc)], limit=1)[0]
             tval = float(ASD(cbal) - ASD(obal))
             if self.glint == "Y" and tval:
@@ -222,6 +222,7 @@ New Stock Balance:    %s\n""" % (CCD(obal, "SD", 12.2).disp,
             ("stt_code", "=", cod),
             ("stt_loc", "=", loc),
             ("stt_type", "in", (1, 3))]
+        upd = False
         for per in self.pers:
             w = whr[:]
             w.append(("stt_curdt", "<=", per))
@@ -236,6 +237,11 @@ New Stock Balance:    %s\n""" % (CCD(obal, "SD", 12.2).disp,
                 "stt_code = '%s' and stt_loc = '%s' and stt_type not in "\
                 "(1,3) and stt_curdt = %s" % (cst, self.opts["conum"], grp,
                 cod, loc, per))
+            upd = True
+        if upd:
+            # Rebuild the stores balances summary of the item
+            self.sql.getStrBal().doBuild(cono=self.opts["conum"], group=grp,
+                code=cod, loc=loc)
 
     def doCurrent(self, rec):
         bals = Balances(self.opts["mf"], "STR", self.opts["conum"],
@@ -40,10 +40,10 @@ COPYING
 import copy, sys, time
 sys.path.insert(0, "/home/paul/Tartan-6")
 from itertools import chain
-from TartanClasses import CCD, Dbase, DBCreate, ProgressBar, SplashScreen
-from TartanClasses import Sql
+from TartanClasses import Dbase, DBCreate, ProgressBar, SplashScreen
+from TartanClasses import Sql, StrBal, clearForms, getCCF
 from tartanFunctions import copyList, loadRcFile, showError
-from tartanWork import datdic, stdtpl, tabdic
+from tartanWork import datdic, srchdic, stdtpl, tabdic
 
 class tb1020(object):
     def __init__(self, **opts):
@@ -63,6 +63,8 @@ class tb1020(object):
             self.doProcessTables()
             if self.opts["cln"]:
                 self.doCleanDatabase()
+            self.doStrBal()
+            self.doSearch()
             if self.opts["ver"]:
                 sql = Sql(self.dbm, "verupd", error=False,
                     prog=self.__class__.__name__)
@@ -183,6 +185,7 @@ class tb1020(object):
                     self.sql.updRec("ffield", cols=["ff_type"], data=["d2"],
                     where=[("ff_tabl", "=", "gentrn"), ("ff_name", "=",
                     "glt_recon")])
+                    self.dbm.clearSchema()
             recs = False
             chk = self.doReadTables("idx")
             if not chk:
@@ -310,6 +313,7 @@ class tb1020(object):
                 ("ff_seq", "=", fld[1])], cols=["ff_desc", "ff_head"],
                 data=[fld[5], fld[6]])
         self.dbm.commitDbase()
+        self.dbm.clearSchema()
 
     def doNewTable(self):
         sql = Sql(self.dbm, self.table, error=False,
@@ -371,10 +375,10 @@ class tb1020(object):
                         new = old[olddic[nam][0]]
                     elif nam in olddic:
                         try:
-                            ccd = CCD(old[olddic[nam][0]], typ, siz)
-                            if ccd.err:
+                            new, disp, err = getCCF(typ, siz).format(
+                                old[olddic[nam][0]])
+                            if err:
                                 raise Exception
-                            new = ccd.work
                         except:
                             if typ[1].lower() in ("a", "x"):
                                 new = ""
@@ -601,6 +605,7 @@ class tb1020(object):
                 sql.insRec("tplmst", data=dat)
             for dat in datdic["tpldet"]:
                 sql.insRec("tpldet", data=dat)
+            clearForms()
         sql = Sql(self.dbm, ["wagtxa", "wagtxr"], error=False,
             prog=self.__class__.__name__)
         if not sql.error:
@@ -644,6 +649,26 @@ class tb1020(object):
             spl.closeSplash()
         self.dbm.commitDbase()
 
+    def doStrBal(self):
+        # Rebuild the stores balances summary from the stores transactions
+        if "strbal" not in self.tabs and "strtrn" not in self.tabs:
+            return
+        if not self.dbm.checkTable("strbal"):
+            return
+        StrBal(self.dbm).doBuild()
+        self.dbm.commitDbase()
+
+    def doSearch(self):
+        # Create the missing search indexes of the lookup tables
+        for table in srchdic:
+            if table not in self.tabs or not self.dbm.checkTable(table):
+                continue
+            if self.opts["mf"] and self.opts["mf"].window:
+                self.opts["mf"].updateStatus("Creating Search Index for %s" %
+                    table)
+            self.dbm.createSearch(table)
+        self.dbm.commitDbase()
+
     def doPopulate(self, sql, table, cono=None):
         if cono:
             recs = sql.getRec("ffield", cols=["ff_tabl", "ff_name"],
@@ -690,6 +715,7 @@ class tb1020(object):
             ("ffield", "ftable"))])
         self.sql.delRec("ftable", where=[("ft_tabl", "in",
             ("ffield", "ftable"))])
+        self.dbm.clearSchema()
         # Populate and Create Indexes
         for tab in ("ffield", "ftable"):
             self.dbm.populateTable(tab)
@@ -349,99 +349,176 @@ def dateDiff(date1, date2, ptype="years"):
         return int(months / 12)
 
 def doAutoAge(dbm, system, cono=None, chain=None, acno=None, pbar=None):
-    from TartanClasses import ASD, Sql
+    """
+    Re-age the transactions of an account by allocating the credits to the
+    debits, oldest first.
+
+    system - crs, drs or mem
+    cono   - The company number
+    chain  - The debtors chain store number
+    acno   - The account or member number
+    pbar   - A ProgressBar object
+    """
+    if system == "drs":
+        acc = (chain, acno)
+    else:
+        acc = acno
+    doBulkAge(dbm, system, cono, accs=[acc], pbar=pbar)
+
+def doBulkAge(dbm, system, cono, accs=None, pbar=None):
+    """
+    Re-age all the accounts, or a list of accounts, of a company in one pass.
+
+    system - crs, drs or mem
+    cono   - The company number
+    accs   - A list of account numbers, or (chain, acno) tuples for drs, else
+             None for all accounts
+    pbar   - A ProgressBar object
+
+    The transactions are read in account and date order and the credits are
+    allocated to the debits, oldest first, in cents with the ageing records
+    being written in batches.
+    """
+    from TartanClasses import Sql
     tab = "%strn" % system
     age = "%sage" % system
-    sql = Sql(dbm, [tab, age],  __name__)
-    col = getattr(sql, "%s_col" % tab)
+    sql = Sql(dbm, [tab, age], prog=__name__)
     if system == "crs":
         pfx = "crt"
-        sql.delRec(age, where=[("cra_cono", "=", cono),
-            ("cra_acno", "=", acno)])
-        whr = [
-            ("crt_cono", "=", cono),
-            ("crt_acno", "=", acno)]
+        key = ["crt_acno"]
+        ref = "crt_ref1"
+        akey = ["cra_cono", "cra_acno"]
     elif system == "drs":
         pfx = "drt"
-        sql.delRec(age, where=[("dra_cono", "=", cono),
-            ("dra_chain", "=", chain), ("dra_acno", "=", acno)])
-        whr = [
-            ("drt_cono", "=", cono),
-            ("drt_chain", "=", chain),
-            ("drt_acno", "=", acno)]
+        key = ["drt_chain", "drt_acno"]
+        ref = "drt_ref1"
+        akey = ["dra_cono", "dra_chain", "dra_acno"]
     else:
         pfx = "mlt"
-        sql.delRec(age, where=[("mta_cono", "=", cono),
-            ("mta_memno", "=", acno)])
-        whr = [
-            ("mlt_cono", "=", cono),
-            ("mlt_memno", "=", acno)]
-    crw = whr[:]
-    crw.append(("%s_tramt" % pfx, "<", 0))
-    drw = whr[:]
-    drw.append(("%s_tramt" % pfx, ">", 0))
-    tdt = "%s_trdt" % pfx
-    cdt = "%s_curdt" % pfx
-    amt = "%s_tramt" % pfx
-    cr = sql.getRec(tab, where=crw, order=tdt)     # Credit transactions
-    if cr:
-        dr = sql.getRec(tab, where=drw, order=tdt) # Debit transactions
-        if dr:
-            for cno, ctr in enumerate(cr):         # For each credit transaction
-                if pbar:
-                    pbar.displayProgress()
-                ccdt = ctr[col.index(cdt)]         # Current period
-                cbal = ctr[col.index(amt)]         # Credit amount
-                camt = cbal                        # Amount to allocate
-                for dno, dtr in enumerate(dr):     # For each debit transaction
-                    dcdt = dtr[col.index(cdt)]     # Current period
-                    dbal = dtr[col.index(amt)]     # Debit amount
-                    if not dbal:
-                        continue
-                    damt = float(ASD(dbal) + ASD(camt))
-                    if damt < 0:
-                        camt = damt
-                        damt = 0.00
-                    else:
-                        camt = 0.00
-                    diff = float(ASD(dbal) - ASD(damt))
-                    dr[dno][col.index(amt)] = damt
-                    if diff:
-                        data = [cono]
-                        if system == "drs":
-                            data.append(chain)
-                        data.append(acno)
-                        data.append(dtr[col.index("%s_type" % pfx)])
-                        if system == "mem":
-                            data.append(dtr[col.index("%s_refno" % pfx)])
-                        else:
-                            data.append(dtr[col.index("%s_ref1" % pfx)])
-                        if ccdt < dcdt:
-                            data.append(dcdt)
-                        else:
-                            data.append(ccdt)
-                        data.append(ctr[col.index("%s_type" % pfx)])
-                        data.append(ctr[col.index("%s_ref1" % pfx)])
-                        data.extend([diff, 0])
-                        sql.insRec(age, data=data, dofmt=False)
-                    if not camt:
-                        break
-                diff = float(ASD(cbal) - ASD(camt))
-                if diff:
-                    data = [cono]
-                    if system == "drs":
-                        data.append(chain)
-                    data.append(acno)
-                    data.append(ctr[col.index("%s_type" % pfx)])
-                    if system == "mem":
-                        data.append(ctr[col.index("%s_refno" % pfx)])
-                    else:
-                        data.append(ctr[col.index("%s_ref1" % pfx)])
-                    data.append(ccdt)
-                    data.append(ctr[col.index("%s_type" % pfx)])
-                    data.append(ctr[col.index("%s_ref1" % pfx)])
-                    data.extend([diff, 0])
-                    sql.insRec(age, data=data, dofmt=False)
+        key = ["mlt_memno"]
+        ref = "mlt_refno"
+        akey = ["mta_cono", "mta_memno"]
+    # Delete the existing ageing records
+    if accs is None:
+        sql.delRec(age, where=[(akey[0], "=", cono)])
+    else:
+        chns = {}
+        for acc in accs:
+            if system == "drs":
+                chns.setdefault(acc[0], []).append(acc[1])
+            else:
+                chns.setdefault(None, []).append(acc)
+        for chn in chns:
+            lst = chns[chn]
+            for x in range(0, len(lst), 500):
+                whr = [(akey[0], "=", cono)]
+                if system == "drs":
+                    whr.append((akey[1], "=", chn))
+                whr.append((akey[-1], "in", tuple(lst[x:x + 500])))
+                sql.delRec(age, where=whr)
+        if system == "drs":
+            accs = set([tuple(acc) for acc in accs])
+        else:
+            accs = set(accs)
+    # Stream the transactions in account and date order
+    cols = key + ["%s_type" % pfx, ref, "%s_curdt" % pfx, "%s_tramt" % pfx]
+    whr = [("%s_cono" % pfx, "=", cono), ("%s_tramt" % pfx, "<>", 0)]
+    if accs is not None and len(accs) == 1:
+        # Single account
+        acc = list(accs)[0]
+        if system != "drs":
+            acc = (acc,)
+        for k, v in zip(key, acc):
+            whr.append((k, "=", v))
+    odr = "%s, %s_trdt, %s_seq" % (", ".join(key), pfx, pfx)
+    sql.getRec(tab, cols=cols, where=whr, order=odr, fetch=True)
+    nkey = len(key)
+    rows = []
+    last = None
+    crs = []
+    drs = []
+    def doAccount():
+        if pbar:
+            pbar.displayProgress()
+        for dat in ageAllocate(crs, drs):
+            row = [cono]
+            row.extend(last)
+            row.extend(dat[:5])
+            row.extend([round(dat[5] / 100.0, 2), 0])
+            rows.append(row)
+    while True:
+        recs = sql.sqlRec(fetch=True, limit=5000)
+        if not recs:
+            break
+        for rec in recs:
+            acc = tuple(rec[:nkey])
+            if accs is not None:
+                if system == "drs" and acc not in accs:
+                    continue
+                if system != "drs" and acc[0] not in accs:
+                    continue
+            if acc != last:
+                if last is not None:
+                    doAccount()
+                last = acc
+                crs = []
+                drs = []
+            amt = int(round(rec[-1] * 100, 0))
+            if amt < 0:
+                crs.append([rec[nkey], rec[nkey + 1], rec[nkey + 2], amt])
+            else:
+                drs.append([rec[nkey], rec[nkey + 1], rec[nkey + 2], amt])
+    if last is not None:
+        doAccount()
+    if rows:
+        sql.insRec(age, data=rows)
+
+def ageAllocate(crs, drs):
+    """
+    Allocate credits to debits, oldest first, returning the ageing records.
+
+    crs - A list of credits, in date order, of [type, ref, curdt, cents]
+    drs - A list of debits, in date order, of [type, ref, curdt, cents]
+
+    Returns a list of (type, ref, curdt, atyp, aref, cents) where the credit
+    records the total allocated and each debit the amount allocated to it.
+    The cents in drs are reduced by the amounts allocated.
+    """
+    ages = []
+    if not crs or not drs:
+        return ages
+    pos = 0
+    for ctyp, cref, ccdt, cbal in crs:
+        camt = cbal
+        num = pos
+        while num < len(drs):
+            dtr = drs[num]
+            num += 1
+            dbal = dtr[3]
+            if not dbal:
+                continue
+            damt = dbal + camt
+            if damt < 0:
+                camt = damt
+                damt = 0
+            else:
+                camt = 0
+            dtr[3] = damt
+            if dbal - damt:
+                if ccdt < dtr[2]:
+                    ages.append((dtr[0], dtr[1], dtr[2], ctyp, cref,
+                        dbal - damt))
+                else:
+                    ages.append((dtr[0], dtr[1], ccdt, ctyp, cref,
+                        dbal - damt))
+            if not camt:
+                break
+        # Skip the fully allocated debits
+        while pos < len(drs) and not drs[pos][3]:
+            pos += 1
+        if cbal - camt:
+            ages.append((ctyp, cref, ccdt, ctyp, cref, cbal - camt))
+    return ages
 
 def doChkCatChg(mf, cono, memno, nxtdt):
     from TartanClasses import Sql
@@ -641,7 +718,7 @@ def doDrawTable(fpdf, rr, ppad=1, spad=1, cw=None, ld=None, font=True):
                     fpdf.rect(xx, yy, r[2] * cw, r[3] * ld, style=style)
     return last, table
 
-def doPrinter(mf=None, conum=None, pdfnam=None, splash=True, header=None, repprt=None, repeml=None, fromad=None, attach=None, skip=False):
+def doPrinter(mf=None, conum=None, pdfnam=None, splash=True, header=None, repprt=None, repeml=None, fromad=None, attach=None, skip=False, batch=None):
     """
     This module Views or Prints and/or Mails a Report
 
@@ -667,25 +744,41 @@ def doPrinter(mf=None, conum=None, pdfnam=None, splash=True, header=None, repprt
      fromad = The from address if not the default system or company one.
      attach = A list of attachments
      skip   = Skip mail errors
+     batch  = A PrintBatch object when printing and/or emailing many
+              documents, in which case the mail server details are those of
+              the batch, its mail session is reused and the emllog records
+              are written when the batch is closed and, if the document is
+              still being rendered by the batch, it is printed and/or
+              emailed by the batch once it has been rendered
      """
     import os, subprocess, time
     from TartanClasses import Dbase, ViewPDF, SplashScreen, Sql
 
+    if batch and batch.holdPrint(mf=mf, conum=conum, pdfnam=pdfnam,
+            splash=splash, header=header, repprt=repprt, repeml=repeml,
+            fromad=fromad, attach=attach, skip=skip):
+        return
     # Email Document
     sp = None
     subj = None
     if repeml and repeml[1] == "Y" and repeml[2]:
         try:
-            dbm = Dbase(mf.rcdic)
-            if dbm.err:
-                raise Exception("Database Error")
-            dbm.openDbase()
-            sql = Sql(dbm, tables=["ctlsys", "ctlmst", "emllog"])
-            if not conum:
-                conum = 1
-            smtp = sql.getRec(tables=["ctlmst", "ctlsys"], cols=["sys_msvr",
-                "sys_mprt", "sys_msec", "sys_maut", "sys_mnam", "sys_mpwd",
-                "ctm_email"], where=[("ctm_cono", "=", conum)], limit=1)
+            if batch:
+                smtp = batch.smtp
+            else:
+                dbm = Dbase(mf.rcdic)
+                if dbm.err:
+                    raise Exception("Database Error")
+                dbm.openDbase()
+                sql = Sql(dbm, tables=["ctlsys", "ctlmst", "emllog"])
+                if not conum:
+                    conum = 1
+                smtp = sql.getRec(tables=["ctlmst", "ctlsys"],
+                    cols=["sys_msvr", "sys_mprt", "sys_msec", "sys_maut",
+                    "sys_mnam", "sys_mpwd", "ctm_email"], where=[("ctm_cono",
+                    "=", conum)], limit=1)
+            if not smtp:
+                raise Exception("Missing Mail Server Details")
             if not fromad:
                 fromad = smtp[6]
             if type(repeml[2]) == str:
@@ -736,8 +829,11 @@ def doPrinter(mf=None, conum=None, pdfnam=None, splash=True, header=None, repprt
                         sp = SplashScreen(mf.window.focus_displayof(),
                             "E-Mailing the Report to:\n\n%s\n\nPlease Wait.." %
                             eml)
-                    err = sendMail(smtp[0:6], fromad, eml, subj, mess,
-                        attach=att, wrkdir=mf.rcdic["wrkdir"])
+                    if batch:
+                        err = batch.sendMail(fromad, eml, subj, mess, att)
+                    else:
+                        err = sendMail(smtp[0:6], fromad, eml, subj, mess,
+                            attach=att, wrkdir=mf.rcdic["wrkdir"])
                     if splash:
                         sp.closeSplash()
                     if err:
@@ -756,6 +852,9 @@ def doPrinter(mf=None, conum=None, pdfnam=None, splash=True, header=None, repprt
                                 ok = "FAILED"
                     else:
                         ok = "OK"
+                    if ok and batch:
+                        batch.addLog(fromad, eml, subj, ok)
+                        break
                     if ok:
                         try:
                             sql.insRec("emllog", data=[fromad.strip(), eml,
@@ -767,11 +866,12 @@ def doPrinter(mf=None, conum=None, pdfnam=None, splash=True, header=None, repprt
         except Exception as err:
             showException(mf.window.focus_displayof(), mf.rcdic["wrkdir"],
                 "E-Mail Error\n\n%s" % err)
-        try:
-            dbm.commitDbase()
-            dbm.closeDbase()
-        except:
-            pass
+        if not batch:
+            try:
+                dbm.commitDbase()
+                dbm.closeDbase()
+            except:
+                pass
         if repeml[4].lower() == "n":
             return
     if repprt is None:
@@ -909,6 +1009,8 @@ def doWriteExport(**args):
                         "ULINES" - A sigle underline - skip
                         "TOTAL"  - A total line of columns of data
                     List of values
+                 The datas can also be any iterable of the above e.g. a
+                 RowSpool, the rows are then read once, in order.
         ctots  - A list of TOTAL columns to sum using the SUBTOTAL function
         rcdic  - The tartanrc dictionary
         view   - Whether to view the report
@@ -1156,7 +1258,10 @@ def doWriteExport(**args):
         book = Workbook()
         del book["Sheet"]
         page = 1
-        if args["datas"][0][0] != "PAGE":
+        # Pair each row with the next row to check for underlines
+        datas = iter(args["datas"])
+        nxt = next(datas, None)
+        if not nxt or nxt[0] != "PAGE":
             sheet, rowx = createSheet(book, fmt, page)
             page += 1
         # Generate the body
@@ -1167,7 +1272,9 @@ def doWriteExport(**args):
                 if type(tot) in (list, tuple):
                     stot[tot[0]]
                 stot[tot] = []
-        for num, row in enumerate(args["datas"]):
+        while nxt is not None:
+            row = nxt
+            nxt = next(datas, None)
             if row[0] == "PAGE":
                 args["heads"] = row[1][0]
                 args["colsh"] = row[1][1]
@@ -1191,11 +1298,10 @@ def doWriteExport(**args):
                 continue
             # Check if next line is an underline
             unl = False
-            chk = num + 1
-            if chk != len(args["datas"]):
-                if args["datas"][chk][0] == "ULINES":
+            if nxt is not None:
+                if nxt[0] == "ULINES":
                     unl = "s"
-                elif args["datas"][chk][0] == "ULINED":
+                elif nxt[0] == "ULINED":
                     unl = "d"
             # Write columns
             for colx, valx in enumerate(row[1]):
@@ -1782,24 +1888,15 @@ def getGreens(text, needed, keep=None):
     return greens, first, endrks, None
 
 def getImage(name, siz=None, fle=None):
-    import base64, io
-    from TartanClasses import Image, ImageTk
-    from tartanImages import aliases, images
-    stk = name.lower().split()[0]
-    if stk.count("/"):
-        stk = stk.split("/")[0]
-    if stk not in images and stk not in aliases:
-        return
-    if stk in aliases:
-        stk = aliases[stk]
-    dec = io.BytesIO(base64.b64decode(images[stk]))
-    img = Image.open(dec)
-    if siz is not None:
-        img = img.resize(siz, 0)
+    from TartanClasses import ImageTk
     if fle:
-        img.save(fle)
-    else:
-        return ImageTk.PhotoImage(img.convert(mode="RGBA"))
+        img = loadImage(name, siz)
+        if img is not None:
+            img.save(fle)
+        return
+    img = loadImage(name, siz, "RGBA")
+    if img is not None:
+        return ImageTk.PhotoImage(img)
 
 def getManager(widget):
     # Window Manager
@@ -2171,7 +2268,7 @@ def getSingleRecords(mf, table, cols, title=None, head=None, where=None, group=N
             sel.append(recs[idx])
     return sel
 
-def getTrn(dbm, sys, cdt=None, jon=None, whr=None, odr=None, neg=True, zer="Y", lim=None):
+def getTrn(dbm, sys, cdt=None, jon=None, whr=None, odr=None, neg=True, zer="Y", lim=None, itr=False):
     """
     This function returns a list of column names and a list of lists of data.
 
@@ -2186,8 +2283,10 @@ def getTrn(dbm, sys, cdt=None, jon=None, whr=None, odr=None, neg=True, zer="Y",
     neg = True or False to include or exclude negative transaction balances
     zer = Y, A, N to include or exclude zero transaction balances
     lim = The number of records to return, defaults to all
+    itr = True to return a generator, instead of a list, which yields the
+          records lazily as they are read, neg is then ignored
     """
-    from TartanClasses import ASD, Sql
+    from TartanClasses import ACC, ASD, Sql
     if sys == "crs":
         tab = ["crstrn", "crsage"]
         sql = Sql(dbm, tab, prog=__name__)
@@ -2239,69 +2338,87 @@ def getTrn(dbm, sys, cdt=None, jon=None, whr=None, odr=None, neg=True, zer="Y",
         grp = "%s%s, " % (grp, c)
     grp = grp[:-2]
     if sys == "crs":
+        key = col[:4]
+        aft = "join crsage on cra_cono=crt_cono and cra_acno=crt_acno and "\
+            "cra_atyp=crt_type and cra_aref=crt_ref1 and cra_curdt > %s"
         col.append("max(cra_curdt)")
         col.append("sum(cra_amnt)")
         if not odr:
             odr = "crt_trdt, crt_type, crt_ref1"
+        amt = col.index("crt_tramt")
     elif sys == "drs":
+        key = col[:5]
+        aft = "join drsage on dra_cono=drt_cono and dra_chain=drt_chain and "\
+            "dra_acno=drt_acno and dra_atyp=drt_type and dra_aref=drt_ref1 "\
+            "and dra_curdt > %s"
         col.append("max(dra_curdt)")
         col.append("sum(dra_amnt)")
         if not odr:
             odr = "drt_trdt, drt_type, drt_ref1"
+        amt = col.index("drt_tramt")
     else:
+        key = col[:4]
+        aft = "join memage on mta_cono=mlt_cono and mta_memno=mlt_memno and "\
+            "mta_atyp=mlt_type and mta_aref=mlt_refno and mta_curdt > %s"
         col.append("max(mta_curdt)")
         col.append("sum(mta_amnt)")
         if not odr:
             odr = "mlt_trdt, mlt_type, mlt_refno"
-    recs = sql.getRec(tab[0], join=join, cols=col, where=whr, group=grp,
-        order=odr, limit=lim)
-    col[-2] = "curdt"
-    col[-1] = "paid"
-    col.append("balance")
+        amt = col.index("mlt_tramt")
+    mor = {}
+    if cdt:
+        # Allocations made after the cut-off period, grouped by transaction
+        for rec in sql.getRec(tab[0], join=aft % cdt, cols=key + [col[-1]],
+                where=whr, group=", ".join(key)):
+            if rec[-1]:
+                mor[tuple(rec[:-1])] = rec[-1]
+    if itr:
+        recs = sql.iterRec(tab[0], join=join, cols=col, where=whr, group=grp,
+            order=odr)
+    else:
+        recs = sql.getRec(tab[0], join=join, cols=col, where=whr, group=grp,
+            order=odr, limit=lim)
+    col = col[:-2] + ["curdt", "paid", "balance"]
+    cur = len(col) - 3
+    siz = len(key)
+
+    def getBalance(rec):
+        if rec[cur] is None:
+            rec[cur] = 0
+        pay = rec[cur + 1]
+        if pay is None:
+            pay = 0.0
+        if mor and tuple(rec[:siz]) in mor:
+            pay = float(ASD(pay) + ASD(mor[tuple(rec[:siz])]))
+        rec[cur + 1] = pay
+        bal = float(ASD(rec[amt]) - ASD(pay))
+        rec.append(bal)
+        return bal
+
+    def getRows(recs):
+        for num, rec in enumerate(recs):
+            if lim and num == lim:
+                break
+            bal = getBalance(rec)
+            if bal or zer == "A":
+                yield rec
+            elif zer == "Y" and (not cdt or rec[cur] >= cdt):
+                yield rec
+
+    if itr:
+        return col, getRows(recs)
     dat = []
     if recs and lim == 1:
         recs = [recs]
-    tot = 0
+    tot = ACC()
     for rec in recs:
-        if sys == "crs":
-            amt = rec[col.index("crt_tramt")]
-        elif sys == "drs":
-            amt = rec[col.index("drt_tramt")]
-        else:
-            amt = rec[col.index("mlt_tramt")]
-        if rec[col.index("curdt")] is None:
-            rec[col.index("curdt")] = 0
-        pay = rec[col.index("paid")]
-        if pay is None:
-            pay = 0.0
-        if cdt:
-            if sys == "crs":
-                ccc = ["sum(cra_amnt)"]
-                whr = [("cra_cono", "=", rec[0]), ("cra_acno", "=", rec[1]),
-                    ("cra_atyp", "=", rec[2]), ("cra_aref", "=", rec[3]),
-                    ("cra_curdt", ">", cdt)]
-            elif cdt and sys == "drs":
-                ccc = ["sum(dra_amnt)"]
-                whr = [("dra_cono", "=", rec[0]), ("dra_chain", "=", rec[1]),
-                    ("dra_acno", "=", rec[2]), ("dra_atyp", "=", rec[3]),
-                    ("dra_aref", "=", rec[4]), ("dra_curdt", ">", cdt)]
-            elif cdt:
-                ccc = ["sum(mta_amnt)"]
-                whr = [("mta_cono", "=", rec[0]), ("mta_memno", "=", rec[1]),
-                    ("mta_atyp", "=", rec[2]), ("mta_aref", "=", rec[3]),
-                    ("mta_curdt", ">", cdt)]
-            mor = sql.getRec(tab[1], cols=ccc, where=whr, limit=1)
-            if mor[0]:
-                pay = float(ASD(pay) + ASD(mor[0]))
-        rec[col.index("paid")] = pay
-        bal = float(ASD(amt) - ASD(pay))
-        tot = float(ASD(tot) + ASD(bal))
-        rec.append(bal)
+        bal = getBalance(rec)
+        tot.add(bal)
         if bal or zer == "A":
             dat.append(rec)
-        elif zer == "Y" and (not cdt or rec[col.index("curdt")] >= cdt):
+        elif zer == "Y" and (not cdt or rec[cur] >= cdt):
             dat.append(rec)
-    if not neg and tot < 0:
+    if not neg and float(tot) < 0:
         return col, []
     return col, dat
 
@@ -2375,6 +2492,39 @@ def httpDownload(url, dest=None, check=False):
     except:
         return
 
+def loadImage(name, siz=None, mode=None):
+    """
+    Return the PIL image of the stock image name, resized to siz and
+    converted to mode, or None if there is no such image. The images are
+    decoded once and kept for the life of the process, in loadImage.cache,
+    as the same images are used over and over by buttons and menus.
+    """
+    import base64, io
+    from TartanClasses import Image
+    from tartanImages import aliases, images
+    stk = name.lower().split()[0]
+    if stk.count("/"):
+        stk = stk.split("/")[0]
+    if stk not in images and stk not in aliases:
+        return
+    if stk in aliases:
+        stk = aliases[stk]
+    if siz is not None:
+        siz = tuple(siz)
+    key = (stk, siz, mode)
+    if key not in loadImage.cache:
+        if mode is not None:
+            img = loadImage(stk, siz).convert(mode=mode)
+        else:
+            img = Image.open(io.BytesIO(base64.b64decode(images[stk])))
+            if siz is not None:
+                img = img.resize(siz, 0)
+            img.load()
+        loadImage.cache[key] = img
+    return loadImage.cache[key]
+
+loadImage.cache = {}
+
 def loadRcFile(rcfile=None, default=False):
     """
     Function to load a tartanrc file and return a dictionary.
@@ -2426,6 +2576,7 @@ def loadRcFile(rcfile=None, default=False):
         "errs": ["Y"],
         "wrkf": ["D"],
         "wrka": ["N"],
+        "rwk": [1],
         "mft": ["DejaVu Sans", "Helvetica"],
         "mfs": [0],
         "dft": ["DejaVu Sans Mono", "Courier New"],
@@ -2497,7 +2648,7 @@ def loadRcFile(rcfile=None, default=False):
                 rcdic[o] = opts[o][0]
             else:
                 rcdic[o] = opts[o][1]
-        if o in ("dfs", "mfs"):
+        if o in ("dfs", "mfs", "rwk"):
             rcdic[o] = int(rcdic[o])
         if o == "acnf" and rcdic[o].lower() == "y":
             rcdic["acnf"] = "L"
@@ -2854,8 +3005,68 @@ def sendMail(server, ex, to, subj, mess="", attach=None, embed=None, check=False
         local   = The local hostname as fqdn.
         lnkurl  = An http link to add to the embedded attachments
         wrkdir  = The work directory, defaults to "."
+
+    To send many messages over the same connection use MailQueue.
     """
-    import mimetypes, os, smtplib
+    try:
+        smtp = getMailServer(server, timeout=timeout, local=local)
+        if check:
+            smtp.quit()
+            return
+    except Exception as err:
+        if not check:
+            showException(None, wrkdir, "Mail Server (%s %s) "\
+                "Invalid or Unavailable\n\n%s" % (server[0], server[1], err))
+        return err
+    try:
+        to, msg = getMailMessage(ex, to, subj, mess=mess, attach=attach,
+            embed=embed, lnkurl=lnkurl)
+        smtp.sendmail(ex, to, msg)
+        smtp.quit()
+        return
+    except Exception as err:
+        try:
+            smtp.quit()
+        except:
+            pass
+        return err
+
+def getMailServer(server, timeout=30, local=None):
+    """
+    Returns a connected, and if required authenticated, smtp session.
+
+        server  = A list of the smtp server details i.e.
+                    [host, port, security, auth, username, password]
+        timeout = The number of seconds before timing out defaulting to 30.
+        local   = The local hostname as fqdn.
+    """
+    import smtplib
+
+    host, port, secu, auth, unam, upwd = server
+    try:
+        upwd = b64Convert("decode", upwd)
+    except:
+        pass
+    if secu and int(secu) == 2:
+        smtp = smtplib.SMTP_SSL(host, port, local, timeout=timeout)
+    else:
+        smtp = smtplib.SMTP(host, port, local, timeout=timeout)
+    try:
+        if secu and int(secu) == 1:
+            smtp.starttls()
+        if auth:
+            smtp.login(unam, upwd)
+    except:
+        smtp.close()
+        raise
+    return smtp
+
+def getMailMessage(ex, to, subj, mess="", attach=None, embed=None, lnkurl=None):
+    """
+    Returns the list of recipients and the message, as a string, as used by
+    sendMail, see sendMail for the arguments.
+    """
+    import mimetypes, os
     try:
         from email import encoders as Encoders
         from email.mime.base import MIMEBase
@@ -2883,28 +3094,6 @@ def sendMail(server, ex, to, subj, mess="", attach=None, embed=None, check=False
                 subj = "%s %s" % (subj, word[0].upper() + word[1:].lower())
         return subj
 
-    host, port, secu, auth, unam, upwd = server
-    try:
-        upwd = b64Convert("decode", upwd)
-    except:
-        pass
-    try:
-        if secu and int(secu) == 2:
-            smtp = smtplib.SMTP_SSL(host, port, local, timeout=timeout)
-        else:
-            smtp = smtplib.SMTP(host, port, local, timeout=timeout)
-        if secu and int(secu) == 1:
-            smtp.starttls()
-        if auth:
-            smtp.login(unam, upwd)
-        if check:
-            smtp.quit()
-            return
-    except Exception as err:
-        if not check:
-            showException(None, wrkdir, "Mail Server (%s %s) "\
-                "Invalid or Unavailable\n\n%s" % (host, port, err))
-        return err
     if type(to) == str:
         to = [to]
     if attach is None:
@@ -2985,16 +3174,7 @@ def sendMail(server, ex, to, subj, mess="", attach=None, embed=None, check=False
                 part.add_header("Content-Disposition",
                     'attachment; filename="%s"' % os.path.basename(flenam))
                 msgRoot.attach(part)
-    try:
-        smtp.sendmail(ex, to, msgRoot.as_string())
-        smtp.quit()
-        return
-    except Exception as err:
-        try:
-            smtp.quit()
-        except:
-            pass
-        return err
+    return to, msgRoot.as_string()
 
 def showDialog(screen, dtype, title, mess, butt=None, dflt=None):
     try:
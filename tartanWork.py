@@ -3398,6 +3398,22 @@ tabdic = {
         "idx": [
             ["Sales Recipe Transactions", 1, "U", "si3_seq"],
             ["", 2, "N", "si3_cono", "si3_rtn", "si3_docno", "si3_line"]]},
+    "strbal": {
+        "fld": [
+            [0, "sbl_cono", "UI", 3.0, "Company Number", "Coy"],
+            [1, "sbl_group", "UA", 3.0, "Product Group", "Grp"],
+            [2, "sbl_code", "NA", 20.0, "Product Code", "Product-Code"],
+            [3, "sbl_loc", "UA", 1.0, "Location", "L"],
+            [4, "sbl_curdt", "D2", 7.0, "Current Date", "Curr-Dt"],
+            [5, "sbl_type", "UI", 2.0, "Transaction Type", "TT"],
+            [6, "sbl_qty", "SD", 15.2, "Quantity", "Quantity"],
+            [7, "sbl_cost", "SD", 15.2, "Cost Value", "Cost-Value"],
+            [8, "sbl_sell", "SD", 15.2, "Sale Value", "Sale-Value"],
+            [9, "sbl_trns", "UI", 7.0, "Transactions", "Trans"]],
+        "idx": [
+            ["Stores Balances", 1, "U", "sbl_cono", "sbl_group", "sbl_code",
+                "sbl_loc", "sbl_curdt", "sbl_type"],
+            ["", 2, "N", "sbl_cono", "sbl_loc", "sbl_curdt"]]},
     "strcmu": {
         "fld": [
             [0, "smc_cono", "UI", 3.0, "Company Number", "Coy"],
@@ -3993,6 +4009,13 @@ tabdic = {
             [4, "wtr_rate", "UD", 5.2, "Rate", "Rate"]],
         "idx": [
             ["PAYE Rates", 1, "U", "wtr_year", "wtr_from"]]}}
+# Columns of the Search Indexes of the Lookup Tables
+srchdic = {
+    "crsmst": ["crm_acno", "crm_name"],
+    "drsmst": ["drm_acno", "drm_name"],
+    "genmst": ["glm_desc"],
+    "memmst": ["mlm_surname", "mlm_names"],
+    "strmf1": ["st1_code", "st1_desc"]}
 # Standard Menu
 """
 Module Types
@@ -0,0 +1,1864 @@
+"""
+SYNOPSIS
+    Micro-benchmarks for the database and ledger routines.
+
+    This file is part of Tartan Systems (TARTAN).
+
+    CLI Usage: python benchmark.py [options]
+
+    -b [test]   = The benchmark to run, defaults to all
+    -n [number] = The number of iterations or rows, defaults per benchmark
+    -r [file]   = tartanrc file of an existing database to use, if not
+                  supplied a scratch SQLite database is created
+
+    Benchmarks
+    ----------
+    getrec      = Sql.getRec throughput without and with the compiled
+                  query cache
+    autoage     = Re-ageing a debtors ledger per account, as doAutoAge did,
+                  against doBulkAge, verifying that the results are identical
+    statement   = Reading the balances and transactions of an aged debtors
+                  ledger for statements per account, with doAllBals, against
+                  doBulkBals reading a number of accounts at a time,
+                  verifying that they are identical, followed by getTrn as
+                  a generator against getTrn returning a list
+    bulkrec     = Sql.insRec against Sql.bulkRec, unformatted and formatted,
+                  verifying that the loaded records are identical
+    ccf         = A conformance test of CCF against CCD, value by value, for
+                  every type code in tartanWork.dattyp, followed by the
+                  formatting of columns by CCD against CCF.column
+    money       = Summing a column of amounts with float(ASD(tot) + ASD(amt))
+                  against ACC.add and ACC.addAll, verifying that the totals
+                  are bit-identical
+    mail        = Sending messages to a local stand-in smtp server, using
+                  aiosmtpd or smtpd, with sendMail against MailQueue,
+                  verifying that every message was received, followed by
+                  the emllog records of a PrintBatch being written, in one
+                  insert, when the batch is closed
+    render      = Rendering statements, each in its own file and all in one
+                  file, with DrawForm against a PrintBatch using a pool of
+                  processes, verifying that the text of every page is the
+                  same, followed by opening the template compiled every
+                  time against the cached template, verifying that a change
+                  to the template by another user is used by the next batch
+    prices      = Resolving the cost and selling prices of stores items,
+                  including recipes, with getCost and getSell against a
+                  StrPrices, verifying that the prices are identical
+    payrun      = A monthly salaries and wages run of wg2020, with general
+                  ledger integration and staff loans, for a company of
+                  synthetic employees, verifying that a preview run leaves
+                  the tables unchanged, followed by the previous version of
+                  wg2020, read from git, against wg2020 on the same data,
+                  verifying that every table written is identical
+    lookup      = Opening, searching, filtering and paging to the end of a
+                  debtors lookup by fetching all the records against a
+                  LookupPager, verifying that the pages are identical to
+                  the records fetched
+    search      = Filtering a debtors lookup by name with a like scan
+                  against the search index, kept in sync while inserting,
+                  updating and deleting debtors, verifying that the records
+                  are identical, followed by ranked matches of words
+    viewer      = Paging back and forth through a pdf document, rendering
+                  every page visited as ViewPDF did, against a PdfCache with
+                  the neighbouring pages rendered while idle, and finding
+                  text on every page against the text index, verifying that
+                  the images and the pages found are identical
+    startup     = A startup timing report of fresh interpreters importing
+                  tartanWork, tartanImages and TartanClasses with the
+                  optional modules imported up front, as TartanClasses did,
+                  against importing them when first used, followed by the
+                  decoding of the main menu images, every time as getImage
+                  did against once, verifying that the images are identical
+    launch      = Launching modules from the menu, logging each launch in
+                  ctllog and committing as doRunModule did against a
+                  LogWriter, verifying that the same records are written,
+                  followed by the loader option re-importing the modules
+                  against only re-importing them if changed
+    backup      = A full backup followed by incremental backups after amending
+                  an old general ledger transaction, appending transactions
+                  and replacing a deleted transaction with a backdated one,
+                  verifying that only the appended transactions are backed
+                  up incrementally and that restoring each archive's chain
+                  restores the transactions as they were backed up
+    matrix      = Looking up the movements, budgets and opening balances of
+                  accounts, per company, consolidated and rolled up by
+                  department, with a GenMatrix loaded for one year,
+                  verifying that the amounts within and outside the loaded
+                  periods equal those summed from the records
+    strbal      = Two users, each with their own connection, concurrently
+                  adding to the same strbal summary records, then posting
+                  and deleting stores transactions of the same items,
+                  verifying that no postings are lost and that the summary
+                  agrees with the transactions
+
+AUTHOR
+    Written by Paul Malherbe, <paul@tartan.co.za>
+
+COPYING
+    Copyright (C) 2004-2026 Paul Malherbe.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import base64, datetime, gc, getopt, importlib, io, os, random, shutil
+import json, statistics, subprocess, sys, tarfile, tempfile, threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TartanClasses import ACC, ASD, Balances, CCD, CCF, Dbase, DBCreate
+from TartanClasses import DrawForm, GenMatrix, Image, LazyModule, LogWriter
+from TartanClasses import LookupPager, MailQueue, PdfCache, PrintBatch, Sql
+from TartanClasses import StrBal, StrPrices, TarBckRes
+from TartanClasses import clearForms, getCCF
+from tartanFunctions import doBulkAge, getCost, getSell, getTrn, loadImage
+from tartanFunctions import loadRcFile, sendMail
+import tartanWork
+
+def getDbase(rcf=None):
+    if rcf:
+        rcdic = loadRcFile(rcfile=rcf)
+        if rcdic == "error":
+            print("Invalid RC File", rcf)
+            sys.exit()
+    else:
+        wrkdir = tempfile.mkdtemp(prefix="tartan_")
+        rcdic = {
+            "dbase": "SQLite",
+            "dbname": "benchmark.db",
+            "dbhost": "",
+            "dbdir": wrkdir,
+            "dbport": "0",
+            "dbuser": "",
+            "dbpwd": "",
+            "wrkdir": wrkdir,
+            "bupdir": wrkdir,
+            "upgdir": wrkdir}
+        dbm = Dbase(rcdic=rcdic)
+        DBCreate(dbm=dbm, opts=[("-c", "i"), ("-d", True), ("-x", True)])
+    dbm = Dbase(rcdic=rcdic)
+    dbm.openDbase()
+    return dbm
+
+def showTimes(name, rows, times):
+    print("%-30s %12s %12s %8s" % (name, "Before", "After", "Ratio"))
+    for text, old, new in times:
+        print("%-30s %10.0f/s %10.0f/s %7.1fx" % (text, rows / old,
+            rows / new, old / new))
+
+def benchGetRec(dbm, num):
+    sql = Sql(dbm, ["genmst", "gentrn"], prog="benchmark")
+    sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+    data = []
+    for x in range(1000):
+        data.append([999, 1000 + (x % 50), 202401 + (x % 12), 20240101 + x,
+            1, "REF%s" % x, "BATCH", x * 1.25, 0, "Benchmark", "N", "",
+            0, "benchmark", 20240101, "", 0])
+    sql.insRec("gentrn", data=data)
+    shapes = (
+        ("Single row select", {
+            "tables": "gentrn",
+            "cols": ["glt_tramt"],
+            "where": [("glt_cono", "=", 999), ("glt_acno", "=", 1000),
+                ("glt_refno", "=", "REF0")],
+            "limit": 1}),
+        ("Summed balance", {
+            "tables": "gentrn",
+            "cols": ["sum(glt_tramt)"],
+            "where": [("glt_cono", "=", 999), ("glt_acno", "=", 1001),
+                ("glt_curdt", "between", 202401, 202412)],
+            "limit": 1}),
+        ("Grouped periods", {
+            "tables": "gentrn",
+            "cols": ["glt_curdt", "sum(glt_tramt)"],
+            "where": [("glt_cono", "=", 999), ("glt_acno", "in",
+                (1000, 1001, 1002)), ("glt_type", "=", 1)],
+            "order": "glt_curdt"}))
+    times = []
+    for text, opts in shapes:
+        # Compile the statement on every call as before the cache
+        st = time.perf_counter()
+        for _ in range(num):
+            sql.schema.queries.clear()
+            sql.getRec(**opts)
+        old = time.perf_counter() - st
+        # Bind only
+        sql.getRec(**opts)
+        st = time.perf_counter()
+        for _ in range(num):
+            sql.getRec(**opts)
+        new = time.perf_counter() - st
+        times.append((text, old, new))
+    sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+    dbm.commitDbase()
+    print("Sql.getRec calls per second over %s calls" % num)
+    showTimes("Query", num, times)
+
+def legacyAutoAge(dbm, cono, chain, acno):
+    # The per account debtors re-ageing as it was before doBulkAge
+    sql = Sql(dbm, ["drstrn", "drsage"], prog="benchmark")
+    col = sql.drstrn_col
+    sql.delRec("drsage", where=[("dra_cono", "=", cono),
+        ("dra_chain", "=", chain), ("dra_acno", "=", acno)])
+    whr = [
+        ("drt_cono", "=", cono),
+        ("drt_chain", "=", chain),
+        ("drt_acno", "=", acno)]
+    cr = sql.getRec("drstrn", where=whr + [("drt_tramt", "<", 0)],
+        order="drt_trdt")
+    if not cr:
+        return
+    dr = sql.getRec("drstrn", where=whr + [("drt_tramt", ">", 0)],
+        order="drt_trdt")
+    if not dr:
+        return
+    for ctr in cr:
+        ccdt = ctr[col.index("drt_curdt")]
+        cbal = ctr[col.index("drt_tramt")]
+        camt = cbal
+        for dno, dtr in enumerate(dr):
+            dcdt = dtr[col.index("drt_curdt")]
+            dbal = dtr[col.index("drt_tramt")]
+            if not dbal:
+                continue
+            damt = float(ASD(dbal) + ASD(camt))
+            if damt < 0:
+                camt = damt
+                damt = 0.00
+            else:
+                camt = 0.00
+            diff = float(ASD(dbal) - ASD(damt))
+            dr[dno][col.index("drt_tramt")] = damt
+            if diff:
+                sql.insRec("drsage", data=[cono, chain, acno,
+                    dtr[col.index("drt_type")], dtr[col.index("drt_ref1")],
+                    max(ccdt, dcdt), ctr[col.index("drt_type")],
+                    ctr[col.index("drt_ref1")], diff, 0], dofmt=False)
+            if not camt:
+                break
+        diff = float(ASD(cbal) - ASD(camt))
+        if diff:
+            sql.insRec("drsage", data=[cono, chain, acno,
+                ctr[col.index("drt_type")], ctr[col.index("drt_ref1")], ccdt,
+                ctr[col.index("drt_type")], ctr[col.index("drt_ref1")], diff,
+                0], dofmt=False)
+
+def benchAutoAge(dbm, num):
+    sql = Sql(dbm, ["drstrn", "drsage"], prog="benchmark")
+    sql.delRec("drstrn", where=[("drt_cono", "=", 999)])
+    sql.delRec("drsage", where=[("dra_cono", "=", 999)])
+    # Generate a ledger of 50 transactions per account, every 4th a payment
+    accs = []
+    data = []
+    for x in range(num):
+        acc = "B%05i" % int(x / 50)
+        if not x % 50:
+            accs.append(acc)
+        seq = x % 50
+        trdt = 20200101 + (int(seq / 12) * 10000) + ((seq % 12) * 100)
+        if seq % 4 == 3:
+            typ = 5
+            amt = -round(((x * 7919) % 150000) / 100.0 + 0.01, 2)
+        else:
+            typ = 1
+            amt = round(((x * 104729) % 100000) / 100.0 + 0.01, 2)
+        data.append([999, 0, acc, typ, "R%06i" % x, "BATCH", trdt, "", amt,
+            0, int(trdt / 100), "Benchmark", "N", "", "benchmark", trdt, "",
+            0])
+    sql.insRec("drstrn", data=data)
+    dbm.commitDbase()
+    cols = ["dra_chain", "dra_acno", "dra_type", "dra_ref1", "dra_curdt",
+        "dra_atyp", "dra_aref", "dra_amnt"]
+    odr = "dra_acno, dra_type, dra_ref1, dra_atyp, dra_aref, dra_curdt"
+    # Per account
+    st = time.perf_counter()
+    for acc in accs:
+        legacyAutoAge(dbm, 999, 0, acc)
+    old = time.perf_counter() - st
+    oage = sql.getRec("drsage", cols=cols, where=[("dra_cono", "=", 999)],
+        order=odr)
+    # Bulk
+    st = time.perf_counter()
+    doBulkAge(dbm, "drs", 999)
+    new = time.perf_counter() - st
+    nage = sql.getRec("drsage", cols=cols, where=[("dra_cono", "=", 999)],
+        order=odr)
+    sql.delRec("drstrn", where=[("drt_cono", "=", 999)])
+    sql.delRec("drsage", where=[("dra_cono", "=", 999)])
+    dbm.commitDbase()
+    print("Re-ageing %s transactions on %s accounts" % (num, len(accs)))
+    showTimes("Routine", num, [("doBulkAge", old, new)])
+    if oage == nage:
+        print("Identical results, %s ageing records" % len(nage))
+    else:
+        print("Results DIFFER, %s against %s ageing records" % (len(oage),
+            len(nage)))
+
+def benchStatement(dbm, num):
+    sql = Sql(dbm, ["drstrn", "drsage"], prog="benchmark")
+    sql.delRec("drstrn", where=[("drt_cono", "=", 999)])
+    sql.delRec("drsage", where=[("dra_cono", "=", 999)])
+    # An aged ledger of 40 transactions per account over 2 chains, every
+    # 4th a payment, with some accounts having no transactions
+    rnd = random.Random(num)
+    accs = []
+    data = []
+    for x in range(num):
+        key = (x // 40 % 2, "S%05i" % (x // 80))
+        if not x % 40:
+            accs.append(key)
+            if not x % 400:
+                accs.append((9, "N%05i" % x))
+        trdt = 20230101 + (x % 24 // 12 * 10000) + (x % 12 * 100)
+        if x % 4 == 3:
+            typ = 5
+            amt = -round(rnd.uniform(1, 1500), 2)
+        else:
+            typ = 1
+            amt = round(rnd.uniform(1, 1000), 2)
+        data.append([999, key[0], key[1], typ, "R%06i" % x, "BATCH", trdt,
+            "", amt, 0, trdt // 100, "Benchmark", "N", "", "benchmark", trdt,
+            "", 0])
+    sql.insRec("drstrn", data=data)
+    doBulkAge(dbm, "drs", 999)
+    dbm.commitDbase()
+    rnd.shuffle(accs)
+    mf = type("MainFrame", (object,), {"dbm": dbm, "body": None,
+        "window": None, "rcdic": dbm.rcdic})
+    bad = 0
+    times = []
+    for curdt in (202312, 202406):
+        for trans in ("Y", "A"):
+            st = time.perf_counter()
+            old = []
+            for acc in accs:
+                old.append(Balances(mf, "DRS", 999, curdt,
+                    acc).doAllBals(trans=trans))
+            secs = time.perf_counter() - st
+            st = time.perf_counter()
+            new = [list(bal[1:]) for bal in Balances(mf, "DRS", 999,
+                curdt).doBulkBals(accs, trans=trans)]
+            times.append(("Statements %s %s" % (curdt, trans), secs,
+                time.perf_counter() - st))
+            bad += sum([int(list(o) != n) for o, n in zip(old, new)])
+            bad += abs(len(old) - len(new))
+    # getTrn as a generator
+    cnt = 0
+    for cdt in (None, 202312):
+        for zer in ("Y", "A", "N"):
+            for lim in (None, 1, 7):
+                for acc in accs[:20]:
+                    whr = [("drt_cono", "=", 999), ("drt_chain", "=",
+                        acc[0]), ("drt_acno", "=", acc[1])]
+                    col, lst = getTrn(dbm, "drs", cdt=cdt, whr=list(whr),
+                        zer=zer, lim=lim)
+                    icol, itr = getTrn(dbm, "drs", cdt=cdt,
+                        whr=list(whr), zer=zer, lim=lim, itr=True)
+                    itr = list(itr)
+                    cnt += len(itr)
+                    if col != icol or lst != itr:
+                        bad += 1
+    sql.delRec("drstrn", where=[("drt_cono", "=", 999)])
+    sql.delRec("drsage", where=[("dra_cono", "=", 999)])
+    dbm.commitDbase()
+    print("Statements of %s transactions on %s accounts and %s iterated "
+        "records, %s differences" % (num, len(accs), cnt, bad))
+    showTimes("Routine", len(accs), times)
+
+def benchBulkRec(dbm, num):
+    sql = Sql(dbm, "gentrn", prog="benchmark")
+    sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+    # Mix in data needing formatting, i.e. strings, dates and long text
+    data = []
+    for x in range(num):
+        data.append([999, str(1000 + (x % 50)), 202401 + (x % 12),
+            "2024-01-%02i" % (1 + x % 28), 1, "ref%s" % x, "batch",
+            round(x * 1.257, 3), "0", "Benchmark %s\\ " % x, "n", "",
+            (0, 202403)[x % 2], "benchmark", 20240101, "", 0])
+    cols = sql.gentrn_col[:-1]
+    odr = "glt_refno"
+    times = []
+    recs = []
+    for text, func in (
+            ("Unformatted", lambda: sql.insRec("gentrn", data=data)),
+            ("Formatted", lambda: [sql.insRec("gentrn", data=d)
+                for d in data])):
+        st = time.perf_counter()
+        func()
+        old = time.perf_counter() - st
+        recs.append(sql.getRec("gentrn", cols=cols, where=[("glt_cono",
+            "=", 999)], order=odr))
+        sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+        dofmt = bool(text == "Formatted")
+        st = time.perf_counter()
+        sql.bulkRec("gentrn", data=data, dofmt=dofmt)
+        new = time.perf_counter() - st
+        recs.append(sql.getRec("gentrn", cols=cols, where=[("glt_cono",
+            "=", 999)], order=odr))
+        sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+        times.append((text, old, new))
+    dbm.commitDbase()
+    print("Loading %s records, insRec against bulkRec at %.0f/s" % (num,
+        sql.rate))
+    showTimes("Records", num, times)
+    for text, old, new in ((times[0][0], recs[0], recs[1]),
+            (times[1][0], recs[2], recs[3])):
+        if old == new:
+            print("%s identical results, %s records" % (text, len(new)))
+        else:
+            print("%s results DIFFER" % text)
+
+def getCorpus(num):
+    # Edge cases followed by random values of all the usual python types
+    data = [None, "", " ", "None", "0", "00", "-", "L", "12L", "1_0", "+5",
+        "-5", "5-", " 12", "012", "abc", "AbC 1", "  x  ", "a\\b", "x\x01y",
+        "caf\xe9", "\t7", "1,234", "1.5", "-1.5", "3.", ".5", "1e3", "nan",
+        "2024-01-05", "2024/02/29", "20230229", "240105", "2024-13", "202413",
+        "12:30", "1230", "123045", "9" * 20, True, False, 0, 1, -1, 5, 99,
+        100, 999, 1000, -999, 10 ** 9, -10 ** 9, 10 ** 12, 10 ** 20,
+        20240105, 20240230, 19991231, 202401, 202400, 2401, 0.0, -0.0, 0.005,
+        0.015, 2.675, -2.675, 1.005, 1e-05, 1e-07, 1e16, 1e20, 123456.789,
+        -123456.789, 99999999.995, float("inf"), float("nan"), b"abc", [1],
+        (1, 2)]
+    rnd = random.Random(num)
+    for x in range(num):
+        choice = x % 6
+        if choice == 0:
+            data.append(rnd.randint(-10 ** rnd.randint(1, 12),
+                10 ** rnd.randint(1, 12)))
+        elif choice == 1:
+            data.append(round(rnd.uniform(-10 ** rnd.randint(1, 10),
+                10 ** rnd.randint(1, 10)), rnd.randint(0, 4)))
+        elif choice == 2:
+            data.append(rnd.randint(1990, 2040) * 10000 + rnd.randint(1, 13)
+                * 100 + rnd.randint(1, 32))
+        elif choice == 3:
+            data.append(rnd.randint(1990, 2040) * 100 + rnd.randint(0, 13))
+        elif choice == 4:
+            data.append("".join([rnd.choice("abcXYZ 019-_.\\\t")
+                for y in range(rnd.randint(0, 12))]))
+        else:
+            data.append(str(rnd.choice(data[:x + 40])))
+    return data
+
+def getResult(func, *args):
+    try:
+        ret = func(*args)
+        if isinstance(ret, CCD):
+            ret = (ret.work, ret.disp, ret.err)
+        return [repr(r) for r in ret]
+    except Exception as err:
+        return ["Exception", type(err).__name__]
+
+def benchCCF(dbm, num):
+    corpus = getCorpus(num)
+    sizes = (0, 1, 2, 3, 5, 7, 9, 10, 12, 13.2, 15.2, 5.2, 7.3, 13.0, 4.1)
+    bad = 0
+    chks = 0
+    for typ, des in tartanWork.dattyp:
+        errs = 0
+        for siz in sizes:
+            ccf = CCF(typ, siz)
+            for dat in corpus:
+                chks += 1
+                old = getResult(CCD, dat, typ, siz)
+                new = getResult(ccf.format, dat)
+                if old != new:
+                    errs += 1
+                    if errs < 4:
+                        print("%s %s %r CCD %s CCF %s" % (typ, siz, dat,
+                            old, new))
+        bad += errs
+    print("CCF conformance, %s types, %s checks, %s differences" % (
+        len(tartanWork.dattyp), chks, bad))
+    # Column throughput
+    rnd = random.Random(1)
+    cols = (
+        ("UI", 7, [rnd.randint(0, 9999999) for x in range(num)]),
+        ("SD", 13.2, [round(rnd.uniform(-99999, 99999), 2)
+            for x in range(num)]),
+        ("D1", 10, [20240101 + (x % 28) for x in range(num)]),
+        ("NA", 30, ["Description %s" % x for x in range(num)]),
+        ("UA", 7, ["code%s" % (x % 500) for x in range(num)]))
+    times = []
+    for typ, siz, dat in cols:
+        st = time.perf_counter()
+        old = []
+        for d in dat:
+            c = CCD(d, typ, siz)
+            old.append((c.work, c.disp, c.err))
+        ot = time.perf_counter() - st
+        st = time.perf_counter()
+        new = getCCF(typ, siz).column(dat)
+        nt = time.perf_counter() - st
+        if list(zip(*new)) != old:
+            print("Column %s results DIFFER" % typ)
+        times.append(("%s %s" % (typ, siz), ot, nt))
+    print("Formatting columns of %s values" % num)
+    showTimes("Column", num, times)
+
+def benchMoney(dbm, num):
+    rnd = random.Random(1)
+    cols = (
+        ("Cents", [round(rnd.uniform(-99999, 99999), 2) for x in range(num)]),
+        ("Half cents", [rnd.randint(-999999, 999999) / 1000 + 0.0005
+            for x in range(num)]),
+        ("Large", [round(rnd.uniform(-1e13, 1e13), rnd.randint(0, 4))
+            for x in range(num)]))
+    bad = 0
+    times = []
+    for text, dat in cols:
+        st = time.perf_counter()
+        tot = 0
+        fold = []
+        for amt in dat:
+            tot = float(ASD(tot) + ASD(amt))
+            fold.append(tot)
+        ot = time.perf_counter() - st
+        st = time.perf_counter()
+        acc = ACC()
+        for x, amt in enumerate(dat):
+            acc.add(amt)
+            if x % 1000 == 0 and repr(float(acc)) != repr(fold[x]):
+                bad += 1
+        nt = time.perf_counter() - st
+        st = time.perf_counter()
+        alt = ACC().addAll(dat)
+        at = time.perf_counter() - st
+        if repr(float(acc)) != repr(tot) or repr(float(alt)) != repr(tot):
+            bad += 1
+            print("%s ASD %r ACC %r ACC.addAll %r" % (text, tot, float(acc),
+                float(alt)))
+        times.append(("%s, ACC.add" % text, ot, nt))
+        times.append(("%s, ACC.addAll" % text, ot, at))
+    print("Summing %s amounts, %s differences" % (len(dat), bad))
+    showTimes("Total", len(dat), times)
+
+def getStandIn(stats):
+    # A local stand-in smtp server counting the sessions and messages
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import SMTP
+
+        class Handler(object):
+            async def handle_DATA(self, server, session, envelope):
+                stats["msgs"] += 1
+                return "250 OK"
+
+        class Server(SMTP):
+            def connection_made(self, transport):
+                stats["conn"] += 1
+                super().connection_made(transport)
+
+        class Stand(Controller):
+            def factory(self):
+                return Server(self.handler)
+
+        ctl = Stand(Handler(), hostname="127.0.0.1", port=8025)
+        ctl.start()
+        return ctl.stop
+    except ImportError:
+        pass
+    import asyncore, smtpd, threading
+
+    class Channel(smtpd.SMTPChannel):
+        def __init__(self, *args, **kwargs):
+            stats["conn"] += 1
+            super().__init__(*args, **kwargs)
+
+    class Server(smtpd.SMTPServer):
+        channel_class = Channel
+
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            stats["msgs"] += 1
+
+    srv = Server(("127.0.0.1", 8025), None, decode_data=True)
+    thd = threading.Thread(target=asyncore.loop, kwargs={"timeout": 0.05})
+    thd.daemon = True
+    thd.start()
+    return srv.close
+
+def benchMail(dbm, num):
+    import warnings
+    warnings.simplefilter("ignore", DeprecationWarning)
+    stats = {"conn": 0, "msgs": 0}
+    try:
+        stop = getStandIn(stats)
+    except ImportError:
+        print("Mail benchmark needs aiosmtpd or smtpd")
+        return
+    server = ["127.0.0.1", 8025, 0, 0, "", ""]
+    mess = "Statement of account\n" * 50
+    times = []
+    st = time.perf_counter()
+    for x in range(num):
+        sendMail(server, "bench@tartan.co.za", "acc%s@tartan.co.za" % x,
+            "Statement", mess)
+    old = time.perf_counter() - st
+    sent = [(stats["conn"], stats["msgs"])]
+    for workers in (1, 4):
+        stats.update(conn=0, msgs=0)
+        st = time.perf_counter()
+        with MailQueue(server, workers=workers) as mq:
+            for x in range(num):
+                mq.addMail("bench@tartan.co.za", "acc%s@tartan.co.za" % x,
+                    "Statement", mess, key=x)
+            res = mq.doSend()
+        times.append(("MailQueue, %s workers" % workers, old,
+            time.perf_counter() - st))
+        sent.append((stats["conn"], stats["msgs"]))
+        if [r[4] for r in res].count("OK") != num:
+            print("MailQueue, %s workers, FAILED recipients" % workers)
+    # A PrintBatch without mail server details returns an error and the
+    # emllog records of a batch are written when it is closed
+    sql = Sql(dbm, "emllog", prog="benchmark")
+    sql.delRec("emllog", where=[("eml_sub", "=", "Batch")])
+    dbm.commitDbase()
+    mf = type("MainFrame", (object,), {"dbm": dbm, "body": None,
+        "window": None, "rcdic": dbm.rcdic})
+    batch = PrintBatch(mf, 999)
+    if not batch.sendMail("bench@tartan.co.za", "acc@tartan.co.za", "Batch",
+            mess, []):
+        print("PrintBatch without a mail server sent a message")
+    batch.smtp = server + ["bench@tartan.co.za"]
+    for x in range(10):
+        err = batch.sendMail("bench@tartan.co.za", "acc%s@tartan.co.za" % x,
+            "Batch", mess, [])
+        batch.addLog("bench@tartan.co.za", "acc%s@tartan.co.za" % x, "Batch",
+            ["OK", "FAILED"][int(bool(err))])
+    batch.closeBatch()
+    logs = sql.getRec("emllog", cols=["count(*)"], where=[("eml_sub", "=",
+        "Batch"), ("eml_sta", "=", "OK")], limit=1)[0]
+    sql.delRec("emllog", where=[("eml_sub", "=", "Batch")])
+    dbm.commitDbase()
+    print("PrintBatch of 10 messages, %s logged on closing the batch" %
+        logs)
+    stop()
+    print("Sending %s messages, sessions and messages received %s" % (num,
+        sent))
+    showTimes("Messages", num, times)
+
+def benchRender(dbm, num):
+    try:
+        import pymupdf
+    except ImportError:
+        print("Render benchmark needs pymupdf")
+        return
+    sql = Sql(dbm, ["tplmst", "tpldet"], prog=__name__)
+    sql.delRec("tplmst", where=[("tpm_tname", "=", "bench")])
+    sql.delRec("tpldet", where=[("tpd_tname", "=", "bench")])
+    sql.insRec("tplmst", data=["bench", "Benchmark", "S", "DRS", "N", "A4",
+        "P"])
+    codes = ["document_date", "account_details", "drm_name", "drm_acno",
+        "drt_tramt", "", "", "drm_add1"]
+    for n, cod in enumerate(codes * 4):
+        if cod:
+            typ = "C"
+        elif n % 2:
+            typ = "T"
+        else:
+            typ = "L"
+        y1 = 20 + n * 8
+        sql.insRec("tpldet", data=["bench", n + 1, typ, "A", "L",
+            "Text %s" % n, "courier", 10, "#000000", "N", "N", "N", "L", "",
+            "N", 10, y1, 50, 10, y1, y1 + 5, 0.2, cod, "courier", 10,
+            "#000000", "Y", "N", "N", "L", "TLRB", "N", 60, y1, 100, 10, y1,
+            y1 + 5, 1, 1])
+    dbm.commitDbase()
+    tdc = sql.tpldet_col
+    mf = type("MainFrame", (object,), {"dbm": dbm, "body": None,
+        "window": None, "rcdic": dbm.rcdic})
+
+    def doRun(batch, single):
+        names = []
+        form = None
+        for acc in range(num):
+            if not form:
+                form = DrawForm(dbm, "bench", wrkdir=dbm.wrkdir, batch=batch)
+                form.sysdt = "Benchmark"
+                form.doNewDetail()
+            for page in range(2):
+                form.add_page()
+                for key in form.newkey:
+                    line = list(form.newdic[key])
+                    if line[tdc.index("tpd_type")] == "C":
+                        line[tdc.index("tpd_text")] = "Account %s Page %s %s" \
+                            % (acc, page, key)
+                    form.doDrawDetail(line, fmat=False)
+            if not single:
+                names.append(os.path.join(dbm.wrkdir, "bench_%s.pdf" % acc))
+                form.saveFile(names[-1])
+                form = None
+        if single:
+            names.append(os.path.join(dbm.wrkdir, "bench_all.pdf"))
+            form.saveFile(names[-1])
+        if batch:
+            batch.closeBatch()
+        text = []
+        for name in names:
+            doc = pymupdf.open(name)
+            text.append([page.get_text() for page in doc])
+            doc.close()
+        return text
+
+    times = []
+    bad = 0
+    for single in (False, True):
+        if single:
+            text = "One file"
+        else:
+            text = "A file each"
+        st = time.perf_counter()
+        old = doRun(None, single)
+        ot = time.perf_counter() - st
+        for workers in (1, 4):
+            st = time.perf_counter()
+            new = doRun(PrintBatch(mf, workers=workers), single)
+            times.append(("%s, %s workers" % (text, workers), ot,
+                time.perf_counter() - st))
+            if new != old:
+                bad += 1
+                print("%s, %s workers, the pages differ" % (text, workers))
+    # Opening the template, compiled every time against the cached template
+    # checked once per batch
+    st = time.perf_counter()
+    for acc in range(num):
+        clearForms("bench")
+        DrawForm(dbm, "bench", wrkdir=dbm.wrkdir)
+    ot = time.perf_counter() - st
+    batch = PrintBatch(mf, workers=1)
+    st = time.perf_counter()
+    for acc in range(num):
+        DrawForm(dbm, "bench", wrkdir=dbm.wrkdir, batch=batch)
+    times.append(("Opening the template", ot, time.perf_counter() - st))
+    # A change by another user is used by the next batch
+    odbm = Dbase(rcdic=dbm.rcdic)
+    odbm.openDbase()
+    Sql(odbm, "tpldet", prog=__name__).updRec("tpldet", cols=["tpd_text"],
+        data=["Changed"], where=[("tpd_tname", "=", "bench"), ("tpd_detseq",
+        "=", 2)])
+    odbm.commitDbase()
+    odbm.closeDbase()
+    form = DrawForm(dbm, "bench", wrkdir=dbm.wrkdir, batch=batch)
+    if form.tpldet[1][tdc.index("tpd_text")] == "Changed":
+        bad += 1
+        print("The template was checked more than once per batch")
+    batch.closeBatch()
+    form = DrawForm(dbm, "bench", wrkdir=dbm.wrkdir, batch=PrintBatch(mf,
+        workers=1))
+    if form.tpldet[1][tdc.index("tpd_text")] != "Changed":
+        bad += 1
+        print("The changed template was not used")
+    print("Rendering %s statements on %s cpus, %s differences" % (num,
+        os.cpu_count(), bad))
+    showTimes("Statements", num, times)
+
+def benchPrices(dbm, num):
+    tabs = (("strcmu", "smc"), ("strcst", "stc"), ("strctl", "cts"),
+        ("strgmu", "smg"), ("strmf1", "st1"), ("strprc", "stp"),
+        ("strrcp", "srr"), ("strtrn", "stt"))
+    sql = Sql(dbm, [tab[0] for tab in tabs], prog="benchmark")
+    for tab, pfx in tabs:
+        sql.delRec(tab, where=[("%s_cono" % pfx, "=", 999)])
+    # Items, every tenth a recipe of three others, in 5 groups and 2 locations
+    rnd = random.Random(num)
+    items = []
+    for x in range(num):
+        grp = "G%s" % (x % 5)
+        cod = "ITEM%06i" % x
+        items.append((grp, cod))
+        if x % 10:
+            typ = "N"
+        else:
+            typ = "R"
+        sql.insRec("strmf1", data=[999, grp, cod, typ, "Item %s" % x, "Each",
+            rnd.choice("AAS"), "V", 0, "", 0, 0])
+    normal = [item for x, item in enumerate(items) if x % 10]
+    for x, (grp, cod) in enumerate(items):
+        for loc in ("1", "2"):
+            if rnd.random() < .3:
+                sql.insRec("strcst", data=[999, grp, cod, loc, x % 97 + 1])
+            if rnd.random() < .3:
+                sql.insRec("strprc", data=[999, grp, cod, loc, 1, x % 89 + 5])
+            if rnd.random() < .2:
+                sql.insRec("strcmu", data=[999, grp, cod, loc, 1, 25])
+            if not x % 10:
+                for ggg, ccc in rnd.sample(normal, 3):
+                    sql.insRec("strrcp", data=[999, grp, cod, loc, ggg, ccc,
+                        2])
+    for grp in ("G0", "G1", "G2"):
+        sql.insRec("strgmu", data=[999, grp, 1, 40])
+    sql.insRec("strctl", data=[999, "N", "Y", 1, "A", "", "", ""])
+    # Transactions, each captured on a different day as getSell only orders
+    # by the capture date
+    first = datetime.date(1970, 1, 1).toordinal()
+    trns = []
+    for x in range(num * 10):
+        capdt = datetime.date.fromordinal(first + x % 2900000)
+        capdt = int(capdt.strftime("%Y%m%d"))
+        grp, cod = rnd.choice(items)
+        typ = rnd.choice((1, 1, 3, 5, 6, 7, 7, 8))
+        qty = round(rnd.uniform(1, 50), 2)
+        if typ in (5, 6, 7, 8):
+            qty = 0 - qty
+        trns.append([999, grp, cod, rnd.choice("12"), 20240101 + x % 28,
+            typ, "REF", "BATCH", "", qty, round(qty * rnd.uniform(5, 9), 2),
+            round(qty * rnd.uniform(10, 15), 2), 202401, "Benchmark", 0, "",
+            "", "STR", 0, "", "benchmark", capdt])
+    sql.insRec("strtrn", data=trns)
+    dbm.commitDbase()
+    keys = [(grp, cod, loc) for grp, cod in items for loc in ("1", "2")]
+
+    def doOld():
+        res = []
+        for grp, cod, loc in keys:
+            res.append(getCost(sql, 999, grp, cod, loc=loc, ind="AL",
+                bal=True))
+            res.append(getCost(sql, 999, grp, cod, loc=loc, ind="I",
+                tot=True))
+            res.append(getSell(sql, 999, grp, cod, loc))
+        return res
+
+    def doNew():
+        res = []
+        prices = StrPrices(dbm, 999)
+        prices.doLoad(keys)
+        for grp, cod, loc in keys:
+            res.append(prices.getCost(grp, cod, loc=loc, ind="AL", bal=True))
+            res.append(prices.getCost(grp, cod, loc=loc, ind="I", tot=True))
+            res.append(prices.getSell(grp, cod, loc))
+        return res
+
+    st = time.perf_counter()
+    old = doOld()
+    ot = time.perf_counter() - st
+    st = time.perf_counter()
+    new = doNew()
+    nt = time.perf_counter() - st
+    for tab, pfx in tabs:
+        sql.delRec(tab, where=[("%s_cono" % pfx, "=", 999)])
+    dbm.commitDbase()
+    bad = 0
+    for o, n in zip(old, new):
+        if repr(o) != repr(n):
+            bad += 1
+    print("Pricing %s items in %s locations, %s differences" % (num, 2, bad))
+    showTimes("Items", len(keys), [("getCost/getSell", ot, nt)])
+
+def getPayrun(dbm, num):
+    # A company with num monthly employees, tax tables and control records
+    tabs = (("ctlctl", "ctl"), ("ctldep", "dep"), ("ctlynd", "cye"),
+        ("genmst", "glm"), ("gentrn", "glt"), ("wagbal", "wbl"), ("wagcap", "wcp"),
+        ("wagcod", "wcd"), ("wagctl", "ctw"), ("wagedc", "ced"),
+        ("waglmf", "wlm"), ("wagltf", "wlt"), ("wagmst", "wgm"),
+        ("wagtf1", "wt1"), ("wagtf2", "wt2"))
+    sql = Sql(dbm, [tab[0] for tab in tabs] + ["wagtxa", "wagtxr"],
+        prog="benchmark")
+    for tab, pfx in tabs:
+        sql.delRec(tab, where=[("%s_cono" % pfx, "=", 999)])
+    sql.delRec("wagtxa", where=[("wta_year", "=", 2025)])
+    sql.delRec("wagtxr", where=[("wtr_year", "=", 2025)])
+    sql.insRec("wagtxa", data=[2025, 17235, 9444, 3145, 500000, 0, 1, 1, 1,
+        0])
+    for dat in ((1, 237100, 0, 18), (237101, 370500, 42678, 26), (370501,
+            512800, 77362, 31), (512801, 673000, 121475, 36), (673001,
+            857900, 179147, 39), (857901, 1817000, 251258, 41), (1817001, 0,
+            644489, 45)):
+        sql.insRec("wagtxr", data=[2025] + list(dat))
+    sql.insRec("ctlynd", data=[999, 0, 20230301, 20240229, 0, "Y", ""])
+    sql.insRec("ctlynd", data=[999, 1, 20240301, 20250228, 0, "N", ""])
+    sql.insRec("wagctl", data=[999, "Y", "", "", "", 0, 8, 40, 173.33, "N",
+        0, 0, "", 0, "", "", ""])
+    for acno, desc in ((7000, "Salaries"), (7010, "Commission"), (7100,
+            "Company Contributions"), (8000, "Salaries Control"), (8010,
+            "Staff Loans Control"), (8100, "PAYE Control"), (8110,
+            "Deductions Control")):
+        sql.insRec("genmst", data=[999, acno, desc, "P", "", 0, "", "N", ""])
+    sql.insRec("ctlctl", data=[999, "wag_ctl", "Wages Control", 8000, "",
+        "", "", ""])
+    sql.insRec("ctlctl", data=[999, "wag_slc", "Staff Loans Control", 8010,
+        "", "", "", ""])
+    for dep in range(1, 4):
+        sql.insRec("ctldep", data=[999, dep, "Department %s" % dep, 999,
+            7000, 7010, 999, 8000, 8000, ""])
+    col = sql.wagedc_col
+    for cod, flds in (
+            (("E", 1, "Basic Salary"), {"ced_eamt": 1}),
+            (("E", 2, "Overtime"), {"ced_eamt": 1.5}),
+            (("E", 6, "Travel Allowance"), {"ced_eind": "F",
+                "ced_eamt": 500, "ced_taxportion": 80}),
+            (("E", 7, "Commission"), {"ced_earntype": "C"}),
+            (("E", 8, "Bonus"), {"ced_eind": "R", "ced_ebase": 3,
+                "ced_eamt": 10, "ced_taxcode": "O"}),
+            (("D", 1, "PAYE"), {"ced_ror": 4102, "ced_eglno": 8100}),
+            (("D", 2, "Pension"), {"ced_eind": "R", "ced_ebase": 3,
+                "ced_eamt": 7.5, "ced_rind": "Y", "ced_rbase": 3,
+                "ced_ramt": 10, "ced_rglno": 7100}),
+            (("D", 3, "Medical Aid"), {"ced_eind": "F", "ced_eamt": 1200,
+                "ced_rind": "Y", "ced_ramt": 800, "ced_taxcode": "N",
+                "ced_rglno": 7100}),
+            (("D", 4, "Union Fees"), {"ced_eind": "F", "ced_eamt": 50,
+                "ced_taxcode": "N", "ced_balno": 1}),
+            (("D", 5, "UIF"), {"ced_eind": "R", "ced_ebase": 6,
+                "ced_eamt": 1, "ced_rind": "Y", "ced_taxcode": "N"}),
+            (("D", 6, "Staff Loan"), {"ced_taxcode": "N"})):
+        dat = {"ced_cono": 999, "ced_type": cod[0], "ced_code": cod[1],
+            "ced_desc": cod[2], "ced_eind": "V", "ced_earntype": "S",
+            "ced_rind": "N", "ced_taxcode": "Y", "ced_taxportion": 100,
+            "ced_must": "Y", "ced_monthly": "N", "ced_eglno": 8110}
+        if cod[0] == "E":
+            dat["ced_eglno"] = 0
+            dat["ced_uifportion"] = 100
+            dat["ced_sdlportion"] = 100
+        dat.update(flds)
+        rec = []
+        for c in col:
+            if c in dat:
+                rec.append(dat[c])
+            elif sql.wagedc_dic[c][2][1] in ("A", "a"):
+                rec.append("")
+            else:
+                rec.append(0)
+        sql.insRec("wagedc", data=rec)
+    rnd = random.Random(num)
+    col = sql.wagmst_col
+    mst = []
+    cod = []
+    for emp in range(1, num + 1):
+        dat = {"wgm_cono": 999, "wgm_empno": emp, "wgm_dept": emp % 3 + 1,
+            "wgm_sname": "Surname %s" % emp, "wgm_fname": "Name",
+            "wgm_dob": rnd.choice((19500615, 19700101, 19851231, 19990301)),
+            "wgm_start": rnd.choice((20150101, 20230601, 20240401)),
+            "wgm_payamt": rnd.randint(800, 9000) * 10, "wgm_freq": "M",
+            "wgm_ptype": "S", "wgm_paye": "Y", "wgm_btype": "1"}
+        rec = []
+        for c in col:
+            if c in dat:
+                rec.append(dat[c])
+            elif sql.wagmst_dic[c][2][1] in ("A", "a"):
+                rec.append("")
+            else:
+                rec.append(0)
+        mst.append(rec)
+        codes = [("E", 1, 0, 0), ("D", 2, 0, 0), ("D", 5, 0, 0)]
+        if emp % 2:
+            codes.append(("E", 6, 0, 0))
+        if not emp % 10:
+            codes.append(("E", 8, 0, 0))
+        if not emp % 3:
+            codes.append(("D", 3, 0, 0))
+        if not emp % 5:
+            codes.append(("D", 4, 0, 0))
+            sql.insRec("wagbal", data=[999, emp, 1, 120, ""])
+        if not emp % 7:
+            sql.insRec("waglmf", data=[999, emp, 1, "Staff Loan", 6, 8.5,
+                20240101, 750, ""])
+            sql.insRec("wagltf", data=[999, emp, 1, "B0001", 2, 20240101,
+                "L%s" % emp, 6000, 0, 0, 0, 202401, "Staff Loan", "N",
+                "benchmark", 20240101, "", 0])
+        for typ, code, eamt, ramt in codes:
+            cod.append([999, emp, typ, code, eamt, ramt, ""])
+    sql.insRec("wagmst", data=mst)
+    sql.insRec("wagcod", data=cod)
+    dbm.commitDbase()
+
+def getBaseline():
+    # The wg2020 class of the version before the last change to wg2020, read
+    # from git, or None if not available
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        rev = subprocess.run(["git", "log", "-n", "1", "--format=%H", "--",
+            "wag/wg2020.py"], cwd=top, capture_output=True, text=True,
+            check=True).stdout.strip()
+        src = subprocess.run(["git", "show", "%s~1:wag/wg2020.py" % rev],
+            cwd=top, capture_output=True, text=True, check=True).stdout
+    except:
+        return
+    mod = {"__name__": "wg2020_base"}
+    exec(compile(src, "wg2020_base", "exec"), mod)
+    return mod["wg2020"]
+
+def runPayrun(dbm, num, rundt, preview="N", base=None):
+    # Capture the month's data and run the payslips of wg2020, or of the
+    # base class, returns the elapsed seconds
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "wag"))
+    from wg2020 import wg2020
+    if base:
+        wg2020 = base
+    rnd = random.Random(rundt)
+    sql = Sql(dbm, "wagcap", prog="benchmark")
+    cap = []
+    for emp in range(1, num + 1):
+        cap.append([999, emp, 0, 0, "E", 1, "Y", 0, "N", "benchmark",
+            rundt, 0])
+        if not emp % 4:
+            cap.append([999, emp, 0, 0, "E", 2, "Y", rnd.randint(1, 20),
+                "N", "benchmark", rundt, 0])
+            cap.append([999, emp, 0, 0, "E", 7, "Y", rnd.randint(100, 5000),
+                "N", "benchmark", rundt, 0])
+        if not emp % 9:
+            cap.append([999, emp, 0, 0, "D", 3, "N", 0, "N", "benchmark",
+                rundt, 0])
+        if not emp % 11:
+            cap.append([999, emp, 0, 0, "D", 1, "Y", rnd.randint(100, 900),
+                "N", "benchmark", rundt, 0])
+    sql.insRec("wagcap", data=cap)
+    mf = type("MainFrame", (object,), {"dbm": dbm, "body": None,
+        "window": None, "rcdic": dbm.rcdic})
+    st = time.perf_counter()
+    run = wg2020.__new__(wg2020)
+    run.opts = {"mf": mf, "conum": 999, "conam": "Benchmark", "period":
+        (1, (20240301, ""), (20250228, "")), "capnm": "benchmark"}
+    run.setVariables()
+    run.doRunDate(None, 0, 1, 0, 1, 1, rundt)
+    run.paydt = rundt
+    run.freq = "M"
+    run.whole = "Y"
+    run.dept = ""
+    run.ignore = "N"
+    run.mthly = "Y"
+    run.minus = "N"
+    run.preview = preview
+    recs = run.sql.getRec("wagmst", where=[("wgm_cono", "=", 999),
+        ("wgm_freq", "=", "M")], order="wgm_empno")
+    if not base:
+        run.doLoad(recs)
+    for emp in recs:
+        run.doProcess(emp)
+    if not base:
+        run.doWrite()
+    run.doIntegration()
+    return time.perf_counter() - st
+
+def benchPayrun(dbm, num):
+    getPayrun(dbm, num)
+    sql = Sql(dbm, ["gentrn", "wagbal", "wagcap", "wagltf", "wagtf1",
+        "wagtf2"], prog="benchmark")
+    chks = (("gentrn", "glt", "glt_tramt"), ("wagbal", "wbl", "wbl_balance"),
+        ("wagcap", "wcp", "wcp_paid"), ("wagltf", "wlt", "wlt_amt"),
+        ("wagtf1", "wt1", "wt1_taxbl"), ("wagtf2", "wt2", "wt2_eamt"))
+
+    def getTotals():
+        tots = []
+        for tab, pfx, col in chks:
+            if col == "wcp_paid":
+                col = "count(*)"
+                whr = [("wcp_paid", "=", "Y")]
+            else:
+                col = "round(sum(%s), 2)" % col
+                whr = []
+            tots.append(sql.getRec(tab, cols=["count(*)", col],
+                where=[("%s_cono" % pfx, "=", 999)] + whr, limit=1))
+        return tots
+
+    times = []
+    for rundt in (20240331, 20240430):
+        old = getTotals()
+        secs = runPayrun(dbm, num, rundt, preview="Y")
+        dbm.rollbackDbase()
+        if getTotals() != old:
+            print("Preview of %s CHANGED the tables" % rundt)
+        else:
+            print("Preview of %s left the tables unchanged" % rundt)
+        times.append(("Preview %s" % rundt, secs))
+        secs = runPayrun(dbm, num, rundt)
+        dbm.commitDbase()
+        times.append(("Payrun %s" % rundt, secs))
+    for (tab, pfx, col), tot in zip(chks, getTotals()):
+        print("%-6s %8s records %15s" % (tab, tot[0], tot[1]))
+    print("%-30s %12s %12s" % ("Paying %s employees" % num, "Seconds",
+        "Rate"))
+    for text, secs in times:
+        print("%-30s %11.2fs %10.0f/s" % (text, secs, num / secs))
+    # The previous wg2020 against the current one on the same data, every
+    # table written by the runs being compared, less the sequence numbers
+    base = getBaseline()
+    if not base:
+        print("The previous wg2020 is not available from git")
+    else:
+        tabs = (("gentrn", "glt"), ("wagbal", "wbl"), ("wagcap", "wcp"),
+            ("waglmf", "wlm"), ("wagltf", "wlt"), ("wagmst", "wgm"),
+            ("wagtf1", "wt1"), ("wagtf2", "wt2"))
+        sql = Sql(dbm, [tab[0] for tab in tabs], prog="benchmark")
+        data = []
+        times = []
+        for cls in (base, None):
+            getPayrun(dbm, num)
+            secs = 0
+            for rundt in (20240331, 20240430, 20240531):
+                secs += runPayrun(dbm, num, rundt, base=cls)
+                dbm.commitDbase()
+            times.append(secs)
+            recs = {}
+            for tab, pfx in tabs:
+                dic = getattr(sql, "%s_dic" % tab)
+                cols = [c for c in getattr(sql, "%s_col" % tab) if
+                    dic[c][2] != "US"]
+                recs[tab] = sorted(sql.getRec(tab, cols=cols,
+                    where=[("%s_cono" % pfx, "=", 999)]))
+            data.append(recs)
+        bad = 0
+        for tab, pfx in tabs:
+            if data[0][tab] != data[1][tab]:
+                bad += 1
+                print("%s differs" % tab)
+        print("The previous wg2020 against wg2020, 3 runs, %s records, %s "
+            "differences" % (sum([len(data[1][tab]) for tab, pfx in tabs]),
+            bad))
+        print("%-30s %12s %12s %8s" % ("Payruns", "Before", "After",
+            "Ratio"))
+        print("%-30s %11.2fs %11.2fs %7.1fx" % ("Paying %s employees" % num,
+            times[0], times[1], times[0] / times[1]))
+    for tab, pfx in (("ctlctl", "ctl"), ("ctldep", "dep"), ("ctlynd", "cye"),
+            ("genmst", "glm"), ("gentrn", "glt"), ("wagbal", "wbl"), ("wagcap", "wcp"),
+            ("wagcod", "wcd"), ("wagctl", "ctw"), ("wagedc", "ced"),
+            ("waglmf", "wlm"), ("wagltf", "wlt"), ("wagmst", "wgm"),
+            ("wagtf1", "wt1"), ("wagtf2", "wt2")):
+        Sql(dbm, tab, prog="benchmark").delRec(tab, where=[("%s_cono" % pfx,
+            "=", 999)])
+    dbm.commitDbase()
+
+def benchLookup(dbm, num):
+    sql = Sql(dbm, "drsmst", prog="benchmark")
+    sql.delRec("drsmst", where=[("drm_cono", "=", 999)])
+    rnd = random.Random(num)
+    words = ("Acme", "Bright", "Cape", "Delta", "Eagle", "Falcon", "Granite",
+        "Harbour", "Indigo", "Jade", "Karoo", "Lion", "Marula", "Nova")
+    data = []
+    col = sql.drsmst_col
+    for acno in range(num):
+        dat = {"drm_cono": 999, "drm_chain": acno % 3, "drm_acno":
+            "A%06d" % acno, "drm_name": "%s %s %s" % (rnd.choice(words),
+            rnd.choice(words), rnd.randint(1, 500)), "drm_add1": "%s Street" %
+            rnd.randint(1, 999), "drm_stat": rnd.choice(("N", "N", "X"))}
+        rec = []
+        for c in col:
+            if c in dat:
+                rec.append(dat[c])
+            elif sql.drsmst_dic[c][2][1] in ("A", "a", "X"):
+                rec.append("")
+            else:
+                rec.append(0)
+        data.append(rec)
+    sql.bulkRec("drsmst", data=data)
+    dbm.commitDbase()
+    cols = ["drm_chain", "drm_acno", "drm_name", "drm_add1"]
+    where = [("drm_cono", "=", 999), ("drm_stat", "<>", "X")]
+    diff = 0
+    times = []
+    for order in ("drm_acno", "drm_name", "drm_add1 desc"):
+        # Fetching all the records, as SRec did
+        st = time.perf_counter()
+        recs = sql.getRec("drsmst", cols=cols, where=where, order=order)
+        old = time.perf_counter() - st
+        st = time.perf_counter()
+        pager = LookupPager(dbm, ["drsmst"], cols, where=where, order=order)
+        page, keys, more = pager.getPage()
+        new = time.perf_counter() - st
+        times.append(("Open by %s" % order, old, new))
+        # Page to the end and back to the start
+        fwd = list(page)
+        while more:
+            page, keys, more = pager.getPage(keys[-1])
+            fwd.extend(page)
+        page, keys, more = pager.getPage(direction="P")
+        bwd = list(page)
+        while more:
+            page, keys, more = pager.getPage(keys[0], "P")
+            bwd = page + bwd
+        # The ties of the order are in the order of the unique index
+        pos = cols.index(order.split()[0])
+        chk = sorted(recs, key=lambda x: (x[0], x[1]))
+        chk.sort(key=lambda x: x[pos], reverse=bool(order.count(" desc")))
+        if fwd != chk or bwd != chk:
+            diff += 1
+            print("Paging by %s DIFFERS" % order)
+    # Searching and filtering
+    pager = LookupPager(dbm, ["drsmst"], cols, where=where, order="drm_acno")
+    recs = sql.getRec("drsmst", cols=cols, where=where, order="drm_acno")
+    for text in ("falcon jade 49", "Karoo Lion", "A00012", "zzz"):
+        for begins, col in ((False, 2), (True, 2), (False, 1)):
+            fnd = None
+            for rec in recs:
+                if begins and rec[col].lower().startswith(text.lower()):
+                    fnd = rec[1]
+                    break
+                elif not begins and rec[col].lower().count(text.lower()):
+                    fnd = rec[1]
+                    break
+            key = pager.findKey(col, text, begins)
+            if key:
+                key = key[0]
+            if key != fnd:
+                diff += 1
+                print("Search for %s DIFFERS" % text)
+    for text in ("eagle", "Street"):
+        chk = [rec for rec in recs if rec[2].lower().count(text.lower())]
+        pager.fltr = [pager.getFilter(2, text)]
+        page = pager.getAll()
+        if page != chk:
+            diff += 1
+            print("Filter of %s DIFFERS" % text)
+    pager.fltr = []
+    sql.delRec("drsmst", where=[("drm_cono", "=", 999)])
+    dbm.commitDbase()
+    print("Lookups of %s debtors, %s differences" % (num, diff))
+    print("%-30s %12s %12s %8s" % ("Lookup", "Before", "After", "Ratio"))
+    for text, old, new in times:
+        print("%-30s %11.4fs %11.4fs %7.1fx" % (text, old, new, old / new))
+
+def benchSearch(dbm, num):
+    if "drsmst" not in dbm.getSchema().getSearch(dbm):
+        print("The drsmst search index is not available")
+        return
+    sql = Sql(dbm, "drsmst", prog="benchmark")
+    sql.delRec("drsmst", where=[("drm_cono", "=", 999)])
+    rnd = random.Random(num)
+    words = ("Acme", "Bright", "Cape", "Delta", "Eagle", "Falcon", "Granite",
+        "Harbour", "Indigo", "Jade", "Karoo", "Lion", "Marula", "Nova",
+        "Protea", "Quartz", "Rooibos", "Sable", "Thorn", "Umbrella")
+    col = sql.drsmst_col
+    data = []
+    for acno in range(num):
+        dat = {"drm_cono": 999, "drm_acno": "A%06d" % acno, "drm_name":
+            "%s %s Trading %s" % (rnd.choice(words), rnd.choice(words),
+            rnd.randint(1, 999)), "drm_stat": "N"}
+        rec = []
+        for c in col:
+            if c in dat:
+                rec.append(dat[c])
+            elif sql.drsmst_dic[c][2][1] in ("A", "a", "X"):
+                rec.append("")
+            else:
+                rec.append(0)
+        data.append(rec)
+    # Keep the search index in sync with insRec, updRec and delRec
+    st = time.perf_counter()
+    sql.insRec("drsmst", data=data)
+    for acno in rnd.sample(range(num), num // 20):
+        sql.updRec("drsmst", cols=["drm_name"], data=["%s Holdings %s" %
+            (rnd.choice(words), acno)], where=[("drm_cono", "=", 999),
+            ("drm_chain", "=", 0), ("drm_acno", "=", "A%06d" % acno)])
+    sql.delRec("drsmst", where=[("drm_cono", "=", 999), ("drm_acno", "<",
+        "A%06d" % (num // 20))])
+    dbm.commitDbase()
+    load = time.perf_counter() - st
+    sql.sqlRec("Insert into drsmst_fts (drsmst_fts, rank) values "
+        "('integrity-check', 1)")
+    cols = ["drm_acno", "drm_name"]
+    where = [("drm_cono", "=", 999)]
+    recs = sql.getRec("drsmst", cols=cols, where=where, order="drm_acno")
+    pager = LookupPager(dbm, ["drsmst"], cols, where=where, order="drm_acno")
+    scan = LookupPager(dbm, ["drsmst"], cols, where=where, order="drm_acno")
+    scan.search = []
+    diff = 0
+    times = []
+    for text in ("falcon", "Rooibos Sable", "holdings 1", "ding 99", "zzz"):
+        chk = [rec for rec in recs if rec[1].lower().count(text.lower())]
+        res = []
+        for pgr in (scan, pager):
+            st = time.perf_counter()
+            pgr.fltr = [pgr.getFilter(1, text)]
+            res.append(pgr.getAll())
+            res.append(time.perf_counter() - st)
+            pgr.fltr = []
+        if res[0] != chk or res[2] != chk:
+            diff += 1
+            print("Filter of %s DIFFERS" % text)
+        times.append(("Filter %s" % text, res[1], res[3]))
+    print("Search index of %s debtors loaded and maintained in %.2fs, "
+        "%s differences" % (num, load, diff))
+    print("%-30s %12s %12s %8s" % ("Search", "Like", "Index", "Ratio"))
+    for text, old, new in times:
+        print("%-30s %11.4fs %11.4fs %7.1fx" % (text, old, new, old / new))
+    for text in ("falcon jade", "rooibos hold", "umbrella thorn 12"):
+        st = time.perf_counter()
+        page = pager.getMatches(text, 5)[0]
+        secs = time.perf_counter() - st
+        print("Ranked %-23s %11.4fs %s" % (text, secs, [rec[1] for rec in
+            page[:3]]))
+        for rec in page:
+            for word in text.split():
+                if len(word) > 2 and not rec[1].lower().count(word):
+                    print("Ranked match %s for %s DIFFERS" % (rec, text))
+    sql.delRec("drsmst", where=[("drm_cono", "=", 999)])
+    dbm.commitDbase()
+
+def benchViewer(dbm, num):
+    try:
+        import pymupdf
+    except ImportError:
+        print("Viewer benchmark needs pymupdf")
+        return
+    # A general ledger like listing of num pages
+    rnd = random.Random(num)
+    doc = pymupdf.open()
+    for pgno in range(num):
+        page = doc.new_page()
+        page.insert_text((40, 40), "General Ledger Listing  Page %s" % (pgno +
+            1), fontsize=12)
+        for line in range(70):
+            page.insert_text((40, 60 + line * 10.5), "%07i  %-30s %12.2f" % (
+                rnd.randint(1000000, 9999999), rnd.choice(("Bank Charges",
+                "Sales", "Purchases", "Interest Received", "Rent Paid")),
+                rnd.uniform(-10000, 10000)), fontname="cour", fontsize=8)
+        page.draw_rect(pymupdf.Rect(35, 50, 560, 800), width=0.5)
+    name = os.path.join(dbm.wrkdir, "bench_viewer.pdf")
+    doc.save(name)
+    doc.close()
+    doc = pymupdf.open(name)
+    matrix = list(pymupdf.Matrix(1.25, 1.25))
+    # Page forward, back and forward again as a user would
+    visits = []
+    for pgno in list(range(1, 21)) + list(range(19, 0, -1)) + \
+            list(range(2, 31)):
+        visits.append(pgno)
+    times = []
+    bad = 0
+    old = []
+    st = time.perf_counter()
+    for pgno in visits:
+        dlist = doc[pgno - 1].get_displaylist()
+        pix = dlist.get_pixmap(matrix=matrix, alpha=False)
+        old.append(pix.tobytes("ppm"))
+    ot = time.perf_counter() - st
+    cache = PdfCache(doc)
+    new = []
+    nt = 0
+    idle = 0
+    for pgno in visits:
+        st = time.perf_counter()
+        new.append(cache.getPage(pgno, matrix))
+        nt += time.perf_counter() - st
+        # The prefetch while the user reads the page
+        st = time.perf_counter()
+        page = cache.getPrefetch(pgno, matrix)
+        while page is not None:
+            cache.getPage(page, matrix)
+            page = cache.getPrefetch(pgno, matrix)
+        idle += time.perf_counter() - st
+    if new != old:
+        bad += 1
+        print("The rendered pages differ")
+    times.append(("Paging", ot, nt))
+    # Finding text, the index being built once on the first find
+    st = time.perf_counter()
+    cache.findPages("index")
+    build = time.perf_counter() - st
+    for text in ("Interest Received", "page 77", "bank  charges", "zzz"):
+        st = time.perf_counter()
+        old = []
+        for page in doc:
+            found = page.search_for(text)
+            if found:
+                old.append((page.number + 1, found))
+        ot = time.perf_counter() - st
+        st = time.perf_counter()
+        new = []
+        for pgno in cache.findPages(text):
+            found = doc[pgno - 1].search_for(text)
+            if found:
+                new.append((pgno, found))
+        times.append(("Find %s" % text, ot, time.perf_counter() - st))
+        if new != old:
+            bad += 1
+            print("Finding %s differs" % text)
+    doc.close()
+    os.remove(name)
+    print("Viewing %s pages of %s, %s differences, %.4fs rendering while "
+        "idle, %.4fs building the text index" % (len(visits), num, bad, idle,
+        build))
+    print("%-30s %12s %12s %8s" % ("Viewer", "Before", "After", "Ratio"))
+    for text, old, new in times:
+        print("%-30s %11.4fs %11.4fs %7.1fx" % (text, old, new, old / new))
+
+STARTUP = """
+import importlib, sys, time
+sys.path.insert(0, sys.argv[1])
+tims = [time.perf_counter()]
+import tartanWork
+tims.append(time.perf_counter())
+import tartanImages
+tims.append(time.perf_counter())
+if sys.argv[2] == "eager":
+    for mod in sys.argv[3:]:
+        try:
+            importlib.import_module(mod)
+        except:
+            pass
+import TartanClasses
+tims.append(time.perf_counter())
+print(" ".join([str(tims[x + 1] - tims[x]) for x in range(3)]))
+"""
+
+def legacyImage(name, siz=None):
+    from tartanImages import aliases, images
+    stk = name.lower().split()[0]
+    if stk.count("/"):
+        stk = stk.split("/")[0]
+    if stk not in images and stk not in aliases:
+        return
+    if stk in aliases:
+        stk = aliases[stk]
+    dec = io.BytesIO(base64.b64decode(images[stk]))
+    img = Image.open(dec)
+    if siz is not None:
+        img = img.resize(siz, 0)
+    return img.convert(mode="RGBA")
+
+def benchStartup(dbm, num):
+    import TartanClasses
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    mods = []
+    for obj in vars(TartanClasses).values():
+        if isinstance(obj, LazyModule) and obj._name not in mods:
+            mods.append(obj._name)
+    # Alternate the runs as the timings of a busy machine drift
+    runs = {"eager": [], "lazy": []}
+    for run in range(num):
+        for typ in ("eager", "lazy"):
+            st = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", STARTUP, base, typ] +
+                mods, capture_output=True, text=True).stdout
+            runs[typ].append([time.perf_counter() - st] + [float(x)
+                for x in out.split()])
+    times = []
+    for num, text in enumerate(("Starting python and importing",
+            "Importing tartanWork", "Importing tartanImages",
+            "Importing TartanClasses")):
+        times.append((text, statistics.median([x[num] for x in
+            runs["eager"]]), statistics.median([x[num] for x in
+            runs["lazy"]])))
+    # The images of the main menu, drawn twice, as getImage did and cached
+    names = [mod[2] for mod in tartanWork.tarmen["msmod"]] + ["yes", "no",
+        "cancel", "quit", "help"]
+    bad = 0
+    legacyImage("tartan", (20, 20))
+    for draw in ("First menu images", "Redrawn menu images"):
+        st = time.perf_counter()
+        old = [legacyImage(name, (20, 20)) for name in names]
+        ot = time.perf_counter() - st
+        st = time.perf_counter()
+        new = [loadImage(name, (20, 20), "RGBA") for name in names]
+        times.append((draw, ot, time.perf_counter() - st))
+        for o, n in zip(old, new):
+            if (o is None) != (n is None) or (o and o.tobytes() !=
+                    n.tobytes()):
+                bad += 1
+    print("Startup of %s runs each, optional modules %s, %s images differ" %
+        (len(runs["lazy"]), ", ".join(mods), bad))
+    print("%-30s %12s %12s %8s" % ("Startup", "Before", "After", "Ratio"))
+    for text, old, new in times:
+        print("%-30s %11.4fs %11.4fs %7.1fx" % (text, old, new, old / new))
+
+def legacyLaunch(dbm, logd):
+    sql = Sql(dbm, ["ffield", "ctllog"], prog="ms0000")
+    if not sql.error:
+        chk = sql.getRec("ffield", where=[("ff_tabl", "=", "ctllog")])
+    if not sql.error and len(chk) == 8:
+        sql.insRec("ctllog", data=logd)
+        dbm.commitDbase()
+
+def benchLaunch(dbm, num):
+    sql = Sql(dbm, "ctllog", prog="benchmark")
+    sql.delRec("ctllog", where=[("clg_login", "in", ("old", "new"))])
+    dbm.commitDbase()
+    progs = ["gl1010", "gl2010", "cr2010", "dr2010", "st2010", "wg2010"]
+    logs = []
+    start = datetime.datetime(2026, 1, 1)
+    for num in range(num):
+        tim = start + datetime.timedelta(seconds=num)
+        logs.append(["", "bench", progs[num % len(progs)], num % 3, 1,
+            num % 5, int(tim.strftime("%Y%m%d%H%M%S"))])
+    times = []
+    st = time.perf_counter()
+    for log in logs:
+        legacyLaunch(dbm, ["old"] + log[1:])
+    times.append(("Logging launches", time.perf_counter() - st))
+    writer = LogWriter(dbm.rcdic, delay=0.1)
+    st = time.perf_counter()
+    for log in logs:
+        writer.addLog(["new"] + log[1:])
+    times[-1] += (time.perf_counter() - st,)
+    # A launch twice in the same second is skipped and not fatal
+    writer.addLog(["new"] + logs[0][1:])
+    st = time.perf_counter()
+    writer.closeWriter()
+    wait = time.perf_counter() - st
+    cols = ["clg_user", "clg_prog", "clg_type", "clg_cono", "clg_period",
+        "clg_start", "clg_xflag"]
+    old = sql.getRec("ctllog", cols=cols, where=[("clg_login", "=", "old")],
+        order="clg_start")
+    new = sql.getRec("ctllog", cols=cols, where=[("clg_login", "=", "new")],
+        order="clg_start")
+    bad = int(old != new or len(new) != len(logs))
+    sql.delRec("ctllog", where=[("clg_login", "in", ("old", "new"))])
+    dbm.commitDbase()
+    # The loader option, the modules being unchanged
+    mods = ["gen.%s" % prog for prog in ("gl1010", "gl2010", "gl3010")]
+    for mod in mods:
+        importlib.import_module(mod)
+    st = time.perf_counter()
+    for run in range(20):
+        for mod in mods:
+            for nam in list(sys.modules):
+                if nam.count(mod.split(".")[1]):
+                    del sys.modules[nam]
+                    gc.collect()
+            importlib.import_module(mod)
+    old = time.perf_counter() - st
+    loaded = {}
+    for mod in mods:
+        loaded[mod] = time.time()
+    st = time.perf_counter()
+    for run in range(20):
+        for mod in mods:
+            for nam in list(sys.modules):
+                if not nam.count(mod.split(".")[1]):
+                    continue
+                try:
+                    if os.path.getmtime(sys.modules[nam].__file__) >= \
+                            loaded[nam]:
+                        raise Exception("Changed")
+                except:
+                    del sys.modules[nam]
+            importlib.import_module(mod)
+    times.append(("Loader re-importing", old, time.perf_counter() - st))
+    print("Launching %s modules, %s differences, %.4fs writing the log in "
+        "the background" % (len(logs), bad, wait))
+    print("%-30s %12s %12s %8s" % ("Launch", "Before", "After", "Ratio"))
+    for text, old, new in times:
+        print("%-30s %11.4fs %11.4fs %7.1fx" % (text, old, new, old / new))
+
+def runBackup(mf, incr):
+    # Make a backup, returns the name, the manifest and the elapsed seconds
+    time.sleep(1)
+    st = time.perf_counter()
+    bck = TarBckRes(mf, mode="B", pbar=False, incr=incr)
+    secs = time.perf_counter() - st
+    tarfle = tarfile.open(bck.arcfle, "r")
+    manifest = json.load(tarfle.extractfile("manifest.json"))
+    tarfle.close()
+    return os.path.basename(bck.arcfle), manifest, secs
+
+def runRestore(mf, arc, cono):
+    # Restore the company's tables from an archive and its chain, as
+    # doFullRestore does without the dialog and progress bars
+    res = TarBckRes.__new__(TarBckRes)
+    res.mf = mf
+    res.mode = "R"
+    res.workers = 1
+    res.p1 = None
+    res.ver = None
+    res.full = "Y"
+    res.setVariables()
+    res.doPlace(None, 0, 1, 0, 1, 1, arc)
+    for tmp, manifest in res.getArchives():
+        for name, comp, fle, ent, incr in res.getFiles(tmp, manifest):
+            if comp != cono:
+                continue
+            sql = res.getSql(mf.dbm, name)
+            if incr:
+                res.clearTable(sql, name, comp, ent)
+            else:
+                res.clearTable(sql, name, comp)
+            if not res.restoreTable(sql, name, fle, ent, pbar=False):
+                mf.dbm.rollbackDbase()
+                return False
+    mf.dbm.commitDbase()
+    shutil.rmtree(res.tmpdir)
+    return True
+
+def benchBackup(dbm, num):
+    sql = Sql(dbm, ["ctlmst", "gentrn"], prog="benchmark")
+    sql.delRec("ctlmst", where=[("ctm_cono", "=", 999)])
+    sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+    rec = []
+    for c in sql.ctlmst_col:
+        if sql.ctlmst_dic[c][2][1] in ("A", "a"):
+            rec.append("")
+        else:
+            rec.append(0)
+    rec[:2] = [999, "Benchmark"]
+    sql.insRec("ctlmst", data=rec)
+    rnd = random.Random(num)
+
+    def addTrans(cnt, capdt):
+        data = []
+        for seq in range(cnt):
+            data.append([999, rnd.randint(1000, 9999), capdt // 100,
+                capdt, 4, "R%s" % rnd.randint(1, 99999), "B%s" % (capdt %
+                100), round(rnd.uniform(-5000, 5000), 2), 0, "Journal", "N",
+                "", 0, "benchmark", capdt, "", 0])
+        sql.insRec("gentrn", data=data)
+
+    def getTrans():
+        # The sequence is renumbered when restored
+        return sql.getRec("gentrn", cols=sql.gentrn_col[:-1],
+            where=[("glt_cono", "=", 999)], order="glt_seq")
+
+    for day in range(1, 11):
+        addTrans(num // 10, 20240100 + day)
+    dbm.commitDbase()
+    bupdir = tempfile.mkdtemp(prefix="tartan_")
+    rcdic = dict(dbm.rcdic)
+    rcdic["bupdir"] = bupdir
+    mf = type("MainFrame", (object,), {"dbm": dbm, "body": None,
+        "window": None, "rcdic": rcdic})
+    arcs = []
+    times = []
+    arc, manifest, secs = runBackup(mf, False)
+    arcs.append((arc, manifest, getTrans(), None))
+    times.append(("Full backup", secs))
+    for text, incr in (
+            ("Amended transaction", False),
+            ("Appended transactions", True),
+            ("Backdated transaction", False)):
+        if text == "Amended transaction":
+            seq = sql.getRec("gentrn", cols=["glt_seq"], where=[("glt_cono",
+                "=", 999)], order="glt_seq", limit=num // 20)[-1][0]
+            sql.updRec("gentrn", cols=["glt_recon"], data=[202401],
+                where=[("glt_seq", "=", seq)])
+        elif text == "Backdated transaction":
+            seq = sql.getRec("gentrn", cols=["glt_seq"], where=[("glt_cono",
+                "=", 999)], order="glt_seq", limit=num // 30)[-1][0]
+            sql.delRec("gentrn", where=[("glt_seq", "=", seq)])
+            addTrans(1, 20240102)
+        addTrans(num // 10, 20240111 + len(arcs))
+        dbm.commitDbase()
+        arc, manifest, secs = runBackup(mf, True)
+        arcs.append((arc, manifest, getTrans(), incr))
+        times.append((text, secs))
+    bad = 0
+    for arc, manifest, trans, incr in arcs:
+        for ent in manifest["files"]:
+            if ent["name"] == "gentrn_999.rec":
+                if incr is not None and incr != bool("from" in ent):
+                    bad += 1
+                    print("%s backed up gentrn %s" % (arc, ["in full",
+                        "incrementally"][int("from" in ent)]))
+        sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+        dbm.commitDbase()
+        if not runRestore(mf, arc, 999) or getTrans() != trans:
+            bad += 1
+            print("Restoring %s differs" % arc)
+    sql.delRec("ctlmst", where=[("ctm_cono", "=", 999)])
+    sql.delRec("gentrn", where=[("glt_cono", "=", 999)])
+    dbm.commitDbase()
+    shutil.rmtree(bupdir, ignore_errors=True)
+    print("Backing up and restoring %s archives, %s differences" % (len(arcs),
+        bad))
+    print("%-30s %12s" % ("Backup", "Seconds"))
+    for text, secs in times:
+        print("%-30s %11.2fs" % (text, secs))
+
+def benchStrBal(dbm, num):
+    sql = Sql(dbm, ["strbal", "strtrn"], prog="benchmark")
+    sql.delRec("strtrn", where=[("stt_cono", "=", 999)])
+    dbm.commitDbase()
+    items = [("GRP", "ITEM%s" % itm, "1") for itm in range(5)]
+    errs = []
+
+    def doPost(user):
+        # Post num transactions of the items, deleting every tenth one
+        pdbm = Dbase(rcdic=dbm.rcdic)
+        pdbm.openDbase()
+        psql = Sql(pdbm, "strtrn", prog="benchmark")
+        rnd = random.Random(user)
+        try:
+            # Summary postings, each adding to the summary first
+            stb = StrBal(pdbm)
+            for seq in range(num):
+                grp, code, loc = items[seq % len(items)]
+                stb.addSums([[998, grp, code, loc, 202403, 1, 1.5, 10.25,
+                    20.5, 1]])
+                pdbm.commitDbase()
+            for seq in range(num):
+                grp, code, loc = items[seq % len(items)]
+                ref = "%s%s" % (user, seq)
+                psql.insRec("strtrn", data=[999, grp, code, loc, 20240315,
+                    rnd.choice((1, 3)), ref, "B%s" % user, "", rnd.randint(1,
+                    20), round(rnd.uniform(1, 500), 2), round(rnd.uniform(1,
+                    900), 2), 202403, "Posting", 0, "", "", "STR", 0, "",
+                    "benchmark", 20240315, "", 0])
+                if not seq % 10:
+                    psql.delRec("strtrn", where=[("stt_cono", "=", 999),
+                        ("stt_ref1", "=", ref)])
+                pdbm.commitDbase()
+        except Exception as err:
+            errs.append(err)
+        pdbm.closeDbase()
+
+    st = time.perf_counter()
+    thds = [threading.Thread(target=doPost, args=(user,)) for user in
+        ("A", "B")]
+    for thd in thds:
+        thd.start()
+    for thd in thds:
+        thd.join()
+    secs = time.perf_counter() - st
+    bals = sql.getRec("strbal", where=[("sbl_cono", "=", 999)],
+        order="sbl_group, sbl_code, sbl_loc, sbl_curdt, sbl_type")
+    sums = StrBal(dbm).getSums(where=[("stt_cono", "=", 999)])
+    sums.sort()
+    tots = sql.getRec("strbal", cols=["sum(sbl_qty)", "sum(sbl_cost)",
+        "sum(sbl_sell)", "sum(sbl_trns)"], where=[("sbl_cono", "=", 998)],
+        limit=1)
+    trns = sql.getRec("strtrn", cols=["count(*)"], where=[("stt_cono", "=",
+        999)], limit=1)[0]
+    bad = len(errs) + int(bals != sums) + int(trns != num * 2 - (num // 10 +
+        min(1, num % 10)) * 2) + int(tots != [num * 3, num * 20.5, num * 41,
+        num * 2])
+    sql.delRec("strbal", where=[("sbl_cono", "=", 998)])
+    sql.delRec("strtrn", where=[("stt_cono", "=", 999)])
+    dbm.commitDbase()
+    print("Posting %s summaries and %s transactions by 2 users, %s "
+        "differences" % (num * 2, num * 2, bad))
+    print("%-30s %12s %12s" % ("Posting", "Seconds", "Rate"))
+    print("%-30s %11.2fs %10.0f/s" % ("Concurrent postings", secs,
+        num * 4 / secs))
+
+def benchMatrix(dbm, num):
+    sql = Sql(dbm, ["genbal", "genbud", "gentrn"], prog="benchmark")
+    conos = [998, 999]
+    for tab, pfx in (("genbal", "glo"), ("genbud", "glb"), ("gentrn", "glt")):
+        sql.delRec(tab, where=[("%s_cono" % pfx, "in", conos)])
+    rnd = random.Random(num)
+    acnos = [(dep * 1000) + acc for dep in (1, 2, 3) for acc in (100, 200,
+        300)]
+    curdts = [(yr * 100) + mth for yr in (2022, 2023, 2024) for mth in
+        range(1, 13)]
+    trdts = [20220101, 20230101, 20240101]
+    move = {}
+    budg = {}
+    obal = {}
+    data = []
+    for seq in range(num):
+        cono = rnd.choice(conos)
+        acno = rnd.choice(acnos)
+        curdt = rnd.choice(curdts)
+        amt = round(rnd.uniform(-5000, 5000), 2)
+        data.append([cono, acno, curdt, (curdt * 100) + 1, 4, "R%s" % seq,
+            "B%s" % (curdt % 100), amt, 0, "Journal", "N", "", 0,
+            "benchmark", curdt * 100 + 1, "", 0])
+        key = (cono, acno, curdt)
+        move[key] = move.get(key, 0) + int(round(amt * 100))
+    sql.insRec("gentrn", data=data)
+    for cono in conos:
+        for acno in acnos:
+            for curdt in curdts:
+                amt = rnd.randint(-1000, 1000)
+                sql.insRec("genbud", data=[cono, acno, curdt, amt, ""])
+                budg[(cono, acno, curdt)] = amt * 100
+            for trdt in trdts:
+                amt = round(rnd.uniform(-9000, 9000), 2)
+                sql.insRec("genbal", data=[cono, acno, trdt, amt, ""])
+                obal[(cono, acno, trdt)] = int(round(amt * 100))
+    dbm.commitDbase()
+
+    def getSum(amts, cono, acno, per, consol, base):
+        tot = 0
+        for (c, a, p), amt in amts.items():
+            if p != per:
+                continue
+            if not consol and c != cono:
+                continue
+            if base:
+                if a % base != acno % base:
+                    continue
+            elif a != acno:
+                continue
+            tot += amt
+        return round(tot / 100.0, 2)
+
+    bad = 0
+    cnt = 0
+    times = {}
+    for nam, consol, base in (("Company", False, None), ("Consolidated",
+            True, None), ("Department", False, 1000)):
+        st = time.perf_counter()
+        mtx = GenMatrix(sql, conos, 202301, 202312, [20230101],
+            consol=consol, base=base)
+        for cono in conos:
+            for acno in acnos:
+                for curdt in curdts:
+                    for amts, func in ((move, mtx.getMove), (budg,
+                            mtx.getBudget)):
+                        amt = func(cono, acno, curdt)
+                        cnt += 1
+                        if amt != getSum(amts, cono, acno, curdt, consol,
+                                base):
+                            bad += 1
+                for trdt in trdts:
+                    amt = mtx.getObal(cono, acno, trdt)
+                    cnt += 1
+                    if amt != getSum(obal, cono, acno, trdt, consol, base):
+                        bad += 1
+        times[nam] = time.perf_counter() - st
+    for tab, pfx in (("genbal", "glo"), ("genbud", "glb"), ("gentrn", "glt")):
+        sql.delRec(tab, where=[("%s_cono" % pfx, "in", conos)])
+    dbm.commitDbase()
+    print("Looking up %s amounts within and outside the loaded periods, "
+        "%s differences" % (cnt, bad))
+    print("%-30s %12s" % ("Matrix", "Seconds"))
+    for nam in ("Company", "Consolidated", "Department"):
+        print("%-30s %11.2fs" % (nam, times[nam]))
+
+if __name__ == "__main__":
+    bench = {
+        "getrec": (benchGetRec, 20000),
+        "autoage": (benchAutoAge, 100000),
+        "statement": (benchStatement, 20000),
+        "bulkrec": (benchBulkRec, 100000),
+        "ccf": (benchCCF, 20000),
+        "money": (benchMoney, 1000000),
+        "mail": (benchMail, 500),
+        "render": (benchRender, 500),
+        "prices": (benchPrices, 2000),
+        "payrun": (benchPayrun, 2000),
+        "lookup": (benchLookup, 20000),
+        "search": (benchSearch, 100000),
+        "viewer": (benchViewer, 500),
+        "startup": (benchStartup, 10),
+        "launch": (benchLaunch, 500),
+        "backup": (benchBackup, 20000),
+        "strbal": (benchStrBal, 1000),
+        "matrix": (benchMatrix, 5000)}
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "b:n:r:")
+    except:
+        print(__doc__)
+        sys.exit()
+    test = None
+    num = None
+    rcf = None
+    for o, v in opts:
+        if o == "-b":
+            test = v
+        elif o == "-n":
+            num = int(v)
+        elif o == "-r":
+            rcf = v
+    if test and test not in bench:
+        print("Invalid benchmark %s, choose from %s" % (test,
+            ", ".join(bench.keys())))
+        sys.exit()
+    dbm = getDbase(rcf)
+    for nam in bench:
+        if test and nam != test:
+            continue
+        func, dflt = bench[nam]
+        func(dbm, num or dflt)
+    dbm.closeDbase()
+    if not rcf:
+        shutil.rmtree(dbm.wrkdir, ignore_errors=True)
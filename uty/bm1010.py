@@ -24,7 +24,7 @@ COPYING
     along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
-import glob, imghdr, os, pathlib, time
+import glob, imghdr, os, pathlib
 try:
     import requests
     REQ = True
@@ -41,10 +41,10 @@ try:
 except:
     FITZ = False
 
-from TartanClasses import FileImport, GetCtl, Image, ShowEmail, SplashScreen
-from TartanClasses import Sql, TartanDialog
+from TartanClasses import FileImport, GetCtl, Image, MailQueue, ShowEmail
+from TartanClasses import SplashScreen, Sql, TartanDialog
 from tartanFunctions import askQuestion, b64Convert, getSingleRecords
-from tartanFunctions import sendMail, showError
+from tartanFunctions import showError
 
 class bm1010(object):
     def __init__(self, **opts):
@@ -1102,6 +1102,7 @@ xbm   X Bitmap Files""")
         elif self.ulist == "X":
             accs = self.impdat
         sent = []
+        mq = MailQueue(self.smtp, workers=4)
         for num, acc in enumerate(accs):
             mail = acc[0].strip().replace(" ", "").split(",")
             for add in mail:
@@ -1127,43 +1128,52 @@ xbm   X Bitmap Files""")
                         name = "%s %s" % (nam[1], nam[0])
                     mess = self.mess.replace("{{surname}}", name)
                     html = html.replace("{{surname}}", name)
-            ok = False
-            while not ok:
-                sp = SplashScreen(self.opts["mf"].body, "E-Mailing the "\
-                    "Message to %s\n\nPlease Wait........ (%s of %s)" %
-                    (mail[0], num + 1, len(accs)))
-                if self.link == "Y":
-                    url = (self.lnktxt, self.lnkurl)
-                else:
-                    url = None
-                err = sendMail(self.smtp, self.fadd, mail, self.subj,
-                    mess=(mess, html), attach=self.attach, embed=self.embed,
-                    lnkurl=url, wrkdir=self.opts["mf"].rcdic["wrkdir"])
-                sp.closeSplash()
-                if err:
-                    if self.skip == "Y":
-                        ok = "SKIPPED"
-                    else:
-                        ok = askQuestion(self.opts["mf"].body, "E-Mail Error",
-                            "Problem Delivering This Message.\n\nTo: "\
-                            "%s\nSubject: %s\n\n%s\n\nWould You Like to "\
-                            "Retry?" % (mail, self.subj, err))
-                    if ok == "yes":
-                        ok = False
-                    else:
-                        ok = "FAILED"
-                else:
-                    ok = "OK"
-            # Log the email attempt into table emllog.
-            tadd = ""
-            for t in mail:
-                if not tadd:
-                    tadd = t
-                else:
-                    tadd = tadd + ", " + t
-            self.sql.insRec("emllog", data=[self.fadd.strip(), tadd.strip(),
-                self.subj.strip(), "%04i-%02i-%02i %02i:%02i" % \
-                time.localtime()[0:5], ok])
+            if self.link == "Y":
+                url = (self.lnktxt, self.lnkurl)
+            else:
+                url = None
+            mq.addMail(self.fadd, mail, self.subj, mess=(mess, html),
+                attach=self.attach, embed=self.embed, lnkurl=url, key=num)
+        # Send the messages, reusing the mail server sessions, and log the
+        # result of every recipient into table emllog.
+        logs = []
+        while mq.mails:
+            sp = SplashScreen(self.opts["mf"].body, "E-Mailing %s "\
+                "Messages\n\nPlease Wait........" % len(mq.mails))
+            mails = {mail[0]: mail for mail in mq.mails}
+            results = mq.doSend()
+            sp.closeSplash()
+            fails = []
+            for result in results:
+                if result[4] == "OK":
+                    logs.append(result)
+                elif result[0] not in fails:
+                    fails.append(result[0])
+            if not fails:
+                break
+            if self.skip == "Y":
+                ok = "no"
+            else:
+                err = [r for r in results if r[0] == fails[0]][0][5]
+                ok = askQuestion(self.opts["mf"].body, "E-Mail Error",
+                    "Problem Delivering %s of %s Messages.\n\nTo: %s\n"\
+                    "Subject: %s\n\n%s\n\nWould You Like to Retry?" %
+                    (len(fails), len(mails), mails[fails[0]][2], self.subj,
+                    err))
+            if ok == "yes":
+                for key in fails:
+                    mq.addMail(*mails[key][1:], key=key)
+                continue
+            if self.skip == "Y":
+                sta = "SKIPPED"
+            else:
+                sta = "FAILED"
+            for result in results:
+                if result[4] != "OK":
+                    logs.append(result[:4] + (sta, result[5]))
+        mq.closeQueue()
+        if logs:
+            self.sql.insRec("emllog", data=mq.getLog(logs))
             self.opts["mf"].dbm.commitDbase()
 
     def doGetRecs(self, tab, col, whr, odr, sel):
@@ -25,8 +25,9 @@ COPYING
 """
 
 import os, shutil, time
-from TartanClasses import GetCtl, SelectChoice, SplashScreen, Sql, TartanDialog
-from tartanFunctions import askQuestion, callModule, doPrinter, sendMail
+from TartanClasses import GetCtl, MailQueue, SelectChoice, SplashScreen, Sql
+from TartanClasses import TartanDialog
+from tartanFunctions import askQuestion, callModule, doPrinter
 from tartanFunctions import showError, getPrinters, showWarning
 from tartanWork import allsys, tarmen
 
@@ -410,13 +411,14 @@ Therefore No Emailing will be Possible.""")
     def doEmailReps(self):
         subj = "Sundry Reports"
         ok = False
+        mq = MailQueue(self.smtp)
         while not ok:
             emls = self.tadd.split(",")
             for eml in emls:
                 sp = SplashScreen(self.opts["mf"].body, "E-Mailing the "\
                     "Message to\n\n%s\n\nPlease Wait........" % eml)
-                err = sendMail(self.smtp, self.fadd, eml, subj, mess=self.mess,
-                    attach=self.fles, wrkdir=self.opts["mf"].rcdic["wrkdir"])
+                err = mq.sendMail(self.fadd, eml, subj, mess=self.mess,
+                    attach=self.fles)
                 sp.closeSplash()
                 if err:
                     if self.skip == "Y":
@@ -433,8 +435,9 @@ Therefore No Emailing will be Possible.""")
                 else:
                     ok = "OK"
                 # Log the email attempt into table emllog.
-                self.sql.insRec("emllog", data=[self.fadd, self.tadd, subj,
+                self.sql.insRec("emllog", data=[self.fadd, eml, subj,
                     "%04i-%02i-%02i %02i:%02i" % time.localtime()[0:5], ok])
+        mq.closeQueue()
 
     def doPrintReps(self):
         repprt = ["Y", "P", self.sprt]
@@ -28,7 +28,7 @@ COPYING
 
 import operator, os
 from TartanClasses import ViewPDF, DrawForm, FileDialog, RepPrt, Sql
-from TartanClasses import TartanDialog, tkfont
+from TartanClasses import TartanDialog, clearForms, tkfont
 from tartanFunctions import askQuestion, showError, showInfo
 from tartanWork import allsys, stdtpl, tptrtp
 
@@ -726,6 +726,7 @@ class tp1010(object):
         self.sql.delRec("tplmst", where=[("tpm_tname", "=", self.template)])
         self.sql.delRec("tpldet", where=[("tpd_tname", "=", self.template)])
         self.opts["mf"].dbm.commitDbase()
+        clearForms(self.template)
         self.df.focusField("T", 0, 1)
 
     def doCpyTpt(self):
@@ -851,6 +852,7 @@ class tp1010(object):
                 else:
                     self.sql.insRec("tpldet", data=dat[1:])
         self.opts["mf"].dbm.commitDbase()
+        clearForms()
         showInfo(self.opts["mf"].body, "Import",
             "The Template has been Imported.")
         self.df.focusField(self.df.frt, self.df.pag, 1)
@@ -933,6 +935,8 @@ class tp1010(object):
 
     def doView(self):
         self.df.setWidget(self.df.mstFrame, state="hide")
+        # Compile the template as it is now, changes not yet being saved
+        clearForms(self.template)
         self.frm = DrawForm(self.opts["mf"].dbm, self.template,
             wrkdir=self.opts["mf"].rcdic["wrkdir"])
         self.frm.doNewDetail()
@@ -1065,6 +1069,7 @@ class tp1010(object):
     def doT1Exit(self):
         if not self.nochg:
             self.opts["mf"].dbm.commitDbase(ask=True, mess="Save All Changes?")
+        clearForms(self.template)
         self.df.focusField("T", 0, 1)
 
     def doT2Exit(self):
@@ -241,6 +241,7 @@ class wg2020(object):
                 pb = ProgressBar(self.opts["mf"].body, mxs=len(recs), esc=True)
             else:
                 pb = ProgressBar(self.opts["mf"].body, mxs=len(recs))
+            self.doLoad(recs)
             for num, emp in enumerate(recs):
                 pb.displayProgress(num)
                 if self.preview == "Y" and pb.quit:
@@ -250,6 +251,7 @@ class wg2020(object):
             if self.preview == "Y" and pb.quit:
                 self.opts["mf"].closeLoop()
                 return
+            self.doWrite()
             if self.glint == "Y":
                 chk = self.doIntegration()
             else:
@@ -276,6 +278,92 @@ No Records Have Been Updated.""")
         self.df.closeProcess()
         self.opts["mf"].closeLoop()
 
+    def doLoad(self, recs):
+        # Load the codes, captured data, balances, loans and year to date
+        # totals of all the employees in the run
+        self.edc = {}
+        col = self.sql.wagedc_col
+        for rec in self.sql.getRec("wagedc", where=[("ced_cono", "=",
+                self.opts["conum"])]):
+            key = (rec[col.index("ced_type")], rec[col.index("ced_code")])
+            self.edc[key] = rec
+        self.cod = {}
+        self.yes = {}
+        self.no = {}
+        self.bal = {}
+        self.lmf = {}
+        self.ytd = {}
+        self.tax = {}
+        col = self.sql.wagmst_col.index("wgm_empno")
+        emps = [int(emp[col]) for emp in recs]
+        for x in range(0, len(emps), 500):
+            whr = [("wcd_cono", "=", self.opts["conum"]), ("wcd_empno", "in",
+                emps[x:x + 500])]
+            for rec in self.sql.getRec("wagcod", where=whr,
+                    order="wcd_empno, wcd_type, wcd_code"):
+                self.cod.setdefault(rec[1], []).append(rec)
+            whr = [("wcp_cono", "=", self.opts["conum"]), ("wcp_empno", "in",
+                emps[x:x + 500]), ("wcp_paid", "=", "N")]
+            for rec in self.sql.getRec("wagcap", cols=["wcp_empno",
+                    "wcp_type", "wcp_code", "round(sum(wcp_amt),2)"],
+                    where=whr + [("wcp_ind", "=", "Y")],
+                    group="wcp_empno, wcp_type, wcp_code",
+                    order="wcp_empno, wcp_type, wcp_code"):
+                self.yes.setdefault(rec[0], []).append(rec[1:])
+            for rec in self.sql.getRec("wagcap", cols=["wcp_empno",
+                    "wcp_type", "wcp_code"], where=whr + [("wcp_ind", "=",
+                    "N")]):
+                self.no.setdefault(rec[0], []).append(rec[1:])
+            whr = [("wbl_cono", "=", self.opts["conum"]), ("wbl_empno", "in",
+                emps[x:x + 500])]
+            for rec in self.sql.getRec("wagbal", where=whr):
+                self.bal[(rec[1], rec[2])] = rec
+            whr = [("wlm_cono", "=", self.opts["conum"]), ("wlm_empno", "in",
+                emps[x:x + 500])]
+            for rec in self.sql.getRec("waglmf", where=whr):
+                self.lmf.setdefault(rec[1], {})[rec[2]] = rec
+            whr = [("wt1_cono", "=", self.opts["conum"]), ("wt1_empno", "in",
+                emps[x:x + 500]), ("wt1_date", "between", self.sdate,
+                self.rundt)]
+            for rec in self.sql.getRec("wagtf1", cols=["wt1_empno",
+                    "round(sum(wt1_taxbl), 2)", "round(sum(wt1_rtpay), 2)",
+                    "round(sum(wt1_anpay), 2)"], where=whr, group="wt1_empno"):
+                self.ytd[rec[0]] = rec[1:]
+            whr = [("wt2_cono", "=", self.opts["conum"]), ("wt2_empno", "in",
+                emps[x:x + 500]), ("wt2_date", "between", self.sdate,
+                self.rundt), ("wt2_type", "=", "D"), ("wt2_code", "=", 1)]
+            for rec in self.sql.getRec("wagtf2", cols=["wt2_empno",
+                    "round(sum(wt2_eamt),2)"], where=whr, group="wt2_empno"):
+                self.tax[rec[0]] = rec[1]
+        # Records to be written by doWrite
+        self.paid = []
+        self.upbal = {}
+        self.wagtf1 = []
+        self.wagtf2 = {}
+        self.wagltf = []
+        self.gentrn = {}
+
+    def doWrite(self):
+        # Write the records of the run
+        if self.paid:
+            for x in range(0, len(self.paid), 500):
+                self.sql.updRec("wagcap", cols=["wcp_paid"], data=["Y"],
+                    where=[("wcp_cono", "=", self.opts["conum"]),
+                    ("wcp_empno", "in", self.paid[x:x + 500])])
+        for key in self.upbal:
+            self.sql.updRec("wagbal", data=self.upbal[key],
+                where=[("wbl_cono", "=", self.opts["conum"]), ("wbl_empno",
+                "=", key[0]), ("wbl_balno", "=", key[1])])
+        for tab, data in (("wagtf1", self.wagtf1), ("wagtf2",
+                list(self.wagtf2.values())), ("wagltf", self.wagltf)):
+            if data:
+                self.sql.insRec(tab, data=data)
+        self.paid = []
+        self.upbal = {}
+        self.wagtf1 = []
+        self.wagtf2 = {}
+        self.wagltf = []
+
     def doProcess(self, emp):
         self.empno = int(emp[self.sql.wagmst_col.index("wgm_empno")])
         self.dob = emp[self.sql.wagmst_col.index("wgm_dob")]
@@ -320,7 +408,7 @@ No Records Have Been Updated.""")
                 self.pspay, self.taxdd, self.nondd, self.psded,
                 int(self.uifpay), int(self.sdlpay), self.shift,
                 self.drbal, self.opts["capnm"], self.sysdtw, 0)
-            self.sql.insRec("wagtf1", data=wagtf1)
+            self.wagtf1.append(wagtf1)
             self.doPAYE()
             if self.loan:
                 self.doStaffLoans()
@@ -341,8 +429,7 @@ No Records Have Been Updated.""")
     def doCodes(self):
         self.ern = {}
         self.ded = {}
-        codes = self.sql.getRec("wagcod", where=[("wcd_cono", "=",
-            self.opts["conum"]), ("wcd_empno", "=", self.empno)])
+        codes = self.cod.get(self.empno)
         if not codes:
             return
         for c in codes:
@@ -350,9 +437,7 @@ No Records Have Been Updated.""")
             code = int(c[self.sql.wagcod_col.index("wcd_code")])
             eamt = float(c[self.sql.wagcod_col.index("wcd_eamt")])
             ramt = float(c[self.sql.wagcod_col.index("wcd_ramt")])
-            det = self.sql.getRec("wagedc", where=[("ced_cono", "=",
-                self.opts["conum"]), ("ced_type", "=", ctype), ("ced_code",
-                "=", code)], limit=1)
+            det = self.edc.get((ctype, code))
             if not det:
                 continue
             if ctype == "D" and det[
@@ -374,13 +459,8 @@ No Records Have Been Updated.""")
                     self.ded[code] = [eamt, ramt]
 
     def doCapture(self):
-        yes = self.sql.getRec("wagcap", cols=["wcp_type", "wcp_code",
-            "round(sum(wcp_amt),2)"], where=[("wcp_cono", "=",
-            self.opts["conum"]), ("wcp_empno", "=", self.empno), ("wcp_ind",
-            "=", "Y"), ("wcp_paid", "=", "N")], group="wcp_type, wcp_code")
-        no = self.sql.getRec("wagcap", cols=["wcp_type", "wcp_code"],
-            where=[("wcp_cono", "=", self.opts["conum"]), ("wcp_empno", "=",
-            self.empno), ("wcp_ind", "=", "N"), ("wcp_paid", "=", "N")])
+        yes = self.yes.get(self.empno)
+        no = self.no.get(self.empno)
         if not yes:
             return
         if not no:
@@ -389,11 +469,11 @@ No Records Have Been Updated.""")
             typ = y[0]
             cod = int(y[1])
             amt = float(y[2])
-            ind = self.sql.getRec("wagedc", cols=["ced_eind",
-                "ced_ror"], where=[("ced_cono", "=", self.opts["conum"]),
-                ("ced_type", "=", typ), ("ced_code", "=", cod)], limit=1)
+            ind = self.edc.get((typ, cod))
             if not ind:
                 continue
+            ind = [ind[self.sql.wagedc_col.index("ced_eind")],
+                ind[self.sql.wagedc_col.index("ced_ror")]]
             if typ == "E":
                 if cod in self.ern:
                     if ind[0] == "R":
@@ -424,9 +504,7 @@ No Records Have Been Updated.""")
                 if cod in self.ded:
                     del self.ded[cod]
         if self.preview == "N":
-            self.sql.updRec("wagcap", cols=["wcp_paid"], data=["Y"],
-                where=[("wcp_cono", "=", self.opts["conum"]), ("wcp_empno",
-                "=", self.empno)])
+            self.paid.append(self.empno)
         return True
 
     def doEarnings(self):
@@ -439,9 +517,7 @@ No Records Have Been Updated.""")
         idx = list(self.ern.keys())
         idx.sort()
         for cod in idx:
-            ced = self.sql.getRec("wagedc", where=[("ced_cono", "=",
-                self.opts["conum"]), ("ced_type", "=", "E"), ("ced_code", "=",
-                cod)], limit=1)
+            ced = self.edc.get(("E", cod))
             if not ced:
                 continue
             eind = ced[self.sql.wagedc_col.index("ced_eind")]
@@ -545,9 +621,7 @@ No Records Have Been Updated.""")
         idx = list(self.ded.keys())
         idx.sort()
         for cod in idx:
-            ced = self.sql.getRec("wagedc", where=[("ced_cono", "=",
-                self.opts["conum"]), ("ced_type", "=", "D"), ("ced_code", "=",
-                cod)], limit=1)
+            ced = self.edc.get(("D", cod))
             if not ced:
                 continue
             eind = ced[self.sql.wagedc_col.index("ced_eind")]
@@ -601,11 +675,7 @@ No Records Have Been Updated.""")
                 emt = eamt
             # Check Balance Records
             if balno:
-                bwh = [
-                    ("wbl_cono", "=", self.opts["conum"]),
-                    ("wbl_empno", "=", self.empno),
-                    ("wbl_balno", "=", balno)]
-                old = self.sql.getRec("wagbal", where=bwh, limit=1)
+                old = self.bal.get((self.empno, balno))
                 if old:
                     tmp = old[:-1]
                     if tmp[3] < emt:
@@ -634,7 +704,8 @@ No Records Have Been Updated.""")
             if old and tmp != old[:len(tmp)]:
                 col = self.sql.wagbal_col
                 tmp.append(old[col.index("wbl_xflag")])
-                self.sql.updRec("wagbal", data=tmp, where=bwh)
+                self.bal[(self.empno, balno)] = tmp
+                self.upbal[(self.empno, balno)] = tmp
             if rind == "N":
                 rmt = 0
             elif eind == "R":
@@ -668,15 +739,14 @@ No Records Have Been Updated.""")
             self.doWriteWagtf2(wagtf2)
             if cod in self.lonacc:
                 # Get Latest Loan
-                lon = self.sql.getRec("waglmf", cols=["max(wlm_loan)"],
-                    where=[("wlm_cono", "=", self.opts["conum"]),
-                    ("wlm_empno", "=", self.empno)], limit=1)[0]
+                lon = max(self.lmf.get(self.empno, [None]))
                 # Write Loan Transaction
                 emt = float(ASD(0) - ASD(emt))
                 dat = [self.opts["conum"], self.empno, lon, "Payslip", 4,
-                    self.rundt, self.pgnum, emt, 0, 0, 0, self.curdt,
-                    "Salary Deduction", "N", self.opts["capnm"], self.sysdtw, 0]
-                self.sql.insRec("wagltf", data=dat)
+                    self.rundt, CCD(self.pgnum, "Na", 9).work, emt, 0, 0, 0,
+                    self.curdt, "Salary Deduction", "N", self.opts["capnm"],
+                    self.sysdtw, 0]
+                self.wagltf.append(dat)
                 self.loan = False
 
     def doPAYE(self):
@@ -691,21 +761,11 @@ No Records Have Been Updated.""")
             if self.taxamt < 0:
                 self.taxamt = 0
             else:
-                tx = self.sql.getRec("wagtf2",
-                    cols=["round(sum(wt2_eamt),2)"], where=[("wt2_cono", "=",
-                    self.opts["conum"]), ("wt2_empno", "=", self.empno),
-                    ("wt2_date", "between", self.sdate, self.rundt),
-                    ("wt2_type", "=", "D"), ("wt2_code", "=", 1)])
-                if tx == [[None]]:
-                    tx = 0
-                else:
-                    tx = tx[0][0]
+                tx = self.tax.get(self.empno, 0)
                 self.taxamt = float(ASD(self.taxamt) - ASD(tx))
         if self.taxamt <= 0:
             return
-        ced = self.sql.getRec("wagedc", where=[("ced_cono", "=",
-            self.opts["conum"]), ("ced_type", "=", "D"), ("ced_code", "=", 1)],
-            limit=1)
+        ced = self.edc.get(("D", 1))
         if not ced:
             return
         eglco = int(ced[self.sql.wagedc_col.index("ced_eglco")])
@@ -754,10 +814,11 @@ No Records Have Been Updated.""")
         self.taxamt = float(ASD(self.taxamt) + ASD(ann) + ASD(ret))
 
     def doTaxableIncome(self):
-        ed = self.sql.getRec("wagtf1", cols=["round(sum(wt1_taxbl), 2)",
-            "round(sum(wt1_rtpay), 2)", "round(sum(wt1_anpay), 2)"],
-            where=[("wt1_cono", "=", self.opts["conum"]), ("wt1_empno", "=",
-            self.empno), ("wt1_date", "between", self.sdate, self.rundt)])
+        # Year to date totals, including this payslip
+        ed = [[]]
+        ytd = self.ytd.get(self.empno, [0, 0, 0])
+        for num, amt in enumerate((self.taxbl, self.rtpay, self.anpay)):
+            ed[0].append(float(ASD(ytd[num]) + ASD(amt)))
         inc = 0
         anp = 0
         if ed:
@@ -812,23 +873,20 @@ No Records Have Been Updated.""")
         loan = 0
         self.lonbl1 = 0
         self.lonbl2 = 0
+        lmfs = self.lmf.get(self.empno, {})
         while loan != 99:
             totpay = float(ASD(self.totern) - ASD(self.totded))
             if totpay <= 0:
                 return
             loan = loan + 1
-            lmf = self.sql.getRec("waglmf", where=[("wlm_cono", "=",
-                self.opts["conum"]), ("wlm_empno", "=", self.empno),
-                ("wlm_loan", "=", loan)], limit=1)
+            lmf = lmfs.get(loan)
             if not lmf:
                 continue
             dcode = lmf[self.sql.waglmf_col.index("wlm_code")]
             damnt = lmf[self.sql.waglmf_col.index("wlm_repay")]
             if not damnt:
                 return  # No deduction amount
-            ced = self.sql.getRec("wagedc", where=[("ced_cono", "=",
-                self.opts["conum"]), ("ced_type", "=", "D"), ("ced_code", "=",
-                dcode)], limit=1)
+            ced = self.edc.get(("D", dcode))
             if not ced:
                 return  # Missing Loan wagedc record
             mthly = ced[self.sql.wagedc_col.index("ced_monthly")]
@@ -857,30 +915,24 @@ No Records Have Been Updated.""")
             # Write Loan Transaction
             ded = float(ASD(0) - ASD(ded))
             dat = [self.opts["conum"], self.empno, loan, "Payslip", 4,
-                self.rundt, self.pgnum, ded, 0, 0, 0, self.curdt,
-                "Salary Deduction", "N", self.opts["capnm"], self.sysdtw, 0]
-            self.sql.insRec("wagltf", data=dat)
+                self.rundt, CCD(self.pgnum, "Na", 9).work, ded, 0, 0, 0,
+                self.curdt, "Salary Deduction", "N", self.opts["capnm"],
+                self.sysdtw, 0]
+            self.wagltf.append(dat)
 
     def doWriteWagtf2(self, dat):
-        old = self.sql.getRec("wagtf2", cols=["wt2_hrs", "wt2_eamt",
-            "wt2_ramt"], where=[("wt2_cono", "=", dat[0]), ("wt2_empno", "=",
-            dat[1]), ("wt2_page", "=", dat[2]), ("wt2_date", "=", dat[3]),
-            ("wt2_type", "=", dat[4]), ("wt2_code", "=", dat[5])], limit=1)
-        if old:
-            old[0] = float(ASD(old[0]) + ASD(dat[6]))
-            old[1] = float(ASD(old[1]) + ASD(dat[7]))
-            old[2] = float(ASD(old[2]) + ASD(dat[8]))
-            self.sql.updRec("wagtf2",
-                cols=["wt2_hrs", "wt2_eamt", "wt2_ramt"],
-                data=[old[0], old[1], old[2]],
-                where=[
-                    ("wt2_cono", "=", dat[0]),
-                    ("wt2_empno", "=", dat[1]),
-                    ("wt2_date", "=", dat[3]),
-                    ("wt2_type", "=", dat[4]),
-                    ("wt2_code", "=", dat[5])])
+        if dat[4] == "D" and dat[5] == 1:
+            # Year to date PAYE
+            self.tax[dat[1]] = float(ASD(self.tax.get(dat[1], 0)) +
+                ASD(dat[7]))
+        key = tuple(dat[:6])
+        if key in self.wagtf2:
+            old = self.wagtf2[key]
+            old[6] = float(ASD(old[6]) + ASD(dat[6]))
+            old[7] = float(ASD(old[7]) + ASD(dat[7]))
+            old[8] = float(ASD(old[8]) + ASD(dat[8]))
         else:
-            self.sql.insRec("wagtf2", data=dat)
+            self.wagtf2[key] = list(dat)
 
     def doPrint(self):
         if self.preview == "Y":
@@ -900,24 +952,31 @@ No Records Have Been Updated.""")
             "=", self.freq)], order="wt1_empno")
         if not tr1:
             return
+        # Transactions of all the employees
+        trns = {}
+        for t2 in self.sql.getRec("wagtf2", where=[("wt2_cono", "=",
+                self.opts["conum"]), ("wt2_date", "=", self.rundt)],
+                order="wt2_empno, wt2_page, wt2_type, wt2_code"):
+            trns.setdefault(t2[1], []).append(t2)
+        deps = {}
         for t1 in tr1:
             empno = int(t1[self.sql.wagtf1_col.index("wt1_empno")])
             self.dept = int(t1[self.sql.wagtf1_col.index("wt1_dept")])
             # Check that Department Accounts are Loaded
-            cols = ["dep_dr_coy", "dep_dr_sal", "dep_dr_com", "dep_cr_coy",
-                "dep_cr_sal", "dep_cr_com"]
-            self.glacno = self.sql.getRec("ctldep", cols=cols,
-                where=[("dep_cono", "=", self.opts["conum"]),
-                ("dep_code", "=", self.dept)], limit=1)
+            if self.dept not in deps:
+                cols = ["dep_dr_coy", "dep_dr_sal", "dep_dr_com",
+                    "dep_cr_coy", "dep_cr_sal", "dep_cr_com"]
+                deps[self.dept] = self.sql.getRec("ctldep", cols=cols,
+                    where=[("dep_cono", "=", self.opts["conum"]),
+                    ("dep_code", "=", self.dept)], limit=1)
+            self.glacno = deps[self.dept]
             if not self.glacno:
                 showError(self.opts["mf"].body, "Department Error",
                     "Department %s %s Has No valid GL Account Numbers. "\
                     "Please Correct it and Re-Run Payslips." %
                     (self.opts["conum"], self.dept))
                 return
-            tr2 = self.sql.getRec("wagtf2", where=[("wt2_cono", "=",
-                self.opts["conum"]), ("wt2_empno", "=", empno), ("wt2_date",
-                "=", self.rundt)])
+            tr2 = trns.get(empno)
             if not tr2:
                 continue
             for num, t2 in enumerate(tr2):
@@ -931,10 +990,9 @@ No Records Have Been Updated.""")
                 acc1 = int(t2[self.sql.wagtf2_col.index("wt2_gl_eacno")])
                 coy2 = self.glacno[3]
                 acc2 = self.glacno[4]
-                edc = self.sql.getRec("wagedc", cols=["ced_desc",
-                    "ced_eglco", "ced_eglno"], where=[("ced_cono", "=",
-                    self.opts["conum"]), ("ced_type", "=", wgtp), ("ced_code",
-                    "=", code)], limit=1)
+                edc = self.edc.get((wgtp, code))
+                edc = [edc[self.sql.wagedc_col.index(c)] for c in ("ced_desc",
+                    "ced_eglco", "ced_eglno")]
                 edes = edc[0]
                 if edc and not coy1:
                     coy1 = edc[1]
@@ -980,30 +1038,43 @@ No Records Have Been Updated.""")
                     err = self.doGenInt(coy2, eamt)
                     if err:
                         return
+        self.doWriteGen()
         return True
 
     def doGenTrn(self, cono, acno, amnt, edes=None):
+        # Accumulate the amount, written by doWriteGen
         if not edes:
             edes = "Salaries and Wages"
+        key = (cono, acno, edes)
+        if key in self.gentrn:
+            self.gentrn[key] = float(ASD(self.gentrn[key]) + ASD(amnt))
+        else:
+            self.gentrn[key] = amnt
+
+    def doWriteGen(self):
         batno = CCD("%03i%04i" % (self.opts["conum"], (self.curdt % 10000)),
             "Na", 7)
         refno = CCD(1, "Na", 9)
-        whr = [("glt_cono", "=", cono), ("glt_acno", "=", acno),
-            ("glt_curdt", "=", self.curdt), ("glt_trdt", "=", self.rundt),
-            ("glt_type", "=", 4), ("glt_refno", "=", refno.work),
-            ("glt_batch", "=", batno.work),
-            ("glt_desc", "=", edes)]
-        trn = self.sql.getRec("gentrn", cols=["glt_seq", "glt_tramt"],
-            where=whr, limit=1)
-        if not trn:
-            data = [cono, acno, self.curdt, self.rundt, 4, refno.work,
-                batno.work, amnt, 0.00, edes, "", "", 0, self.opts["capnm"],
-                self.sysdtw, 0]
+        data = []
+        for (cono, acno, edes), amnt in self.gentrn.items():
+            whr = [("glt_cono", "=", cono), ("glt_acno", "=", acno),
+                ("glt_curdt", "=", self.curdt), ("glt_trdt", "=", self.rundt),
+                ("glt_type", "=", 4), ("glt_refno", "=", refno.work),
+                ("glt_batch", "=", batno.work),
+                ("glt_desc", "=", edes)]
+            trn = self.sql.getRec("gentrn", cols=["glt_seq", "glt_tramt"],
+                where=whr, limit=1)
+            if not trn:
+                data.append([cono, acno, self.curdt, self.rundt, 4,
+                    refno.work, batno.work, amnt, 0.00, edes, "", "", 0,
+                    self.opts["capnm"], self.sysdtw, 0])
+            else:
+                newamt = float(ASD(trn[1]) + ASD(amnt))
+                self.sql.updRec("gentrn", cols=["glt_tramt"], data=[newamt],
+                    where=[("glt_seq", "=", int(trn[0]))])
+        if data:
             self.sql.insRec("gentrn", data=data)
-        else:
-            newamt = float(ASD(trn[1]) + ASD(amnt))
-            self.sql.updRec("gentrn", cols=["glt_tramt"], data=[newamt],
-                where=[("glt_seq", "=", int(trn[0]))])
+        self.gentrn = {}
 
     def doGenInt(self, cono, amnt):
         # General Ledger Transaction (Intercompany From)